@@ -0,0 +1,85 @@
+"""
+VALINTEL.AI — Audit Trail Archival
+==================================
+Seals closed months of the append-only Part 11 logs out of validation_app.db
+so the live database (and every WAL checkpoint and backup of it) stays small.
+Run it from cron, e.g. on the first of each month.
+
+    seal    — archive_seal_closed()  every month older than the hot window of
+              audit_log / signature_log / ai_gen_log → one gzipped read-only
+              SQLite segment per (table, month) under audit_archive/, recorded
+              in the hash-chained archive_segments table, then removed from the
+              live tables (the no-delete trigger is lifted only inside that
+              sealing transaction)
+    verify  — archive_verify()       re-walk the chain: prev_hash links, seal
+              hashes, segment file SHA-256; --deep re-reads every row
+    status  — list the recorded segments
+
+Sealed rows stay searchable: audit_search() and archive_frame() read the
+overlapping segments alongside the live tables.
+
+Usage:
+    python audit_archive.py [seal|verify|status] [--hot-months N]
+                            [--user NAME] [--no-vacuum] [--deep]
+
+    --hot-months N  calendar months kept live, the current one included
+                    (default: _ARCHIVE_HOT_MONTHS)
+    --no-vacuum     skip the VACUUM that returns freed pages to the filesystem
+
+Exit code: 0 = success / chain intact, 1 = a seal failed or a segment fails
+verification
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+
+def _generator():
+    sys.path.insert(0, str(ROOT))
+    import generator as G
+    return G
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("command", nargs="?", default="seal", choices=("seal", "verify", "status"))
+    ap.add_argument("--hot-months", type=int, default=None,
+                    help="calendar months kept in the live DB, current one included")
+    ap.add_argument("--user", default="archive", help="user recorded in the audit trail")
+    ap.add_argument("--no-vacuum", action="store_true", help="skip VACUUM after sealing")
+    ap.add_argument("--deep", action="store_true", help="verify: re-read and re-hash every row")
+    a = ap.parse_args()
+
+    G = _generator()
+    if a.command == "seal":
+        hot = a.hot_months or G._ARCHIVE_HOT_MONTHS
+        print(f"Sealing closed months before {G._archive_cutoff(hot)} → {G._ARCHIVE_DIR}")
+        try:
+            sealed = G.archive_seal_closed(a.user, hot_months=hot, vacuum=not a.no_vacuum)
+        except Exception as e:
+            print(f"  ❌ {e}")
+            return 1
+        for s in sealed:
+            print(f"  ✅ {s['table_name']:<14} {s['period']}  {s['row_count']:>9,} rows  "
+                  f"{s['file_bytes'] / 1024:>9,.1f} KB  seal {s['seal_hash'][:16]}")
+        print(f"{len(sealed)} segment(s) sealed.")
+        return 0
+
+    report = G.archive_verify(deep=a.deep and a.command == "verify")
+    if report.empty:
+        print("No archive segments recorded.")
+        return 0
+    print(report.to_string(index=False))
+    if a.command == "status":
+        return 0
+    bad = int((~report["ok"]).sum())
+    print(f"{len(report)} segment(s) — " + (f"{bad} FAIL verification" if bad
+                                             else "hash chain intact"))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,24 @@
+"""
+VALINTEL.AI — Synthetic LIMS Audit Trail Generator
+==================================================
+Usage:
+    python audit_sample_generate.py
+        Fixed 1,000-row reviewer sample → labware_comprehensive_test.csv
+
+    python audit_sample_generate.py <out.csv|out.xlsx> [--rows N] [--users N]
+            [--record-types N] [--start YYYY-MM-DD] [--days N]
+            [--rate SCENARIO=P ...] [--seed N] [--manifest path]
+        Scaled benchmark trail (10k–10M rows) with injected AT rule scenarios
+        and a ground-truth manifest (<out>.manifest.json by default).
+        e.g.  --rows 1000000 --users 2000 --days 180 --rate all=0.0002 --rate burst=0
+"""
+
 import csv
+import sys
+import json
+import heapq
 import random
+import argparse
 from datetime import datetime, timedelta
 
 def generate_audit_trail(filename="labware_comprehensive_test.csv"):
@@ -156,5 +175,353 @@ def generate_audit_trail(filename="labware_comprehensive_test.csv"):
     print(f"SUCCESS: Generated 1000 lines.")
     print(f"Target file: {filename}")
 
+# =============================================================================
+# SCALED GENERATOR — parametric baseline + controlled rule injection
+# =============================================================================
+# generate_audit_trail() above is the fixed 1,000-row reviewer sample. The
+# scaled generator below produces 10k–10M rows for throughput and recall
+# benchmarking of at_score_events(): a quiet baseline that fires no AT rule,
+# plus injected scenarios at a configurable rate per baseline row. Rows are
+# streamed to CSV/XLSX in timestamp order — multi-step scenarios wait in a
+# small heap until their time comes — so memory stays flat at any size.
+#
+# Every injected scenario gets its own record_id(s), and a ground-truth
+# manifest (JSON) lists them with the score column expected to fire, so
+# recall_report() can match a scored DataFrame back to what was planted.
+
+COLUMNS = ["timestamp", "user_id", "action_type", "record_type", "role",
+           "record_id", "comments", "old_value", "new_value", "status"]
+
+# Baseline rationale text: ≥3 words, an SOP reference (exempt from the Rule 1
+# copy-paste check) and no vague terms — so routine rows never fire Rule 1.
+_BASE_COMMENTS = [
+    "Result entered per SOP-QC-014 after instrument run",
+    "Value transcribed per SOP-LAB-002 from balance printout",
+    "Reading recorded per SOP-01 during scheduled analysis",
+    "Assay value captured per SOP-QC-021 from chromatography system",
+    "Sample weight logged per SOP-LAB-007 at preparation bench",
+]
+# No _AT_SENSITIVE / audit-control keywords — baseline record types stay quiet.
+_BASE_RECORD_TYPES = ["RESULTS", "BATCH", "SAMPLE_DATA", "SAMPLE", "BATCH_RELEASE",
+                      "INVENTORY", "INSTRUMENT", "STANDARD_PREP", "REAGENT"]
+_BASE_ROLES = ["Analyst", "Senior Analyst", "QC Reviewer"]
+
+# scenario → (v96 rule label, score column expected to fire, default rate)
+SCENARIOS = {
+    "delete_recreate":   ("#1 Record Reconstruction",        "score_del_recreate",              0.0005),
+    "audit_integrity":   ("#2 Audit Trail Integrity Event",  "score_record",                    0.0002),
+    "missing_values":    ("#3 Missing Before/After Values",  "score_rule17_missing_values",     0.0005),
+    "self_approval":     ("#4 Self-Approval SoD Violation",  "score_rule18_self_approval",      0.0005),
+    "mod_after_approval":("#5 Modification After Approval",  "score_rule19_mod_after_approval", 0.0005),
+    "vague_rationale":   ("#6 Vague Rationale",              "score_rule1_vague_rationale",     0.0005),
+    "drift":             ("#7 Change Control Drift",         "score_rule4_drift",               0.0002),
+    "service_account":   ("#8 Service / Shared Account",     "score_rule13_service_account",    0.0002),
+    "failed_login":      ("#9 Failed Login → Data Manipulation", "score_rule5_failed_login",    0.0002),
+    "privileged":        ("#10 Privileged User on GxP Data", "score_rule3_admin_conflict",      0.0002),
+    "missing_user":      ("#11 Missing User Attribution",    "score_rule16_missing_user",       0.0002),
+    "timestamp_reversal":("#12 Timestamp Reversal",          "score_rule12_timestamp_reversal", 0.0002),
+    "missing_timestamp": ("#13 Missing Timestamp",           "score_rule15_missing_ts",         0.0002),
+    "burst":             ("#15 Contemporaneous Burst",       "score_rule2_burst",               0.0001),
+    "status_reversal":   ("#17 Workflow Status Reversal",    "score_rule20_workflow_reversal",  0.0002),
+    "dormancy":          ("Dormant Account (UAR U11 — AT score column only)",
+                                                             "score_rule14_dormant_account",    0.0001),
+}
+
+_DORMANT_GAP_DAYS = 95   # engine threshold is 90 days
+
+
+def _ts(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _row(dt, user, action, rtype, role, rid, comment="", old="", new="", status=""):
+    return {"timestamp": _ts(dt) if dt is not None else "", "user_id": user,
+            "action_type": action, "record_type": rtype, "role": role,
+            "record_id": rid, "comments": comment, "old_value": old,
+            "new_value": new, "status": status}
+
+
+def _scenario_rows(name, inj, t, rng, analyst, span_end):
+    """Rows for one injected scenario starting at t: list of (datetime|None, row).
+    Returns None when the scenario cannot fit (dormancy past the span end)."""
+    m   = lambda n: timedelta(minutes=n)
+    sop = rng.choice(_BASE_COMMENTS)
+    val = lambda: f"{rng.uniform(7.0, 7.5):.2f}"
+    u1, u2 = analyst(), analyst()
+    while u2 == u1:
+        u2 = analyst()
+    rid = f"RES-{inj}"
+    if name == "delete_recreate":
+        return [(t,       _row(t,       u1, "UPDATE", "RESULTS", "Analyst", rid, sop, val(), val())),
+                (t+m(10), _row(t+m(10), u1, "DELETE", "RESULTS", "Analyst", rid, "Removed entry per SOP-QC-014 review", val(), "")),
+                (t+m(25), _row(t+m(25), u1, "INSERT", "RESULTS", "Analyst", rid, sop, "", val()))]
+    if name == "audit_integrity":
+        return [(t, _row(t, f"labadmin_{inj.lower()}", "UPDATE", "AUDIT_TRAIL", "Admin",
+                         f"SYS-{inj}", "System maintenance window", "ENABLED", "DISABLED"))]
+    if name == "missing_values":
+        return [(t, _row(t, u1, "UPDATE", "RESULTS", "Analyst", rid, sop, "", val()))]
+    if name == "self_approval":
+        return [(t,       _row(t,       u1, "INSERT",  "RESULTS", "Analyst", rid, sop, "", val())),
+                (t+m(20), _row(t+m(20), u1, "APPROVE", "RESULTS", "Analyst", rid, "Approved per SOP-QA-003", "", ""))]
+    if name == "mod_after_approval":
+        return [(t,       _row(t,       u1, "INSERT",  "RESULTS", "Analyst",     rid, sop, "", val())),
+                (t+m(30), _row(t+m(30), u2, "APPROVE", "RESULTS", "QC Reviewer", rid, "Approved per SOP-QA-003", "", "")),
+                (t+m(90), _row(t+m(90), u1, "UPDATE",  "RESULTS", "Analyst",     rid, sop, "7.10", "7.45"))]
+    if name == "vague_rationale":
+        return [(t, _row(t, u1, "UPDATE", "RESULTS", "Analyst", rid,
+                         rng.choice(["fixed", "error", "changed", "ok", "correction"]), val(), val()))]
+    if name == "drift":
+        return [(t, _row(t, u1, "UPDATE", "RESULTS", "Analyst", rid, sop, "7.20",
+                         f"{rng.uniform(140, 160):.1f}"))]
+    if name == "service_account":
+        svc = f"svc_{inj.lower()}"
+        return [(t,       _row(t,       svc, "UPDATE", "OOS_RESULT", "Service", f"OOS-{inj}", "Interface sync", val(), val())),
+                (t+m(5),  _row(t+m(5),  svc, "DELETE", "OOS_RESULT", "Service", f"OOS-{inj}", "Interface sync", val(), ""))]
+    if name == "failed_login":
+        s = timedelta(seconds=1)
+        out = [(t + s*20*k, _row(t + s*20*k, u1, "LOGIN_FAILED", "USER_SESSION", "Analyst",
+                                 f"SES-{inj}", "Wrong password")) for k in range(3)]
+        out.append((t+s*60, _row(t+s*60, u1, "LOGIN", "USER_SESSION", "Analyst", f"SES-{inj}", "Success")))
+        out.append((t+s*90, _row(t+s*90, u1, "DELETE", "RESULTS", "Analyst", rid,
+                                 "Removed entry per SOP-QC-014 review", val(), "")))
+        return out
+    if name == "privileged":
+        return [(t, _row(t, f"labadmin_{inj.lower()}", "UPDATE", "RESULTS", "Admin", rid, sop, val(), val()))]
+    if name == "missing_user":
+        return [(t, _row(t, "", "UPDATE", "RESULTS", "Analyst", rid, sop, val(), val()))]
+    if name == "timestamp_reversal":
+        return [(t,       _row(t,       u2, "APPROVE", "RESULTS", "QC Reviewer", rid, "Approved per SOP-QA-003", "", "")),
+                (t+m(30), _row(t+m(30), u1, "INSERT",  "RESULTS", "Analyst",     rid, sop, "", val()))]
+    if name == "missing_timestamp":
+        return [(t, _row(None, u1, "UPDATE", "RESULTS", "Analyst", rid, sop, val(), val()))]
+    if name == "burst":
+        s = timedelta(seconds=5)
+        return [(t + s*k, _row(t + s*k, u1, "RESULT_INSERT", "RESULTS", "Analyst",
+                               f"{rid}-{k:02d}", sop, "", val())) for k in range(12)]
+    if name == "status_reversal":
+        return [(t,       _row(t,       u1, "INSERT", "RESULTS", "Analyst",     rid, sop, "", val(), "draft")),
+                (t+m(15), _row(t+m(15), u2, "UPDATE", "RESULTS", "QC Reviewer", rid, "Reviewed per SOP-QA-003", "7.20", "7.21", "approved")),
+                (t+m(45), _row(t+m(45), u1, "UPDATE", "RESULTS", "Analyst",     rid, sop, "7.21", "7.35", "draft"))]
+    if name == "dormancy":
+        back = t + timedelta(days=_DORMANT_GAP_DAYS)
+        if back > span_end:
+            return None
+        usr = f"dormant_{inj.lower()}"
+        out = [(t+m(30*k), _row(t+m(30*k), usr, "UPDATE", "RESULTS", "Analyst",
+                                f"{rid}-{k}", sop, val(), val())) for k in range(4)]
+        out.append((back, _row(back, usr, "UPDATE", "RESULTS", "Analyst", f"{rid}-R", sop, val(), val())))
+        return out
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.fh = open(path, "w", newline="", encoding="utf-8")
+        self.w  = csv.DictWriter(self.fh, fieldnames=COLUMNS)
+        self.w.writeheader()
+
+    def write(self, row):
+        self.w.writerow(row)
+
+    def close(self):
+        self.fh.close()
+
+
+class _XlsxSink:
+    MAX_ROWS = 1_048_575   # Excel sheet limit minus the header row
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self.path = path
+        self.wb   = Workbook(write_only=True)
+        self.ws   = self.wb.create_sheet("Audit Trail")
+        self.ws.append(COLUMNS)
+        self.n    = 0
+
+    def write(self, row):
+        self.n += 1
+        if self.n > self.MAX_ROWS:
+            raise ValueError("XLSX output exceeds Excel's 1,048,576-row limit — use .csv")
+        self.ws.append([row[c] for c in COLUMNS])
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+def generate_scaled(out_path, rows=100_000, users=200, record_types=9,
+                    start="2026-01-01", days=90, rates=None, seed=42,
+                    manifest_path=None, quiet=False):
+    """
+    Stream a synthetic audit trail of `rows` baseline events (plus injected
+    scenario rows) to out_path (.csv or .xlsx) and write the ground-truth
+    manifest next to it (or to manifest_path).
+
+    rates — {scenario: probability per baseline row}; scenarios not listed use
+            their SCENARIOS default, 0 disables one.
+    Returns the manifest dict.
+    """
+    bad    = set(rates or {}) - set(SCENARIOS)
+    if bad:
+        raise ValueError(f"Unknown scenario(s): {', '.join(sorted(bad))}")
+    rng    = random.Random(seed)
+    rates  = {k: (rates or {}).get(k, d) for k, (_, _, d) in SCENARIOS.items()}
+    t0     = datetime.strptime(start, "%Y-%m-%d")
+    t_end  = t0 + timedelta(days=days)
+    step   = (t_end - t0) / max(rows, 1)
+    pool   = [f"analyst_{k:05d}" for k in range(max(users, 2))]
+    roles  = {u: rng.choice(_BASE_ROLES) for u in pool}
+    rtypes = (_BASE_RECORD_TYPES + [f"LIMS_TABLE_{k:03d}" for k in range(record_types)])[:max(record_types, 1)]
+    analyst = lambda: rng.choice(pool)
+
+    # Rule 2 fires on >10 same-type actions by one user inside 15 minutes;
+    # a dense baseline spread over too few users would trip it on its own.
+    per_user_15m = rows / len(pool) / max((t_end - t0).total_seconds() / 900, 1)
+    if per_user_15m >= 3 and not quiet:
+        print(f"WARNING: ~{per_user_15m:.1f} baseline events per user per 15 min — "
+              f"raise --users to keep the baseline below the Rule 2 burst threshold.")
+
+    sink = _XlsxSink(out_path) if out_path.lower().endswith(".xlsx") else _CsvSink(out_path)
+    pending, seq = [], 0          # heap of (datetime, seq, row) for future scenario steps
+    injections   = []
+    skipped      = {k: 0 for k in SCENARIOS}
+    written      = 0
+    active       = [(k, r) for k, r in rates.items() if r > 0]
+
+    def _flush_until(limit):
+        nonlocal written
+        while pending and (limit is None or pending[0][0] <= limit):
+            sink.write(heapq.heappop(pending)[2])
+            written += 1
+
+    try:
+        for i in range(rows):
+            t = t0 + step * i + timedelta(seconds=rng.uniform(0, max(step.total_seconds() - 1, 0)))
+            _flush_until(t)
+            user   = analyst()
+            action = rng.choices(["UPDATE", "INSERT", "VIEW"], weights=[70, 20, 10])[0]
+            rtype  = rng.choice(rtypes)
+            rid    = f"{rtype[:3]}-{i:09d}"
+            new    = f"{rng.uniform(7.0, 7.5):.2f}" if action != "VIEW" else ""
+            old    = f"{rng.uniform(7.0, 7.5):.2f}" if action == "UPDATE" else ""
+            sink.write(_row(t, user, action, rtype, roles[user], rid,
+                            rng.choice(_BASE_COMMENTS), old, new))
+            written += 1
+
+            for name, rate in active:
+                if rng.random() >= rate:
+                    continue
+                inj   = f"INJ{len(injections) + sum(skipped.values()):07d}"
+                steps = _scenario_rows(name, inj, t + timedelta(seconds=1), rng, analyst, t_end)
+                if steps is None:
+                    skipped[name] += 1
+                    continue
+                rule, col, _ = SCENARIOS[name]
+                injections.append({
+                    "id": inj, "scenario": name, "rule": rule, "score_col": col,
+                    "record_ids": sorted({r["record_id"] for _, r in steps}),
+                    "rows": len(steps),
+                })
+                for dt, r in steps:
+                    if dt is None:            # missing timestamp — no place in the order
+                        sink.write(r)
+                        written += 1
+                        continue
+                    heapq.heappush(pending, (dt, seq, r))
+                    seq += 1
+            if not quiet and rows >= 1_000_000 and (i + 1) % 1_000_000 == 0:
+                print(f"  … {i + 1:,} baseline rows")
+        _flush_until(None)
+    finally:
+        sink.close()
+
+    manifest = {
+        "generator":     "audit_sample_generate.generate_scaled",
+        "output":        out_path,
+        "seed":          seed,
+        "baseline_rows": rows,
+        "total_rows":    written,
+        "users":         len(pool),
+        "record_types":  rtypes,
+        "start":         start,
+        "days":          days,
+        "rates":         rates,
+        "counts":        {k: sum(1 for j in injections if j["scenario"] == k) for k in SCENARIOS},
+        "skipped":       {k: v for k, v in skipped.items() if v},
+        "injections":    injections,
+    }
+    manifest_path = manifest_path or out_path.rsplit(".", 1)[0] + ".manifest.json"
+    with open(manifest_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1)
+    if not quiet:
+        print(f"SUCCESS: Generated {written:,} lines ({rows:,} baseline + "
+              f"{written - rows:,} injected across {len(injections):,} scenarios).")
+        print(f"Target file: {out_path}")
+        print(f"Manifest:    {manifest_path}")
+    return manifest
+
+
+def recall_report(scored, manifest):
+    """
+    Match a scored DataFrame (at_score_events output) back to the manifest.
+    An injection counts as detected when any of its rows has a score > 0 in
+    its expected score column. Returns {scenario: {injected, detected, recall}}
+    plus "_baseline_fired" — baseline rows that fired any rule (false positives).
+    """
+    rid   = scored["record_id"].astype(str)
+    out   = {}
+    by_id = {}
+    for j in manifest["injections"]:
+        for r in j["record_ids"]:
+            by_id[r] = j
+    for j in manifest["injections"]:
+        col = j["score_col"]
+        hit = False
+        if col in scored.columns:
+            hit = bool((scored.loc[rid.isin(j["record_ids"]), col] > 0).any())
+        s = out.setdefault(j["scenario"], {"rule": j["rule"], "injected": 0, "detected": 0})
+        s["injected"] += 1
+        s["detected"] += int(hit)
+    for s in out.values():
+        s["recall"] = round(s["detected"] / s["injected"], 4) if s["injected"] else None
+    if "Risk_Tier" in scored.columns:
+        base = ~rid.isin(by_id)
+        out["_baseline_fired"] = int((base & scored["Risk_Tier"].isin(["Critical", "High", "Medium"])).sum())
+    return out
+
+
+def _parse_rates(pairs):
+    rates = {}
+    for p in pairs or []:
+        name, _, val = p.partition("=")
+        if name == "all":
+            rates.update({k: float(val) for k in SCENARIOS})
+        else:
+            rates[name] = float(val)
+    return rates
+
+
 if __name__ == "__main__":
-    generate_audit_trail()
\ No newline at end of file
+    if len(sys.argv) == 1:
+        generate_audit_trail()
+        sys.exit(0)
+    ap = argparse.ArgumentParser(
+        description="Scaled synthetic LIMS audit trail with rule injection and a ground-truth manifest.")
+    ap.add_argument("out", help="output path (.csv or .xlsx)")
+    ap.add_argument("--rows", type=int, default=100_000, help="baseline rows (injected rows are added)")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--record-types", type=int, default=9)
+    ap.add_argument("--start", default="2026-01-01", help="YYYY-MM-DD")
+    ap.add_argument("--days", type=int, default=90)
+    ap.add_argument("--rate", action="append", metavar="SCENARIO=P",
+                    help=f"injection rate per baseline row; 'all=P' sets every scenario. "
+                         f"Scenarios: {', '.join(SCENARIOS)}")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--manifest", default=None)
+    a = ap.parse_args()
+    rates = _parse_rates(a.rate)
+    bad   = set(rates) - set(SCENARIOS)
+    if bad:
+        ap.error(f"unknown scenario(s) in --rate: {', '.join(sorted(bad))}")
+    generate_scaled(a.out, rows=a.rows, users=a.users, record_types=a.record_types,
+                    start=a.start, days=a.days, rates=rates,
+                    seed=a.seed, manifest_path=a.manifest)
@@ -0,0 +1,425 @@
+"""
+VALINTEL.AI — Headless Batch Review & DIM Banking
+=================================================
+Scores a set of period files (e.g. LIMS_AT_Q1–Q4.csv) without the UI: each file
+goes through the same validator, engine, Top-N selection and evidence-workbook
+builder that show_audit_trail / show_uar / show_dci_review use, its DIM rows
+are banked to the persistent dim_bank table, and the DIM evidence package is
+built over every period stored for the system.
+
+    at   — at_score_events()     → AT_<system>_<period>.xlsx
+    uar  — uar_score_users()     → UAR_<system>_<period>.xlsx
+    dci  — dci_score_records()   → DCI_<system>_<period>.xlsx
+    dim  — dim_score_periods()   → DIM_<system>_<date>.xlsx  (≥ 2 stored periods)
+
+Period files are scored in parallel, one file per worker process. Narratives
+are the deterministic ones unless --model names an AI model.
+
+Usage:
+    python batch_review.py INPUT [--module at|uar|dci] [--system NAME]
+                           [--map column_map.json] [--out DIR] [--workers N]
+                           [--model MODEL_ID] [--user NAME] [--force]
+                           [--consolidate]
+
+INPUT is a directory (every .csv/.xlsx/.xls in it is one period of --module,
+labelled like the UI does) or a manifest JSON:
+
+    {"system": "LIMS",
+     "column_map": {"at": {"timestamp": "Event Time", "user_id": "Login"}},
+     "periods": [{"file": "Out/LIMS_AT_Q1.csv", "module": "at", "period": "Q1 2025"},
+                 {"file": "Out/LIMS_AT_Q2.csv", "module": "at"}]}
+
+column_map is {internal field: source header} per module — the same mapping the
+UI column mapper confirms. Fields it leaves out are auto-detected (AT) or
+resolved by the module's own alias table (UAR, DCI). --map loads the same
+object from a separate file. Relative paths resolve against the manifest.
+
+    --force    score files the input validator hard-rejects (logged as an
+               override in the audit trail, as the UI override button is).
+
+    --consolidate  UAR only: every file is one system's export for the same
+               review (system name = the manifest's per-file "system", else
+               the file stem). Systems are scored in parallel by
+               uar_score_systems(), each gets its own workbook, DIM rows and
+               DIM package, and UAR_CONSOLIDATED_<date>.xlsx adds the
+               cross-system findings (privileged in several systems, SoD
+               pairs spanning systems).
+
+A batch_summary.json with per-period counts, timings and output paths is
+written next to the workbooks.
+Exit code: 0 = every period scored and banked, 1 = one or more periods failed
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT      = Path(__file__).resolve().parent
+MODULES   = ("at", "uar", "dci")
+FILE_EXTS = (".csv", ".xlsx", ".xls")
+
+
+def _generator():
+    sys.path.insert(0, str(ROOT))
+    import generator as G
+    return G
+
+
+def _safe(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9-]+", "_", str(s)).strip("_")[:60]
+
+
+def _period_label(start: str, end: str, stem: str, with_stem: bool) -> str:
+    """Same labels the UI banks under: "start → end", plus "(file stem)" for
+    UAR / DCI so two exports covering the same dates stay distinct periods."""
+    rng = f"{start} → {end}".strip(" →") if (start or end) else ""
+    if rng and with_stem and stem:
+        return f"{rng} ({stem[:30]})"
+    return rng or stem
+
+
+# ── Per-period workers (one process each) ─────────────────────────────────────
+
+def _gate(spec: dict, severity: str, title: str):
+    """Headless stand-in for _render_validator_verdict: warn passes, a hard
+    reject stops the period unless --force."""
+    if severity == "hard_reject" and not spec["_force"]:
+        raise ValueError(f"input validator rejected the file: {title}")
+
+
+def _run_at(G, raw, name, column_map, spec, system, model_id):
+    df, sheets, _ = G._at_read_table(raw, name)
+    _, sev, title, _, _ = G._validate_at_input_file(raw, name, df, sheets)
+    _gate(spec, sev, title)
+    mapping = {f: column_map.get(f) or G._at_autodetect_column(f, df.columns)
+               for f in G._AT_REQUIRED_COLS}
+    mdf = df.rename(columns={v: k for k, v in mapping.items()
+                             if v and v != "(not in file)" and v in df.columns})
+    for c in G._AT_REQUIRED_COLS:
+        if c not in mdf.columns:
+            mdf[c] = ""
+    r_start, r_end, _ = G._at_review_period(mdf)
+    r_start = spec.get("review_start", r_start)
+    r_end   = spec.get("review_end", r_end)
+    period  = spec.get("period") or _period_label(r_start, r_end, Path(name).stem, False)
+
+    cfg    = dict(G._AT_RULE_DEFAULTS)
+    prof   = {}
+    scored = G.at_score_events(mdf, rule_config=cfg, profile=prof, workers=1)
+    scored, top, _, n_oop = G._at_select_for_review(scored, r_start, r_end)
+    top = top.copy()
+    top["AI_Justification"] = [G._at_deterministic_justification(r.to_dict())
+                               for _, r in top.iterrows()]
+    settings = dict(cfg, at_system_name=system, at_rule_profile=prof)
+    xlsx = G.at_build_excel(top, scored, system,
+                            r_start or "(review period dates not specified)",
+                            r_end   or "(review period dates not specified)",
+                            name, settings=settings)
+    rows = G._at_dim_rows(scored, period, system, name, cfg)
+    return dict(period=period, validator=sev, validator_title=title,
+                records=len(scored), escalated=len(top), out_of_period=n_oop,
+                critical=int((scored["Risk_Tier"] == "Critical").sum()),
+                engine_seconds=prof.get("total_seconds")), xlsx, rows
+
+
+def _read_uar(G, raw, name, column_map, spec):
+    df, sheets, _ = G._uar_read_table(raw, name)
+    _, sev, title, _, _ = G._validate_uar_input_file(raw, name, df, sheets)
+    _gate(spec, sev, title)
+    r_start, r_end = G._uar_review_period(df)
+    r_start = spec.get("review_start", r_start)
+    r_end   = spec.get("review_end", r_end)
+    period  = spec.get("period") or _period_label(r_start, r_end, Path(name).stem, True)
+    rename  = {v: k for k, v in column_map.items() if v in df.columns and v != k}
+    return df.rename(columns=rename), sev, title, r_start, r_end, period
+
+
+def _finish_uar(G, result, name, system, r_start, r_end, period, model_id):
+    """Narratives, workbook and DIM rows for one scored UAR export."""
+    if result["data_quality_issues"]:
+        raise ValueError("; ".join(result["data_quality_issues"]))
+    top = result["top_users"]
+    if not top.empty:
+        if model_id:
+            result["top_users"] = G.uar_generate_justifications(top, model_id)
+        else:
+            top = top.copy()
+            top["System_Narrative"] = [G._uar_deterministic_narrative(r.to_dict())
+                                       for _, r in top.iterrows()]
+            result["top_users"] = top
+    xlsx = G.uar_build_excel(result, system, r_start, r_end, name)
+    rows = G._uar_dim_rows(result, period, system, name)
+    return dict(period=period, records=int(result["summary"].get("total_users", 0)),
+                escalated=len(result["top_users"])), xlsx, rows
+
+
+def _run_uar(G, raw, name, column_map, spec, system, model_id):
+    df, sev, title, r_start, r_end, period = _read_uar(G, raw, name, column_map, spec)
+    info, xlsx, rows = _finish_uar(G, G.uar_score_users(df), name, system,
+                                   r_start, r_end, period, model_id)
+    return dict(info, validator=sev, validator_title=title), xlsx, rows
+
+
+def _run_dci(G, raw, name, column_map, spec, system, model_id):
+    import pandas as pd
+    import dci_module as D
+    df, sheets = D._dci_read_table(raw, name)
+    _, sev, title, _, _ = D._validate_dci_input_file(raw, name, df, sheets)
+    _gate(spec, sev, title)
+    rename = {v: k for k, v in column_map.items() if v in df.columns and v != k}
+    dci_df = D._dci_apply_column_aliases(df.rename(columns=rename))
+    cfg    = dict(D._DCI_RULE_DEFAULTS)
+    scored = D.dci_score_records(dci_df, rule_config=cfg)
+    r_start = r_end = ""
+    if "open_date" in scored.columns:
+        dates = pd.to_datetime(scored["open_date"], errors="coerce").dropna()
+        if len(dates):
+            r_start = dates.min().strftime("%d-%b-%Y")
+            r_end   = dates.max().strftime("%d-%b-%Y")
+    r_start = spec.get("review_start", r_start)
+    r_end   = spec.get("review_end", r_end)
+    period  = spec.get("period") or _period_label(r_start, r_end, Path(name).stem, True)
+    cfg_hash = G.hashlib.sha256(json.dumps(cfg, sort_keys=True).encode()).hexdigest()[:16]
+    xlsx = D.dci_build_excel(scored, system, r_start, r_end, name,
+                             config_hash=cfg_hash, operator_user=spec["_user"],
+                             model_used=model_id, rule_config=cfg)
+    rows, _ = D._dci_dim_rows(scored, period, system, name,
+                              event_category_fn=G._dim_event_category)
+    return dict(period=period, validator=sev, validator_title=title,
+                records=len(scored),
+                escalated=int(scored["Risk_Tier"].isin(["Critical", "High"]).sum())), xlsx, rows
+
+
+_RUNNERS = {"at": _run_at, "uar": _run_uar, "dci": _run_dci}
+
+
+def _score_period(spec: dict) -> dict:
+    """Worker entry point: score one period file and write its workbook.
+    Returns a JSON-able summary plus the DIM rows for the parent to bank —
+    only the parent touches dim_bank, so there is one writer."""
+    t0  = time.perf_counter()
+    out = {"file": spec["file"], "module": spec["module"], "ok": False}
+    try:
+        G    = _generator()
+        path = Path(spec["file"])
+        info, xlsx, rows = _RUNNERS[spec["module"]](
+            G, path.read_bytes(), path.name, spec.get("_column_map") or {},
+            spec, spec["_system"], spec["_model"])
+        wb = Path(spec["_out"]) / (f"{spec['module'].upper()}_{_safe(spec['_system'])}_"
+                                   f"{_safe(info['period']) or _safe(path.stem)}.xlsx")
+        wb.write_bytes(xlsx)
+        out.update(info, ok=True, workbook=str(wb), dim_rows=rows)
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+    out["seconds"] = round(time.perf_counter() - t0, 3)
+    return out
+
+
+def _consolidate_uar(G, periods: list, out: Path, workers: int) -> tuple:
+    """--consolidate: every file is one system's UAR export for the same
+    review. The exports are scored together by uar_score_systems (one system
+    per worker process). Each system then gets its own workbook and DIM
+    rows, and the cross-system findings get UAR_CONSOLIDATED_<date>.xlsx.
+    Returns (per-system results shaped like _score_period's, consolidated
+    info)."""
+    t0 = time.perf_counter()
+    read, results = {}, []
+    for spec in periods:
+        path   = Path(spec["file"])
+        system = str(spec.get("system") or path.stem)
+        out_r  = {"file": spec["file"], "module": "uar", "system": system, "ok": False}
+        try:
+            if system in read:
+                raise ValueError(f"system '{system}' appears twice — set \"system\" per file")
+            df, sev, title, r_start, r_end, period = _read_uar(
+                G, path.read_bytes(), path.name, spec.get("_column_map") or {}, spec)
+            read[system] = (spec, df, r_start, r_end, period)
+            out_r.update(validator=sev, validator_title=title)
+        except Exception as e:
+            out_r["error"] = f"{type(e).__name__}: {e}"
+        results.append(out_r)
+
+    cons = G.uar_score_systems({s: v[1] for s, v in read.items()}, workers=workers)
+    for r in results:
+        if "error" in r:
+            continue
+        t1 = time.perf_counter()
+        spec, _, r_start, r_end, period = read[r["system"]]
+        name = Path(r["file"]).name
+        try:
+            info, xlsx, rows = _finish_uar(G, cons["systems"][r["system"]], name,
+                                           r["system"], r_start, r_end, period,
+                                           spec["_model"])
+            wb = out / f"UAR_{_safe(r['system'])}_{_safe(period) or _safe(Path(name).stem)}.xlsx"
+            wb.write_bytes(xlsx)
+            r.update(info, ok=True, workbook=str(wb), dim_rows=rows)
+        except Exception as e:
+            r["error"] = f"{type(e).__name__}: {e}"
+        r["seconds"] = round(time.perf_counter() - t1, 3)
+
+    # Review period of the consolidated package spans every system's period
+    span = G.pd.to_datetime(G.pd.Series([d for v in read.values() for d in v[2:4] if d],
+                                        dtype=object),
+                            errors="coerce", dayfirst=True).dropna()
+    r_span = ((span.min().strftime("%d-%b-%Y"), span.max().strftime("%d-%b-%Y"))
+              if len(span) else ("", ""))
+    xlsx = G.uar_build_consolidated_excel(cons, *r_span)
+    wb = out / f"UAR_CONSOLIDATED_{datetime.datetime.utcnow():%Y-%m-%d}.xlsx"
+    wb.write_bytes(xlsx)
+    smry = {k: v for k, v in cons["summary"].items() if k != "per_system"}
+    info = dict(smry, identity_key=cons["identity_key"], workbook=str(wb),
+                seconds=round(time.perf_counter() - t0, 3))
+    return results, info
+
+
+# ── Input resolution ──────────────────────────────────────────────────────────
+
+def _load_periods(a) -> tuple:
+    """(system, column_map, [period spec]) from a directory or manifest."""
+    src = Path(a.input)
+    column_map, system, periods = {}, a.system, []
+    if src.is_dir():
+        if not a.module:
+            raise SystemExit("--module is required when INPUT is a directory")
+        periods = [{"file": str(p), "module": a.module}
+                   for p in sorted(src.iterdir())
+                   if p.suffix.lower() in FILE_EXTS and not p.name.startswith("~$")]
+    else:
+        man = json.loads(src.read_text(encoding="utf-8"))
+        column_map = man.get("column_map") or {}
+        system     = system or man.get("system")
+        for p in man.get("periods") or []:
+            p = dict(p)
+            p["file"]   = str((src.parent / p["file"]).resolve())
+            p["module"] = str(p.get("module") or a.module or "").lower()
+            periods.append(p)
+    if a.map:
+        column_map = json.loads(Path(a.map).read_text(encoding="utf-8"))
+    bad = sorted({p["module"] for p in periods} - set(MODULES))
+    if bad:
+        raise SystemExit(f"unknown module(s): {', '.join(bad) or '(missing)'}")
+    if not periods:
+        raise SystemExit(f"no period files found in {src}")
+    return system or "System", column_map, periods
+
+
+def _dim(G, system: str, out: Path, model: str) -> dict:
+    """DIM evidence package over every period stored for the system."""
+    dim = {"periods": 0, "workbook": None}
+    rows = G._dim_store_load(system)
+    n_periods = len({r.get("Review_Period") for r in rows})
+    dim["periods"] = n_periods
+    if n_periods >= 2:
+        result = G.dim_score_periods(G._dim_normalise_columns(G.pd.DataFrame(rows)))
+        if "error" in result:
+            dim["error"] = result["error"]
+            print(f"  ❌ DIM {system}: {result['error']}")
+        else:
+            modules = " + ".join(sorted({r.get("Source_Module", "AT") for r in rows}))
+            xlsx = G.dim_build_excel(result, system, f"{modules} ({n_periods} periods)", model)
+            wb = out / f"DIM_{_safe(system)}_{datetime.datetime.utcnow():%Y-%m-%d}.xlsx"
+            wb.write_bytes(xlsx)
+            dim["workbook"] = str(wb)
+            print(f"  📊 DIM {system} over {n_periods} stored periods → {wb.name}")
+    else:
+        print(f"  DIM {system} skipped — {n_periods} stored period(s), "
+              f"2 needed for trend analysis")
+    return dim
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("input", help="directory of period files or manifest JSON")
+    ap.add_argument("--module", choices=MODULES, help="module for a directory input")
+    ap.add_argument("--system", help="system name (overrides the manifest)")
+    ap.add_argument("--map", help="column map JSON {module: {field: header}}")
+    ap.add_argument("--out", default="batch_out", help="output directory")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="parallel period files (default: min(files, CPUs))")
+    ap.add_argument("--model", default="", help="AI model for narratives (default: deterministic)")
+    ap.add_argument("--user", default="batch", help="user recorded in the audit trail")
+    ap.add_argument("--force", action="store_true", help="override validator hard-rejects")
+    ap.add_argument("--consolidate", action="store_true",
+                    help="UAR only: each file is one system's export; add cross-system analytics")
+    a = ap.parse_args()
+
+    system, column_map, periods = _load_periods(a)
+    out = Path(a.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for p in periods:
+        p.update(_system=system, _model=a.model, _out=str(out), _user=a.user,
+                 _force=a.force, _column_map=column_map.get(p["module"], {}))
+
+    workers = max(1, min(len(periods), a.workers or os.cpu_count() or 1))
+    t0 = time.perf_counter()
+    consolidated = None
+    if a.consolidate:
+        if {p["module"] for p in periods} != {"uar"}:
+            raise SystemExit("--consolidate takes UAR exports only")
+        print(f"Consolidating {len(periods)} system export(s) on {workers} worker(s)…")
+        results, consolidated = _consolidate_uar(_generator(), periods, out, workers)
+    else:
+        print(f"Scoring {len(periods)} period file(s) for '{system}' on {workers} worker(s)…")
+        if workers == 1:
+            results = [_score_period(p) for p in periods]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(_score_period, periods))
+
+    G = _generator()
+    failed = False
+    for r in results:
+        if not r["ok"]:
+            failed = True
+            print(f"  ❌ {Path(r['file']).name}: {r['error']}")
+            continue
+        r_system = r.get("system", system)
+        G._dim_store_bank(r.pop("dim_rows"), r_system, r["period"], r["module"].upper(),
+                          Path(r["file"]).name, a.user)
+        G.log_audit(a.user, f"{r['module'].upper()}_BATCH_RUN", "DATASET",
+                    new_value=f"{r['records']} records, {r['escalated']} escalated",
+                    reason=f"System: {r_system} · Period: {r['period']} · "
+                           f"File: {Path(r['file']).name}"
+                           + (" · validator override" if r["validator"] == "hard_reject" else ""))
+        print(f"  ✅ {r['module'].upper():<3} {r['period']:<40} {r['records']:>9,} records "
+              f"{r['escalated']:>5} escalated  {r['seconds']:>7.1f}s  → {Path(r['workbook']).name}")
+
+    # ── DIM over every stored period for each system ─────────────────────────
+    systems = list(dict.fromkeys(r["system"] for r in results if r["ok"])) \
+        if a.consolidate else [system]
+    dim = {s: _dim(G, s, out, a.model) for s in systems}
+    failed = failed or any("error" in d for d in dim.values())
+    if not a.consolidate:
+        dim = dim[system]
+
+    summary = {"system": system, "run_at": datetime.datetime.utcnow().isoformat(),
+               "version": G.VERSION, "user": a.user, "workers": workers,
+               "seconds": round(time.perf_counter() - t0, 3),
+               "periods": results, "dim": dim}
+    if consolidated:
+        summary["consolidated"] = consolidated
+        print(f"  🔗 {consolidated['multi_system_privileged']} multi-system privileged, "
+              f"{consolidated['cross_system_sod_count']} cross-system SoD "
+              f"→ {Path(consolidated['workbook']).name}")
+        if consolidated["unkeyed_accounts"]:
+            print(f"  ⚠️ {consolidated['unkeyed_accounts']} account(s) carry no identity "
+                  f"value — see the Unkeyed Accounts sheet")
+        G.log_audit(a.user, "UAR_CONSOLIDATED_RUN", "DATASET",
+                    new_value=f"{consolidated['systems']} systems, "
+                              f"{consolidated['identities']} identities",
+                    reason=f"{consolidated['multi_system_privileged']} multi-system privileged · "
+                           f"{consolidated['cross_system_sod_count']} cross-system SoD")
+    (out / "batch_summary.json").write_text(json.dumps(summary, indent=2, default=str),
+                                            encoding="utf-8")
+    print(f"Summary written to {out / 'batch_summary.json'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
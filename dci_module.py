@@ -111,6 +111,8 @@ def _gen():
         "_cols_lower":                    _gen_mod._cols_lower,
         "_matching_cols":                 _gen_mod._matching_cols,
         "_find_col":                      _gen_mod._find_col,
+        "_col_alias_resolve":             _gen_mod._col_alias_resolve,
+        "_col_alias_kind":                _gen_mod._col_alias_kind,
         "_verdict_from_results":          _gen_mod._verdict_from_results,
         "_VALINTEL_SHEET_FINGERPRINTS":   _gen_mod._VALINTEL_SHEET_FINGERPRINTS,
         "_VALINTEL_COLUMN_FINGERPRINTS":  _gen_mod._VALINTEL_COLUMN_FINGERPRINTS,
@@ -190,6 +192,11 @@ _DCI_COLUMN_ALIASES = {
     "sla_days": "sla_days", "sla": "sla_days", "due_days": "sla_days",
     "target_days": "sla_days", "closure_sla": "sla_days",
 }
+# canonical → every alias for it (validator column checks), built once
+_DCI_ALIASES_BY_CANON = {
+    canon: frozenset(a for a, c in _DCI_COLUMN_ALIASES.items() if c == canon)
+    for canon in set(_DCI_COLUMN_ALIASES.values())
+}
 
 # Cross-module rejection detection
 _DCI_VOCAB_COLUMNS = {
@@ -261,14 +268,11 @@ def _validate_dci_input_file(raw_bytes: bytes, file_name: str, df: pd.DataFrame,
     results  = []
     evidence = []
 
+    cols_norm = _gen()["_cols_lower"](df)
+
     def _has_dci_col(canonical: str) -> tuple:
         """Returns (has_col, actual_column_name_found)."""
-        aliases_for_canonical = {
-            alias for alias, canon in _DCI_COLUMN_ALIASES.items()
-            if canon == canonical
-        }
-        cols_norm = _gen()["_cols_lower"](df)
-        hit = cols_norm & aliases_for_canonical
+        hit = cols_norm & _DCI_ALIASES_BY_CANON.get(canonical, frozenset())
         if hit:
             return True, sorted(hit)[0]
         return False, ""
@@ -521,6 +525,55 @@ _DCI_RULE_DISPLAY_NAMES = {
 # ═══════════════════════════════════════════════════════════════════════════
 #  Helpers
 # ═══════════════════════════════════════════════════════════════════════════
+def _dci_read_table(raw_bytes, file_name):
+    """Read a DCI upload as blank-filled string columns.
+
+    Returns (df, sheet_names). CSV reports its own file name as the only
+    sheet; Excel prefers a deviation / CAPA / incident-named sheet.
+    """
+    if file_name.lower().endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(raw_bytes), dtype=str).fillna("")
+        return df, [file_name]
+    xl = pd.ExcelFile(io.BytesIO(raw_bytes))
+    all_sheets = xl.sheet_names
+    preferred = None
+    for s in all_sheets:
+        sn = str(s).lower()
+        if any(k in sn for k in ("deviation", "capa", "incident",
+                                  "investigation", "nc", "record")):
+            preferred = s; break
+    sheet_to_use = preferred or all_sheets[0]
+    df = pd.read_excel(
+        io.BytesIO(raw_bytes), sheet_name=sheet_to_use, dtype=str
+    ).fillna("")
+    return df, all_sheets
+
+
+def _dci_alias_renames(columns: list) -> dict:
+    col_rename = {}
+    for col in columns:
+        norm = str(col).strip().lower().replace(" ", "_")
+        if norm in _DCI_COLUMN_ALIASES:
+            canonical = _DCI_COLUMN_ALIASES[norm]
+            if canonical != col:
+                col_rename[col] = canonical
+    return col_rename
+
+
+def _dci_apply_column_aliases(df_raw):
+    """Copy of df_raw with known header variants renamed to the canonical
+    DCI column names (_DCI_COLUMN_ALIASES). The rename map is resolved once
+    per header layout by generator's shared _col_alias_resolve."""
+    g = _gen()
+    col_rename = g["_col_alias_resolve"](
+        g["_col_alias_kind"]("dci", _DCI_COLUMN_ALIASES), df_raw.columns,
+        _dci_alias_renames)
+    df = df_raw.copy()
+    if col_rename:
+        df = df.rename(columns=col_rename)
+    return df
+
+
 def _dci_normalize_status(status) -> str:
     """Canonicalize status to one of: closed | reopened | open | other."""
     if status is None or (isinstance(status, float) and pd.isna(status)):
@@ -551,142 +604,120 @@ def _dci_parse_date(v):
 # ═══════════════════════════════════════════════════════════════════════════
 #  ENGINE A — RCA Recurrence (Rules 1-3)
 # ═══════════════════════════════════════════════════════════════════════════
-def _dci_rule1_recurring_category(df):
-    """Rule 1 — Recurring Category. Same deviation_category in >=3 records
-    within 180-day sliding window. Medium severity."""
+# Rules 1-3 are the same test on different keys: the first run of records
+# (in open-date order) sharing a key whose open dates all fall within N days
+# of the run's first record. _dci_first_dense_windows() finds that run for
+# every key in one sort + searchsorted pass; the rules differ only in the
+# key column, window, minimum count, severity and rationale.
+_DAY_NS = 86_400 * 10**9
+
+
+def _dci_date_ns(dates):
+    """int64 nanoseconds since epoch for a parsed date Series (tz-aware
+    values compared in UTC); NaT maps to the int64 minimum."""
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_convert("UTC").dt.tz_localize(None)
+    return dates.to_numpy(dtype="datetime64[ns]").astype("int64")
+
+
+def _dci_first_dense_windows(keys, dates, window_days, min_count):
+    """For each key, the first window of >= min_count records whose open
+    dates are within window_days (whole days, as Timedelta.days counts them)
+    of the window's first record.
+
+    keys / dates — aligned Series (normalised key strings, parsed open dates).
+    Returns {key: (positions, start_ts, end_ts)}; positions are 0-based row
+    positions in date order (ties in row order).
+    """
+    import numpy as np
+    valid = (~keys.isin(["nan", "none", ""])) & dates.notna()
+    if int(valid.sum()) < min_count:
+        return {}
+    k   = keys[valid].to_numpy()
+    t   = _dci_date_ns(dates[valid])
+    pos = np.flatnonzero(valid.to_numpy())
+    codes, uniques = pd.factorize(k)
+    order = np.lexsort((pos, t, codes))
+    codes, t, pos = codes[order], t[order], pos[order]
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends   = np.concatenate((bounds, [len(codes)]))
+    # (d_j - d_i).days <= W  ⇔  d_j - d_i < (W + 1) days, for d_j >= d_i
+    limit = (window_days + 1) * _DAY_NS
+    out = {}
+    for a, b in zip(starts, ends):
+        if b - a < min_count:
+            continue
+        tt  = t[a:b]
+        cnt = np.searchsorted(tt, tt + limit, side="left") - np.arange(b - a)
+        hit = np.flatnonzero(cnt >= min_count)
+        if not len(hit):
+            continue
+        s0, s1 = int(hit[0]), int(hit[0] + cnt[hit[0]])
+        rows = pos[a + s0:a + s1]
+        out[uniques[codes[a]]] = (rows, dates.iloc[rows[0]], dates.iloc[rows[-1]])
+    return out
+
+
+def _dci_recurrence_rule(df, key_col, window_days, min_count, severity, rationale):
+    """Score + rationale Series for one recurrence rule. `rationale` is
+    called as rationale(key, n_in_window, window_start, window_end)."""
     n = len(df)
     scores    = [0.0] * n
     rationales = [""]  * n
-    if "deviation_category" not in df.columns or "open_date" not in df.columns:
+    if key_col not in df.columns or "open_date" not in df.columns:
         return pd.Series(scores, index=df.index), pd.Series(rationales, index=df.index)
 
-    cats  = df["deviation_category"].astype(str).str.strip().str.lower()
+    keys  = df[key_col].astype(str).str.strip().str.lower()
     dates = pd.to_datetime(df["open_date"], errors="coerce")
-
-    from collections import defaultdict
-    cat_index = defaultdict(list)
-    for i, (c, d) in enumerate(zip(cats, dates)):
-        if c and c not in ("nan", "none", "") and pd.notna(d):
-            cat_index[c].append((i, d))
-
-    for cat, entries in cat_index.items():
-        if len(entries) < 3:
-            continue
-        entries.sort(key=lambda x: x[1])
-        dates_arr = [e[1] for e in entries]
-        for start_i in range(len(entries)):
-            end_i = start_i
-            while (end_i + 1 < len(entries) and
-                   (dates_arr[end_i + 1] - dates_arr[start_i]).days <= 180):
-                end_i += 1
-            if end_i - start_i + 1 >= 3:
-                n_in_window = end_i - start_i + 1
-                window_start = dates_arr[start_i].strftime("%Y-%m-%d")
-                window_end   = dates_arr[end_i].strftime("%Y-%m-%d")
-                for j in range(start_i, end_i + 1):
-                    row_idx = entries[j][0]
-                    if scores[row_idx] == 0.0:
-                        scores[row_idx] = _DCI_SEVERITY_SCORE["Medium"]
-                        rationales[row_idx] = (
-                            f"Deviation category '{cat}' appeared in "
-                            f"{n_in_window} records between {window_start} and "
-                            f"{window_end} — possible recurring systemic cause. "
-                            "ICH Q10 §3.2 requires effective CAPA to prevent "
-                            "recurrence."
-                        )
-                break
+    for key, (rows, w_start, w_end) in _dci_first_dense_windows(
+            keys, dates, window_days, min_count).items():
+        text = rationale(key, len(rows), w_start, w_end)
+        for row_idx in rows:
+            scores[row_idx]     = _DCI_SEVERITY_SCORE[severity]
+            rationales[row_idx] = text
     return (pd.Series(scores, index=df.index),
             pd.Series(rationales, index=df.index))
 
 
+def _dci_rule1_recurring_category(df):
+    """Rule 1 — Recurring Category. Same deviation_category in >=3 records
+    within 180-day sliding window. Medium severity."""
+    return _dci_recurrence_rule(
+        df, "deviation_category", 180, 3, "Medium",
+        lambda cat, n, w0, w1: (
+            f"Deviation category '{cat}' appeared in "
+            f"{n} records between {w0.strftime('%Y-%m-%d')} and "
+            f"{w1.strftime('%Y-%m-%d')} — possible recurring systemic cause. "
+            "ICH Q10 §3.2 requires effective CAPA to prevent "
+            "recurrence."
+        ))
+
+
 def _dci_rule2_repeat_category_hivol(df):
     """Rule 2 — Repeat Category High Volume. Same deviation_category in >=5
     records within 90-day window. High severity."""
-    n = len(df)
-    scores    = [0.0] * n
-    rationales = [""]  * n
-    if "deviation_category" not in df.columns or "open_date" not in df.columns:
-        return pd.Series(scores, index=df.index), pd.Series(rationales, index=df.index)
-
-    cats  = df["deviation_category"].astype(str).str.strip().str.lower()
-    dates = pd.to_datetime(df["open_date"], errors="coerce")
-
-    from collections import defaultdict
-    cat_index = defaultdict(list)
-    for i, (c, d) in enumerate(zip(cats, dates)):
-        if c and c not in ("nan", "none", "") and pd.notna(d):
-            cat_index[c].append((i, d))
-
-    for cat, entries in cat_index.items():
-        if len(entries) < 5:
-            continue
-        entries.sort(key=lambda x: x[1])
-        dates_arr = [e[1] for e in entries]
-        for start_i in range(len(entries)):
-            end_i = start_i
-            while (end_i + 1 < len(entries) and
-                   (dates_arr[end_i + 1] - dates_arr[start_i]).days <= 90):
-                end_i += 1
-            if end_i - start_i + 1 >= 5:
-                n_in_window = end_i - start_i + 1
-                for j in range(start_i, end_i + 1):
-                    row_idx = entries[j][0]
-                    if scores[row_idx] == 0.0:
-                        scores[row_idx] = _DCI_SEVERITY_SCORE["High"]
-                        rationales[row_idx] = (
-                            f"Deviation category '{cat}' appeared in "
-                            f"{n_in_window} records within 90 days — "
-                            "high-volume recurrence indicates prior CAPA "
-                            "ineffective. 21 CFR 820.100(a)(2), ICH Q10 §3.2.3."
-                        )
-                break
-    return (pd.Series(scores, index=df.index),
-            pd.Series(rationales, index=df.index))
+    return _dci_recurrence_rule(
+        df, "deviation_category", 90, 5, "High",
+        lambda cat, n, w0, w1: (
+            f"Deviation category '{cat}' appeared in "
+            f"{n} records within 90 days — "
+            "high-volume recurrence indicates prior CAPA "
+            "ineffective. 21 CFR 820.100(a)(2), ICH Q10 §3.2.3."
+        ))
 
 
 def _dci_rule3_repeat_system(df):
     """Rule 3 — Repeat System. Same system_name has >=3 deviations within
     60-day window. High severity."""
-    n = len(df)
-    scores    = [0.0] * n
-    rationales = [""]  * n
-    if "system_name" not in df.columns or "open_date" not in df.columns:
-        return pd.Series(scores, index=df.index), pd.Series(rationales, index=df.index)
-
-    systems = df["system_name"].astype(str).str.strip().str.lower()
-    dates   = pd.to_datetime(df["open_date"], errors="coerce")
-
-    from collections import defaultdict
-    sys_index = defaultdict(list)
-    for i, (s, d) in enumerate(zip(systems, dates)):
-        if s and s not in ("nan", "none", "") and pd.notna(d):
-            sys_index[s].append((i, d))
-
-    for sys_name, entries in sys_index.items():
-        if len(entries) < 3:
-            continue
-        entries.sort(key=lambda x: x[1])
-        dates_arr = [e[1] for e in entries]
-        for start_i in range(len(entries)):
-            end_i = start_i
-            while (end_i + 1 < len(entries) and
-                   (dates_arr[end_i + 1] - dates_arr[start_i]).days <= 60):
-                end_i += 1
-            if end_i - start_i + 1 >= 3:
-                n_in_window = end_i - start_i + 1
-                for j in range(start_i, end_i + 1):
-                    row_idx = entries[j][0]
-                    if scores[row_idx] == 0.0:
-                        scores[row_idx] = _DCI_SEVERITY_SCORE["High"]
-                        rationales[row_idx] = (
-                            f"System '{sys_name}' had {n_in_window} deviations "
-                            "in 60 days — concentrated issue pattern. Annex 11 "
-                            "§10 requires change management to address systemic "
-                            "deficiencies."
-                        )
-                break
-    return (pd.Series(scores, index=df.index),
-            pd.Series(rationales, index=df.index))
+    return _dci_recurrence_rule(
+        df, "system_name", 60, 3, "High",
+        lambda sys_name, n, w0, w1: (
+            f"System '{sys_name}' had {n} deviations "
+            "in 60 days — concentrated issue pattern. Annex 11 "
+            "§10 requires change management to address systemic "
+            "deficiencies."
+        ))
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -836,46 +867,70 @@ def _dci_rule9_repeat_post_closure(df):
     statuses = df["status"].apply(_dci_normalize_status)
     rids     = df.get("record_id", pd.Series([""] * n)).astype(str)
 
-    from collections import defaultdict
-    key_index = defaultdict(list)
-    for i in range(n):
-        if not (rtypes.iloc[i] and syss.iloc[i] and cats.iloc[i]):
+    # Per (record_type, system, category) key, records in open-date order
+    # (undated last, ties in row order). A dated record fires on the FIRST
+    # earlier record in that order that is closed with
+    # 0 <= (open - prev close).days <= 90, i.e. close in (open - 91d, open].
+    # Closures are sorted by date so that interval is one searchsorted range;
+    # a sparse min-table over their order positions then answers "earliest
+    # record in the range" in O(1), and it qualifies if it precedes the
+    # current record. Same prev_rid as the pairwise scan, O(k log k) per key.
+    import numpy as np
+    ok  = ((rtypes != "") & (syss != "") & (cats != "")
+           & ~rtypes.isin(["nan", "none"])).to_numpy()
+    pos = np.flatnonzero(ok)
+    if len(pos) < 2:
+        return (pd.Series(scores, index=df.index),
+                pd.Series(rationales, index=df.index))
+    o_ns = _dci_date_ns(opens)[pos]
+    c_ns = _dci_date_ns(closes)[pos]
+    o_ok = opens.notna().to_numpy()[pos]
+    is_closed = ((statuses == "closed") & closes.notna()).to_numpy()[pos]
+    o_sort = np.where(o_ok, o_ns, np.iinfo("int64").max)
+    codes, _ = pd.factorize((rtypes + "\x1f" + syss + "\x1f" + cats).to_numpy()[pos])
+    order = np.lexsort((pos, o_sort, codes))
+    codes, pos, o_ns, c_ns, o_ok, is_closed = (
+        codes[order], pos[order], o_ns[order], c_ns[order], o_ok[order], is_closed[order])
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    window = 91 * _DAY_NS
+
+    for a, b in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(pos)]))):
+        if b - a < 2:
             continue
-        if rtypes.iloc[i] in ("nan", "none", ""):
+        cj = np.flatnonzero(is_closed[a:b])
+        if not len(cj):
             continue
-        key = (rtypes.iloc[i], syss.iloc[i], cats.iloc[i])
-        key_index[key].append((
-            i, opens.iloc[i], closes.iloc[i],
-            statuses.iloc[i], rids.iloc[i]
-        ))
-
-    for key, entries in key_index.items():
-        if len(entries) < 2:
-            continue
-        entries.sort(key=lambda x: (x[1] if pd.notna(x[1]) else pd.Timestamp.max))
-        for i_cur in range(1, len(entries)):
-            cur = entries[i_cur]
-            cur_idx, cur_open = cur[0], cur[1]
-            if pd.isna(cur_open):
+        by_close = np.argsort(c_ns[a:b][cj], kind="stable")
+        cc, jj   = c_ns[a:b][cj][by_close], cj[by_close]
+        # sparse table: mins[k][x] = min(jj[x : x + 2**k])
+        mins = [jj]
+        while 2 ** len(mins) <= len(jj):
+            h, prev_lvl = 2 ** (len(mins) - 1), mins[-1]
+            mins.append(np.minimum(prev_lvl[:-h], prev_lvl[h:]))
+        cur = np.flatnonzero(o_ok[a:b])
+        cur = cur[cur > 0]
+        oo  = o_ns[a:b][cur]
+        lo  = np.searchsorted(cc, oo - window, side="right")
+        hi  = np.searchsorted(cc, oo, side="right")
+        for i_cur, l, h in zip(cur, lo, hi):
+            if h <= l:
+                continue
+            lvl    = (int(h - l)).bit_length() - 1
+            i_prev = min(mins[lvl][l], mins[lvl][h - 2 ** lvl])
+            if i_prev >= i_cur:
                 continue
-            for i_prev in range(i_cur):
-                prev = entries[i_prev]
-                prev_idx, prev_open, prev_close, prev_status, prev_rid = prev
-                if prev_status != "closed" or pd.isna(prev_close):
-                    continue
-                delta = (cur_open - prev_close).days
-                if 0 <= delta <= 90:
-                    if scores[cur_idx] == 0.0:
-                        scores[cur_idx] = _DCI_SEVERITY_SCORE["Critical"]
-                        rationales[cur_idx] = (
-                            f"Same {key[0]} recurred for {key[1]} in "
-                            f"category '{key[2]}' {delta} days after previous "
-                            f"closure ({prev_rid} closed "
-                            f"{prev_close.strftime('%Y-%m-%d')}). Indicates "
-                            "prior CAPA was ineffective. 21 CFR 820.100(a)(2), "
-                            "ICH Q10 §3.2.3."
-                        )
-                    break
+            cur_idx, prev_idx = int(pos[a + i_cur]), int(pos[a + i_prev])
+            prev_close = closes.iloc[prev_idx]
+            delta      = (opens.iloc[cur_idx] - prev_close).days
+            scores[cur_idx] = _DCI_SEVERITY_SCORE["Critical"]
+            rationales[cur_idx] = (
+                f"Same {rtypes.iloc[cur_idx]} recurred for {syss.iloc[cur_idx]} in "
+                f"category '{cats.iloc[cur_idx]}' {delta} days after previous "
+                f"closure ({rids.iloc[prev_idx]} closed "
+                f"{prev_close.strftime('%Y-%m-%d')}). Indicates "
+                "prior CAPA was ineffective. 21 CFR 820.100(a)(2), "
+                "ICH Q10 §3.2.3."
+            )
     return (pd.Series(scores, index=df.index),
             pd.Series(rationales, index=df.index))
 
@@ -1213,15 +1268,50 @@ def dci_score_records(df, rule_config=None):
 # ═══════════════════════════════════════════════════════════════════════════
 #  Excel builder — 6 sheets per Spec v1.3 §6
 # ═══════════════════════════════════════════════════════════════════════════
+def _dci_export_column(frame, key):
+    """One workbook column as a list: blanks for missing / NaN values, open
+    and close dates as YYYY-MM-DD (parsed once per distinct value)."""
+    if key not in frame.columns:
+        return [""] * len(frame)
+    col = frame[key]
+    if key in ("open_date", "close_date"):
+        fmt, out = {}, []
+        for v in col.tolist():
+            if v is None or (not isinstance(v, str) and pd.isna(v)):
+                out.append("")
+                continue
+            if v not in fmt:
+                try:
+                    dt = pd.to_datetime(v, errors="coerce")
+                    fmt[v] = dt.strftime("%Y-%m-%d") if pd.notna(dt) else ""
+                except Exception:
+                    fmt[v] = str(v) if v else ""
+            out.append(fmt[v])
+        return out
+    vals = col.astype(object)
+    return vals.where(col.notna(), "").tolist()
+
+
 def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
                      config_hash="", operator_user="", model_used="",
                      rule_config=None):
-    """Build 6-sheet GxP evidence workbook for DCI findings."""
+    """Build 6-sheet GxP evidence workbook for DCI findings.
+
+    Written with a write-only (streaming) workbook: rows go to the zip as
+    they are appended, so memory stays flat on 100k-record QMS exports.
+    Record rows use one precomputed named style per column / row parity;
+    Risk Tier and IQI colouring are conditional formats over the column
+    rather than per-cell fills.
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import NamedStyle
+    from openpyxl.formatting.rule import CellIsRule, FormulaRule
+
     if rule_config is None:
         rule_config = dict(_DCI_RULE_DEFAULTS)
 
     output = io.BytesIO()
-    wb     = Workbook()
+    wb     = Workbook(write_only=True)
 
     C_NAVY      = "1E3A5F"
     C_WHITE     = "FFFFFF"
@@ -1239,6 +1329,9 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
         "Medium":   (C_AMBER,  C_WHITE),
         "Low":      (C_GREY,   C_DARK_TEXT),
     }
+    # IQI bands: (lower bound, fill, font colour) — green (strong) → red (poor)
+    _IQI_BANDS = [(85, "D1FAE5", "065F46"), (65, "FEF9C3", "713F12"),
+                  (40, "FED7AA", "7C2D12"), (0,  "FEE2E2", "7F1D1D")]
 
     bdr = Border(
         left=Side(style="thin", color="D1D5DB"),
@@ -1250,25 +1343,111 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
     def _fill(hex_color):
         return PatternFill("solid", fgColor=hex_color)
 
-    def _hdr(ws, row, col, val, width=None, bg=C_NAVY, fg=C_WHITE, size=9, wrap=False):
-        c = ws.cell(row=row, column=col, value=val)
+    # Write-only sheets only move forward: _put() appends `cells` as row
+    # `row`, emitting any skipped rows empty. Column widths, panes and grid
+    # lines must be set before a sheet's first row is written.
+    _at_row = {}
+
+    def _put(ws, row, cells, height=None):
+        nxt = _at_row.get(ws.title, 1)
+        while nxt < row:
+            ws.append([])
+            nxt += 1
+        if height:
+            ws.row_dimensions[row].height = height
+        ws.append(cells)
+        _at_row[ws.title] = row + 1
+
+    def _hdr(ws, val, bg=C_NAVY, fg=C_WHITE, size=9, wrap=False):
+        c = WriteOnlyCell(ws, value=val)
         c.font = Font(name="Calibri", bold=True, size=size, color=fg)
         c.fill = _fill(bg)
         c.alignment = Alignment(horizontal="left", vertical="center", wrap_text=wrap)
         c.border = bdr
-        if width:
-            ws.column_dimensions[get_column_letter(col)].width = width
         return c
 
-    def _cell(ws, row, col, val, bold=False, bg=None, fg=C_DARK_TEXT,
+    def _cell(ws, val, bold=False, bg=None, fg=C_DARK_TEXT,
               size=9, wrap=False, align="left"):
-        c = ws.cell(row=row, column=col, value=val)
+        c = WriteOnlyCell(ws, value=val)
         c.font = Font(name="Calibri", bold=bold, size=size, color=fg)
         c.fill = _fill(bg) if bg else PatternFill()
         c.alignment = Alignment(horizontal=align, vertical="top", wrap_text=wrap)
         c.border = bdr
         return c
 
+    def _text(ws, val, **font):
+        c = WriteOnlyCell(ws, value=val)
+        c.font = Font(name="Calibri", **font)
+        return c
+
+    # Named styles for record cells, registered on first use. Cells take a
+    # copy of the style's array — what `cell.style = name` does, minus the
+    # by-name search of the workbook's style list on every cell.
+    _named = {}
+
+    def _style(name, size, bold=False, fg=C_DARK_TEXT, bg=None,
+               align="center", wrap=False):
+        """Register (once) and return the named style's array."""
+        if name not in _named:
+            ns = NamedStyle(name=name)
+            ns.font      = Font(name="Calibri", bold=bold, size=size, color=fg)
+            ns.fill      = _fill(bg) if bg else PatternFill()
+            ns.alignment = Alignment(horizontal=align, vertical="top", wrap_text=wrap)
+            ns.border    = bdr
+            wb.add_named_style(ns)
+            _named[name] = ns.as_tuple()
+        return _named[name]
+
+    def _record_row_height(ws, height):
+        # Record rows carry no per-row height — the sheet default covers
+        # them, so no RowDimension is held per record. Set before row 1.
+        ws.sheet_format.defaultRowHeight = height
+        ws.sheet_format.customHeight     = True
+
+    def _record_rows(ws, frame, cols, styles_for, first_row):
+        """Stream one row per record. styles_for(col_key, ci, even, val)
+        returns the cell's named-style array (see _style)."""
+        from copy import copy
+        values = [_dci_export_column(frame, key) for key in cols]
+        for offset, row_vals in enumerate(zip(*values)):
+            even  = (first_row + offset) % 2 == 0
+            cells = []
+            for ci, (key, val) in enumerate(zip(cols, row_vals), 1):
+                c = WriteOnlyCell(ws, value=val)
+                c._style = copy(styles_for(key, ci, even, val))
+                cells.append(c)
+            ws.append(cells)
+
+    def _tier_and_iqi_formats(ws, cols, n_rows):
+        """Conditional formats for the Risk Tier and IQI columns; the cell
+        styles carry the Low-tier / no-band appearance."""
+        if not n_rows:
+            return
+        last = 3 + n_rows
+        if "Risk_Tier" in cols:
+            col = get_column_letter(cols.index("Risk_Tier") + 1)
+            for tier in ("Critical", "High", "Medium"):
+                bg, fg = _TIER_COLORS[tier]
+                ws.conditional_formatting.add(
+                    f"{col}4:{col}{last}",
+                    CellIsRule(operator="equal", formula=[f'"{tier}"'],
+                               font=Font(bold=True, color=fg),
+                               fill=PatternFill(start_color=bg, end_color=bg,
+                                                fill_type="solid")))
+        if "IQI" in cols:
+            col = get_column_letter(cols.index("IQI") + 1)
+            ref = f"{col}4"
+            for lo, bg, fg in _IQI_BANDS:
+                # ISNUMBER: blank / text IQI stays unbanded (text sorts above
+                # numbers in Excel comparisons)
+                ws.conditional_formatting.add(
+                    f"{col}4:{col}{last}",
+                    FormulaRule(formula=[f"AND(ISNUMBER({ref}),{ref}>={lo})"],
+                                stopIfTrue=True,
+                                font=Font(bold=True, color=fg),
+                                fill=PatternFill(start_color=bg, end_color=bg,
+                                                 fill_type="solid")))
+
     n_total    = len(scored_df)
     n_critical = int((scored_df["Risk_Tier"] == "Critical").sum()) if n_total else 0
     n_high     = int((scored_df["Risk_Tier"] == "High").sum())     if n_total else 0
@@ -1292,25 +1471,19 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
     _capa_types = scored_df["CAPA_Type"].value_counts().to_dict() if "CAPA_Type" in scored_df.columns and n_total else {}
 
     # ── Sheet 1 — Summary ───────────────────────────────────────────────
-    ws1 = wb.active
-    ws1.title = "Summary"
+    ws1 = wb.create_sheet("Summary")
     ws1.sheet_view.showGridLines = False
-
-    ws1.cell(row=1, column=1, value="VALINTEL.AI — Deviation & CAPA Investigation"
-    ).font = Font(name="Calibri", bold=True, size=14, color=C_NAVY)
-    ws1.cell(row=2, column=1,
-             value=f"System: {system_name}   ·   Review Period: {r_start} → {r_end}"
-    ).font = Font(name="Calibri", size=10, color=C_DARK_TEXT)
-    ws1.cell(row=3, column=1,
-             value=f"Source File: {fname}"
-    ).font = Font(name="Calibri", size=9, italic=True, color=C_MID)
-
-    ws1.row_dimensions[1].height = 22
     ws1.column_dimensions["A"].width = 26
     ws1.column_dimensions["B"].width = 60
 
-    _hdr(ws1, 5, 1, "KPI", width=26)
-    _hdr(ws1, 5, 2, "Value", width=60)
+    _put(ws1, 1, [_text(ws1, "VALINTEL.AI — Deviation & CAPA Investigation",
+                        bold=True, size=14, color=C_NAVY)], height=22)
+    _put(ws1, 2, [_text(ws1, f"System: {system_name}   ·   Review Period: {r_start} → {r_end}",
+                        size=10, color=C_DARK_TEXT)])
+    _put(ws1, 3, [_text(ws1, f"Source File: {fname}",
+                        size=9, italic=True, color=C_MID)])
+
+    _put(ws1, 5, [_hdr(ws1, "KPI"), _hdr(ws1, "Value")])
 
     kpi_rows = [
         ("Records Analyzed",         str(n_total)),
@@ -1334,15 +1507,12 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
                 kpi_rows.append((f"CAPA Type: {ctype}", str(cnt)))
     _kpi_start = 6
     for i, (k, v) in enumerate(kpi_rows, _kpi_start):
-        _cell(ws1, i, 1, k, bold=True, bg=C_LIGHT)
-        _cell(ws1, i, 2, v)
-        ws1.row_dimensions[i].height = 16
+        _put(ws1, i, [_cell(ws1, k, bold=True, bg=C_LIGHT), _cell(ws1, v)], height=16)
     # Track the next available row so CAPA-type expansion never collides with
     # the Top Rules / Regulatory References / Config Hash sections below.
     _next_row = _kpi_start + len(kpi_rows) + 1  # +1 blank gap
 
-    _hdr(ws1, _next_row, 1, "Top Rules Fired")
-    _hdr(ws1, _next_row, 2, "Count")
+    _put(ws1, _next_row, [_hdr(ws1, "Top Rules Fired"), _hdr(ws1, "Count")])
     _rules_data_start = _next_row + 1
     if n_total:
         rule_counts = {}
@@ -1354,31 +1524,28 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
                     rule_counts[disp] = cnt
         top3 = sorted(rule_counts.items(), key=lambda x: -x[1])[:3]
         for i, (rname, cnt) in enumerate(top3, _rules_data_start):
-            _cell(ws1, i, 1, rname)
-            _cell(ws1, i, 2, str(cnt), align="center")
-            ws1.row_dimensions[i].height = 15
+            _put(ws1, i, [_cell(ws1, rname), _cell(ws1, str(cnt), align="center")],
+                 height=15)
         _next_row = _rules_data_start + max(len(top3), 1) + 1
     else:
-        _cell(ws1, _rules_data_start, 1, "No findings", fg=C_MID)
+        _put(ws1, _rules_data_start, [_cell(ws1, "No findings", fg=C_MID)])
         _next_row = _rules_data_start + 2
 
-    _hdr(ws1, _next_row, 1, "Regulatory References")
-    _cell(ws1, _next_row + 1, 1, _REG_DCI, wrap=True)
-    ws1.merge_cells(start_row=_next_row + 1, start_column=1,
-                    end_row=_next_row + 1, end_column=2)
-    ws1.row_dimensions[_next_row + 1].height = 48
+    _put(ws1, _next_row, [_hdr(ws1, "Regulatory References")])
+    _put(ws1, _next_row + 1, [_cell(ws1, _REG_DCI, wrap=True)], height=48)
+    ws1.merged_cells.add(f"A{_next_row + 1}:B{_next_row + 1}")
     _next_row += 3
 
     # Config Hash — footer note, small grey text (not a KPI row).
-    _cell(ws1, _next_row, 1, f"Config Hash: {config_hash or 'n/a'}",
-          fg=C_MID, size=8)
+    _put(ws1, _next_row, [_cell(ws1, f"Config Hash: {config_hash or 'n/a'}",
+                                fg=C_MID, size=8)])
 
     # ── Sheet 2 — Records for Review ────────────────────────────────────
     ws2 = wb.create_sheet("Records for Review")
     ws2.sheet_view.showGridLines = False
 
     review_df = scored_df[scored_df["Risk_Tier"].isin(
-        ["Critical", "High", "Medium"])].copy()
+        ["Critical", "High", "Medium"])]
 
     review_cols = [
         ("Record ID",       "record_id",           18),
@@ -1400,76 +1567,39 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
         ("Rule 15 Note",    "Rule15_Reason",       50),
         ("Detection Basis", "Detection_Basis",     80),
     ]
-
-    ws2.cell(row=1, column=1,
-             value=f"Records for Review — {len(review_df)} record(s) "
-                   f"at Medium or higher risk"
-    ).font = Font(name="Calibri", bold=True, size=12, color=C_NAVY)
-    ws2.row_dimensions[1].height = 20
-
-    for ci, (hdr, _, width) in enumerate(review_cols, 1):
-        _hdr(ws2, 3, ci, hdr, width=width)
-    ws2.row_dimensions[3].height = 18
-
-    for ri, (_, row_data) in enumerate(review_df.iterrows(), 4):
-        tier = str(row_data.get("Risk_Tier", "Low"))
-        tier_bg, tier_fg = _TIER_COLORS.get(tier, (C_GREY, C_DARK_TEXT))
-        for ci, (_, col_key, _) in enumerate(review_cols, 1):
-            val = row_data.get(col_key, "")
-            if pd.isna(val):
-                val = ""
-            if col_key in ("open_date", "close_date"):
-                try:
-                    dt = pd.to_datetime(val, errors="coerce")
-                    val = dt.strftime("%Y-%m-%d") if pd.notna(dt) else ""
-                except Exception:
-                    val = str(val) if val else ""
-            c = ws2.cell(row=ri, column=ci, value=val)
-            c.font = Font(name="Calibri", size=9, color=C_DARK_TEXT)
-            c.alignment = Alignment(
-                horizontal="center" if ci > 1 else "left",
-                vertical="top",
-                wrap_text=col_key in ("Detection_Basis", "All_Rules_Fired",
-                                      "Primary_Rule", "IQI_Drivers", "Rule15_Reason"))
-            c.border = bdr
-            if col_key == "Risk_Tier":
-                c.font = Font(name="Calibri", bold=True, size=9, color=tier_fg)
-                c.fill = _fill(tier_bg)
-            elif col_key == "IQI":
-                # Colour-code IQI: green (strong) → red (poor)
-                try:
-                    iq = int(val) if val != "" else -1
-                except (ValueError, TypeError):
-                    iq = -1
-                if iq >= 85:
-                    c.fill = _fill("D1FAE5"); c.font = Font(name="Calibri", bold=True, size=9, color="065F46")
-                elif iq >= 65:
-                    c.fill = _fill("FEF9C3"); c.font = Font(name="Calibri", bold=True, size=9, color="713F12")
-                elif iq >= 40:
-                    c.fill = _fill("FED7AA"); c.font = Font(name="Calibri", bold=True, size=9, color="7C2D12")
-                elif iq >= 0:
-                    c.fill = _fill("FEE2E2"); c.font = Font(name="Calibri", bold=True, size=9, color="7F1D1D")
-            elif col_key == "Rule15_Reason" and val:
-                c.fill = _fill("FFF7ED")  # amber tint for escalation notes
-            elif ri % 2 == 0:
-                c.fill = _fill("F8FAFC")
-        ws2.row_dimensions[ri].height = 36
-
+    for ci, (_, _, width) in enumerate(review_cols, 1):
+        ws2.column_dimensions[get_column_letter(ci)].width = width
     ws2.freeze_panes = "A4"
+    _record_row_height(ws2, 36)
+
+    _put(ws2, 1, [_text(ws2, f"Records for Review — {len(review_df)} record(s) "
+                             f"at Medium or higher risk",
+                        bold=True, size=12, color=C_NAVY)], height=20)
+    _put(ws2, 2, [], height=15)
+    _put(ws2, 3, [_hdr(ws2, hdr) for hdr, _, _ in review_cols], height=18)
+
+    _rev_wrap = ("Detection_Basis", "All_Rules_Fired",
+                 "Primary_Rule", "IQI_Drivers", "Rule15_Reason")
+
+    def _review_style(key, ci, even, val):
+        align = "center" if ci > 1 else "left"
+        wrap  = key in _rev_wrap
+        if key == "Risk_Tier":
+            return _style("dci_rev_tier", 9, bold=True, bg=C_GREY, align=align)
+        if key == "IQI":
+            return _style("dci_rev_iqi", 9, align=align)
+        if key == "Rule15_Reason" and val:
+            return _style("dci_rev_r15", 9, bg="FFF7ED", align=align, wrap=wrap)
+        return _style(f"dci_rev_{ci}_{'e' if even else 'o'}", 9,
+                      bg="F8FAFC" if even else None, align=align, wrap=wrap)
+
+    _rev_keys = [k for _, k, _ in review_cols]
+    _record_rows(ws2, review_df, _rev_keys, _review_style, 4)
+    _tier_and_iqi_formats(ws2, _rev_keys, len(review_df))
 
     # ── Sheet 3 — Full Log ──────────────────────────────────────────────
     ws3 = wb.create_sheet("Full Log")
     ws3.sheet_view.showGridLines = False
-    ws3.cell(row=1, column=1,
-             value=f"Full Record Log — {n_total} record(s), all tiers"
-    ).font = Font(name="Calibri", bold=True, size=12, color=C_NAVY)
-    ws3.row_dimensions[1].height = 20
-
-    # Row 2 legend: explain the two header colour bands
-    _leg = ws3.cell(row=2, column=1,
-        value="Navy headers = input columns from your file  ·  Teal headers = derived columns added by VALINTEL")
-    _leg.font = Font(name="Calibri", italic=True, size=8, color="64748B")
-    ws3.row_dimensions[2].height = 13
 
     # Columns: (Display name, internal key, width, is_derived)
     C_DERIVED_HDR  = "0F5156"   # teal-navy for derived column headers
@@ -1501,64 +1631,48 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
     for sc, _, _ in _DCI_RULE_TIER_PRIORITY:
         rn = sc.split("rule")[1].split("_")[0]
         full_cols.append((f"R{rn} Score", sc, 9, True))
-
-    for ci, (hdr, _, width, is_derived) in enumerate(full_cols, 1):
+    for ci, (_, _, width, _) in enumerate(full_cols, 1):
         ws3.column_dimensions[get_column_letter(ci)].width = width
-        hdr_cell = ws3.cell(row=3, column=ci, value=hdr)
-        hdr_cell.alignment = Alignment(horizontal="center", vertical="center")
-        hdr_cell.border = bdr
-        if is_derived:
-            hdr_cell.font = Font(name="Calibri", bold=True, size=9, color="FFFFFF")
-            hdr_cell.fill = PatternFill("solid", fgColor=C_DERIVED_HDR)
+    ws3.freeze_panes = "A4"
+    _record_row_height(ws3, 22)
+
+    _put(ws3, 1, [_text(ws3, f"Full Record Log — {n_total} record(s), all tiers",
+                        bold=True, size=12, color=C_NAVY)], height=20)
+    # Row 2 legend: explain the two header colour bands
+    _put(ws3, 2, [_text(ws3, "Navy headers = input columns from your file  ·  "
+                             "Teal headers = derived columns added by VALINTEL",
+                        italic=True, size=8, color="64748B")], height=13)
+    _hdr_cells = []
+    for hdr, _, _, is_derived in full_cols:
+        hc = WriteOnlyCell(ws3, value=hdr)
+        hc.alignment = Alignment(horizontal="center", vertical="center")
+        hc.border = bdr
+        hc.font = Font(name="Calibri", bold=True, size=9, color="FFFFFF")
+        hc.fill = PatternFill("solid", fgColor=C_DERIVED_HDR if is_derived else C_NAVY)
+        _hdr_cells.append(hc)
+    _put(ws3, 3, _hdr_cells, height=18)
+
+    _full_wrap    = ("rca_text", "capa_text", "IQI_Drivers", "Rule15_Reason")
+    _full_derived = {k for _, k, _, d in full_cols if d}
+
+    def _full_style(key, ci, even, val):
+        align = "center" if ci > 1 else "left"
+        wrap  = key in _full_wrap
+        if key == "Risk_Tier":
+            return _style("dci_full_tier", 9, bold=True, bg=C_GREY, align=align)
+        if key == "IQI":
+            return _style("dci_full_iqi", 8.5, align=align)
+        if key in _full_derived:
+            # Teal tint on derived cells — alternating rows stay visible
+            bg = C_DERIVED_FILL if even else C_DERIVED_ALT
         else:
-            hdr_cell.font = Font(name="Calibri", bold=True, size=9, color="FFFFFF")
-            hdr_cell.fill = PatternFill("solid", fgColor=C_NAVY)
-    ws3.row_dimensions[3].height = 18
-
-    for ri, (_, row_data) in enumerate(scored_df.iterrows(), 4):
-        tier = str(row_data.get("Risk_Tier", "Low"))
-        tier_bg, tier_fg = _TIER_COLORS.get(tier, (C_GREY, C_DARK_TEXT))
-        for ci, (_, col_key, _, is_derived) in enumerate(full_cols, 1):
-            val = row_data.get(col_key, "")
-            if pd.isna(val):
-                val = ""
-            if col_key in ("open_date", "close_date"):
-                try:
-                    dt = pd.to_datetime(val, errors="coerce")
-                    val = dt.strftime("%Y-%m-%d") if pd.notna(dt) else ""
-                except Exception:
-                    val = str(val) if val else ""
-            c = ws3.cell(row=ri, column=ci, value=val)
-            c.font = Font(name="Calibri", size=8.5, color=C_DARK_TEXT)
-            c.alignment = Alignment(
-                horizontal="center" if ci > 1 else "left",
-                vertical="top",
-                wrap_text=col_key in ("rca_text", "capa_text", "IQI_Drivers", "Rule15_Reason"))
-            c.border = bdr
-            if col_key == "Risk_Tier":
-                c.font = Font(name="Calibri", bold=True, size=9, color=tier_fg)
-                c.fill = _fill(tier_bg)
-            elif col_key == "IQI":
-                try:
-                    iq = int(val) if val != "" else -1
-                except (ValueError, TypeError):
-                    iq = -1
-                if iq >= 85:
-                    c.fill = _fill("D1FAE5"); c.font = Font(name="Calibri", bold=True, size=8.5, color="065F46")
-                elif iq >= 65:
-                    c.fill = _fill("FEF9C3"); c.font = Font(name="Calibri", bold=True, size=8.5, color="713F12")
-                elif iq >= 40:
-                    c.fill = _fill("FED7AA"); c.font = Font(name="Calibri", bold=True, size=8.5, color="7C2D12")
-                elif iq >= 0:
-                    c.fill = _fill("FEE2E2"); c.font = Font(name="Calibri", bold=True, size=8.5, color="7F1D1D")
-            elif is_derived:
-                # Teal tint on derived cells — alternating rows stay visible
-                c.fill = _fill(C_DERIVED_FILL if ri % 2 == 0 else C_DERIVED_ALT)
-            elif ri % 2 == 0:
-                c.fill = _fill("F8FAFC")
-        ws3.row_dimensions[ri].height = 22
+            bg = "F8FAFC" if even else None
+        return _style(f"dci_full_{ci}_{'e' if even else 'o'}", 8.5,
+                      bg=bg, align=align, wrap=wrap)
 
-    ws3.freeze_panes = "A4"
+    _full_keys = [k for _, k, _, _ in full_cols]
+    _record_rows(ws3, scored_df, _full_keys, _full_style, 4)
+    _tier_and_iqi_formats(ws3, _full_keys, n_total)
 
 
     # ── Sheet 5 — Integrity Audit ────────────────────────────────────────
@@ -1567,9 +1681,8 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
     ws5.column_dimensions["A"].width = 28
     ws5.column_dimensions["B"].width = 70
 
-    ws5.cell(row=1, column=1, value="DCI Integrity Audit"
-    ).font = Font(name="Calibri", bold=True, size=12, color=C_NAVY)
-    ws5.row_dimensions[1].height = 20
+    _put(ws5, 1, [_text(ws5, "DCI Integrity Audit", bold=True, size=12, color=C_NAVY)],
+         height=20)
 
     try:
         file_hash = hashlib.sha256(str(fname).encode()).hexdigest()[:16]
@@ -1593,9 +1706,8 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
         ("Regulatory References",  _REG_DCI),
     ]
     for ri, (k, v) in enumerate(audit_rows, 3):
-        _cell(ws5, ri, 1, k, bold=True, bg=C_LIGHT)
-        _cell(ws5, ri, 2, v, wrap=True)
-        ws5.row_dimensions[ri].height = 18 if len(str(v)) < 60 else 32
+        _put(ws5, ri, [_cell(ws5, k, bold=True, bg=C_LIGHT), _cell(ws5, v, wrap=True)],
+             height=18 if len(str(v)) < 60 else 32)
 
 
     wb.save(output)
@@ -1605,9 +1717,10 @@ def dci_build_excel(scored_df, system_name, r_start, r_end, fname,
 # ═══════════════════════════════════════════════════════════════════════════
 #  DIM banking hook
 # ═══════════════════════════════════════════════════════════════════════════
-def _dci_bank_to_dim(scored_df, period_label, system_name, file_name,
-                     event_category_fn=None):
-    """Bank H/C DCI findings to st.session_state.dim_accumulated_rows.
+def _dci_dim_rows(scored_df, period_label, system_name, file_name,
+                  event_category_fn=None):
+    """DIM rows for one DCI period: the H/C findings, or one
+    "(no escalations)" sentinel. Returns (rows, n_findings).
 
     event_category_fn: callable that maps Rule_Triggered -> Event_Category.
     When called from generator.py, pass the _dim_event_category function so
@@ -1621,63 +1734,96 @@ def _dci_bank_to_dim(scored_df, period_label, system_name, file_name,
         scored_df["Risk_Tier"].isin(["Critical", "High"])
     ] if not scored_df.empty else pd.DataFrame()
 
+    # Column-wise: each distinct status / date / rule is normalised once,
+    # then the row dicts are zipped together from whole columns.
+    def _col(name, default):
+        if name in hc_df.columns:
+            return hc_df[name]
+        return pd.Series([default] * len(hc_df), index=hc_df.index, dtype=object)
+
+    def _per_value(series, fn):
+        memo = {}
+        out  = []
+        for v in series.tolist():
+            k = "\x00nan" if (not isinstance(v, str) and pd.isna(v)) else v
+            if k not in memo:
+                memo[k] = fn(v)
+            out.append(memo[k])
+        return out
+
     dci_dim_rows = []
-    for _, row in hc_df.iterrows():
-        status_norm = _dci_normalize_status(row.get("status"))
-        cd = _dci_parse_date(row.get("close_date"))
-        od = _dci_parse_date(row.get("open_date"))
-        if status_norm == "closed" and pd.notna(cd):
-            event_ts = str(cd)
-        elif pd.notna(od):
-            event_ts = str(od)
-        else:
-            event_ts = ""
-
-        rule_str = str(row.get("Primary_Rule", "DCI finding"))[:120]
-        dci_dim_rows.append({
-            "Review_Period":   period_label,
-            "Username":        str(row.get("assigned_to", "unknown")),
-            "Risk_Level":      str(row.get("Risk_Tier", "High")),
-            "Rule_Triggered":  rule_str,
-            "Event_Category":  event_category_fn(rule_str),
-            "System_Name":     str(row.get("system_name", system_name)),
-            "Event_Type":      str(row.get("record_type", "DEVIATION")),
-            "Event_Timestamp": event_ts,
-            "Source_File":     file_name,
-            "Source_Module":   "DCI",
-            "IQI":             int(row.get("IQI", 0)) if "IQI" in row.index else 0,
-        })
+    if len(hc_df):
+        closed = [s_ == "closed" for s_ in _per_value(_col("status", None),
+                                                        _dci_normalize_status)]
+        cds = _per_value(_col("close_date", None), _dci_parse_date)
+        ods = _per_value(_col("open_date", None), _dci_parse_date)
+        event_ts = [str(cd) if (c and pd.notna(cd)) else (str(od) if pd.notna(od) else "")
+                    for c, cd, od in zip(closed, cds, ods)]
+        rule_strs = [str(v)[:120] for v in _col("Primary_Rule", "DCI finding").tolist()]
+        categories = _per_value(pd.Series(rule_strs, dtype=object), event_category_fn)
+        iqis = ([int(v) for v in hc_df["IQI"].tolist()] if "IQI" in hc_df.columns
+                else [0] * len(hc_df))
+        for user_, tier, rule_str, cat, sys_, etype, ts, iqi in zip(
+                _col("assigned_to", "unknown").astype(str).tolist(),
+                _col("Risk_Tier", "High").astype(str).tolist(),
+                rule_strs, categories,
+                _col("system_name", system_name).astype(str).tolist(),
+                _col("record_type", "DEVIATION").astype(str).tolist(),
+                event_ts, iqis):
+            dci_dim_rows.append({
+                "Review_Period":   period_label,
+                "Username":        user_,
+                "Risk_Level":      tier,
+                "Rule_Triggered":  rule_str,
+                "Event_Category":  cat,
+                "System_Name":     sys_,
+                "Event_Type":      etype,
+                "Event_Timestamp": ts,
+                "Source_File":     file_name,
+                "Source_Module":   "DCI",
+                "IQI":             iqi,
+            })
+
+    if dci_dim_rows:
+        return dci_dim_rows, len(dci_dim_rows)
+    sentinel = {
+        "Review_Period":   period_label,
+        "Username":        "(no escalations)",
+        "Risk_Level":      "Low",
+        "Rule_Triggered":  "No named rules triggered",
+        "Event_Category":  "Other",
+        "System_Name":     system_name,
+        "Event_Type":      "DCI_REVIEW",
+        "Event_Timestamp": "",
+        "Source_File":     file_name,
+        "Source_Module":   "DCI",
+    }
+    return [sentinel], 1
 
+
+def _dci_bank_to_dim(scored_df, period_label, system_name, file_name,
+                     event_category_fn=None):
+    """Bank H/C DCI findings to st.session_state.dim_accumulated_rows.
+
+    Existing DCI rows for period_label are replaced, so re-banking the same
+    period is idempotent. Returns the number of rows banked.
+    """
+    rows, banked = _dci_dim_rows(scored_df, period_label, system_name,
+                                 file_name, event_category_fn)
     existing = [
         r for r in st.session_state.get("dim_accumulated_rows", [])
         if not (r.get("Review_Period") == period_label
                 and r.get("Source_Module") == "DCI")
     ]
-
-    if dci_dim_rows:
-        existing.extend(dci_dim_rows)
-        banked = len(dci_dim_rows)
-    else:
-        sentinel = {
-            "Review_Period":   period_label,
-            "Username":        "(no escalations)",
-            "Risk_Level":      "Low",
-            "Rule_Triggered":  "No named rules triggered",
-            "Event_Category":  "Other",
-            "System_Name":     system_name,
-            "Event_Type":      "DCI_REVIEW",
-            "Event_Timestamp": "",
-            "Source_File":     file_name,
-            "Source_Module":   "DCI",
-        }
-        existing.append(sentinel)
-        banked = 1
+    existing.extend(rows)
 
     st.session_state["dim_accumulated_rows"] = existing
     st.session_state["dim_periods_banked"] = len(
         set(r["Review_Period"] for r in existing))
     st.session_state["dim_analysis_done"] = False
     st.session_state["dim_result"] = None
+    st.session_state["dim_cache"] = None
+    st.session_state["dim_rows_gen"] = st.session_state.get("dim_rows_gen", 0) + 1
 
     return banked
 
@@ -2295,22 +2441,7 @@ def show_dci_review(user, role, model_id):
             st.session_state["dci_pending_hash"] = _dci_new_hash
 
         st.session_state["dci_file_name"] = file_name
-        if file_name.lower().endswith(".csv"):
-            dci_df_raw = pd.read_csv(io.BytesIO(raw_bytes), dtype=str).fillna("")
-            all_sheets = [file_name]
-        else:
-            xl = pd.ExcelFile(io.BytesIO(raw_bytes))
-            all_sheets = xl.sheet_names
-            preferred = None
-            for s in all_sheets:
-                sn = str(s).lower()
-                if any(k in sn for k in ("deviation", "capa", "incident",
-                                          "investigation", "nc", "record")):
-                    preferred = s; break
-            sheet_to_use = preferred or all_sheets[0]
-            dci_df_raw = pd.read_excel(
-                io.BytesIO(raw_bytes), sheet_name=sheet_to_use, dtype=str
-            ).fillna("")
+        dci_df_raw, all_sheets = _dci_read_table(raw_bytes, file_name)
     except Exception as e:
         st.error(f"Failed to read file: {e}")
         return
@@ -2330,16 +2461,7 @@ def show_dci_review(user, role, model_id):
         return
 
     # Apply column aliases (auto-detection from _DCI_COLUMN_ALIASES)
-    dci_df = dci_df_raw.copy()
-    col_rename = {}
-    for col in dci_df.columns:
-        norm = str(col).strip().lower().replace(" ", "_")
-        if norm in _DCI_COLUMN_ALIASES:
-            canonical = _DCI_COLUMN_ALIASES[norm]
-            if canonical != col:
-                col_rename[col] = canonical
-    if col_rename:
-        dci_df = dci_df.rename(columns=col_rename)
+    dci_df = _dci_apply_column_aliases(dci_df_raw)
 
     # ── Column Mapping — always shown, all 12 required columns ──────────────
     # Show before the hard-stop so users can fix missing columns in-UI.
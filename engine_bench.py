@@ -0,0 +1,371 @@
+"""
+VALINTEL.AI — Scoring Engine Benchmark & Equivalence Harness
+============================================================
+Runs the four deterministic engines on fixed-seed synthetic inputs at several
+sizes, records wall time, peak RSS and rows/sec, and diffs the scored output
+against a frozen golden copy — so a performance rewrite of any rule can show
+it is both faster and output-identical.
+
+    at   — at_score_events()     per event:  Risk_Score, Risk_Tier, Primary_Rule
+    uar  — uar_score_users()     per user:   Risk_Score, Risk_Level, Triggered_Rules
+                                 + SoD conflict pairs
+    dim  — dim_score_periods()   period trend, repeat-user and rule-recurrence tables
+    dci  — dci_score_records()   per record: Risk_Score, Risk_Tier, Primary_Rule, IQI
+
+Each (engine, size) case runs in a fresh subprocess so peak RSS is per case.
+Inputs are generated before the timer starts; only the engine call is timed.
+Date-relative inputs (UAR last login, DCI open/close dates) are offsets from
+today, so "days since" rules produce the same result on any day.
+
+Usage:
+    python engine_bench.py [--engines at,uar,dim,dci] [--sizes 1000,10000]
+                           [--repeat N] [--at-workers N] [--freeze]
+                           [--results bench_results.jsonl]
+
+    --freeze         write the current outputs as the golden copy (bench_golden/)
+                     instead of diffing against it — only after a change that is
+                     MEANT to alter scoring, and commit the new golden files with it.
+    --at-workers N   score AT on N worker processes; the golden copy is the
+                     same, so this doubles as the parallel-equivalence check.
+
+Results are appended to the results file as one JSON object per case.
+Exit code: 0 = every case matched its golden copy, 1 = a diff or a missing golden
+"""
+
+import io
+import os
+import sys
+import csv
+import gzip
+import json
+import time
+import random
+import argparse
+import datetime
+import subprocess
+from pathlib import Path
+
+import pandas as pd
+
+ROOT       = Path(__file__).resolve().parent
+GOLDEN_DIR = ROOT / "bench_golden"
+ENGINES    = ["at", "uar", "dim", "dci"]
+SEED       = 1234
+
+
+# ── Synthetic inputs (fixed seed) ─────────────────────────────────────────────
+
+def _input_at(n, tmp):
+    from audit_sample_generate import generate_scaled
+    path = os.path.join(tmp, f"at_{n}.csv")
+    generate_scaled(path, rows=n, users=max(50, n // 200), days=120,
+                    seed=SEED, manifest_path=os.path.join(tmp, "at.manifest.json"),
+                    quiet=True)
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df["_bench_row"] = range(len(df))
+    return df
+
+
+def _input_uar(n, tmp):
+    rng   = random.Random(SEED)
+    today = pd.Timestamp.today().normalize()
+    roles = ["Analyst", "QA Approver", "System Admin", "Method Admin", "Purge",
+             "Batch Release", "Specification Editor", "Master Data Configurator",
+             "Delete Records", "Administrator", "Lab Manager", "Reviewer"]
+    rows = []
+    for i in range(n):
+        k = rng.choice([1, 1, 1, 2])
+        rows.append({
+            "username":             f"user_{i:06d}",
+            "account_status":       rng.choices(["Active", "Inactive", "Locked", "TRUE"],
+                                                weights=[80, 10, 5, 5])[0],
+            "role":                 "|".join(rng.sample(roles, k)),
+            "full_name":            f"Person {i}",
+            "last_login_date":      "" if rng.random() < 0.03 else
+                                    (today - pd.Timedelta(days=rng.randint(0, 400))).strftime("%Y-%m-%d"),
+            "employment_status":    rng.choices(["Active", "Terminated", "Resigned", "On Leave"],
+                                                weights=[90, 4, 4, 2])[0],
+            "access_justification": rng.choice(["Analyst role per onboarding form HR-2024-0112",
+                                                "yes", "", "Approved per access request AR-5521"]),
+            "system_name":          rng.choice(["LabVantage LIMS", "SAP QM", "Veeva Vault"]),
+            "department":           rng.choice(["QA", "QC", "IT", "Manufacturing"]),
+            "job_title":            rng.choice(["Analyst", "Manager", "Engineer", "Admin"]),
+            "account_type":         rng.choices(["User", "Shared", "Service"], weights=[92, 4, 4])[0],
+        })
+    return pd.DataFrame(rows)
+
+
+def _input_dim(n, tmp):
+    rng     = random.Random(SEED)
+    periods = [("Q1 2026", "2026-01-01"), ("Q2 2026", "2026-04-01"),
+               ("Q3 2026", "2026-07-01"), ("Q4 2026", "2026-10-01")]
+    rules   = ["Rule 1 — Record Reconstruction [CRITICAL]",
+               "Rule 2 — Audit Trail Integrity Event [CRITICAL]",
+               "Rule 6 — Vague Rationale [HIGH]",
+               "Rule 9 — Failed Login → Data Manipulation [CRITICAL]",
+               "Rule 10 — Privileged User Modification of GxP Data [CRITICAL]",
+               "U1: Admin Access Review", "U7: Dormant Account", "U8: Ghost Account",
+               "DCI Rule 1 — Recurring Category"]
+    users   = [f"user_{k:04d}" for k in range(max(20, n // 25))]
+    rows = []
+    for i in range(n):
+        label, start = rng.choice(periods)
+        rule = rng.choice(rules)
+        rows.append({
+            "Review_Period":   label,
+            "Username":        rng.choice(users),
+            "Risk_Level":      rng.choice(["Critical", "High", "High", "Medium"]),
+            "Rule_Triggered":  rule,
+            "Source_Module":   "UAR" if rule.startswith("U") else
+                               "DCI" if rule.startswith("DCI") else "AT",
+            "System_Name":     rng.choice(["LIMS", "SAP QM"]),
+            "Event_Timestamp": (pd.Timestamp(start) + pd.Timedelta(minutes=rng.randint(0, 129_600))
+                                ).strftime("%Y-%m-%d %H:%M:%S"),
+        })
+    return pd.DataFrame(rows)
+
+
+def _input_dci(n, tmp):
+    rng   = random.Random(SEED)
+    today = pd.Timestamp.today().normalize()
+    cats  = [f"category_{k:02d}" for k in range(max(5, n // 40))]
+    rca   = ["Human error", "Operator did not follow SOP-QC-014 step 6.2 because the "
+             "balance calibration label was illegible; label replaced and verified",
+             "", "Equipment malfunction of HPLC pump seal due to exceeded maintenance interval",
+             "Unknown"]
+    capa  = ["Retrain analyst", "", "Revised SOP-QC-014 and added checklist item",
+             "Install interlock on autosampler door", "Process redesign of sample intake workflow"]
+    rows = []
+    for i in range(n):
+        opened = today - pd.Timedelta(days=rng.randint(1, 540))
+        status = rng.choices(["Closed", "Open", "Re-opened"], weights=[70, 25, 5])[0]
+        closed = "" if status == "Open" else \
+            (opened + pd.Timedelta(days=rng.randint(1, 90))).strftime("%Y-%m-%d")
+        rows.append({
+            "record_id":          f"DEV-{i:06d}",
+            "record_type":        rng.choice(["Deviation", "CAPA"]),
+            "deviation_category": rng.choice(cats),
+            "system_name":        rng.choice(["LIMS", "MES", "ERP", "CDS"]),
+            "open_date":          opened.strftime("%Y-%m-%d"),
+            "close_date":         closed,
+            "rca_text":           rng.choice(rca),
+            "capa_text":          rng.choice(capa),
+            "assigned_to":        f"qa_{rng.randint(1, 30):02d}",
+            "approved_by":        "" if rng.random() < 0.05 else f"qa_{rng.randint(1, 30):02d}",
+            "status":             status,
+            "sla_days":           rng.choice([30, 60, 90]),
+        })
+    return pd.DataFrame(rows)
+
+
+# ── Engine runners → named output frames for the golden diff ──────────────────
+
+def _run_at(G, df, at_workers=None):
+    out = G.at_score_events(df, workers=at_workers)
+    return {"events": out[["_bench_row", "Risk_Score", "Risk_Tier", "Primary_Rule"]]
+                      .sort_values("_bench_row")}
+
+
+def _run_uar(G, df, at_workers=None):
+    res = G.uar_score_users(df)
+    sod = res.get("sod_conflicts", pd.DataFrame())
+    return {"users": res["all_scored"][["username", "Risk_Score", "Risk_Level", "Triggered_Rules"]]
+                     .sort_values("username"),
+            "sod":   sod.sort_values(list(sod.columns)) if not sod.empty else sod}
+
+
+def _run_dim(G, df, at_workers=None):
+    res = G.dim_score_periods(df)
+    if "error" in res:
+        raise RuntimeError(res["error"])
+    return {"periods": res["period_df"], "repeat": res["repeat_df"], "rules": res["rule_df"]}
+
+
+def _run_dci(G, df, at_workers=None):
+    import dci_module
+    out = dci_module.dci_score_records(df)
+    return {"records": out[["record_id", "Risk_Score", "Risk_Tier", "Primary_Rule", "IQI"]]
+                       .sort_values("record_id")}
+
+
+_CASES = {
+    "at":  (_input_at,  _run_at),
+    "uar": (_input_uar, _run_uar),
+    "dim": (_input_dim, _run_dim),
+    "dci": (_input_dci, _run_dci),
+}
+
+
+# ── Golden copy ───────────────────────────────────────────────────────────────
+
+def _to_csv(frame: pd.DataFrame) -> str:
+    buf = io.StringIO()
+    frame.reset_index(drop=True).to_csv(buf, index=False, quoting=csv.QUOTE_NONNUMERIC)
+    return buf.getvalue()
+
+
+def _golden_path(engine, size, name):
+    return GOLDEN_DIR / f"{engine}_{size}_{name}.csv.gz"
+
+
+def _golden_diff(engine, size, frames, freeze):
+    """Compare (or with freeze, write) each output frame. Returns a report dict."""
+    report = {}
+    for name, frame in frames.items():
+        path = _golden_path(engine, size, name)
+        text = _to_csv(frame)
+        if freeze:
+            GOLDEN_DIR.mkdir(exist_ok=True)
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as fh:
+                fh.write(text)
+            report[name] = {"status": "frozen", "rows": len(frame)}
+            continue
+        if not path.exists():
+            report[name] = {"status": "missing"}
+            continue
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+            gold = fh.read()
+        if gold == text:
+            report[name] = {"status": "match", "rows": len(frame)}
+            continue
+        g_rows = gold.splitlines()
+        c_rows = text.splitlines()
+        diffs  = [i for i in range(max(len(g_rows), len(c_rows)))
+                  if i >= len(g_rows) or i >= len(c_rows) or g_rows[i] != c_rows[i]]
+        report[name] = {
+            "status":     "DIFF",
+            "rows_gold":  len(g_rows) - 1,
+            "rows_now":   len(c_rows) - 1,
+            "rows_diff":  len(diffs),
+            "first":      [{"line": i,
+                            "gold": g_rows[i] if i < len(g_rows) else None,
+                            "now":  c_rows[i] if i < len(c_rows) else None}
+                           for i in diffs[:5]],
+        }
+    return report
+
+
+# ── One case (child process) ──────────────────────────────────────────────────
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return kb / 1024 if sys.platform != "darwin" else kb / 2**20
+    except ImportError:
+        return None
+
+
+def _child(engine, size, repeat, freeze, at_workers=None):
+    import gc
+    import tempfile
+    sys.path.insert(0, str(ROOT))
+    import generator as G
+    make_input, run = _CASES[engine]
+    with tempfile.TemporaryDirectory() as tmp:
+        df = make_input(size, tmp)
+    gc.collect()
+    rss0  = _rss_mb()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        frames = run(G, df.copy(), at_workers)
+        times.append(time.perf_counter() - t0)
+    wall = min(times)
+    peak = _peak_rss_mb()
+    return {
+        "engine":         engine,
+        "size":           size,
+        "rows":           len(df),
+        "wall_s":         round(wall, 4),
+        "wall_all_s":     [round(t, 4) for t in times],
+        "rows_per_s":     round(len(df) / wall, 1) if wall else None,
+        "peak_rss_mb":    round(peak, 1) if peak else None,
+        "rss_before_mb":  round(rss0, 1) if rss0 else None,
+        "golden":         _golden_diff(engine, size, frames, freeze),
+        "engine_version": getattr(G, "VERSION", "?"),
+        "at_workers":     at_workers if engine == "at" else None,
+    }
+
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--engines", default=",".join(ENGINES))
+    ap.add_argument("--sizes", default="1000,10000")
+    ap.add_argument("--repeat", type=int, default=1, help="timed runs per case (best is kept)")
+    ap.add_argument("--freeze", action="store_true")
+    ap.add_argument("--at-workers", type=int, default=None,
+                    help="worker processes for at_score_events (default: engine's choice)")
+    ap.add_argument("--results", default=str(ROOT / "bench_results.jsonl"))
+    ap.add_argument("--_child", nargs=2, metavar=("ENGINE", "SIZE"), help=argparse.SUPPRESS)
+    a = ap.parse_args()
+
+    if a._child:
+        print(json.dumps(_child(a._child[0], int(a._child[1]), a.repeat, a.freeze,
+                                a.at_workers)))
+        return 0
+
+    engines = [e.strip() for e in a.engines.split(",") if e.strip()]
+    bad = set(engines) - set(ENGINES)
+    if bad:
+        ap.error(f"unknown engine(s): {', '.join(sorted(bad))}")
+    sizes  = [int(s) for s in a.sizes.split(",")]
+    run_id = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    rev    = _git_rev()
+    failed = False
+
+    print(f"{'engine':<6} {'size':>9} {'rows':>9} {'wall s':>9} {'rows/s':>11} {'peak MB':>9}  golden")
+    print("─" * 72)
+    for engine in engines:
+        for size in sizes:
+            cmd = [sys.executable, __file__, "--_child", engine, str(size),
+                   "--repeat", str(a.repeat)] + (["--freeze"] if a.freeze else []) \
+                  + (["--at-workers", str(a.at_workers)] if a.at_workers else [])
+            proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+            if proc.returncode != 0:
+                failed = True
+                print(f"{engine:<6} {size:>9}  ❌ case crashed:\n{proc.stderr.strip()[-2000:]}")
+                continue
+            res = json.loads(proc.stdout.strip().splitlines()[-1])
+            res.update(run_id=run_id, git_rev=rev)
+            states = {k: v["status"] for k, v in res["golden"].items()}
+            ok     = all(s in ("match", "frozen") for s in states.values())
+            failed |= not ok
+            print(f"{engine:<6} {size:>9,} {res['rows']:>9,} {res['wall_s']:>9.3f} "
+                  f"{res['rows_per_s'] or 0:>11,.0f} {res['peak_rss_mb'] or 0:>9.1f}  "
+                  + ("✅ " if ok else "❌ ") + ", ".join(f"{k}={v}" for k, v in states.items()))
+            for name, rep in res["golden"].items():
+                if rep["status"] == "DIFF":
+                    print(f"         {name}: {rep['rows_diff']} differing row(s) "
+                          f"(gold {rep['rows_gold']}, now {rep['rows_now']})")
+                    for d in rep["first"]:
+                        print(f"           line {d['line']}:\n             gold {d['gold']}\n"
+                              f"             now  {d['now']}")
+            with open(a.results, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(res) + "\n")
+
+    print("─" * 72)
+    print(f"Results appended to {a.results}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,13 +10,47 @@ Version 78.0
      VERSION, regulatory reference constants (_REG_AT, _REG_UAR, _REG_NV),
      GAMP AI compliance block, trial mode helpers (_is_trial, _trial_gate),
      MODELS dict, CHUNK_SIZE, SESSION_TIMEOUT, DB_PATH
+     Startup: completion() / _lazy_import() — litellm, the langchain PDF loader
+     and pdfplumber load on first use; _boot_profile() — cold-start timings;
+     _process_state() — st.cache_resource dicts that survive script reruns
+     _col_alias_resolve() — shared header→canonical resolver (alias tables
+     compiled at import, answers memoised per header signature) for AT, UAR,
+     DIM and DCI ingestion
+
+§1a  LLM GATEWAY
+     _llm_completion(), _llm_cascade_completion(), llm_gateway_stats()
+     _llm_hedged_cascade(), _llm_ranked_cascade() — hedging + per-model health
+     Per-provider token bucket + concurrency cap, jittered backoff, call log
+     _llm_stream_json_array() — incremental JSON-array parse of a streamed reply
 
 §2   SECURITY & AUTH
      Rate limiter, session timeout, password hashing, user management,
      authentication, e-signature validation, audit log (log_audit)
 
+§2a  BACKGROUND ARTIFACT BUILDS
+     artifact_submit(), artifact_status(), artifact_wait(), artifact_stats()
+     AT/UAR evidence workbooks built off-thread as soon as scoring finishes;
+     bytes persisted under artifact_cache/ keyed by (module, file hash,
+     system, period, VERSION)
+
 §3   DATABASE
      db_setup(), db_migrate(), DB schema
+     dim_bank — persistent DIM periods (_dim_store_bank / _dim_store_load),
+                written by batch_review.py, loadable from show_dim()
+     audit_search() — paged audit_log / signature_log query (user, action,
+                date range, free text); composite indexes + FTS5 mirrors fed
+                by AFTER INSERT triggers (_audit_search_migrate)
+     blob_put(), blob_get(), blob_gc(), blob_stats() — content-addressed,
+                compressed store under blob_store/ for job uploads, job
+                results and document content; rows hold SHA-256 digests,
+                blob_refs carries references + retention policy
+     archive_seal_closed(), archive_verify(), archive_frame() — closed
+                months of audit_log / signature_log / ai_gen_log rolled into
+                gzipped read-only SQLite segments under audit_archive/,
+                hash-chained in archive_segments; audit_search() spans them
+     submit_job(), _worker_loop(), _run_job() — async validation jobs;
+                per-stage checkpoints (job_checkpoints), heartbeat_at and
+                _job_recover_stale() resume jobs a restart interrupted
 
 §4   URS GATE & DOCUMENT VALIDATION
      validate_urs_document(), URS keyword lists
@@ -26,12 +60,15 @@ Version 78.0
      run_segmented_analysis(), run_cross_source_analysis()
      run_deterministic_validation(), _build_traceability()
      _apply_confidence_flags(), _fill_missing_frs(), _fill_missing_oq()
+     _build_link_index() — shared URS→FRS→OQ adjacency maps
      build_styled_excel(), build_dashboard_sheet(), build_cover_sheet()
      build_signature_sheet(), build_audit_log_sheet(), build_pdf_bytes()
      _build_demo_validation_package()
 
 §6   CHANGE IMPACT ANALYSIS (CIA) MODULE
      build_cia_pass1/2/3_prompt(), run_cia_analysis()
+     _cia_chunked_pass1/2() — map-reduce mode for large change specs / FRS
+     _cia_prematch() — deterministic change↔FRS linker ahead of Pass 2
      build_cia_excel(), show_change_impact()
 
 §7   SESSION STATE DEFAULTS (_defaults dict)
@@ -39,7 +76,15 @@ Version 78.0
 §8   CSS & BRANDING
 
 §9   AUDIT TRAIL (AT) MODULE — Periodic Review Module 1
+     _AtRuleProfiler            per-stage wall time / rows examined / rows fired
+                                (analysis log, Detection Logic "Performance", JSON)
+     _at_map_partitions()       user/record hash partitions on a process pool
+                                (Rule 2 burst, Rule 12 reversal, Rule 16 first-time)
      at_score_events()          line ~6242
+     _at_read_table(), _at_autodetect_column(), _at_review_period(),
+     _at_select_for_review(), _at_dim_rows()
+                                upload → DIM pipeline steps shared by
+                                show_audit_trail() and batch_review.py
      at_generate_justifications() line ~8058
      at_build_excel()           line ~8145  (Sheet 5: Rule Summary — rule firing chart, replaces Compliance Checklist v96)
      show_audit_trail()         line ~11516
@@ -53,6 +98,11 @@ Version 78.0
      _uar_score_single()        line ~9560
      _uar_sod_conflicts()       line ~9680
      uar_score_users()          line ~9922  (main entry point)
+     uar_score_systems()        multi-system consolidation: per-system scoring
+                                on a process pool + identity-keyed cross-system
+                                analytics (_uar_cross_system_privileged/_sod)
+     uar_build_consolidated_excel()  cross-system evidence workbook
+     _show_uar_consolidated()   UAR screen's multi-file consolidated path
      _uar_deterministic_narrative()  line ~9980
      _uar_finding_rationale()   line ~10030
      uar_generate_justifications()   line ~10060
@@ -94,12 +144,25 @@ Deploy pattern:
 """
 
 
+import time as _boot_time
+_BOOT_MARKS = [("start", _boot_time.perf_counter())]   # see _boot_profile()
+
 import streamlit as st
 import streamlit.components.v1 as _st_components
 import os
+import sys
+import importlib
+import importlib.util
 import datetime
 import pandas as pd
-from litellm import completion
+_BOOT_MARKS.append(("streamlit + pandas", _boot_time.perf_counter()))
+
+
+def completion(*args, **kwargs):
+    """litellm.completion, imported on first LLM call rather than at startup.
+    `import litellm` alone costs 1–3 s of every cold start, and the login
+    page and the deterministic modules (AT/UAR/DIM/DCI scoring) never need it."""
+    return _lazy_import("litellm").completion(*args, **kwargs)
 
 
 # ── Provider quota preflight ──────────────────────────────────────────────────
@@ -128,8 +191,10 @@ def _has_sufficient_quota(model_id: str) -> tuple:
     an invalid request. Use a small but realistic prompt instead.
     """
     try:
-        completion(
+        _llm_completion(
             model=model_id,
+            purpose="quota_probe",
+            retries=0,
             stream=False,
             temperature=0,
             max_tokens=10,
@@ -191,6 +256,610 @@ def _show_quota_error(model_id: str, error_detail: str):
         f"an incomplete analysis cannot be used as a validation artifact.*"
     )
 
+# ── LLM gateway — shared throttling, retry, failover and accounting ──────────
+# Every LLM call in the app goes through _llm_completion() (single model) or
+# _llm_cascade_completion() (walks _get_ai_cascade()). The gateway enforces a
+# per-provider token-bucket request rate and a concurrency cap, retries 429 /
+# 5xx / timeout errors with jittered exponential backoff, and records latency
+# and token usage per call so parallel pipelines (segmented Pass 2, chunked
+# CIA, narrative fallbacks) share one budget instead of each tripping limits.
+# Limits can be overridden in secrets.toml:
+#   [llm_limits.anthropic]
+#   rpm = 100
+#   concurrency = 8
+import threading   as _threading
+import time        as _time_mod
+import random      as _random
+import collections as _collections
+import json        as _json
+
+_LLM_PROVIDER_LIMITS = {
+    # rpm = sustained requests/minute (bucket refill), burst = bucket size,
+    # concurrency = max in-flight calls (streams hold their slot until drained)
+    "anthropic": {"rpm": 50, "burst": 10, "concurrency": 4},
+    "openai":    {"rpm": 60, "burst": 10, "concurrency": 4},
+    "gemini":    {"rpm": 60, "burst": 10, "concurrency": 4},
+    "groq":      {"rpm": 30, "burst": 5,  "concurrency": 2},
+}
+_LLM_DEFAULT_LIMITS = {"rpm": 30, "burst": 5, "concurrency": 2}
+_LLM_MAX_RETRIES    = 3       # transient-error retries per call (not per cascade)
+_LLM_BACKOFF_BASE   = 2.0     # seconds — delay = base × 2^attempt × U(0.5, 1.5)
+_LLM_BACKOFF_CAP    = 30.0
+_LLM_CALL_LOG_MAX   = 500     # most recent calls kept for the stats panel
+
+_LLM_TRANSIENT_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+_LLM_TRANSIENT_KW    = ("rate limit", "rate_limit", "ratelimit", "overloaded",
+                        "timeout", "timed out", "temporarily", "try again",
+                        "connection", "service unavailable", "internal server error")
+_LLM_PERMANENT_KW    = ("quota", "billing", "exceeded your", "api key",
+                        "unauthorized", "invalid_api_key", "authentication",
+                        "permission_denied")
+
+
+# ── Process-wide state ────────────────────────────────────────────────────────
+# Streamlit re-executes this script in a fresh module namespace on every rerun,
+# so a plain module-level dict / lock / pool is silently replaced each time —
+# and background threads keep writing into the previous run's copy. State that
+# must be shared by every rerun and session of the process (rate limiters,
+# health windows, build registries) is anchored in st.cache_resource instead.
+@st.cache_resource(show_spinner=False)
+def _process_state(name: str) -> dict:
+    """One mutable dict per name, shared by all reruns and sessions."""
+    return {}
+
+
+def _lazy_import(module: str):
+    """Import a heavy optional dependency on first use and record the cost
+    (first import per process) for the admin cold-start report."""
+    mod = sys.modules.get(module)
+    if mod is not None:
+        return mod
+    t0  = _boot_time.perf_counter()
+    mod = importlib.import_module(module)
+    _process_state("lazy_imports").setdefault(
+        module, round((_boot_time.perf_counter() - t0) * 1000, 1))
+    return mod
+
+
+def _boot_profile() -> dict:
+    """
+    Startup profile. Phase timings come from _BOOT_MARKS, appended as the
+    script executes. The first execution in a process is kept as "cold";
+    every later rerun overwrites "last". lazy_imports holds the first-use
+    import cost of each dependency deferred via _lazy_import().
+    Rendered in the admin sidebar.
+    """
+    phases = [
+        {"Phase": label, "ms": round((t - _BOOT_MARKS[i][1]) * 1000, 1)}
+        for i, (label, t) in enumerate(_BOOT_MARKS[1:])
+    ]
+    prof = _process_state("boot_profile")
+    prof.setdefault("cold", phases)
+    prof["last"] = phases
+    return {"cold": prof["cold"], "last": prof["last"],
+            "lazy_imports": dict(_process_state("lazy_imports"))}
+
+
+# ── Column alias resolution ───────────────────────────────────────────────────
+# Every ingestion path maps export headers onto its own canonical names:
+# _at_autodetect_column (AT column mapper), _uar_normalise_columns and the
+# _uar_preprocess alias pass (UAR), _dim_normalise_columns (DIM), and
+# dci_module._dci_apply_column_aliases / the DCI validator (DCI). Each alias
+# table is compiled once at import into a flat lookup dict. Each path's
+# answer for a whole header row, including AT's containment fallback, is
+# memoised per header signature in _process_state("column_aliases"). The
+# same export template uploaded again, in a later rerun or a later quarter,
+# then maps from the cache without re-matching.
+_COL_ALIAS_CACHE_MAX = 512
+
+
+def _col_alias_collapse(s) -> str:
+    """Lower-case alphanumerics only: 'Last Login-Date' → 'lastlogindate'."""
+    return "".join(ch for ch in str(s).lower() if ch.isalnum())
+
+
+def _col_alias_compile(pairs, key_fn=None) -> dict:
+    """Flat {key_fn(alias): canonical} lookup from (alias, canonical) pairs.
+    A later pair overwrites an earlier one that normalises to the same key."""
+    return {(key_fn(a) if key_fn else a): canon for a, canon in pairs}
+
+
+def _col_alias_resolve(kind: str, columns, resolve):
+    """resolve(columns) memoised per (kind, header signature). kind names the
+    alias table plus its fingerprint, so an edited table never reuses an
+    answer from the old one. The cached value is shared, so callers must
+    treat it as read-only."""
+    cache = _process_state("column_aliases")
+    key   = (kind, tuple(columns))
+    hit   = cache.get(key)
+    if hit is None:
+        hit = resolve(list(columns))
+        if len(cache) >= _COL_ALIAS_CACHE_MAX:
+            cache.clear()
+        cache[key] = hit
+    return hit
+
+
+def _col_alias_kind(name: str, table) -> str:
+    """Cache namespace for one alias table: name + content fingerprint."""
+    return f"{name}:{hashlib.md5(repr(table).encode()).hexdigest()[:12]}"
+
+
+_LLM_STATE     = _process_state("llm_gateway")
+_LLM_LOCK      = _LLM_STATE.setdefault("lock", _threading.Lock())
+_LLM_PROVIDERS = _LLM_STATE.setdefault("providers", {})
+_LLM_CALL_LOG  = _LLM_STATE.setdefault(
+    "call_log", _collections.deque(maxlen=_LLM_CALL_LOG_MAX))
+
+
+class _TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until one request token is free."""
+
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate     = max(rate_per_sec, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        self.tokens   = self.capacity
+        self.stamp    = _time_mod.monotonic()
+        self.lock     = _threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token; returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now         = _time_mod.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp  = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+            _time_mod.sleep(delay)
+            waited += delay
+
+
+def _llm_provider_key(model_id: str) -> str:
+    return model_id.split("/")[0].lower() if "/" in model_id else "unknown"
+
+
+def _llm_provider_state(provider: str) -> dict:
+    """Lazily create the bucket + semaphore for a provider."""
+    with _LLM_LOCK:
+        state = _LLM_PROVIDERS.get(provider)
+        if state is None:
+            limits = dict(_LLM_PROVIDER_LIMITS.get(provider, _LLM_DEFAULT_LIMITS))
+            try:
+                limits.update(dict(st.secrets.get("llm_limits", {}).get(provider, {})))
+            except Exception:
+                pass
+            state = {
+                "limits": limits,
+                "bucket": _TokenBucket(limits["rpm"] / 60.0, limits["burst"]),
+                "sem":    _threading.BoundedSemaphore(int(limits["concurrency"])),
+            }
+            _LLM_PROVIDERS[provider] = state
+        return state
+
+
+def _llm_is_transient(exc: Exception) -> bool:
+    """429 / 5xx / timeouts are retried; auth, billing and quota errors are not."""
+    msg = str(exc).lower()
+    if any(kw in msg for kw in _LLM_PERMANENT_KW):
+        return False
+    code = getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in _LLM_TRANSIENT_CODES
+    return any(kw in msg for kw in _LLM_TRANSIENT_KW)
+
+
+def _llm_record(**rec):
+    rec.setdefault("ts", datetime.datetime.utcnow().isoformat(timespec="seconds"))
+    _LLM_CALL_LOG.append(rec)
+    # Retries and abandoned streams say nothing about the model's health
+    if not str(rec.get("status", "")).startswith(("retry", "abandoned")):
+        _llm_health_update(rec.get("model", ""), rec.get("latency_s"),
+                           rec.get("status") == "ok")
+
+
+def _llm_usage(resp) -> tuple:
+    """(prompt_tokens, completion_tokens) from a litellm response, or (None, None)."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None, None
+    return (getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None))
+
+
+class _LLMStream:
+    """
+    Iterator over a streamed completion that holds the provider's concurrency
+    slot, then records latency / time-to-first-token / usage when the stream
+    ends. Providers that don't report usage on streams get a chars/4 estimate.
+
+    The slot is released exactly once: at exhaustion, on a stream error, on
+    close() / leaving a `with` block, or when the object is garbage-collected
+    — so a stream nobody iterates (an abandoned hedge leg) cannot pin it.
+    """
+
+    def __init__(self, stream, state: dict, rec: dict, t0: float):
+        self._state, self._rec, self._t0 = state, rec, t0
+        self._chars, self._first, self._usage = 0, None, (None, None)
+        self._done   = False
+        self._stream = stream
+        try:
+            self._it = iter(stream)
+        except Exception as e:
+            self._finish(f"stream_error: {str(e)[:80]}")
+            raise
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        try:
+            chunk = next(self._it)
+        except StopIteration:
+            self._finish("ok")
+            raise
+        except Exception as e:
+            self._finish(f"stream_error: {str(e)[:80]}")
+            raise
+        if self._first is None:
+            self._first = _time_mod.monotonic() - self._t0
+        if getattr(chunk, "choices", None):
+            self._chars += len(chunk.choices[0].delta.content or "")
+        if getattr(chunk, "usage", None) is not None:
+            self._usage = _llm_usage(chunk)
+        return chunk
+
+    def close(self):
+        """Stop early: close the provider stream and give the slot back."""
+        if self._done:
+            return
+        try:
+            getattr(self._stream, "close", lambda: None)()
+        except Exception:
+            pass
+        self._finish("abandoned")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _finish(self, status: str):
+        if self._done:
+            return
+        self._done = True
+        self._state["sem"].release()
+        rec = self._rec
+        rec["status"]            = status
+        rec["latency_s"]         = round(_time_mod.monotonic() - self._t0, 3)
+        rec["ttft_s"]            = round(self._first, 3) if self._first is not None else None
+        rec["prompt_tokens"]     = self._usage[0]
+        rec["completion_tokens"] = (self._usage[1] if self._usage[1] is not None
+                                    else self._chars // 4)
+        rec["tokens_estimated"]  = self._usage[1] is None
+        _llm_record(**rec)
+
+
+def _llm_completion(*, model: str, messages: list, purpose: str = "",
+                    retries: int = None, **kwargs):
+    """
+    Drop-in replacement for litellm.completion(model=…, messages=…, **kwargs)
+    routed through the provider's rate limit and concurrency cap.
+
+    purpose: short tag ("nv_pass1", "at_batch" …) shown in the stats panel.
+    retries: transient-error retries (default _LLM_MAX_RETRIES; 0 = fail fast,
+             used by cascades that would rather fail over than wait).
+    Streaming responses are returned as an _LLMStream that keeps the
+    concurrency slot until consumed, closed or garbage-collected.
+    """
+    provider = _llm_provider_key(model)
+    state    = _llm_provider_state(provider)
+    retries  = _LLM_MAX_RETRIES if retries is None else retries
+    attempt  = 0
+    while True:
+        queued = state["bucket"].acquire()
+        state["sem"].acquire()
+        t0  = _time_mod.monotonic()
+        rec = {"purpose": purpose, "provider": provider, "model": model,
+               "attempts": attempt + 1, "queued_s": round(queued, 3),
+               "stream": bool(kwargs.get("stream"))}
+        try:
+            resp = completion(model=model, messages=messages, **kwargs)
+        except Exception as e:
+            state["sem"].release()
+            transient = _llm_is_transient(e)
+            _llm_record(**rec, latency_s=round(_time_mod.monotonic() - t0, 3),
+                        status=f"{'retry' if transient and attempt < retries else 'error'}: "
+                               f"{str(e)[:80]}")
+            if not transient or attempt >= retries:
+                raise
+            delay = min(_LLM_BACKOFF_CAP, _LLM_BACKOFF_BASE * (2 ** attempt))
+            _time_mod.sleep(delay * _random.uniform(0.5, 1.5))
+            attempt += 1
+            continue
+
+        if kwargs.get("stream"):
+            return _LLMStream(resp, state, rec, t0)
+        state["sem"].release()
+        p_tok, c_tok = _llm_usage(resp)
+        _llm_record(**rec, latency_s=round(_time_mod.monotonic() - t0, 3),
+                    prompt_tokens=p_tok, completion_tokens=c_tok, status="ok")
+        return resp
+
+
+def _llm_cascade_completion(messages: list, purpose: str = "", models: list = None,
+                            accept=None, **kwargs) -> tuple:
+    """
+    Try each model in the cascade (default _get_ai_cascade()) until one
+    returns a response that passes accept(text). Each model gets one fast
+    retry on transient errors before failing over.
+    Returns (response_text, model_id) or (None, None) if every model failed.
+    """
+    for _model in (models or _get_ai_cascade()):
+        try:
+            resp = _llm_completion(model=_model, messages=messages,
+                                   purpose=purpose, retries=1, **kwargs)
+            text = (resp.choices[0].message.content or "").strip()
+        except Exception:
+            continue
+        if text and (accept is None or accept(text)):
+            return text, _model
+    return None, None
+
+
+# ── Streamed JSON-array ingestion ─────────────────────────────────────────────
+# Batch narrative prompts return one JSON array. Parsing it only after the
+# whole completion lands leaves the reviewer watching a spinner for the full
+# generation; parsing it incrementally hands each element to the caller the
+# moment its closing brace / quote arrives.
+class _JsonArrayStream:
+    """
+    Incremental parser for a top-level JSON array arriving in arbitrary
+    text fragments. feed() returns the elements completed by that fragment.
+    Anything before the first '[' (markdown fences, preamble) is ignored;
+    an element that fails to parse is skipped, not fatal.
+    """
+
+    def __init__(self):
+        self._buf     = []
+        self._started = False
+        self._depth   = 0
+        self._in_str  = False
+        self._esc     = False
+        self.done     = False
+
+    def _emit(self, out: list):
+        raw = "".join(self._buf).strip()
+        self._buf = []
+        if raw:
+            try:
+                out.append(_json.loads(raw))
+            except ValueError:
+                pass
+
+    def feed(self, text: str) -> list:
+        out = []
+        for ch in text:
+            if self.done:
+                break
+            if not self._started:
+                self._started = ch == "["
+                continue
+            if self._in_str:
+                self._buf.append(ch)
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 0:
+                        self._emit(out)          # top-level string element
+                continue
+            if ch == '"':
+                self._in_str = True
+                self._buf.append(ch)
+            elif ch in "{[":
+                self._depth += 1
+                self._buf.append(ch)
+            elif ch in "}]":
+                if self._depth == 0:             # the array's own ']'
+                    self._emit(out)
+                    self.done = True
+                    continue
+                self._depth -= 1
+                self._buf.append(ch)
+                if self._depth == 0:
+                    self._emit(out)              # object / nested array closed
+            elif ch == "," and self._depth == 0:
+                self._emit(out)                  # scalar element (or no-op)
+            else:
+                self._buf.append(ch)
+        return out
+
+
+def _llm_stream_json_array(*, model: str, messages: list, on_item,
+                           purpose: str = "", **kwargs) -> list:
+    """
+    Stream a completion that answers with a JSON array and call
+    on_item(element) for each element as soon as it is complete.
+    Returns every element received. A mid-stream failure propagates —
+    elements already delivered stay delivered, so callers keep them and
+    fill only the gaps.
+    """
+    resp   = _llm_completion(model=model, messages=messages, purpose=purpose,
+                             stream=True, **kwargs)
+    parser = _JsonArrayStream()
+    items  = []
+    with resp:
+        for chunk in resp:
+            if not getattr(chunk, "choices", None):
+                continue
+            for item in parser.feed(chunk.choices[0].delta.content or ""):
+                items.append(item)
+                on_item(item)
+    return items
+
+
+# ── Per-model rolling health + hedged cascade ─────────────────────────────────
+# Every gateway call feeds a rolling window of (latency, ok) per model. The
+# cascade is re-ranked from it (healthy + fastest first), and interactive
+# callers can hedge: if the first model hasn't answered within its own p95,
+# the next model is fired concurrently and the first good answer wins.
+_LLM_HEALTH_WINDOW   = 50      # most recent calls per model
+_LLM_HEALTH_MIN_N    = 5       # calls needed before a model's stats are trusted
+_LLM_UNHEALTHY_ERR   = 0.5     # error rate above which a model drops to the back
+_LLM_HEDGE_DEFAULT_S = 4.0     # hedge delay when a model has no latency history
+_LLM_HEDGE_MIN_S     = 1.0
+_LLM_HEDGE_MAX_S     = 8.0
+_LLM_MODEL_HEALTH = _LLM_STATE.setdefault("model_health", {})
+
+
+def _llm_health_update(model: str, latency_s, ok: bool):
+    with _LLM_LOCK:
+        win = _LLM_MODEL_HEALTH.setdefault(
+            model, _collections.deque(maxlen=_LLM_HEALTH_WINDOW))
+        win.append((float(latency_s or 0.0), bool(ok)))
+
+
+def _llm_model_health(model: str) -> dict:
+    """{"n", "err_rate", "p50_s", "p95_s"} over the rolling window (p* from successes)."""
+    with _LLM_LOCK:
+        win = list(_LLM_MODEL_HEALTH.get(model, ()))
+    if not win:
+        return {"n": 0, "err_rate": 0.0, "p50_s": None, "p95_s": None}
+    lat = sorted(l for l, ok in win if ok)
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] if lat else None
+    return {"n": len(win), "err_rate": sum(1 for _, ok in win if not ok) / len(win),
+            "p50_s": pct(0.50), "p95_s": pct(0.95)}
+
+
+def _llm_ranked_cascade(models: list = None) -> list:
+    """
+    Cascade re-ordered by current health, in three tiers: healthy models
+    with enough history (sorted by p50 latency), then models without enough
+    history (configured order), then models whose error rate exceeds
+    _LLM_UNHEALTHY_ERR. With no history at all the configured order stands.
+    """
+    models = list(models or _get_ai_cascade())
+
+    def _key(item):
+        pos, m = item
+        h = _llm_model_health(m)
+        if h["n"] < _LLM_HEALTH_MIN_N:
+            return (1, 0.0, pos)
+        if h["err_rate"] > _LLM_UNHEALTHY_ERR or h["p50_s"] is None:
+            return (2, 0.0, pos)
+        return (0, h["p50_s"], pos)
+    return [m for _, m in sorted(enumerate(models), key=_key)]
+
+
+def _llm_hedge_delay(model: str) -> float:
+    h = _llm_model_health(model)
+    if h["n"] < _LLM_HEALTH_MIN_N or h["p95_s"] is None:
+        return _LLM_HEDGE_DEFAULT_S
+    return max(_LLM_HEDGE_MIN_S, min(_LLM_HEDGE_MAX_S, h["p95_s"]))
+
+
+def _llm_hedged_cascade(messages: list, purpose: str = "", accept=None,
+                        models: list = None, **kwargs) -> tuple:
+    """
+    Hedged version of _llm_cascade_completion for latency-critical calls.
+
+    Models are taken from _llm_ranked_cascade(). The next model is launched
+    when the newest in-flight one exceeds its p95-derived hedge delay, or
+    immediately when one fails or returns an unacceptable answer. The first
+    acceptable answer wins. Losing calls are left to finish in the
+    background (they cannot be cancelled mid-request); their latency still
+    feeds the health window.
+    Returns (response_text, model_id) or (None, None).
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    queue = _llm_ranked_cascade(models)
+    if not queue:
+        return None, None
+
+    def _one(model):
+        resp = _llm_completion(model=model, messages=messages, purpose=purpose,
+                               retries=0, **kwargs)
+        return (resp.choices[0].message.content or "").strip()
+
+    pool     = ThreadPoolExecutor(max_workers=len(queue))
+    inflight = {}
+    try:
+        nxt = 0
+        while True:
+            if nxt < len(queue) and (not inflight or nxt == 0):
+                inflight[pool.submit(_one, queue[nxt])] = queue[nxt]
+                nxt += 1
+            if not inflight:
+                return None, None
+            newest = list(inflight.values())[-1]
+            done, _ = wait(inflight, timeout=_llm_hedge_delay(newest),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Hedge: newest call is slower than its own p95 — fire the next
+                if nxt < len(queue):
+                    inflight[pool.submit(_one, queue[nxt])] = queue[nxt]
+                    nxt += 1
+                continue
+            for fut in done:
+                model = inflight.pop(fut)
+                try:
+                    text = fut.result()
+                except Exception:
+                    text = None
+                if text and (accept is None or accept(text)):
+                    return text, model
+            # A call failed or was rejected — replace it straight away
+            if nxt < len(queue):
+                inflight[pool.submit(_one, queue[nxt])] = queue[nxt]
+                nxt += 1
+    finally:
+        pool.shutdown(wait=False)
+
+
+def llm_gateway_stats() -> pd.DataFrame:
+    """
+    Per provider/model/purpose summary of recent calls: count, errors, p50/p95
+    latency, queue wait and token totals. Empty frame if nothing recorded yet.
+    """
+    if not _LLM_CALL_LOG:
+        return pd.DataFrame()
+    df = pd.DataFrame(list(_LLM_CALL_LOG))
+    df["is_error"] = ~df["status"].astype(str).isin(["ok", "abandoned"])
+    for col in ("prompt_tokens", "completion_tokens", "queued_s"):
+        if col not in df.columns:
+            df[col] = 0
+    g = df.groupby(["provider", "model", "purpose"], dropna=False)
+    out = g.agg(
+        calls=("status", "size"),
+        errors=("is_error", "sum"),
+        p50_latency_s=("latency_s", "median"),
+        p95_latency_s=("latency_s", lambda s: s.quantile(0.95)),
+        total_queued_s=("queued_s", "sum"),
+        prompt_tokens=("prompt_tokens", lambda s: int(pd.to_numeric(s, errors="coerce").fillna(0).sum())),
+        completion_tokens=("completion_tokens", lambda s: int(pd.to_numeric(s, errors="coerce").fillna(0).sum())),
+    ).reset_index()
+    return out.sort_values(["calls"], ascending=False).reset_index(drop=True)
+
+
+_BOOT_MARKS.append(("LLM gateway", _boot_time.perf_counter()))
+
 import tempfile
 import io
 import sqlite3
@@ -199,13 +868,12 @@ import hashlib
 import secrets
 import html as _html_lib
 
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+# Heavy PDF stacks are imported on first PDF upload (see extract_pages) —
+# find_spec only checks availability, it does not import the package.
+PDFPLUMBER_AVAILABLE = importlib.util.find_spec("pdfplumber") is not None
 
-from langchain_community.document_loaders import PyPDFLoader
+# openpyxl stays eager: ~60 ms, and its style classes are module globals used
+# by every workbook builder in the file.
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
@@ -334,7 +1002,9 @@ ROLES = ["Admin", "QA", "Validator"]
 # =============================================================================
 # 1b. PROMPT LOADER
 # =============================================================================
-# All prompts live in ./prompts/*.md — loaded once at startup.
+# All prompts live in ./prompts/*.md — read once per process and kept in
+# _process_state("prompts"); later reruns only stat() the file, so an edited
+# prompt is still picked up without a restart.
 # Separating prompts from code lets domain experts edit clinical/regulatory
 # language without touching Python, and gives prompt changes their own git history.
 
@@ -349,16 +1019,23 @@ def _load_prompt(filename: str) -> str:
     """
     prompt_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
     path       = os.path.join(prompt_dir, filename)
+    cache      = _process_state("prompts")
     try:
+        mtime  = os.stat(path).st_mtime_ns
+        cached = cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
         with open(path, "r", encoding="utf-8") as f:
-            return f.read()
+            text = f.read()
+        cache[path] = (mtime, text)
+        return text
     except FileNotFoundError:
         # Graceful fallback — log warning but don't crash the app
         import warnings
         warnings.warn(f"Prompt file not found: {path}. Using empty string fallback.")
         return ""
 
-# Load all prompt templates at module level — single I/O hit at startup
+# Load all prompt templates at module level — cached per process (see above)
 #
 # Shared gateway prompts (root level — used across all modes)
 _PROMPT_SYSTEM_RAW     = _load_prompt("system_prompt.md")
@@ -372,6 +1049,7 @@ _PROMPT_PASS2_RAW      = _load_prompt("new_validation/pass2_frs_oq_gap.md")
 _PROMPT_CIA_PASS1_RAW  = _load_prompt("change_impact/pass1_change_extraction.md")
 _PROMPT_CIA_PASS2_RAW  = _load_prompt("change_impact/pass2_impact_mapping.md")
 _PROMPT_CIA_PASS3_RAW  = _load_prompt("change_impact/pass3_justification.md")
+_BOOT_MARKS.append(("stdlib + openpyxl + prompts", _boot_time.perf_counter()))
 
 # =============================================================================
 # 1b. SECURITY HELPERS
@@ -467,6 +1145,25 @@ def db_connect():
     # (defence-in-depth — the Python layer never calls DELETE/UPDATE on audit_log)
     return conn
 
+# No-DELETE guards on the append-only Part 11 logs, kept as data so that
+# _archive_seal_one can drop one and recreate it inside its sealing transaction.
+_NO_DELETE_TRIGGERS = {
+    "audit_log": ("trg_audit_no_delete", """
+            CREATE TRIGGER IF NOT EXISTS trg_audit_no_delete
+            BEFORE DELETE ON audit_log
+            BEGIN
+                SELECT RAISE(ABORT, '21CFR11: audit_log rows are immutable — DELETE denied');
+            END
+        """),
+    "signature_log": ("trg_esig_no_delete", """
+            CREATE TRIGGER IF NOT EXISTS trg_esig_no_delete
+            BEFORE DELETE ON signature_log
+            BEGIN
+                SELECT RAISE(ABORT, '21CFR11: signature_log rows are immutable — DELETE denied');
+            END
+        """),
+}
+
 def db_migrate():
     try:
         conn = db_connect()
@@ -582,6 +1279,7 @@ def db_migrate():
             ("content",     "TEXT"),
             ("uploaded_by", "TEXT"),
             ("timestamp",   "TEXT"),
+            ("content_digest", "TEXT"),   # blob store digest; content stays NULL
         ]:
             if col not in doc_cols:
                 try:
@@ -619,7 +1317,123 @@ def db_migrate():
                 result_gap  TEXT,
                 result_xlsx BLOB,
                 error_msg   TEXT,
-                sys_ctx_name TEXT
+                sys_ctx_name TEXT,
+                file_digest    TEXT,
+                sys_ctx_digest TEXT,
+                result_digests TEXT,
+                heartbeat_at   TEXT,
+                attempts       INTEGER DEFAULT 0
+            )
+        """)
+        job_cols = [r[1] for r in conn.execute("PRAGMA table_info(jobs)").fetchall()]
+        for col, defn in [
+            ("file_digest",    "TEXT"),
+            ("sys_ctx_digest", "TEXT"),
+            ("result_digests", "TEXT"),
+            ("heartbeat_at",   "TEXT"),              # see _job_recover_stale
+            ("attempts",       "INTEGER DEFAULT 0"),
+        ]:
+            if col not in job_cols:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {col} {defn}")
+
+        # ── Async job stage checkpoints (see _job_ckpt_save) ─────────────────
+        # One row per finished Pass-1 segment / Pass-2 requirement / Pass-3
+        # call; the raw LLM reply is in the blob store (NULL digest = empty).
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_checkpoints (
+                job_id      TEXT NOT NULL,
+                stage       TEXT NOT NULL,
+                item        TEXT NOT NULL,
+                digest      TEXT,
+                created_at  TEXT,
+                PRIMARY KEY (job_id, stage, item)
+            )
+        """)
+
+        # ── Content-addressed blob store index (see blob_put) ────────────────
+        # The bytes live compressed under blob_store/; these two small tables
+        # hold what is stored and who still references it.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest        TEXT PRIMARY KEY,
+                codec         TEXT    NOT NULL,
+                size          INTEGER NOT NULL,
+                stored_bytes  INTEGER NOT NULL,
+                created_at    TEXT,
+                last_used_at  TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS blob_refs (
+                owner_type  TEXT NOT NULL,
+                owner_id    TEXT NOT NULL,
+                role        TEXT NOT NULL,
+                digest      TEXT NOT NULL,
+                policy      TEXT NOT NULL,
+                created_at  TEXT,
+                PRIMARY KEY (owner_type, owner_id, role)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blob_refs_digest "
+                     "ON blob_refs(digest)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blob_refs_policy "
+                     "ON blob_refs(policy, created_at)")
+
+        # ── AI narrative memo cache (see _narrative_cache_get) ───────────────
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS narrative_cache (
+                cache_key      TEXT PRIMARY KEY,
+                prompt_version TEXT,
+                model          TEXT,
+                narrative      TEXT NOT NULL,
+                created_at     TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_narrative_cache_created "
+                     "ON narrative_cache(created_at)")
+
+        # ── Persistent DIM period store (see _dim_store_bank) ────────────────
+        # Session banking is lost on logout; batch_review.py banks here so a
+        # year of periods can be trended without re-uploading every file.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dim_bank (
+                id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                system_name   TEXT,
+                review_period TEXT,
+                source_module TEXT,
+                source_file   TEXT,
+                row_json      TEXT NOT NULL,
+                banked_by     TEXT,
+                banked_at     TEXT
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_dim_bank_sys "
+            "ON dim_bank(system_name, review_period)")
+
+        # ── Sealed archive segments (see archive_seal_closed) ────────────────
+        # One row per closed month rolled out of audit_log / signature_log /
+        # ai_gen_log into a compressed read-only SQLite file. Each row carries
+        # the SHA-256 of its file and of its rows, chained through prev_hash →
+        # seal_hash. INSERT-ONLY, like the logs it replaces.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive_segments (
+                segment_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name    TEXT    NOT NULL,
+                period        TEXT    NOT NULL,
+                period_start  TEXT    NOT NULL,
+                period_end    TEXT    NOT NULL,
+                first_id      INTEGER NOT NULL,
+                last_id       INTEGER NOT NULL,
+                row_count     INTEGER NOT NULL,
+                rows_sha256   TEXT    NOT NULL,
+                file_name     TEXT    NOT NULL,
+                file_sha256   TEXT    NOT NULL,
+                file_bytes    INTEGER,
+                prev_hash     TEXT    NOT NULL,
+                seal_hash     TEXT    NOT NULL,
+                sealed_by     TEXT,
+                sealed_at     TEXT
             )
         """)
 
@@ -638,13 +1452,15 @@ def db_migrate():
                 SELECT RAISE(ABORT, '21CFR11: audit_log rows are immutable — UPDATE denied');
             END
         """)
-        conn2.execute("""
-            CREATE TRIGGER IF NOT EXISTS trg_audit_no_delete
-            BEFORE DELETE ON audit_log
-            BEGIN
-                SELECT RAISE(ABORT, '21CFR11: audit_log rows are immutable — DELETE denied');
-            END
-        """)
+        # DELETE is denied unconditionally. archive_seal_closed() lifts the
+        # trigger only inside its own sealing transaction (_archive_seal_one).
+        # Earlier builds gated it on archive_segments — restore the plain one.
+        for _tbl, (_trg, _ddl) in _NO_DELETE_TRIGGERS.items():
+            _sql = conn2.execute("SELECT sql FROM sqlite_master WHERE type='trigger' "
+                                 "AND name=?", (_trg,)).fetchone()
+            if _sql and "archive_segments" in _sql[0]:
+                conn2.execute(f"DROP TRIGGER {_trg}")
+        conn2.execute(_NO_DELETE_TRIGGERS["audit_log"][1])
         # signature_log is also append-only — e-signatures cannot be retracted
         conn2.execute("""
             CREATE TRIGGER IF NOT EXISTS trg_esig_no_update
@@ -653,14 +1469,25 @@ def db_migrate():
                 SELECT RAISE(ABORT, '21CFR11: signature_log rows are immutable — UPDATE denied');
             END
         """)
+        conn2.execute(_NO_DELETE_TRIGGERS["signature_log"][1])
         conn2.execute("""
-            CREATE TRIGGER IF NOT EXISTS trg_esig_no_delete
-            BEFORE DELETE ON signature_log
+            CREATE TRIGGER IF NOT EXISTS trg_archive_no_update
+            BEFORE UPDATE ON archive_segments
             BEGIN
-                SELECT RAISE(ABORT, '21CFR11: signature_log rows are immutable — DELETE denied');
+                SELECT RAISE(ABORT, '21CFR11: archive_segments rows are immutable — UPDATE denied');
+            END
+        """)
+        conn2.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_archive_no_delete
+            BEFORE DELETE ON archive_segments
+            BEGIN
+                SELECT RAISE(ABORT, '21CFR11: archive_segments rows are immutable — DELETE denied');
             END
         """)
         conn2.commit()
+        # Search indexes + FTS mirrors sit on top of (never replace) the
+        # immutability triggers above — see _audit_search_migrate.
+        _audit_search_migrate(conn2)
         conn2.close()
 
     except Exception as e:
@@ -678,6 +1505,821 @@ def db_diagnostics() -> dict:
         return {"error": str(e)}
 
 
+# ── Audit search ─────────────────────────────────────────────────────────────
+# Part 11 inspections ask "everything user X did to object Y last March" — on
+# a multi-year log a linear scan of audit_log takes seconds per question.
+# Composite (user, timestamp) / (action, timestamp) indexes serve the
+# structured filters; an FTS5 mirror per table serves free text. The mirrors
+# are external-content tables (no second copy of the text) fed by AFTER INSERT
+# triggers. The source tables are append-only, so the only DELETE they ever
+# see is archival sealing (see archive_seal_closed), mirrored by an AFTER
+# DELETE trigger; the immutability triggers stay untouched.
+# SQLite builds without FTS5 keep the indexes and fall back to LIKE.
+
+_AUDIT_SEARCH_TABLES = {
+    "audit_log": {
+        "pk":       "event_id",
+        "fts":      "audit_fts",
+        "text":     ("action", "object_changed", "reason", "new_value"),
+        "columns":  ("event_id", "timestamp", "user", "action", "object_changed",
+                     "old_value", "new_value", "reason", "user_ip"),
+    },
+    "signature_log": {
+        "pk":       "signature_id",
+        "fts":      "signature_fts",
+        "text":     ("action", "signature_meaning", "document_name", "doc_ids"),
+        "columns":  ("signature_id", "timestamp", "user", "role", "action",
+                     "signature_meaning", "document_name", "document_hash",
+                     "model_used", "prompt_version", "ip_address", "doc_ids"),
+    },
+}
+_AUDIT_SEARCH_PAGE_MAX = 1000
+
+
+def _audit_search_migrate(conn, tables=None) -> None:
+    """Create the audit search indexes and FTS5 mirrors (idempotent).
+
+    tables limits the work to some of _AUDIT_SEARCH_TABLES — archive segment
+    files hold a single table and get the same indexes at seal time.
+    """
+    for table in (tables or _AUDIT_SEARCH_TABLES):
+        spec = _AUDIT_SEARCH_TABLES[table]
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_ts "
+                     f"ON {table}(user, timestamp)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_action_ts "
+                     f"ON {table}(action, timestamp)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts "
+                     f"ON {table}(timestamp)")
+        conn.commit()
+
+        fts, pk, cols = spec["fts"], spec["pk"], spec["text"]
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+            (fts,)).fetchone()
+        try:
+            if not exists:
+                conn.execute(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                    f"{', '.join(cols)}, content='{table}', content_rowid='{pk}')")
+                # Backfill rows written before the mirror existed
+                conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert
+                AFTER INSERT ON {table}
+                BEGIN
+                    INSERT INTO {fts}(rowid, {', '.join(cols)})
+                    VALUES (new.{pk}, {', '.join('new.' + c for c in cols)});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {', '.join(cols)})
+                    VALUES ('delete', old.{pk}, {', '.join('old.' + c for c in cols)});
+                END
+            """)
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()      # no FTS5 in this SQLite build — LIKE fallback
+
+
+def _audit_fts_query(text: str) -> str:
+    """User text → FTS5 MATCH expression: every term must appear (prefix match).
+
+    Terms are quoted so operators/punctuation typed by the reviewer
+    ("AND", "-", ":") are searched literally instead of parsed as syntax.
+    """
+    terms = [t.replace('"', '""') for t in str(text).split() if t.strip('"')]
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def _audit_search_bound(value, end: bool = False):
+    """Date-range bound → (operator, ISO string) against the stored timestamps.
+
+    A bare date as the upper bound covers that whole day (< next day).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return ("<=" if end else ">=", value.isoformat())
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    value = str(value).strip()
+    if not end:
+        return (">=", value)
+    if len(value) == 10:
+        return ("<", (datetime.date.fromisoformat(value)
+                      + datetime.timedelta(days=1)).isoformat())
+    return ("<=", value)
+
+
+def _audit_search_where(conn, spec: dict, where: list, params: list,
+                        text: str) -> tuple:
+    """Append the free-text predicate for one connection → (clause, params, fts).
+
+    Each source (live DB, archive segment) decides FTS vs LIKE on its own, so
+    a segment sealed on a build without FTS5 still answers.
+    """
+    where, params, use_fts = list(where), list(params), False
+    if text and str(text).strip():
+        use_fts = bool(conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+            (spec["fts"],)).fetchone())
+        match = _audit_fts_query(text) if use_fts else ""
+        if use_fts and match:
+            where.append(f"{spec['pk']} IN (SELECT rowid FROM {spec['fts']} "
+                         f"WHERE {spec['fts']} MATCH ?)")
+            params.append(match)
+        else:
+            use_fts = False
+            like = "%" + str(text).strip().replace("\\", "\\\\") \
+                                  .replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append("(" + " OR ".join(
+                f"COALESCE({c}, '') LIKE ? ESCAPE '\\'" for c in spec["text"]) + ")")
+            params.extend([like] * len(spec["text"]))
+    return (" WHERE " + " AND ".join(where)) if where else "", params, use_fts
+
+
+def audit_search(table: str = "audit_log", user=None, date_from=None,
+                 date_to=None, action=None, text: str = "",
+                 page: int = 1, page_size: int = 100,
+                 include_archive: bool = True) -> dict:
+    """
+    Paged search over audit_log or signature_log, newest first.
+
+    Filters combine with AND: user (exact), action (exact, str or list),
+    date_from / date_to (ISO string, date or datetime — a bare date as date_to
+    includes that whole day) and free text over the mirrored text columns.
+    include_archive spans the sealed archive segments overlapping the date
+    range as well as the live table (see archive_seal_closed).
+    Returns {"rows": DataFrame, "total", "page", "pages", "page_size",
+    "fts": bool, "segments": int, "ms"}; on error, an empty frame plus "error".
+    """
+    spec = _AUDIT_SEARCH_TABLES.get(table)
+    if spec is None:
+        raise ValueError(f"audit_search: unsupported table {table!r}")
+    t0        = _time_mod.perf_counter()
+    page_size = max(1, min(int(page_size or 100), _AUDIT_SEARCH_PAGE_MAX))
+    page      = max(1, int(page or 1))
+    offset    = (page - 1) * page_size
+    pk, where, params = spec["pk"], [], []
+
+    if user:
+        where.append("user = ?")
+        params.append(str(user))
+    if action:
+        actions = [action] if isinstance(action, str) else list(action)
+        where.append(f"action IN ({', '.join('?' * len(actions))})")
+        params.extend(actions)
+    lo = _audit_search_bound(date_from)
+    hi = _audit_search_bound(date_to, end=True)
+    for bound in (lo, hi):
+        if bound:
+            where.append(f"timestamp {bound[0]} ?")
+            params.append(bound[1])
+
+    empty = pd.DataFrame(columns=list(spec["columns"]))
+    segments = _archive_segments(table, lo and lo[1], hi and hi[1]) \
+        if include_archive else []
+    try:
+        # Live table first, then each overlapping segment. Every source returns
+        # its own top (offset + page_size) rows; the page is cut from the merge.
+        total, frames, use_fts = 0, [], False
+        for seg in [None] + segments:
+            conn = db_connect() if seg is None else _archive_open(seg)
+            try:
+                clause, q_params, fts = _audit_search_where(conn, spec, where,
+                                                            params, text)
+                use_fts = use_fts or fts
+                n = conn.execute(f"SELECT COUNT(*) FROM {table}{clause}",
+                                 q_params).fetchone()[0]
+                total += n
+                if n:
+                    frames.append(pd.read_sql_query(
+                        f"SELECT {', '.join(spec['columns'])} FROM {table}{clause} "
+                        f"ORDER BY timestamp DESC, {pk} DESC LIMIT ?",
+                        conn, params=q_params + [offset + page_size]))
+            finally:
+                conn.close()
+        if len(frames) == 1:
+            rows = frames[0].iloc[offset:offset + page_size]
+        elif frames:
+            rows = (pd.concat(frames, ignore_index=True)
+                      .sort_values(["timestamp", pk], ascending=False, kind="stable")
+                      .iloc[offset:offset + page_size])
+        else:
+            rows = empty
+        rows = rows.reset_index(drop=True)
+    except Exception as e:
+        return {"rows": empty, "total": 0, "page": page, "pages": 0,
+                "page_size": page_size, "fts": False, "segments": len(segments),
+                "error": str(e),
+                "ms": round((_time_mod.perf_counter() - t0) * 1000, 1)}
+
+    return {"rows": rows, "total": int(total), "page": page,
+            "pages": -(-int(total) // page_size), "page_size": page_size,
+            "fts": use_fts, "segments": len(segments),
+            "ms": round((_time_mod.perf_counter() - t0) * 1000, 1)}
+
+
+# ── Audit archive — sealed, hash-chained monthly segments ────────────────────
+# audit_log / signature_log / ai_gen_log grow forever, and every WAL
+# checkpoint and backup pays for the whole history. archive_seal_closed()
+# rolls each closed calendar month (older than _ARCHIVE_HOT_MONTHS) into its
+# own SQLite file — same schema, same search indexes and FTS mirror — then
+# gzips it, marks it read-only and records it in archive_segments:
+#   rows_sha256  digest of the canonical row stream (format-independent)
+#   file_sha256  digest of the .sqlite.gz as written
+#   prev_hash → seal_hash  one chain across every segment of every table
+# Only then are the month's rows deleted from the hot DB, in the same
+# transaction that records the segment and briefly lifts the no-delete trigger.
+# archive_verify() re-walks the chain; audit_search() and archive_frame()
+# read live + archived rows as one log.
+
+import gzip   as _gzip
+import shutil as _shutil
+
+_ARCHIVE_DIR        = os.path.join(os.path.dirname(DB_PATH), "audit_archive")
+_ARCHIVE_CACHE_DIR  = os.path.join(_ARCHIVE_DIR, ".cache")   # decompressed segments
+_ARCHIVE_CACHE_MAX_BYTES = 512 * 1024 * 1024                   # LRU bound on .cache/
+_ARCHIVE_MANIFEST   = "manifest.jsonl"                       # portable copy of archive_segments
+_ARCHIVE_HOT_MONTHS = 3          # current month + 2 previous stay in the live DB
+_ARCHIVE_GENESIS    = "0" * 64
+_ARCHIVE_TABLES     = {"audit_log": "event_id", "signature_log": "signature_id",
+                       "ai_gen_log": "id"}
+_ARCHIVE_STATE      = _process_state("audit_archive")          # survives reruns
+_ARCHIVE_LOCK       = _ARCHIVE_STATE.setdefault("lock", _threading.Lock())
+_ARCHIVE_OPENED     = _ARCHIVE_STATE.setdefault("opened", {})  # file_sha256 → verified cache path, LRU order
+_ARCHIVE_SEG_FIELDS = ("table_name", "period", "period_start", "period_end",
+                       "first_id", "last_id", "row_count", "rows_sha256",
+                       "file_name", "file_sha256", "file_bytes", "prev_hash",
+                       "sealed_by", "sealed_at")
+
+
+def _archive_seal_hash(entry: dict) -> str:
+    """Chain link: SHA-256 over every sealed field, prev_hash included."""
+    body = {k: entry[k] for k in _ARCHIVE_SEG_FIELDS}
+    return hashlib.sha256(_json.dumps(body, sort_keys=True, default=str)
+                          .encode("utf-8")).hexdigest()
+
+
+def _archive_rows_digest(cursor) -> tuple:
+    """(rows, sha256, first_id, last_id) over a cursor ordered by primary key.
+
+    The digest is over the column names and each row as JSON, so it verifies
+    content regardless of how SQLite lays out the segment file.
+    """
+    h    = hashlib.sha256()
+    cols = [d[0] for d in cursor.description]
+    h.update(_json.dumps(cols).encode("utf-8"))
+    rows = cursor.fetchall()
+    for r in rows:
+        h.update(b"\n" + _json.dumps(list(r), default=str).encode("utf-8"))
+    return (rows, h.hexdigest(),
+            rows[0][0] if rows else None, rows[-1][0] if rows else None)
+
+
+def _archive_file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _archive_month_bounds(period: str) -> tuple:
+    """'2024-03' → ('2024-03-01', '2024-04-01')."""
+    y, m = int(period[:4]), int(period[5:7])
+    nxt  = (y + (m == 12), m % 12 + 1)
+    return f"{y:04d}-{m:02d}-01", f"{nxt[0]:04d}-{nxt[1]:02d}-01"
+
+
+def _archive_cutoff(hot_months: int, now=None) -> str:
+    """First day of the oldest month kept hot, e.g. '2026-08-01'."""
+    now   = now or datetime.datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - max(1, int(hot_months)) + 1
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01"
+
+
+def _archive_write_segment(conn, table: str, period: str) -> dict:
+    """Build the compressed read-only segment file for one (table, month).
+
+    Returns the segment fields (without the chain) or {} if the month is empty.
+    Nothing in the hot DB changes here.
+    """
+    pk = _ARCHIVE_TABLES[table]
+    start, end = _archive_month_bounds(period)
+    cur = conn.execute(f"SELECT * FROM {table} WHERE timestamp >= ? AND timestamp < ? "
+                       f"ORDER BY {pk}", (start, end))
+    cols = [d[0] for d in cur.description]
+    rows, rows_sha, first_id, last_id = _archive_rows_digest(cur)
+    if not rows:
+        return {}
+
+    out_dir = os.path.join(_ARCHIVE_DIR, table)
+    os.makedirs(out_dir, exist_ok=True)
+    name = f"{table}_{period}_{rows_sha[:12]}.sqlite.gz"
+    tmp  = os.path.join(out_dir, f".{name}.{os.getpid()}.sqlite")
+    try:
+        seg = sqlite3.connect(tmp)
+        seg.execute(conn.execute("SELECT sql FROM sqlite_master WHERE type='table' "
+                                 "AND name=?", (table,)).fetchone()[0])
+        seg.executemany(f"INSERT INTO {table} ({', '.join(cols)}) "
+                        f"VALUES ({', '.join('?' * len(cols))})", rows)
+        seg.commit()
+        if table in _AUDIT_SEARCH_TABLES:
+            _audit_search_migrate(seg, [table])
+        seg.execute("VACUUM")
+        seg.close()
+        with open(tmp, "rb") as src, _gzip.open(tmp + ".gz", "wb", compresslevel=6) as dst:
+            _shutil.copyfileobj(src, dst, 1 << 20)
+        final = os.path.join(out_dir, name)
+        if os.path.exists(final):                 # left by an interrupted seal
+            os.chmod(final, 0o644)
+        os.replace(tmp + ".gz", final)
+        os.chmod(final, 0o444)
+    finally:
+        for p in (tmp, tmp + ".gz"):
+            if os.path.exists(p):
+                os.remove(p)
+
+    return {"table_name": table, "period": period,
+            "period_start": start, "period_end": end,
+            "first_id": first_id, "last_id": last_id, "row_count": len(rows),
+            "rows_sha256": rows_sha, "file_name": os.path.join(table, name),
+            "file_sha256": _archive_file_sha256(final),
+            "file_bytes": os.path.getsize(final)}
+
+
+def _archive_seal_one(table: str, period: str, user: str) -> dict:
+    """Seal one (table, month): write the segment, chain it, drop the live rows."""
+    conn = db_connect()
+    try:
+        seg = _archive_write_segment(conn, table, period)
+        if not seg:
+            return {}
+        conn.execute("BEGIN IMMEDIATE")        # serialise the chain head
+        prev = conn.execute("SELECT seal_hash FROM archive_segments "
+                            "ORDER BY segment_id DESC LIMIT 1").fetchone()
+        seg.update(prev_hash=prev[0] if prev else _ARCHIVE_GENESIS,
+                   sealed_by=user, sealed_at=datetime.datetime.utcnow().isoformat())
+        seg["seal_hash"] = _archive_seal_hash(seg)
+        fields = _ARCHIVE_SEG_FIELDS + ("seal_hash",)
+        conn.execute(f"INSERT INTO archive_segments ({', '.join(fields)}) "
+                     f"VALUES ({', '.join('?' * len(fields))})",
+                     [seg[f] for f in fields])
+        # SQLite DDL is transactional: the guard is lifted for this DELETE
+        # only and is back before commit — any failure rolls both back.
+        guard = _NO_DELETE_TRIGGERS.get(table)
+        if guard:
+            conn.execute(f"DROP TRIGGER IF EXISTS {guard[0]}")
+        deleted = conn.execute(
+            f"DELETE FROM {table} WHERE {_ARCHIVE_TABLES[table]} BETWEEN ? AND ? "
+            f"AND timestamp >= ? AND timestamp < ?",
+            (seg["first_id"], seg["last_id"], seg["period_start"],
+             seg["period_end"])).rowcount
+        if guard:
+            conn.execute(guard[1])
+        if deleted != seg["row_count"]:
+            raise RuntimeError(f"{table} {period}: sealed {seg['row_count']} rows "
+                               f"but {deleted} matched for removal")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    with open(os.path.join(_ARCHIVE_DIR, _ARCHIVE_MANIFEST), "a",
+              encoding="utf-8") as fh:
+        fh.write(_json.dumps(seg, sort_keys=True) + "\n")
+    return seg
+
+
+def archive_seal_closed(user: str, hot_months: int = _ARCHIVE_HOT_MONTHS,
+                        tables=None, vacuum: bool = True) -> list:
+    """
+    Seal every closed month older than the hot window into archive segments.
+
+    Months are sealed oldest first, one segment per (table, month); a month
+    that gains late rows after sealing gets a further segment. Each seal is
+    logged to the audit trail. Returns the sealed segment entries.
+    """
+    cutoff = _archive_cutoff(hot_months)
+    sealed = []
+    with _ARCHIVE_LOCK:
+        os.makedirs(_ARCHIVE_DIR, exist_ok=True)
+        conn = db_connect()
+        todo = sorted((p, t) for t in (tables or _ARCHIVE_TABLES)
+                      for (p,) in conn.execute(
+                          f"SELECT DISTINCT substr(timestamp, 1, 7) FROM {t} "
+                          f"WHERE timestamp < ?", (cutoff,)))
+        conn.close()
+        for period, table in todo:
+            seg = _archive_seal_one(table, period, user)
+            if seg:
+                sealed.append(seg)
+        if sealed:
+            conn = db_connect()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if vacuum:
+                conn.execute("VACUUM")
+            conn.close()
+    for seg in sealed:
+        log_audit(user, "AUDIT_ARCHIVE_SEALED", f"{seg['table_name']} {seg['period']}",
+                  new_value=f"{seg['row_count']} rows → {seg['file_name']} "
+                            f"(sha256 {seg['file_sha256'][:16]}…)",
+                  reason=f"Seal hash {seg['seal_hash'][:16]}… · prev "
+                         f"{seg['prev_hash'][:16]}…")
+    return sealed
+
+
+def _archive_segments(table: str = None, lo: str = None, hi: str = None) -> list:
+    """Recorded segments (oldest first), optionally for one table and only
+    those whose month overlaps the [lo, hi] timestamp range."""
+    try:
+        conn = db_connect()
+        conn.row_factory = sqlite3.Row
+        rows = [dict(r) for r in conn.execute(
+            "SELECT * FROM archive_segments ORDER BY segment_id")]
+        conn.close()
+    except sqlite3.OperationalError:
+        return []
+    return [r for r in rows
+            if (table is None or r["table_name"] == table)
+            and (not lo or r["period_end"] > lo)
+            and (not hi or r["period_start"] <= hi)]
+
+
+def _archive_cache_evict() -> None:
+    """Keep _ARCHIVE_CACHE_DIR under _ARCHIVE_CACHE_MAX_BYTES, least recently
+    opened first (the newest entry always stays). Files left by an earlier
+    process are swept on first use. Caller holds _ARCHIVE_LOCK."""
+    if not _ARCHIVE_STATE.get("cache_swept"):
+        _ARCHIVE_STATE["cache_swept"] = True
+        known = set(_ARCHIVE_OPENED.values())
+        for fn in (os.listdir(_ARCHIVE_CACHE_DIR) if os.path.isdir(_ARCHIVE_CACHE_DIR) else []):
+            fp = os.path.join(_ARCHIVE_CACHE_DIR, fn)
+            if fp not in known:
+                try:
+                    os.remove(fp)
+                except OSError:
+                    pass
+    sizes = {k: os.path.getsize(p) if os.path.exists(p) else 0
+             for k, p in _ARCHIVE_OPENED.items()}
+    total = sum(sizes.values())
+    for key in list(_ARCHIVE_OPENED)[:-1]:
+        if total <= _ARCHIVE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(_ARCHIVE_OPENED.pop(key))   # open readers keep their handle
+        except OSError:
+            pass
+        total -= sizes[key]
+
+
+def _archive_open(seg: dict):
+    """Read-only connection to a segment, decompressed into _ARCHIVE_CACHE_DIR
+    (LRU-bounded, see _archive_cache_evict) after its file digest is checked
+    against the chain."""
+    with _ARCHIVE_LOCK:
+        path = _ARCHIVE_OPENED.pop(seg["file_sha256"], None)
+        if path and os.path.exists(path):
+            _ARCHIVE_OPENED[seg["file_sha256"]] = path        # mark most recent
+        else:
+            src = os.path.join(_ARCHIVE_DIR, seg["file_name"])
+            if _archive_file_sha256(src) != seg["file_sha256"]:
+                raise RuntimeError(f"archive segment {seg['file_name']} fails its "
+                                   f"SHA-256 check — refusing to read it")
+            os.makedirs(_ARCHIVE_CACHE_DIR, exist_ok=True)
+            path = os.path.join(_ARCHIVE_CACHE_DIR, f"{seg['file_sha256']}.sqlite")
+            with _gzip.open(src, "rb") as fh, open(path + ".tmp", "wb") as out:
+                _shutil.copyfileobj(fh, out, 1 << 20)
+            os.replace(path + ".tmp", path)
+            _ARCHIVE_OPENED[seg["file_sha256"]] = path
+            _archive_cache_evict()
+    return sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True,
+                           check_same_thread=False)
+
+
+def archive_frame(table: str, date_from=None, date_to=None) -> pd.DataFrame:
+    """Every row of an archivable table in the date range — sealed segments
+    plus the live table — as one frame ordered by timestamp."""
+    if table not in _ARCHIVE_TABLES:
+        raise ValueError(f"archive_frame: unsupported table {table!r}")
+    where, params = [], []
+    lo = _audit_search_bound(date_from)
+    hi = _audit_search_bound(date_to, end=True)
+    for bound in (lo, hi):
+        if bound:
+            where.append(f"timestamp {bound[0]} ?")
+            params.append(bound[1])
+    sql = f"SELECT * FROM {table}" + (" WHERE " + " AND ".join(where) if where else "")
+    frames = []
+    for seg in _archive_segments(table, lo and lo[1], hi and hi[1]) + [None]:
+        conn = db_connect() if seg is None else _archive_open(seg)
+        try:
+            frames.append(pd.read_sql_query(sql, conn, params=params))
+        finally:
+            conn.close()
+    return (pd.concat(frames, ignore_index=True)
+              .sort_values(["timestamp", _ARCHIVE_TABLES[table]], kind="stable")
+              .reset_index(drop=True))
+
+
+def archive_verify(deep: bool = False) -> pd.DataFrame:
+    """
+    Re-walk the segment chain. Per segment: prev_hash links to the previous
+    seal_hash, seal_hash recomputes, the file exists with its recorded SHA-256;
+    deep=True also re-reads the rows and checks rows_sha256 / row_count.
+    One row per segment with an "ok" column and the first failure in "issue".
+    """
+    out, prev = [], _ARCHIVE_GENESIS
+    for seg in _archive_segments():
+        issue = ""
+        path  = os.path.join(_ARCHIVE_DIR, seg["file_name"])
+        if seg["prev_hash"] != prev:
+            issue = "chain broken — prev_hash does not match the previous seal"
+        elif _archive_seal_hash(seg) != seg["seal_hash"]:
+            issue = "seal_hash does not recompute — manifest row altered"
+        elif not os.path.exists(path):
+            issue = "segment file missing"
+        elif _archive_file_sha256(path) != seg["file_sha256"]:
+            issue = "segment file SHA-256 mismatch"
+        elif deep:
+            conn = _archive_open(seg)
+            try:
+                rows, rows_sha, _, _ = _archive_rows_digest(conn.execute(
+                    f"SELECT * FROM {seg['table_name']} "
+                    f"ORDER BY {_ARCHIVE_TABLES[seg['table_name']]}"))
+            finally:
+                conn.close()
+            if rows_sha != seg["rows_sha256"] or len(rows) != seg["row_count"]:
+                issue = "segment rows do not match rows_sha256"
+        prev = seg["seal_hash"]
+        out.append({"segment_id": seg["segment_id"], "table": seg["table_name"],
+                    "period": seg["period"], "rows": seg["row_count"],
+                    "file": seg["file_name"], "KB": round((seg["file_bytes"] or 0) / 1024, 1),
+                    "seal_hash": seg["seal_hash"][:16], "ok": not issue, "issue": issue})
+    return pd.DataFrame(out, columns=["segment_id", "table", "period", "rows", "file",
+                                      "KB", "seal_hash", "ok", "issue"])
+
+
+# ── Content-addressed blob store ─────────────────────────────────────────────
+# Upload bytes, result workbooks and the CSV copies of every generated sheet
+# used to sit uncompressed in jobs / job_blobs / documents, once per job and
+# again per document, so the hot DB grew with every run and SELECT * dragged
+# megabytes along. Now each payload is stored once, compressed, under
+# blob_store/<2 hex>/<sha256>.<codec>; rows keep only the SHA-256 digest.
+# blob_refs records who holds each blob and under which retention policy —
+# identical content (the same URS uploaded twice, a result CSV that is also
+# saved as a document) is one file with several references. blob_gc() expires
+# references past their policy and deletes blobs nobody references.
+# zstd is used when the optional zstandard package is installed, gzip
+# otherwise; the codec is recorded per blob so both read back.
+
+_BLOB_DIR        = os.path.join(os.path.dirname(DB_PATH), "blob_store")
+_BLOB_GRACE_S    = 3600          # unreferenced blobs younger than this are kept (in-flight puts)
+_BLOB_GC_EVERY_S = 3600          # worker-loop GC cadence
+_BLOB_RETENTION_DAYS = {         # policy → days a reference is kept (None = forever)
+    "job_input":  14,            # uploaded URS / system context, once the job has finished
+    "job_result": 90,            # async results — documents keep their own references
+    "document":   None,          # versioned GxP documents are never expired
+}
+_BLOB_STATE      = _process_state("blob_store")                # survives reruns
+_BLOB_LOCK       = _BLOB_STATE.setdefault("lock", _threading.Lock())
+
+
+def _blob_codec() -> str:
+    if "codec" not in _BLOB_STATE:
+        try:
+            _lazy_import("zstandard")
+            _BLOB_STATE["codec"] = "zst"
+        except ImportError:
+            _BLOB_STATE["codec"] = "gz"
+    return _BLOB_STATE["codec"]
+
+
+def _blob_path(digest: str, codec: str) -> str:
+    return os.path.join(_BLOB_DIR, digest[:2], f"{digest}.{codec}")
+
+
+def _blob_compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return _lazy_import("zstandard").ZstdCompressor(level=9).compress(data)
+    return _gzip.compress(data, compresslevel=6)
+
+
+def _blob_decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return _lazy_import("zstandard").ZstdDecompressor().decompress(data)
+    return _gzip.decompress(data)
+
+
+def blob_put(data, owner_type: str, owner_id, role: str,
+             policy: str = "document") -> str:
+    """
+    Store bytes (or text, as UTF-8) and reference them from (owner_type,
+    owner_id, role), replacing any earlier reference of that slot. Returns the
+    SHA-256 digest; None/empty data stores nothing and returns None.
+    """
+    if data is None or len(data) == 0:
+        return None
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if policy not in _BLOB_RETENTION_DAYS:
+        raise ValueError(f"blob_put: unknown retention policy {policy!r}")
+    digest = hashlib.sha256(data).hexdigest()
+    now    = datetime.datetime.utcnow().isoformat()
+    with _BLOB_LOCK:
+        conn = db_connect()
+        try:
+            row = conn.execute("SELECT codec FROM blobs WHERE digest = ?",
+                               (digest,)).fetchone()
+            codec = row[0] if row else _blob_codec()
+            # Touch the row before the file so a concurrent GC sees it in use
+            conn.execute(
+                "INSERT INTO blobs (digest, codec, size, stored_bytes, created_at, "
+                "last_used_at) VALUES (?,?,?,0,?,?) ON CONFLICT(digest) DO UPDATE "
+                "SET last_used_at = excluded.last_used_at",
+                (digest, codec, len(data), now, now))
+            conn.commit()
+            path = _blob_path(digest, codec)
+            if not os.path.exists(path):
+                packed = _blob_compress(data, codec)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + ".tmp", "wb") as fh:
+                    fh.write(packed)
+                os.replace(path + ".tmp", path)
+                conn.execute("UPDATE blobs SET stored_bytes = ? WHERE digest = ?",
+                             (len(packed), digest))
+            conn.execute(
+                "INSERT OR REPLACE INTO blob_refs "
+                "(owner_type, owner_id, role, digest, policy, created_at) "
+                "VALUES (?,?,?,?,?,?)",
+                (owner_type, str(owner_id), role, digest, policy, now))
+            conn.commit()
+        finally:
+            conn.close()
+    return digest
+
+
+def blob_get(digest: str):
+    """Bytes for a digest, verified against it; None if unknown or expired."""
+    if not digest:
+        return None
+    try:
+        conn = db_connect()
+        row  = conn.execute("SELECT codec FROM blobs WHERE digest = ?",
+                            (digest,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        with open(_blob_path(digest, row[0]), "rb") as fh:
+            data = _blob_decompress(fh.read(), row[0])
+    except (OSError, sqlite3.Error):
+        return None
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise RuntimeError(f"blob {digest[:16]}… fails its SHA-256 check")
+    return data
+
+
+def blob_get_text(digest: str):
+    data = blob_get(digest)
+    return None if data is None else data.decode("utf-8")
+
+
+def blob_release(owner_type: str, owner_id, role: str = None) -> int:
+    """Drop an owner's references (one role, a "prefix*" of roles, or all);
+    blob_gc reclaims the bytes."""
+    conn = db_connect()
+    sql, args = "DELETE FROM blob_refs WHERE owner_type = ? AND owner_id = ?", \
+                [owner_type, str(owner_id)]
+    if role and role.endswith("*"):
+        sql += " AND substr(role, 1, ?) = ?"
+        args.extend([len(role) - 1, role[:-1]])
+    elif role:
+        sql += " AND role = ?"
+        args.append(role)
+    n = conn.execute(sql, args).rowcount
+    conn.commit()
+    conn.close()
+    return n
+
+
+def _blob_offload_legacy(conn, limit: int) -> int:
+    """Move payloads written before the blob store (job_blobs rows, inline jobs
+    results, documents.content) into it, leaving only digests behind."""
+    moved = 0
+    has_job_blobs = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                                 "AND name='job_blobs'").fetchone()
+    if has_job_blobs:
+        for job_id, fb, sb in conn.execute(
+                "SELECT job_id, file_bytes, sys_ctx_bytes FROM job_blobs LIMIT ?",
+                (limit,)).fetchall():
+            conn.execute("UPDATE jobs SET file_digest = ?, sys_ctx_digest = ? "
+                         "WHERE job_id = ?",
+                         (blob_put(fb, "job", job_id, "input", "job_input"),
+                          blob_put(sb, "job", job_id, "sys_ctx", "job_input"), job_id))
+            conn.execute("DELETE FROM job_blobs WHERE job_id = ?", (job_id,))
+            conn.commit()
+            moved += 1
+    for row in conn.execute(
+            f"SELECT job_id, {', '.join(_JOB_RESULT_FIELDS)} FROM jobs "
+            f"WHERE status = 'complete' AND result_digests IS NULL "
+            f"AND result_xlsx IS NOT NULL LIMIT ?", (limit,)).fetchall():
+        digests = {f: blob_put(v, "job", row[0], f, "job_result")
+                   for f, v in zip(_JOB_RESULT_FIELDS, row[1:]) if v}
+        conn.execute(f"UPDATE jobs SET result_digests = ?, "
+                     f"{', '.join(f + ' = NULL' for f in _JOB_RESULT_FIELDS)} "
+                     f"WHERE job_id = ?", (_json.dumps(digests), row[0]))
+        conn.commit()
+        moved += 1
+    for doc_id, content in conn.execute(
+            "SELECT id, content FROM documents WHERE content IS NOT NULL "
+            "AND content_digest IS NULL LIMIT ?", (limit,)).fetchall():
+        conn.execute("UPDATE documents SET content_digest = ?, content = NULL "
+                     "WHERE id = ?",
+                     (blob_put(content, "document", doc_id, "content"), doc_id))
+        conn.commit()
+        moved += 1
+    return moved
+
+
+def blob_gc(offload_limit: int = 500) -> dict:
+    """
+    Apply the retention policies and reclaim space:
+      1. offload up to offload_limit legacy inline payloads into the store
+      2. drop references past _BLOB_RETENTION_DAYS (job inputs only once the
+         job is complete/failed) and references whose owner row is gone
+      3. delete blobs with no reference that are older than _BLOB_GRACE_S
+    Returns counts for each step.
+    """
+    now   = datetime.datetime.utcnow()
+    stats = {"offloaded": 0, "expired_refs": 0, "orphan_refs": 0,
+             "blobs_deleted": 0, "bytes_freed": 0}
+    conn  = db_connect()
+    try:
+        stats["offloaded"] = _blob_offload_legacy(conn, offload_limit)
+        for policy, days in _BLOB_RETENTION_DAYS.items():
+            if days is None:
+                continue
+            cutoff = (now - datetime.timedelta(days=days)).isoformat()
+            stats["expired_refs"] += conn.execute(
+                "DELETE FROM blob_refs WHERE policy = ? AND created_at < ? "
+                "AND (owner_type != 'job' OR owner_id IN (SELECT job_id FROM jobs "
+                "WHERE status IN ('complete', 'failed')))",
+                (policy, cutoff)).rowcount
+        stats["orphan_refs"] = conn.execute(
+            "DELETE FROM blob_refs WHERE "
+            "(owner_type = 'job' AND owner_id NOT IN (SELECT job_id FROM jobs)) OR "
+            "(owner_type = 'document' AND CAST(owner_id AS INTEGER) NOT IN "
+            "(SELECT id FROM documents))").rowcount
+        conn.commit()
+
+        grace = (now - datetime.timedelta(seconds=_BLOB_GRACE_S)).isoformat()
+        with _BLOB_LOCK:
+            for digest, codec, stored in conn.execute(
+                    "SELECT digest, codec, stored_bytes FROM blobs b WHERE last_used_at < ? "
+                    "AND NOT EXISTS (SELECT 1 FROM blob_refs r WHERE r.digest = b.digest)",
+                    (grace,)).fetchall():
+                if conn.execute(
+                        "DELETE FROM blobs WHERE digest = ? AND NOT EXISTS "
+                        "(SELECT 1 FROM blob_refs r WHERE r.digest = ?)",
+                        (digest, digest)).rowcount:
+                    conn.commit()
+                    try:
+                        os.remove(_blob_path(digest, codec))
+                    except OSError:
+                        pass
+                    stats["blobs_deleted"] += 1
+                    stats["bytes_freed"]   += stored or 0
+    finally:
+        conn.close()
+    _BLOB_STATE["last_gc"] = _time_mod.time()
+    return stats
+
+
+def blob_stats() -> dict:
+    """Store totals for the admin panel: blobs, references, raw vs stored bytes."""
+    try:
+        conn = db_connect()
+        blobs, raw, stored = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_bytes), 0) "
+            "FROM blobs").fetchone()
+        refs = dict(conn.execute(
+            "SELECT policy, COUNT(*) FROM blob_refs GROUP BY policy").fetchall())
+        referenced = conn.execute(
+            "SELECT COALESCE(SUM(b.size), 0) FROM blob_refs r "
+            "JOIN blobs b ON b.digest = r.digest").fetchone()[0]
+        conn.close()
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+    return {"blobs": blobs, "refs": refs, "raw_bytes": raw, "stored_bytes": stored,
+            "referenced_bytes": referenced,   # what inline copies would have cost
+            "last_gc": _BLOB_STATE.get("last_gc")}
+
 
 # =============================================================================
 # ASYNC JOB QUEUE
@@ -685,14 +2327,23 @@ def db_diagnostics() -> dict:
 # UI submits a job_id and polls status — no blocking, no timeouts.
 # =============================================================================
 
-import threading as _threading
-import uuid      as _uuid
-import time      as _time_mod
+import uuid as _uuid
 
-# Global worker state — one worker thread per process
-_worker_lock    = _threading.Lock()
-_worker_thread  = None
-_worker_running = False
+# Worker state — one worker thread per process. Kept in _process_state: as
+# module globals every Streamlit rerun reset the thread handle to None and
+# ensure_worker_running() started yet another worker on the same queue.
+_WORKER_STATE   = _process_state("job_worker")                 # survives reruns
+_worker_lock    = _WORKER_STATE.setdefault("lock", _threading.Lock())
+
+# Resumable jobs: a running job's heartbeat_at is refreshed every
+# _JOB_HEARTBEAT_S by a side thread. A container restart kills the worker
+# mid-run; once the heartbeat is older than _JOB_STALE_S the job is re-queued
+# and resumes from its stage checkpoints (job_checkpoints) instead of
+# re-paying every Pass-1 segment and Pass-2 requirement call.
+_JOB_HEARTBEAT_S    = 15
+_JOB_STALE_S        = 120
+_JOB_MAX_ATTEMPTS   = 3          # resumes before an interrupted job is failed
+_JOB_STALE_CHECK_S  = 30         # idle-loop cadence of _job_recover_stale
 
 
 def _job_update(job_id: str, **kwargs):
@@ -710,27 +2361,132 @@ def _job_update(job_id: str, **kwargs):
         pass
 
 
+# Result payloads of a job — blob store digests in jobs.result_digests
+# (inline columns only on rows written before the store, see blob_gc)
+_JOB_RESULT_FIELDS = ("result_urs", "result_frs", "result_oq",
+                      "result_trace", "result_gap", "result_xlsx")
+
+
 def _job_get(job_id: str) -> dict:
-    """Fetch a single job row as a dict."""
+    """Fetch a single job row as a dict, results resolved from the blob store."""
     try:
         conn = db_connect()
-        row  = conn.execute(
+        cur  = conn.execute(
             "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
-        ).fetchone()
+        )
+        row  = cur.fetchone()
+        cols = [d[0] for d in cur.description]
         conn.close()
         if row:
-            cols = ["job_id","user","status","file_name","model_id",
-                    "created_at","started_at","completed_at",
-                    "progress","progress_msg",
-                    "result_urs","result_frs","result_oq",
-                    "result_trace","result_gap","result_xlsx",
-                    "error_msg","sys_ctx_name"]
-            return dict(zip(cols, row))
+            job = dict(zip(cols, row))
+            for field, digest in _json.loads(job.get("result_digests") or "{}").items():
+                job[field] = (blob_get(digest) if field == "result_xlsx"
+                              else blob_get_text(digest))
+            return job
     except Exception:
         pass
     return {}
 
 
+def _job_ckpt_load(job_id: str) -> dict:
+    """{(stage, item): raw text} of every checkpoint already saved for a job."""
+    if not job_id:
+        return {}
+    try:
+        conn = db_connect()
+        rows = conn.execute("SELECT stage, item, digest FROM job_checkpoints "
+                            "WHERE job_id = ?", (job_id,)).fetchall()
+        conn.close()
+    except sqlite3.Error:
+        return {}
+    out = {}
+    for stage, item, digest in rows:
+        text = blob_get_text(digest) if digest else ""
+        if text is not None:                     # blob expired → redo the stage
+            out[(stage, item)] = text
+    return out
+
+
+def _job_ckpt_save(job_id: str, stage: str, item, text: str) -> None:
+    """Persist one finished stage's raw LLM reply. Best-effort: a failed
+    checkpoint only costs the call again on resume."""
+    if not job_id:
+        return
+    try:
+        digest = blob_put(text or "", "job", job_id, f"ckpt:{stage}:{item}", "job_input")
+        conn = db_connect()
+        conn.execute("INSERT OR REPLACE INTO job_checkpoints "
+                     "(job_id, stage, item, digest, created_at) VALUES (?,?,?,?,?)",
+                     (job_id, stage, str(item), digest,
+                      datetime.datetime.utcnow().isoformat()))
+        conn.commit()
+        conn.close()
+    except Exception:
+        pass
+
+
+def _job_ckpt_clear(job_id: str) -> None:
+    """Drop a finished job's checkpoints (rows + blob references)."""
+    try:
+        conn = db_connect()
+        conn.execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+        conn.commit()
+        conn.close()
+        blob_release("job", job_id, "ckpt:*")
+    except Exception:
+        pass
+
+
+def _job_recover_stale() -> int:
+    """
+    Re-queue 'running' jobs whose heartbeat stopped (worker died with its
+    process); they resume from their checkpoints. A job interrupted more than
+    _JOB_MAX_ATTEMPTS times is failed instead. Returns the jobs re-queued.
+    """
+    now    = datetime.datetime.utcnow()
+    cutoff = (now - datetime.timedelta(seconds=_JOB_STALE_S)).isoformat()
+    stale  = ("status = 'running' AND "
+              "COALESCE(heartbeat_at, started_at, created_at) < ?")
+    try:
+        conn = db_connect()
+        failed = [r[0] for r in conn.execute(
+            f"SELECT job_id FROM jobs WHERE {stale} AND COALESCE(attempts, 0) >= ?",
+            (cutoff, _JOB_MAX_ATTEMPTS))]
+        conn.execute(
+            f"UPDATE jobs SET status = 'failed', completed_at = ?, error_msg = ? "
+            f"WHERE {stale} AND COALESCE(attempts, 0) >= ?",
+            (now.isoformat(), f"Interrupted {_JOB_MAX_ATTEMPTS} times — resubmit.",
+             cutoff, _JOB_MAX_ATTEMPTS))
+        n = conn.execute(
+            f"UPDATE jobs SET status = 'queued', attempts = COALESCE(attempts, 0) + 1, "
+            f"progress_msg = 'Interrupted — resuming from the last checkpoint…' "
+            f"WHERE {stale}", (cutoff,)).rowcount
+        conn.commit()
+        conn.close()
+    except sqlite3.Error:
+        return 0
+    for job_id in failed:
+        _job_ckpt_clear(job_id)
+    return n
+
+
+def _job_claim(job_id: str) -> bool:
+    """queued → running for exactly one worker (several app processes may
+    share the DB). started_at keeps the first start across resumes."""
+    now = datetime.datetime.utcnow().isoformat()
+    try:
+        conn = db_connect()
+        n = conn.execute(
+            "UPDATE jobs SET status = 'running', heartbeat_at = ?, "
+            "started_at = COALESCE(started_at, ?) WHERE job_id = ? AND status = 'queued'",
+            (now, now, job_id)).rowcount
+        conn.commit()
+        conn.close()
+        return n == 1
+    except sqlite3.Error:
+        return False
+
+
 def _run_job(job_id: str, file_bytes: bytes, sys_ctx_bytes,
              model_id: str, user: str):
     """
@@ -757,9 +2513,14 @@ def _run_job(job_id: str, file_bytes: bytes, sys_ctx_bytes,
         _real_file_name    = "async_job"
         _real_sys_ctx_name = ""
 
-    _job_update(job_id,
-                status="running",
-                started_at=_dt.datetime.utcnow().isoformat())
+    # Heartbeat until this function returns; if the process dies instead,
+    # the beat stops and _job_recover_stale re-queues the job.
+    _hb_stop = _threading.Event()
+    def _heartbeat():
+        while not _hb_stop.wait(_JOB_HEARTBEAT_S):
+            _job_update(job_id, heartbeat_at=_dt.datetime.utcnow().isoformat())
+    _threading.Thread(target=_heartbeat, daemon=True,
+                      name=f"valintel-heartbeat-{job_id}").start()
 
     # Minimal progress_bar / status_text shims so run_segmented_analysis
     # can call them without hitting Streamlit from a background thread.
@@ -782,7 +2543,8 @@ def _run_job(job_id: str, file_bytes: bytes, sys_ctx_bytes,
 
     try:
         urs_df, frs_df, oq_df, trace_df, gap_df = run_segmented_analysis(
-            file_bytes, model_id, fake_bar, fake_text, sys_ctx_bytes
+            file_bytes, model_id, fake_bar, fake_text, sys_ctx_bytes,
+            job_id=job_id
         )
 
         if urs_df.empty and frs_df.empty:
@@ -831,6 +2593,13 @@ def _run_job(job_id: str, file_bytes: bytes, sys_ctx_bytes,
             dashboard_df=dashboard_df
         )
 
+        # CSVs identical to the documents saved above dedupe to the same blob
+        _results = dict(zip(_JOB_RESULT_FIELDS, (
+            urs_df.to_csv(index=False), frs_df.to_csv(index=False),
+            oq_df.to_csv(index=False),  trace_df.to_csv(index=False),
+            gap_df.to_csv(index=False), xlsx_bytes)))
+        _digests = {f: blob_put(v, "job", job_id, f, "job_result")
+                    for f, v in _results.items()}
         _job_update(job_id,
                     status="complete",
                     progress=100,
@@ -838,73 +2607,96 @@ def _run_job(job_id: str, file_bytes: bytes, sys_ctx_bytes,
                         f"✅ Done — {len(urs_df)} requirements, "
                         f"{len(frs_df)} FRS rows, {len(oq_df)} OQ tests"
                     ),
-                    result_urs   = urs_df.to_csv(index=False),
-                    result_frs   = frs_df.to_csv(index=False),
-                    result_oq    = oq_df.to_csv(index=False),
-                    result_trace = trace_df.to_csv(index=False),
-                    result_gap   = gap_df.to_csv(index=False),
-                    result_xlsx  = xlsx_bytes,
-                    completed_at = _dt.datetime.utcnow().isoformat())
+                    result_digests = _json.dumps(_digests),
+                    completed_at   = _dt.datetime.utcnow().isoformat())
 
     except Exception as exc:
         _job_update(job_id,
                     status="failed",
                     error_msg=str(exc)[:1000],
                     completed_at=_dt.datetime.utcnow().isoformat())
+    finally:
+        # Any return from here is terminal (complete / failed) — checkpoints
+        # only matter for a run the process did not survive.
+        _hb_stop.set()
+        _job_ckpt_clear(job_id)
 
 
 def _worker_loop():
     """
     Continuously poll for queued jobs and process them one at a time.
-    Runs as a daemon thread started once at app boot.
+    Runs as a daemon thread started once per process. Jobs left 'running' by
+    a worker that died are re-queued first (see _job_recover_stale).
     """
-    global _worker_running
-    _worker_running = True
+    _WORKER_STATE["running"] = True
+    _last_stale_check = 0.0
     try:
         while True:
+            if _time_mod.time() - _last_stale_check > _JOB_STALE_CHECK_S:
+                _last_stale_check = _time_mod.time()
+                _job_recover_stale()
+
             try:
                 conn = db_connect()
                 row  = conn.execute(
-                    "SELECT job_id, user, model_id FROM jobs "
-                    "WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                    "SELECT job_id, user, model_id, file_digest, sys_ctx_digest "
+                    "FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
                 ).fetchone()
                 conn.close()
             except Exception:
                 row = None
 
+            if row and not _job_claim(row[0]):
+                _time_mod.sleep(1)
+                continue                     # another worker took it
             if row:
-                job_id, user, model_id = row
-                # Fetch file bytes from the job blobs table
+                job_id, user, model_id, file_digest, sys_ctx_digest = row
+                # Fetch file bytes from the blob store (job_blobs for jobs
+                # queued before it)
                 try:
-                    conn = db_connect()
-                    blob_row = conn.execute(
-                        "SELECT file_bytes, sys_ctx_bytes FROM job_blobs "
-                        "WHERE job_id = ?", (job_id,)
-                    ).fetchone()
-                    conn.close()
-                    if blob_row:
+                    if file_digest:
+                        blob_row = (blob_get(file_digest), blob_get(sys_ctx_digest))
+                    else:
+                        conn = db_connect()
+                        blob_row = conn.execute(
+                            "SELECT file_bytes, sys_ctx_bytes FROM job_blobs "
+                            "WHERE job_id = ?", (job_id,)
+                        ).fetchone()
+                        conn.close()
+                    if blob_row and blob_row[0] is not None:
                         file_bytes   = blob_row[0]
                         sys_ctx_bytes = blob_row[1]
                         _run_job(job_id, file_bytes, sys_ctx_bytes,
                                  model_id, user)
+                    else:
+                        _job_update(job_id, status="failed",
+                                    error_msg="Uploaded file is no longer stored — resubmit.")
                 except Exception as exc:
                     _job_update(job_id, status="failed",
                                 error_msg=f"Worker fetch error: {exc}")
             else:
+                if _time_mod.time() - _BLOB_STATE.get("last_gc", 0) > _BLOB_GC_EVERY_S:
+                    for _maint in (blob_gc, _narrative_cache_prune):
+                        try:
+                            _maint()
+                        except Exception:
+                            pass
+                    _BLOB_STATE["last_gc"] = _time_mod.time()
                 _time_mod.sleep(3)  # poll every 3 seconds when idle
     finally:
-        _worker_running = False
+        _WORKER_STATE["running"] = False
 
 
 def ensure_worker_running():
     """Start the background worker thread if not already running."""
-    global _worker_thread, _worker_running
     with _worker_lock:
-        if _worker_thread is None or not _worker_thread.is_alive():
-            _worker_thread = _threading.Thread(
+        _thread = _WORKER_STATE.get("thread")
+        if _thread is None or not _thread.is_alive():
+            _thread = _threading.Thread(
                 target=_worker_loop, daemon=True, name="valintel-worker"
             )
-            _worker_thread.start()
+            _WORKER_STATE["thread"] = _thread
+            _thread.start()
 
 
 def submit_job(user: str, file_bytes: bytes, file_name: str,
@@ -912,70 +2704,306 @@ def submit_job(user: str, file_bytes: bytes, file_name: str,
                sys_ctx_name: str = "") -> str:
     """
     Queue a new validation job. Returns the job_id immediately.
-    File bytes are stored in a separate job_blobs table to keep jobs table lean.
+    File bytes go to the blob store (see blob_put) — the jobs row keeps only
+    their digests, and re-submitting the same URS stores nothing new.
     """
     import datetime as _dt
     job_id = str(_uuid.uuid4())[:12].upper()
 
+    file_digest    = blob_put(file_bytes, "job", job_id, "input", "job_input")
+    sys_ctx_digest = blob_put(sys_ctx_bytes, "job", job_id, "sys_ctx", "job_input")
     conn = db_connect()
-    # Ensure job_blobs table exists
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS job_blobs (
-            job_id       TEXT PRIMARY KEY,
-            file_bytes   BLOB,
-            sys_ctx_bytes BLOB
-        )
-    """)
-    conn.execute(
-        "INSERT INTO job_blobs (job_id, file_bytes, sys_ctx_bytes) VALUES (?,?,?)",
-        (job_id, file_bytes, sys_ctx_bytes)
-    )
     conn.execute(
         """INSERT INTO jobs
-           (job_id, user, status, file_name, model_id, created_at, sys_ctx_name)
-           VALUES (?,?,?,?,?,?,?)""",
+           (job_id, user, status, file_name, model_id, created_at, sys_ctx_name,
+            file_digest, sys_ctx_digest)
+           VALUES (?,?,?,?,?,?,?,?,?)""",
         (job_id, user, "queued", file_name, model_id,
-         _dt.datetime.utcnow().isoformat(), sys_ctx_name)
+         _dt.datetime.utcnow().isoformat(), sys_ctx_name,
+         file_digest, sys_ctx_digest)
     )
     conn.commit()
     conn.close()
 
-    ensure_worker_running()
-    return job_id
+    ensure_worker_running()
+    return job_id
+
+
+def log_audit(user: str, action: str, object_changed: str = "",
+              old_value: str = "", new_value: str = "", reason: str = ""):
+    """
+    Append-only audit write. This function must never UPDATE or DELETE rows.
+    user_ip is pulled from st.session_state and written as a separate indexed
+    column (not embedded in Reason) to support fast audit searches per 21 CFR Part 11.
+    """
+    try:
+        user_ip = st.session_state.get("user_ip", "")
+    except Exception:
+        user_ip = ""
+    try:
+        conn = db_connect()
+        conn.execute(
+            """INSERT INTO audit_log
+               (user, timestamp, action, object_changed, old_value, new_value,
+                reason, location, user_ip)
+               VALUES (?,?,?,?,?,?,?,?,?)""",
+            (user,
+             datetime.datetime.utcnow().isoformat(),
+             action,
+             str(object_changed)[:500],
+             str(old_value)[:2000]  if old_value  else "",
+             str(new_value)[:2000]  if new_value  else "",
+             str(reason)[:1000]     if reason     else "",
+             "",          # location intentionally blank — removed from UI in v27
+             str(user_ip)[:100])
+        )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        st.warning(f"Audit log write failed: {e}")
+
+
+# =============================================================================
+# BACKGROUND ARTIFACT BUILDS
+# Evidence workbooks (AT / UAR) are built on a small process-wide thread pool
+# the moment scoring finishes. The download section only polls for the result,
+# so the button is usually ready by the time the reviewer has read the Top-20,
+# and navigating away no longer throws the half-built workbook away.
+# =============================================================================
+
+from concurrent.futures import ThreadPoolExecutor as _ArtifactPool
+
+_ARTIFACT_DIR         = os.path.join(os.path.dirname(DB_PATH), "artifact_cache")
+_ARTIFACT_MAX_WORKERS = 2            # openpyxl is CPU-bound — more threads just contend on the GIL
+_ARTIFACT_TTL_S       = 24 * 3600    # on-disk workbooks older than this are pruned
+_ARTIFACT_MAX_JOBS    = 64           # finished registry entries kept in memory
+_ARTIFACT_STATE       = _process_state("artifact_builds")   # survives reruns
+_ARTIFACT_LOCK        = _ARTIFACT_STATE.setdefault("lock", _threading.Lock())
+_ARTIFACT_JOBS        = _ARTIFACT_STATE.setdefault("jobs", {})  # key → {status, progress, message, bytes, error, ...}
+
+
+def _artifact_key(module: str, file_hash: str, system_name: str,
+                  r_start: str, r_end: str, variant: str = "") -> str:
+    """Cache key for one evidence workbook.
+
+    (module, file hash, system name, review period, engine VERSION) identify the
+    artifact; `variant` folds in anything else that changes the bytes for the
+    same input file (rule toggles, thresholds, column mapping, narrative text,
+    model, AT rule profile).
+    """
+    raw = "|".join([
+        module, file_hash or "", (system_name or "").strip(),
+        (r_start or "").strip(), (r_end or "").strip(), VERSION, variant or "",
+    ])
+    return f"{module}-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]}"
+
+
+def _artifact_variant(*parts) -> str:
+    """Short stable digest of JSON-able build settings (see _artifact_key)."""
+    blob = _json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:12]
+
+
+def _artifact_narratives(df: pd.DataFrame, col: str) -> list:
+    """Narrative column as a JSON-able list for _artifact_variant ([] if absent)."""
+    if df is None or col not in getattr(df, "columns", ()):
+        return []
+    return df[col].astype(str).tolist()
+
+
+def _artifact_path(key: str) -> str:
+    return os.path.join(_ARTIFACT_DIR, f"{key}.xlsx")
+
+
+def _artifact_prune_disk() -> None:
+    """Drop cached workbooks past their TTL. Best-effort; never raises."""
+    try:
+        _cutoff = _time_mod.time() - _ARTIFACT_TTL_S
+        for _fn in os.listdir(_ARTIFACT_DIR):
+            _fp = os.path.join(_ARTIFACT_DIR, _fn)
+            if os.path.isfile(_fp) and os.path.getmtime(_fp) < _cutoff:
+                os.remove(_fp)
+    except Exception:
+        pass
+
+
+def _artifact_executor():
+    with _ARTIFACT_LOCK:
+        if _ARTIFACT_STATE.get("executor") is None:
+            _ARTIFACT_STATE["executor"] = _ArtifactPool(
+                max_workers=_ARTIFACT_MAX_WORKERS,
+                thread_name_prefix="valintel-artifact",
+            )
+            try:
+                os.makedirs(_ARTIFACT_DIR, exist_ok=True)
+            except Exception:
+                pass
+            _artifact_prune_disk()
+        return _ARTIFACT_STATE["executor"]
+
+
+def _artifact_set(key: str, **fields) -> None:
+    with _ARTIFACT_LOCK:
+        _job = _ARTIFACT_JOBS.get(key)
+        if _job is not None:
+            _job.update(fields)
+
+
+def _artifact_evict() -> None:
+    """Keep the in-memory registry bounded. Caller holds _ARTIFACT_LOCK.
+    Evicted workbooks are still on disk and are picked up again by
+    artifact_status()."""
+    _done = [k for k, j in _ARTIFACT_JOBS.items()
+             if j["status"] in ("ready", "failed")]
+    _excess = len(_ARTIFACT_JOBS) - _ARTIFACT_MAX_JOBS
+    if _excess > 0:
+        _done.sort(key=lambda k: _ARTIFACT_JOBS[k].get("finished_at") or 0)
+        for k in _done[:_excess]:
+            _ARTIFACT_JOBS.pop(k, None)
+
+
+def _artifact_run(key: str, builder, args: tuple, kwargs: dict,
+                  persist: bool) -> None:
+    """Worker body — runs off the script thread, never touches st.*."""
+    _artifact_set(key, status="building", started_at=_time_mod.time(),
+                  progress=0.02, message="Starting")
+
+    def _progress(frac, msg):
+        _artifact_set(key, progress=float(frac), message=str(msg))
+
+    try:
+        data = builder(*args, progress_cb=_progress, **kwargs)
+    except Exception as exc:
+        _artifact_set(key, status="failed", error=str(exc)[:1000],
+                      finished_at=_time_mod.time())
+        return
+
+    if persist:
+        # Atomic write — a reader never sees a half-written workbook.
+        try:
+            _tmp = _artifact_path(key) + f".{_uuid.uuid4().hex[:8]}.tmp"
+            with open(_tmp, "wb") as _fh:
+                _fh.write(data)
+            os.replace(_tmp, _artifact_path(key))
+        except Exception:
+            pass
+    _artifact_set(key, status="ready", progress=1.0, message="Ready",
+                  bytes=data, finished_at=_time_mod.time())
 
 
-def log_audit(user: str, action: str, object_changed: str = "",
-              old_value: str = "", new_value: str = "", reason: str = ""):
-    """
-    Append-only audit write. This function must never UPDATE or DELETE rows.
-    user_ip is pulled from st.session_state and written as a separate indexed
-    column (not embedded in Reason) to support fast audit searches per 21 CFR Part 11.
+def artifact_submit(key: str, builder, *args, persist: bool = True,
+                    **kwargs) -> dict:
+    """Start building an artifact in the background unless it already exists.
+
+    `builder` must accept a `progress_cb=` keyword. All arguments are captured
+    here on the script thread — the builder must not read st.session_state.
+    Idempotent: a key that is queued, building or ready is left alone; a
+    failed key is retried.
     """
+    with _ARTIFACT_LOCK:
+        _job = _ARTIFACT_JOBS.get(key)
+        if _job is not None and _job["status"] != "failed":
+            return dict(_job)
+    if persist and os.path.isfile(_artifact_path(key)):
+        # Built by an earlier session / before a restart — nothing to do.
+        return artifact_status(key)
+    _executor = _artifact_executor()
+    with _ARTIFACT_LOCK:
+        _job = _ARTIFACT_JOBS.get(key)
+        if _job is not None and _job["status"] != "failed":
+            return dict(_job)
+        _ARTIFACT_JOBS[key] = {
+            "key": key, "status": "queued", "progress": 0.0,
+            "message": "Queued", "bytes": None, "error": "",
+            "submitted_at": _time_mod.time(),
+            "started_at": None, "finished_at": None,
+        }
+        _artifact_evict()
+    _executor.submit(_artifact_run, key, builder, args, kwargs, persist)
+    return artifact_status(key)
+
+
+def artifact_status(key: str) -> dict:
+    """Snapshot of a build: status is one of missing / queued / building /
+    ready / failed. `bytes` is populated only when ready. Falls back to the
+    on-disk cache so a workbook survives registry eviction and app restarts."""
+    with _ARTIFACT_LOCK:
+        _job = _ARTIFACT_JOBS.get(key)
+        if _job is not None:
+            return dict(_job)
     try:
-        user_ip = st.session_state.get("user_ip", "")
+        with open(_artifact_path(key), "rb") as _fh:
+            data = _fh.read()
     except Exception:
-        user_ip = ""
-    try:
-        conn = db_connect()
-        conn.execute(
-            """INSERT INTO audit_log
-               (user, timestamp, action, object_changed, old_value, new_value,
-                reason, location, user_ip)
-               VALUES (?,?,?,?,?,?,?,?,?)""",
-            (user,
-             datetime.datetime.utcnow().isoformat(),
-             action,
-             str(object_changed)[:500],
-             str(old_value)[:2000]  if old_value  else "",
-             str(new_value)[:2000]  if new_value  else "",
-             str(reason)[:1000]     if reason     else "",
-             "",          # location intentionally blank — removed from UI in v27
-             str(user_ip)[:100])
+        return {"key": key, "status": "missing", "progress": 0.0,
+                "message": "", "bytes": None, "error": ""}
+    with _ARTIFACT_LOCK:
+        _ARTIFACT_JOBS[key] = {
+            "key": key, "status": "ready", "progress": 1.0,
+            "message": "Ready (cached)", "bytes": data, "error": "",
+            "submitted_at": None, "started_at": None,
+            "finished_at": _time_mod.time(),
+        }
+        _artifact_evict()
+        return dict(_ARTIFACT_JOBS[key])
+
+
+def artifact_wait(key: str, label: str, poll_s: float = 2.0) -> bytes:
+    """Render build progress for `key` and return the bytes once ready.
+
+    Returns None while the build is still running; the progress panel then
+    re-polls on its own (st.fragment where available, otherwise the same
+    sleep-and-rerun loop the async job panel uses). On failure the error is
+    shown and None is returned.
+    """
+    _job = artifact_status(key)
+    if _job["status"] == "ready":
+        return _job["bytes"]
+    if _job["status"] == "failed":
+        st.error(f"❌ {label} build failed: {_job.get('error') or 'unknown error'}")
+        return None
+
+    def _panel():
+        _j = artifact_status(key)
+        if _j["status"] in ("ready", "failed"):
+            st.rerun()
+        _pct = max(float(_j.get("progress") or 0.0), 0.02)
+        _msg = _j.get("message") or ""
+        st.progress(
+            min(_pct, 1.0),
+            text=(f"⏳ Building {label} in the background — {_msg}"
+                  if _j["status"] == "building" else f"⏳ {label} queued…"),
         )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        st.warning(f"Audit log write failed: {e}")
+        st.caption("You can keep reviewing or leave this page — the build "
+                   "continues and the download appears here when it finishes.")
+
+    _fragment = getattr(st, "fragment", None)
+    if _fragment is not None:
+        _fragment(run_every=poll_s)(_panel)()
+    else:
+        _panel()
+        _time_mod.sleep(poll_s)
+        st.rerun()
+    return None
+
+
+def artifact_stats() -> pd.DataFrame:
+    """Admin view of the in-memory build registry (bytes omitted)."""
+    with _ARTIFACT_LOCK:
+        _rows = [
+            {
+                "Key":      j["key"],
+                "Status":   j["status"],
+                "Progress": round(float(j.get("progress") or 0.0) * 100),
+                "Step":     j.get("message", ""),
+                "Size_KB":  round(len(j["bytes"]) / 1024, 1) if j.get("bytes") else None,
+                "Build_s":  (round(j["finished_at"] - j["started_at"], 1)
+                             if j.get("finished_at") and j.get("started_at") else None),
+                "Error":    j.get("error", ""),
+            }
+            for j in _ARTIFACT_JOBS.values()
+        ]
+    return pd.DataFrame(_rows)
 
 
 # =============================================================================
@@ -1068,7 +3096,10 @@ def get_next_doc_version(doc_type: str) -> int:
 
 def save_document(doc_type: str, content: str, created_by: str,
                   project_ref: str = "", file_path: str = "") -> int:
-    """Always inserts a new version — never overwrites. Returns new doc ID."""
+    """Always inserts a new version — never overwrites. Returns new doc ID.
+
+    The full content goes to the blob store; the row keeps its digest.
+    """
     version = get_next_doc_version(doc_type)
     name    = f"{doc_type}_v{version}.0_{datetime.date.today()}"
     try:
@@ -1076,15 +3107,18 @@ def save_document(doc_type: str, content: str, created_by: str,
         cur  = conn.execute(
             """INSERT INTO documents
                (name, type, version, uploaded_by, timestamp, file_path,
-                status, content, project_ref)
+                status, content_digest, project_ref)
                VALUES (?,?,?,?,?,?,?,?,?)""",
             (name, doc_type, version, created_by,
              datetime.datetime.utcnow().isoformat(),
-             file_path, "Active", content[:10000], project_ref)
+             file_path, "Active",
+             hashlib.sha256(content.encode("utf-8")).hexdigest() if content else None,
+             project_ref)
         )
         doc_id = cur.lastrowid
         conn.commit()
         conn.close()
+        blob_put(content, "document", doc_id, "content")
         return doc_id
     except Exception as e:
         st.warning(f"Document save failed: {e}")
@@ -1321,6 +3355,7 @@ def extract_pages(file_bytes: bytes) -> list:
     pages_text = []
     if PDFPLUMBER_AVAILABLE:
         try:
+            pdfplumber = _lazy_import("pdfplumber")
             with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
                 for page_num, page in enumerate(pdf.pages, start=1):
                     parts = []
@@ -1350,6 +3385,7 @@ def extract_pages(file_bytes: bytes) -> list:
         tmp.write(file_bytes)
         tmp_path = tmp.name
     try:
+        PyPDFLoader = _lazy_import("langchain_community.document_loaders").PyPDFLoader
         lc_pages   = PyPDFLoader(tmp_path).load()
         pages_text = [f"--- Page {i+1} ---\n{p.page_content}"
                       for i, p in enumerate(lc_pages)]
@@ -1497,8 +3533,9 @@ def validate_urs_document(
     # ── Stage 2: LLM pre-flight ───────────────────────────────────────────────
     try:
         preflight_text = sample_text[:3000]
-        response = completion(
+        response = _llm_completion(
             model=model_id,
+            purpose="urs_preflight",
             stream=False,
             temperature=0.0,
             max_tokens=100,
@@ -1889,12 +3926,91 @@ def _renumber_frs_ids(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+# ── Normalised URS → FRS → OQ link index ─────────────────────────────────────
+# Traceability, placeholder fill and the R0/R1/R4 checks all need the same
+# joins. Building them here once (with one normalisation rule for
+# Source_URS_Ref) turns per-row frame re-filters into dict lookups — matters
+# for programme-level URS with 1,000+ requirements.
+_URS_REF_SUFFIX_RE = re.compile(r'\s*\(.*?\)\s*$')
+
+
+def _normalise_urs_ref(ref) -> str:
+    """Normalise "URS-001 (CAL01)" → "URS-001" (strip the source-ID annotation)."""
+    return _URS_REF_SUFFIX_RE.sub('', str(ref).strip()).strip()
+
+
+def _build_link_index(urs_df: pd.DataFrame,
+                      frs_df: pd.DataFrame,
+                      oq_df:  pd.DataFrame) -> dict:
+    """
+    Build URS → FRS → OQ adjacency maps in a single O(n) pass per frame.
+
+    Returned keys:
+      urs_ids          Req_IDs in urs_df order (blank/NaN dropped)
+      urs_desc         Req_ID → Requirement_Description
+      frs_by_urs       base URS ref → [FRS row dicts]  (every non-blank ref)
+      frs_urs_refs     set of base URS refs that have ≥1 FRS (non-null refs)
+      frs_ids          set of FRS IDs
+      frs_ids_real     set of FRS IDs excluding cross-source XFRS rows
+      oq_links         set of FRS IDs referenced by ≥1 OQ row
+      oq_tests_by_frs  FRS ID → [OQ Test_IDs]  (rows with link AND test id)
+      oq_link_counts   FRS ID → number of OQ rows linking to it
+
+    Any frame may be None/empty — the corresponding maps are simply empty.
+    The index is a snapshot: rebuild it after placeholder rows are inserted.
+    """
+    idx = {
+        "urs_ids": [], "urs_desc": {}, "frs_by_urs": {}, "frs_urs_refs": set(),
+        "frs_ids": set(), "frs_ids_real": set(), "oq_links": set(),
+        "oq_tests_by_frs": {}, "oq_link_counts": {},
+    }
+
+    if urs_df is not None and not urs_df.empty and "Req_ID" in urs_df.columns:
+        _uids = urs_df["Req_ID"].map(str).str.strip()
+        idx["urs_ids"] = [u for u, raw in zip(_uids, urs_df["Req_ID"].notna())
+                          if raw and u]
+        _descs = (urs_df["Requirement_Description"].map(str).str.strip()
+                  if "Requirement_Description" in urs_df.columns
+                  else pd.Series("", index=urs_df.index))
+        idx["urs_desc"] = {u: d for u, d in zip(_uids, _descs) if u}
+
+    if frs_df is not None and not frs_df.empty:
+        if "ID" in frs_df.columns:
+            _fids = frs_df["ID"].dropna().map(str).str.strip()
+            idx["frs_ids"]      = set(_fids)
+            idx["frs_ids_real"] = {f for f in idx["frs_ids"]
+                                   if not f.upper().startswith("XFRS")}
+        if "Source_URS_Ref" in frs_df.columns:
+            _raw  = frs_df["Source_URS_Ref"].map(str).str.strip()
+            _base = _raw.str.replace(_URS_REF_SUFFIX_RE, "", regex=True).str.strip()
+            _notna = frs_df["Source_URS_Ref"].notna()
+            idx["frs_urs_refs"] = set(_base[_notna])
+            _by_urs = idx["frs_by_urs"]
+            for rec, raw, base in zip(frs_df.to_dict("records"), _raw, _base):
+                if raw:
+                    _by_urs.setdefault(base, []).append(rec)
+
+    if oq_df is not None and not oq_df.empty and "Requirement_Link" in oq_df.columns:
+        _links = oq_df["Requirement_Link"].map(str).str.strip()
+        idx["oq_links"]       = set(_links[oq_df["Requirement_Link"].notna()])
+        idx["oq_link_counts"] = _links.value_counts().to_dict()
+        if "Test_ID" in oq_df.columns:
+            _tids  = oq_df["Test_ID"].map(str).str.strip()
+            _by_fr = idx["oq_tests_by_frs"]
+            for link, tid in zip(_links, _tids):
+                if link and tid:
+                    _by_fr.setdefault(link, []).append(tid)
+
+    return idx
+
+
 def _fill_missing_frs(urs_df: pd.DataFrame, frs_df: pd.DataFrame) -> pd.DataFrame:
     """
     Detect any URS requirement that has no FRS row and insert a clearly-flagged
     placeholder so nothing silently disappears from the output.
     The placeholder has Confidence=0.50 and Confidence_Flag='⚠️ Review Required'
     so it is immediately visible as needing manual completion.
+    Coverage is read from _build_link_index() over the cleaned FRS frame.
     """
     if urs_df.empty or "Req_ID" not in urs_df.columns:
         return frs_df
@@ -1911,16 +4027,18 @@ def _fill_missing_frs(urs_df: pd.DataFrame, frs_df: pd.DataFrame) -> pd.DataFram
             (_valid_id.str.upper() != "NONE")
         ].copy()
 
-    frs_urs_refs = set()
-    if not frs_df.empty and "Source_URS_Ref" in frs_df.columns:
-        # Normalise to base URS ID only — strip any trailing " (SRC_ID)" annotation
-        frs_urs_refs = set(
-            re.sub(r'\s*\(.*?\)\s*$', '', s).strip()
-            for s in frs_df["Source_URS_Ref"].dropna().astype(str)
-        )
+    # Normalised to base URS ID only — trailing " (SRC_ID)" annotation stripped
+    frs_urs_refs = _build_link_index(None, frs_df, None)["frs_urs_refs"]
+
+    # Next FRS number — only scan real, parseable IDs (once, not per placeholder)
+    max_existing = 0
+    if not frs_df.empty and "ID" in frs_df.columns:
+        _nums = frs_df["ID"].dropna().astype(str).str.strip().str.extract(
+            r'^FRS-(\d+)', flags=re.IGNORECASE)[0].dropna()
+        max_existing = int(_nums.astype(int).max()) if not _nums.empty else 0
 
     placeholders = []
-    for _, row in urs_df.iterrows():
+    for row in urs_df.to_dict("records"):
         uid      = str(row.get("Req_ID", "")).strip()
         src_rid  = str(row.get("Source_Req_ID", "")).strip()
         # Build display ref: if original doc ID differs from Req_ID, show both
@@ -1930,16 +4048,7 @@ def _fill_missing_frs(urs_df: pd.DataFrame, frs_df: pd.DataFrame) -> pd.DataFram
             uid_display = uid
         desc = str(row.get("Requirement_Description", "")).strip()
         if uid and uid not in frs_urs_refs:
-            # Determine next FRS number — only scan real, parseable IDs
-            if not frs_df.empty and "ID" in frs_df.columns:
-                existing_nums = []
-                for fid in frs_df["ID"].dropna().astype(str):
-                    m = re.match(r'FRS-(\d+)', fid.strip(), re.IGNORECASE)
-                    if m: existing_nums.append(int(m.group(1)))
-                next_n = max(existing_nums, default=0) + len(placeholders) + 1
-            else:
-                next_n = 1 + len(placeholders)
-            frs_id = f"FRS-{next_n:03d}"
+            frs_id = f"FRS-{max_existing + len(placeholders) + 1:03d}"
             placeholders.append({
                 "ID":                      frs_id,
                 "Requirement_Description": f"[HUMAN-IN-THE-LOOP SAFEGUARD — MANUAL REVIEW REQUIRED] "
@@ -2032,15 +4141,11 @@ def _fill_missing_oq(frs_df: pd.DataFrame, oq_df: pd.DataFrame) -> pd.DataFrame:
     if frs_df.empty or "ID" not in frs_df.columns:
         return oq_df
 
-    # Build set of FRS IDs that already have at least one OQ test
-    linked_frs = set()
-    if not oq_df.empty and "Requirement_Link" in oq_df.columns:
-        linked_frs = set(
-            oq_df["Requirement_Link"].dropna().astype(str).str.strip()
-        )
+    # Set of FRS IDs that already have at least one OQ test
+    linked_frs = _build_link_index(None, None, oq_df)["oq_links"]
 
     placeholders = []
-    for _, row in frs_df.iterrows():
+    for row in frs_df.to_dict("records"):
         fid  = str(row.get("ID", "")).strip()
         desc = str(row.get("Requirement_Description", "")).strip()[:120]
         urs  = str(row.get("Source_URS_Ref", "N/A")).strip()
@@ -2151,7 +4256,8 @@ def run_cross_source_analysis(
     urs_text: str,
     sys_context_text: str,
     model_id: str,
-    sys_context_name: str = "User Guide"
+    sys_context_name: str = "User Guide",
+    job_id: str = None
 ) -> tuple:
     """
     Cross-Source Gap Analysis (v29):
@@ -2213,21 +4319,28 @@ Req_ID,Gap_Type,Description,Recommendation,Severity
 
 If no gaps exist in either direction, output two CSV headers with no data rows.
 """
+    # Async jobs checkpoint the raw reply (see _job_ckpt_save), keyed by the
+    # prompt so a resumed job never reuses a reply to different inputs
+    _ckpt_item = hashlib.sha256(CROSS_SOURCE_PROMPT.encode("utf-8")).hexdigest()[:16]
     try:
-        response = completion(
-            model=model_id,
-            stream=False,
-            temperature=0.1,   # low temp for deterministic gap comparison
-            messages=[
-                {"role": "system", "content": (
-                    "You are a senior GxP validation specialist. "
-                    "You produce only structured CSV output — no prose, no markdown fences. "
-                    "Your gap analysis findings will be incorporated into a regulated validation package."
-                )},
-                {"role": "user", "content": CROSS_SOURCE_PROMPT}
-            ]
-        )
-        raw = response.choices[0].message.content or ""
+        raw = _job_ckpt_load(job_id).get(("pass3", _ckpt_item))
+        if raw is None:
+            response = _llm_completion(
+                model=model_id,
+                purpose="nv_pass3_cross_source",
+                stream=False,
+                temperature=0.1,   # low temp for deterministic gap comparison
+                messages=[
+                    {"role": "system", "content": (
+                        "You are a senior GxP validation specialist. "
+                        "You produce only structured CSV output — no prose, no markdown fences. "
+                        "Your gap analysis findings will be incorporated into a regulated validation package."
+                    )},
+                    {"role": "user", "content": CROSS_SOURCE_PROMPT}
+                ]
+            )
+            raw = response.choices[0].message.content or ""
+            _job_ckpt_save(job_id, "pass3", _ckpt_item, raw)
         raw = re.sub(r'^```[a-zA-Z]*\n?', '', raw, flags=re.MULTILINE)
         raw = re.sub(r'```\s*$',          '', raw, flags=re.MULTILINE)
 
@@ -2259,7 +4372,8 @@ def run_segmented_analysis(
     model_id: str,
     progress_bar,
     status_text,
-    sys_context_bytes: bytes = None
+    sys_context_bytes: bytes = None,
+    job_id: str = None
 ) -> tuple:
     """
     Two-pass analysis with Fail-Stop Protocol (v27).
@@ -2285,10 +4399,23 @@ def run_segmented_analysis(
       After combining chunks, FRS IDs and OQ IDs are globally resequenced
       so FRS-001…FRS-N and OQ-001…OQ-M are always unique and sequential
       regardless of how many chunks the document was split into.
+
+    Checkpoints (async jobs, job_id set):
+      The raw reply of every finished Pass-1 segment, Pass-2 requirement /
+      batch and Pass-3 call is saved per job (_job_ckpt_save). A job resumed
+      after a restart replays those replies through the same parsing instead
+      of calling the LLM again. Every item is keyed by a digest of its
+      input (segment prompt, requirement row, batch / Pass-3 prompt), never
+      by position alone.
     """
     class SegmentFailureError(RuntimeError):
         pass
 
+    _ckpt = _job_ckpt_load(job_id)
+    if _ckpt:
+        status_text.text(f"♻️ Resuming — {len(_ckpt)} completed stage(s) restored "
+                         f"from checkpoint...")
+
     all_pages = extract_pages(file_bytes)
     if not all_pages:
         raise SegmentFailureError(
@@ -2326,16 +4453,27 @@ def run_segmented_analysis(
         status_text.text(f"📄 Pass 1 — Extracting URS: segment {idx + 1} of {total}...")
         _ = progress_bar.progress((idx) / (total * 2))
 
+        # Keyed by the prompt (segment text + position), not the position
+        # alone — a redeploy that re-chunks the pages must not replay the old
+        # reply for a different page range.
+        _p1_prompt = build_pass1_prompt(chunk_text, idx, total)
+        _p1_item   = hashlib.sha256(_p1_prompt.encode("utf-8")).hexdigest()[:16]
         try:
+            if ("pass1", _p1_item) in _ckpt:
+                df_urs = _csv_to_df(_ckpt[("pass1", _p1_item)])
+                if not df_urs.empty:
+                    urs_frames.append(df_urs)
+                continue
             # Phase 1: stream=True prevents silent 600s hang on Pass 1 segments
-            stream_resp_p1 = completion(
+            stream_resp_p1 = _llm_completion(
                 model=model_id,
+                purpose="nv_pass1",
                 stream=True,
                 temperature=TEMPERATURE,
                 timeout=900,
                 messages=[
                     {"role": "system", "content": _make_system_prompt(sys_context)},
-                    {"role": "user",   "content": build_pass1_prompt(chunk_text, idx, total)}
+                    {"role": "user",   "content": _p1_prompt}
                 ]
             )
             raw_urs = ""
@@ -2353,6 +4491,7 @@ def run_segmented_analysis(
             df_urs  = _csv_to_df(raw_urs)
             if not df_urs.empty:
                 urs_frames.append(df_urs)
+            _job_ckpt_save(job_id, "pass1", _p1_item, raw_urs)
         except Exception as e:
             # FAIL-STOP: any segment failure aborts the entire run
             raise SegmentFailureError(
@@ -2501,24 +4640,29 @@ def run_segmented_analysis(
         _ = progress_bar.progress(0.52)
         try:
             _full_csv = header_line + "\n" + "\n".join(data_lines)
-            _stream_fp = completion(
-                model=model_id,
-                stream=True,
-                temperature=TEMPERATURE,
-                timeout=300,
-                messages=[
-                    {"role": "system", "content": _make_system_prompt(sys_summary)},
-                    {"role": "user",   "content": build_pass2_prompt(_full_csv, sys_summary)}
-                ]
-            )
-            _raw_fp = ""
-            for _chunk in _stream_fp:
-                _delta = (_chunk.choices[0].delta.content or "") if _chunk.choices else ""
-                _raw_fp += _delta
-                if len(_raw_fp) % 800 < len(_delta) + 1:
-                    status_text.text(
-                        f"🔬 Pass 2 — generating... ({len(_raw_fp):,} chars)"
-                    )
+            _fp_item  = hashlib.sha256(_full_csv.encode("utf-8")).hexdigest()[:16]
+            _raw_fp   = _ckpt.get(("pass2_batch", _fp_item))
+            if _raw_fp is None:
+                _stream_fp = _llm_completion(
+                    model=model_id,
+                    purpose="nv_pass2_batch",
+                    stream=True,
+                    temperature=TEMPERATURE,
+                    timeout=300,
+                    messages=[
+                        {"role": "system", "content": _make_system_prompt(sys_summary)},
+                        {"role": "user",   "content": build_pass2_prompt(_full_csv, sys_summary)}
+                    ]
+                )
+                _raw_fp = ""
+                for _chunk in _stream_fp:
+                    _delta = (_chunk.choices[0].delta.content or "") if _chunk.choices else ""
+                    _raw_fp += _delta
+                    if len(_raw_fp) % 800 < len(_delta) + 1:
+                        status_text.text(
+                            f"🔬 Pass 2 — generating... ({len(_raw_fp):,} chars)"
+                        )
+                _job_ckpt_save(job_id, "pass2_batch", _fp_item, _raw_fp)
             _sections = _robust_split_datasets(_raw_fp, _PASS2_HEADERS)
             for _frames, _csv_text in [
                 (frs_frames, _sections[0]),
@@ -2553,30 +4697,13 @@ def run_segmented_analysis(
                 f"OQ: {sum(len(f) for f in oq_frames)} tests"
             )
 
-            try:
-                stream_resp = completion(
-                    model=model_id,
-                    stream=True,
-                    temperature=TEMPERATURE,
-                    timeout=120,
-                    messages=[
-                        {"role": "system", "content": _make_system_prompt(sys_summary)},
-                        {"role": "user",   "content": build_pass2_single_prompt(
-                            req_row, header_line, sys_summary)}
-                    ]
-                )
-                raw_p2 = ""
-                for chunk in stream_resp:
-                    delta = (chunk.choices[0].delta.content or "") if chunk.choices else ""
-                    raw_p2 += delta
-
-            except Exception as e:
-                # Phase 2: per-requirement retry once before skipping
+            _req_item = hashlib.sha256(req_row.encode("utf-8")).hexdigest()[:16]
+            raw_p2    = _ckpt.get(("pass2", _req_item))   # restored from checkpoint
+            if raw_p2 is None:
                 try:
-                    import time as _time
-                    _time.sleep(8)
-                    stream_resp2 = completion(
+                    stream_resp = _llm_completion(
                         model=model_id,
+                        purpose="nv_pass2_req",
                         stream=True,
                         temperature=TEMPERATURE,
                         timeout=120,
@@ -2587,13 +4714,36 @@ def run_segmented_analysis(
                         ]
                     )
                     raw_p2 = ""
-                    for chunk in stream_resp2:
+                    for chunk in stream_resp:
                         delta = (chunk.choices[0].delta.content or "") if chunk.choices else ""
                         raw_p2 += delta
-                except Exception as e2:
-                    # Log the skip — do not abort the whole run
-                    _failed_reqs.append(f"req {p2_idx+1}: {str(e2)[:80]}")
-                    continue  # move to next requirement
+
+                except Exception as e:
+                    # Phase 2: per-requirement retry once before skipping
+                    try:
+                        import time as _time
+                        _time.sleep(8)
+                        stream_resp2 = _llm_completion(
+                            model=model_id,
+                            purpose="nv_pass2_req",
+                            stream=True,
+                            temperature=TEMPERATURE,
+                            timeout=120,
+                            messages=[
+                                {"role": "system", "content": _make_system_prompt(sys_summary)},
+                                {"role": "user",   "content": build_pass2_single_prompt(
+                                    req_row, header_line, sys_summary)}
+                            ]
+                        )
+                        raw_p2 = ""
+                        for chunk in stream_resp2:
+                            delta = (chunk.choices[0].delta.content or "") if chunk.choices else ""
+                            raw_p2 += delta
+                    except Exception as e2:
+                        # Log the skip — do not abort the whole run
+                        _failed_reqs.append(f"req {p2_idx+1}: {str(e2)[:80]}")
+                        continue  # move to next requirement
+                _job_ckpt_save(job_id, "pass2", _req_item, raw_p2)
 
             sections = _robust_split_datasets(raw_p2, _PASS2_HEADERS)
             frs_csv, oq_csv, gap_csv = sections[0], sections[1], sections[2]
@@ -2717,8 +4867,7 @@ def run_segmented_analysis(
             _src_ref = str(_fr.get("Source_URS_Ref", "")).strip()
             _risk    = str(_fr.get("Risk", "")).strip()
             if _src_ref and _risk and not _src_ref.startswith("[GAP"):
-                # Normalise "URS-001 (CAL01)" → "URS-001"
-                _base = re.sub(r'\s*\(.*?\)\s*$', '', _src_ref).strip()
+                _base = _normalise_urs_ref(_src_ref)
                 # Take the highest risk among multiple FRS for same URS
                 _priority = {"High": 3, "Medium": 2, "Low": 1}
                 _existing = _urs_risk_map.get(_base, "Low")
@@ -2752,7 +4901,8 @@ def run_segmented_analysis(
             urs_text    = urs_text_for_cross,
             sys_context_text = sys_context,
             model_id    = model_id,
-            sys_context_name = "User Guide"
+            sys_context_name = "User Guide",
+            job_id      = job_id
         )
         # Append cross-source FRS rows to main FRS table
         if not xfrs_df.empty:
@@ -2846,37 +4996,14 @@ def _build_traceability(urs_df: pd.DataFrame,
     """
     MIN_TESTS = {"high": 3, "medium": 2, "low": 1}
 
-    # Build URS description lookup
-    urs_desc: dict = {}
-    if not urs_df.empty and "Req_ID" in urs_df.columns:
-        for _, r in urs_df.iterrows():
-            uid  = str(r.get("Req_ID", "")).strip()
-            desc = str(r.get("Requirement_Description", "")).strip()
-            if uid:
-                urs_desc[uid] = desc
-
-    # Build FRS lookup keyed by base URS ID → list of FRS rows
-    frs_by_urs: dict = {}
-    if not frs_df.empty and "Source_URS_Ref" in frs_df.columns:
-        for _, r in frs_df.iterrows():
-            ref = str(r.get("Source_URS_Ref", "")).strip()
-            if ref:
-                # Normalise "URS-001 (CAL01)" → "URS-001"
-                base_ref = re.sub(r'\s*\(.*?\)\s*$', '', ref).strip()
-                frs_by_urs.setdefault(base_ref, []).append(r)
-
-    # Build OQ lookup keyed by Requirement_Link (FRS_ID) → list of OQ Test_IDs
-    oq_map: dict = {}
-    if not oq_df.empty and "Requirement_Link" in oq_df.columns and "Test_ID" in oq_df.columns:
-        for _, r in oq_df.iterrows():
-            link    = str(r.get("Requirement_Link", "")).strip()
-            test_id = str(r.get("Test_ID", "")).strip()
-            if link and test_id:
-                oq_map.setdefault(link, []).append(test_id)
+    idx = _build_link_index(urs_df, frs_df, oq_df)
+    urs_desc   = idx["urs_desc"]
+    frs_by_urs = idx["frs_by_urs"]
+    oq_map     = idx["oq_tests_by_frs"]
 
     # Determine URS ID list — prefer urs_df order, fallback to FRS refs
     if not urs_df.empty and "Req_ID" in urs_df.columns:
-        urs_ids = [str(v).strip() for v in urs_df["Req_ID"].dropna() if str(v).strip()]
+        urs_ids = idx["urs_ids"]
     else:
         urs_ids = sorted(frs_by_urs.keys())
 
@@ -3053,37 +5180,20 @@ def run_deterministic_validation(
     # genuine description quality checks that apply to any FRS row.
     _is_xfrs_id = lambda fid: str(fid).strip().upper().startswith("XFRS")
 
-    frs_ids = set()
-    if not frs_df.empty and "ID" in frs_df.columns:
-        frs_ids = set(frs_df["ID"].dropna().astype(str).str.strip())
+    # One normalised URS → FRS → OQ index feeds R0/R1/R2/R4
+    idx = _build_link_index(urs_df, frs_df, oq_df)
+    frs_ids      = idx["frs_ids"]
+    frs_ids_real = idx["frs_ids_real"]     # R1/R4 — real URS-derived FRS rows only
+    frs_urs_refs = idx["frs_urs_refs"]     # R0 — base URS IDs with an FRS
+    oq_req_links = idx["oq_links"]
 
-    # Subsets used for R1/R4 — real URS-derived FRS rows only
     frs_df_real = frs_df[
         ~frs_df["ID"].astype(str).str.strip().str.upper().str.startswith("XFRS")
-    ].copy() if not frs_df.empty and "ID" in frs_df.columns else frs_df
-    frs_ids_real = set(frs_df_real["ID"].dropna().astype(str).str.strip()) \
-                   if not frs_df_real.empty and "ID" in frs_df_real.columns else set()
-
-    # FRS lookup by Source_URS_Ref for R0 — normalise to base URS ID
-    frs_urs_refs = set()
-    if not frs_df.empty and "Source_URS_Ref" in frs_df.columns:
-        frs_urs_refs = set(
-            re.sub(r'\s*\(.*?\)\s*$', '', s).strip()
-            for s in frs_df["Source_URS_Ref"].dropna().astype(str)
-        )
-
-    oq_req_links = set()
-    oq_test_ids  = set()
-    if not oq_df.empty:
-        if "Requirement_Link" in oq_df.columns:
-            oq_req_links = set(oq_df["Requirement_Link"].dropna().astype(str).str.strip())
-        if "Test_ID" in oq_df.columns:
-            oq_test_ids = set(oq_df["Test_ID"].dropna().astype(str).str.strip())
+    ] if not frs_df.empty and "ID" in frs_df.columns else frs_df
 
     # ── R0: URS requirement with no FRS generated ────────────────────────────
     if urs_df is not None and not urs_df.empty and "Req_ID" in urs_df.columns:
-        for _, row in urs_df.iterrows():
-            uid = str(row.get("Req_ID", "")).strip()
+        for uid in urs_df["Req_ID"].map(str).str.strip():
             if uid and uid not in frs_urs_refs:
                 issues.append({
                     "Rule":           "R0",
@@ -3297,13 +5407,13 @@ def run_deterministic_validation(
     # ── R4: High-risk reqs with insufficient OQ test count ───────────────────
     # Only fires on real URS-derived FRS rows (XFRS excluded — Fix 2).
     if not frs_df_real.empty and "Risk" in frs_df_real.columns and not oq_df.empty:
-        req_link_col = "Requirement_Link" if "Requirement_Link" in oq_df.columns else None
-        if req_link_col:
-            for _, row in frs_df_real.iterrows():
+        if "Requirement_Link" in oq_df.columns:
+            oq_counts = idx["oq_link_counts"]
+            for row in frs_df_real.to_dict("records"):
                 fid       = str(row.get("ID", "")).strip()
                 risk      = str(row.get("Risk", "")).strip().lower()
                 min_tests = {"high": 3, "medium": 2, "low": 1}.get(risk, 1)
-                test_cnt  = oq_df[oq_df[req_link_col].astype(str).str.strip() == fid].shape[0]
+                test_cnt  = oq_counts.get(fid, 0)
                 if test_cnt < min_tests:
                     issues.append({
                         "Rule":            "R4",
@@ -4351,6 +6461,7 @@ _defaults = {
     "uar_file_name":        "",
     "uar_key_n":            0,
     "uar_file_was_attached": False,   # True only after a file is read this session
+    "uar_cons_result":      None,    # (uar_score_systems() result, review span, skipped files)
     # ── Audit Trail Intelligence (Periodic Review Module 1) ──────────────────
     "at_raw_df":            None,
     "at_mapped_df":         None,
@@ -4385,11 +6496,13 @@ _defaults = {
     # ── Data Integrity Monitor ────────────────────────────────────────────────
     "dim_raw_df":           None,
     "dim_result":           None,
+    "dim_cache":            None,   # {key, result, xlsx} — see _dim_cache_key
     "dim_analysis_done":    False,
     "dim_system_name":      "",
     "dim_file_name":        "",
     "dim_key_n":            0,
     "dim_accumulated_rows": [],
+    "dim_rows_gen":         0,      # bumped on every bank / clear — see _dim_cache_key
     "dim_periods_banked":   0,
 }
 for _k, _v in _defaults.items():
@@ -4965,32 +7078,28 @@ def _call_ai_with_fallback(
     system_prompt: str = "",
     max_tokens: int = 80,
     temperature: float = 0.05,
+    hedge: bool = True,
 ) -> str | None:
     """
     Try each model in cascade order. Return response text on first success.
     Returns None if all models fail — caller is responsible for deterministic fallback.
-    Permanent errors (auth/billing) skip that provider; transient errors try next.
+
+    hedge=True (default): the cascade is ranked by live per-model health and
+    the next model is fired concurrently once the current one passes its
+    p95 latency, so one slow provider no longer adds up to 20 s on the
+    interactive path. hedge=False walks the cascade strictly in order.
     """
-    from litellm import completion as _comp
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": user_prompt})
 
-    for _model in _get_ai_cascade():
-        try:
-            resp = _comp(
-                model=_model, stream=False,
-                temperature=temperature, max_tokens=max_tokens,
-                messages=messages, timeout=20,
-            )
-            candidate = resp.choices[0].message.content.strip()
-            if candidate:
-                return candidate
-        except Exception as _e:
-            # Always continue to next model — both transient and permanent failures
-            continue
-    return None
+    _run = _llm_hedged_cascade if hedge else _llm_cascade_completion
+    candidate, _ = _run(
+        messages, purpose="ai_fallback", stream=False,
+        temperature=temperature, max_tokens=max_tokens, timeout=20,
+    )
+    return candidate
 
 
 def _capture_client_ip():
@@ -5673,7 +7782,7 @@ def _validate_uar_input_file(raw_bytes: bytes, file_name: str, df: pd.DataFrame,
     # Derive candidate set from _UAR_COL_ALIASES (single source of truth) so
     # the validator matches exactly the same columns the normaliser will map.
     # All keys whose alias target is "username" are valid user identifier cols.
-    _user_candidates = {k for k, v in _UAR_COL_ALIASES.items() if v == "username"}
+    _user_candidates = _UAR_ALIASES_BY_CANON["username"]
     _user_col = _find_col(df, _user_candidates)
     _f2_passed = _user_col is not None
     _f2_detail = (f"User identifier column: '{_user_col}'" if _user_col
@@ -5707,7 +7816,7 @@ def _validate_uar_input_file(raw_bytes: bytes, file_name: str, df: pd.DataFrame,
     })
 
     # ── UAR-N1: Role/permission column exists ──────────────────────────────
-    _role_candidates = {k for k, v in _UAR_COL_ALIASES.items() if v == "role"}
+    _role_candidates = _UAR_ALIASES_BY_CANON["role"]
     _role_col = _find_col(df, _role_candidates)
     _n1_passed = _role_col is not None
     _n1_detail = (f"Role/permission column: '{_role_col}'" if _role_col
@@ -5721,8 +7830,8 @@ def _validate_uar_input_file(raw_bytes: bytes, file_name: str, df: pd.DataFrame,
     })
 
     # ── UAR-N2: Status column exists ───────────────────────────────────────
-    _status_candidates = {k for k, v in _UAR_COL_ALIASES.items()
-                          if v in ("account_status", "employment_status")}
+    _status_candidates = (_UAR_ALIASES_BY_CANON["account_status"]
+                          | _UAR_ALIASES_BY_CANON["employment_status"])
     _status_col = _find_col(df, _status_candidates)
     _n2_passed = _status_col is not None
     _n2_detail = (f"Status column: '{_status_col}'" if _status_col
@@ -5889,78 +7998,576 @@ def _render_validator_verdict(severity, title, results, evidence,
 
 
 
-def build_cia_pass1_prompt(change_spec_text: str) -> str:
-    """Extract structured change table from change specification PDF."""
-    return _PROMPT_CIA_PASS1_RAW.format(
-        change_spec_text=change_spec_text[:6000]
+def build_cia_pass1_prompt(change_spec_text: str) -> str:
+    """Extract structured change table from change specification PDF."""
+    return _PROMPT_CIA_PASS1_RAW.format(
+        change_spec_text=change_spec_text[:6000]
+    )
+
+
+def build_cia_pass2_prompt(
+    chg_csv: str,
+    frs_text: str,
+    oq_df: pd.DataFrame,
+    trace_df: pd.DataFrame
+) -> str:
+    """
+    Map each change to impact on existing FRS rows, OQ rows, and trace links.
+    Uses the trace matrix to build the relationship graph first.
+    """
+    oq_summary  = oq_df[oq_df.columns[:5]].head(80).to_csv(index=False) if not oq_df.empty else "No OQ provided"
+    trc_summary = trace_df.head(80).to_csv(index=False) if not trace_df.empty else "No traceability matrix provided"
+
+    return _PROMPT_CIA_PASS2_RAW.format(
+        chg_csv     = chg_csv,
+        frs_text    = frs_text[:4000],
+        oq_summary  = oq_summary,
+        trc_summary = trc_summary,
+    )
+
+
+def build_cia_pass3_prompt(
+    frs_impact_df: pd.DataFrame,
+    oq_impact_df:  pd.DataFrame,
+    change_spec_text: str,
+) -> str:
+    """
+    Build the Pass 3 justification prompt.
+    Only feeds Must_Update, New_Required, and Obsolete rows — the three statuses
+    that require Change Control justification strings. Needs_Review rows are
+    excluded because they do not trigger Change Control actions.
+    """
+    action_statuses = {"Must_Update", "New_Required", "Obsolete"}
+
+    frs_rows = pd.DataFrame()
+    if not frs_impact_df.empty and "Impact_Status" in frs_impact_df.columns:
+        frs_rows = frs_impact_df[
+            frs_impact_df["Impact_Status"].astype(str).isin(action_statuses)
+        ].copy()
+        frs_rows["Document_Type"] = "FRS"
+        # Rename FRS_ID → Document_ID for the unified prompt
+        if "FRS_ID" in frs_rows.columns:
+            frs_rows = frs_rows.rename(columns={"FRS_ID": "Document_ID"})
+
+    oq_rows = pd.DataFrame()
+    if not oq_impact_df.empty and "Impact_Status" in oq_impact_df.columns:
+        oq_rows = oq_impact_df[
+            oq_impact_df["Impact_Status"].astype(str).isin(action_statuses)
+        ].copy()
+        oq_rows["Document_Type"] = "OQ"
+        if "OQ_ID" in oq_rows.columns:
+            oq_rows = oq_rows.rename(columns={"OQ_ID": "Document_ID"})
+
+    # Combine and select only the columns the prompt needs
+    keep_cols = ["Document_ID", "Document_Type", "Impact_Status",
+                 "Change_Driver", "Rationale"]
+    combined  = pd.concat([frs_rows, oq_rows], ignore_index=True)
+    avail     = [c for c in keep_cols if c in combined.columns]
+    impacted_csv = combined[avail].to_csv(index=False) if not combined.empty else "No actionable rows."
+
+    return _PROMPT_CIA_PASS3_RAW.format(
+        impacted_csv      = impacted_csv,
+        change_spec_text  = change_spec_text[:4000],
+    )
+
+
+
+# ── Chunked (map-reduce) CIA mode ─────────────────────────────────────────────
+# Large vendor release notes overflow a single Pass 1/Pass 2 call — the prompt
+# builders truncate the change spec at 6000 chars and the FRS at 4000, so most
+# of a big document is silently ignored. Chunked mode extracts changes per
+# page group, then maps each batch of changes against only the FRS sections
+# that share vocabulary with it. Batches run concurrently; results are merged
+# in batch order so the output is deterministic regardless of finish order.
+_CIA_P1_CHUNK_CHARS  = 6000    # matches build_cia_pass1_prompt truncation
+_CIA_FRS_CTX_CHARS   = 4000    # matches build_cia_pass2_prompt truncation
+_CIA_BATCH_SIZE      = 8       # change items per Pass 2 batch
+_CIA_MAX_WORKERS     = 4
+_CIA_SECTION_CHARS   = 1500    # max size of one retrieved FRS section
+_CIA_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "shall", "must",
+    "will", "are", "was", "were", "has", "have", "not", "all", "any", "can",
+    "into", "when", "each", "per", "new", "system", "user", "users", "page",
+    "table", "data", "should", "may", "been", "which", "their", "its", "via",
+}
+_CIA_TOKEN_RE   = re.compile(r"[a-z][a-z0-9_]{2,}")
+_CIA_FRS_ID_RE  = re.compile(r"\b((?:X?FRS|FS|REQ)[-_]?[A-Z]*[-_]?\d+(?:\.\d+)*)\b", re.IGNORECASE)
+_CIA_SECTION_RE = re.compile(r"(?m)^(?=\s*(?:X?FRS|FS|REQ)[-_]?[A-Z]*[-_]?\d)", re.IGNORECASE)
+
+
+def _cia_tokens(text: str) -> set:
+    """Lower-case content tokens (≥3 chars, stopwords removed)."""
+    return {t for t in _CIA_TOKEN_RE.findall(str(text).lower())
+            if t not in _CIA_STOPWORDS}
+
+
+def _cia_split_frs_sections(frs_pages: list) -> list:
+    """
+    Split FRS page text into retrievable sections.
+
+    Sections start at lines that begin with an FRS-style ID (FRS-007, FS-2.1,
+    REQ-12 …); pages without IDs fall back to paragraph blocks. Oversized
+    sections are cut at _CIA_SECTION_CHARS. Returns a list of dicts:
+      {"frs_ids": [...], "owner_id": str, "text": str, "tokens": set, "order": int}
+    owner_id is the ID the section starts with ("" for untitled blocks);
+    continuation chunks of an oversized section inherit it.
+    """
+    sections = []
+    for page in frs_pages:
+        pieces = [p for p in _CIA_SECTION_RE.split(page) if p.strip()]
+        if not any(_CIA_FRS_ID_RE.match(p.strip()) for p in pieces):
+            pieces = [p for p in re.split(r"\n\s*\n", page) if p.strip()] or [page]
+        for piece in pieces:
+            piece = piece.strip()
+            _lead = _CIA_FRS_ID_RE.match(piece)
+            owner = _lead.group(1).upper() if _lead else ""
+            for start in range(0, len(piece), _CIA_SECTION_CHARS):
+                text = piece[start:start + _CIA_SECTION_CHARS]
+                sections.append({
+                    "frs_ids": sorted({m.upper() for m in _CIA_FRS_ID_RE.findall(text)}),
+                    "owner_id": owner,
+                    "text":    text,
+                    "tokens":  _cia_tokens(text),
+                    "order":   len(sections),
+                })
+    return sections
+
+
+def _cia_retrieve_frs_context(batch_df: pd.DataFrame, sections: list,
+                              idf: dict, max_chars: int = _CIA_FRS_CTX_CHARS) -> tuple:
+    """
+    Pick the FRS sections that share the most (IDF-weighted) vocabulary with
+    a batch of change items, up to max_chars. Sections are re-emitted in
+    document order so the model sees them in context.
+    Returns (frs_context_text, set_of_frs_ids_in_context).
+    """
+    batch_tokens = _cia_tokens(" ".join(
+        batch_df.astype(str).apply(" ".join, axis=1).tolist()
+    ))
+    scored = []
+    for sec in sections:
+        shared = batch_tokens & sec["tokens"]
+        if shared:
+            scored.append((sum(idf.get(t, 0.0) for t in shared), sec["order"], sec))
+    scored.sort(key=lambda s: (-s[0], s[1]))
+
+    picked, used = [], 0
+    for _, _, sec in scored:
+        if used + len(sec["text"]) > max_chars and picked:
+            continue
+        picked.append(sec)
+        used += len(sec["text"]) + 2
+        if used >= max_chars:
+            break
+    picked.sort(key=lambda s: s["order"])
+    ids = {i for sec in picked for i in sec["frs_ids"]}
+    return "\n\n".join(sec["text"] for sec in picked)[:max_chars], ids
+
+
+def _cia_scope_trace(oq_df: pd.DataFrame, trace_df: pd.DataFrame, frs_ids: set) -> tuple:
+    """
+    Narrow the OQ / trace summaries to rows linked to the retrieved FRS IDs so
+    each batch prompt carries the relevant 80 rows rather than the first 80.
+    Falls back to the unfiltered frames when nothing matches.
+    """
+    if not frs_ids or trace_df.empty:
+        return oq_df, trace_df
+    _ids = {i.upper() for i in frs_ids}
+    # Cells may hold "OQ-001; OQ-002" lists (see _build_traceability)
+    cells   = trace_df.astype(str).stack().str.upper().str.split(r"[;,]").explode().str.strip()
+    hit_idx = cells[cells.isin(_ids)].index.get_level_values(0).unique()
+    trc_hit = trace_df.loc[hit_idx]
+    if trc_hit.empty:
+        return oq_df, trace_df
+    oq_ids  = set(cells.loc[hit_idx])
+    oq_hit  = (oq_df[oq_df.iloc[:, 0].astype(str).str.strip().str.upper().isin(oq_ids)]
+               if not oq_df.empty else oq_df)
+    return (oq_hit if not oq_hit.empty else oq_df), trc_hit
+
+
+def _cia_stream(model_id: str, prompt: str, progress: dict, key, timeout: int = 300,
+                purpose: str = "cia") -> str:
+    """Streamed completion; running char count is written to progress[key]."""
+    resp = _llm_completion(
+        model=model_id, purpose=purpose, stream=True, temperature=TEMPERATURE, timeout=timeout,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user",   "content": prompt},
+        ]
+    )
+    raw = ""
+    for chunk in resp:
+        raw += (chunk.choices[0].delta.content or "") if chunk.choices else ""
+        progress[key] = len(raw)
+    raw = re.sub(r'^```[a-zA-Z]*\n?', '', raw, flags=re.MULTILINE)
+    return re.sub(r'```\s*$', '', raw, flags=re.MULTILINE).strip()
+
+
+def _cia_run_concurrent(jobs: list, fn, status_widget, label: str) -> list:
+    """
+    Run fn(job, progress, key) for each job on a thread pool and return the
+    results in job order. Each job is retried once; a second failure aborts
+    the whole run — a CIA that silently drops a batch of changes is worse
+    than no CIA. Progress is rendered from the calling (script) thread only,
+    since Streamlit widgets cannot be touched from worker threads.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    def _with_retry(i, job, progress):
+        try:
+            return fn(job, progress, i)
+        except Exception:
+            _time_mod.sleep(5)
+            return fn(job, progress, i)
+
+    progress = {}
+    results  = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=min(_CIA_MAX_WORKERS, max(len(jobs), 1))) as pool:
+        pending = {pool.submit(_with_retry, i, job, progress): i for i, job in enumerate(jobs)}
+        done_n  = 0
+        while pending:
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    for f in pending:
+                        f.cancel()
+                    raise RuntimeError(
+                        f"{label} batch {i + 1}/{len(jobs)} failed: {e}. "
+                        "Analysis aborted — partial impact results cannot be used "
+                        "as a Change Control artifact. Please retry."
+                    ) from e
+                done_n += 1
+            status_widget.text(
+                f"{label} — {done_n}/{len(jobs)} batches complete "
+                f"({sum(progress.values()):,} chars streamed)"
+            )
+    return results
+
+
+def _cia_merge_impacts(frames: list, id_col: str) -> pd.DataFrame:
+    """
+    Concatenate per-batch impact frames in batch order and drop exact repeats
+    of the same (document, change) pair that overlapping retrieval can produce.
+    "NEW" rows are never collapsed — each describes a distinct new item.
+    """
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    merged = pd.concat(frames, ignore_index=True)
+    if id_col in merged.columns and "Change_Driver" in merged.columns:
+        _id  = merged[id_col].astype(str).str.strip()
+        _key = _id.str.upper() + "|" + merged["Change_Driver"].astype(str).str.strip()
+        merged = merged[(_id.str.upper() == "NEW") | ~_key.duplicated()].reset_index(drop=True)
+    return merged
+
+
+def _cia_single_pass1(chg_text: str, model_id: str) -> tuple:
+    """Original single-call Pass 1 — returns (chg_df, raw_chg_csv)."""
+    p1_resp = _llm_completion(
+        model=model_id, purpose="cia_pass1", stream=False, temperature=TEMPERATURE,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user",   "content": build_cia_pass1_prompt(chg_text)}
+        ]
+    )
+    raw_chg = p1_resp.choices[0].message.content or ""
+    raw_chg = re.sub(r'^```[a-zA-Z]*\n?', '', raw_chg, flags=re.MULTILINE)
+    raw_chg = re.sub(r'```\s*$', '', raw_chg, flags=re.MULTILINE).strip()
+    return _csv_to_df(raw_chg), raw_chg
+
+
+def _cia_single_pass2(raw_chg: str, frs_text: str, oq_df: pd.DataFrame,
+                      trace_df: pd.DataFrame, model_id: str) -> tuple:
+    """Original single-call Pass 2 — returns (frs_impact_df, oq_impact_df)."""
+    p2_resp = _llm_completion(
+        model=model_id, purpose="cia_pass2", stream=False, temperature=TEMPERATURE,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user",   "content": build_cia_pass2_prompt(
+                raw_chg, frs_text, oq_df, trace_df
+            )}
+        ]
     )
+    raw_p2 = p2_resp.choices[0].message.content or ""
+    raw_p2 = re.sub(r'^```[a-zA-Z]*\n?', '', raw_p2, flags=re.MULTILINE)
+    raw_p2 = re.sub(r'```\s*$', '', raw_p2, flags=re.MULTILINE).strip()
 
+    parts = [p.strip() for p in raw_p2.split("|||")]
+    frs_impact_df = _csv_to_df(parts[0]) if len(parts) > 0 else pd.DataFrame()
+    oq_impact_df  = _csv_to_df(parts[1]) if len(parts) > 1 else pd.DataFrame()
+    return frs_impact_df, oq_impact_df
+
+
+def _cia_split_page(page: str, limit: int = _CIA_P1_CHUNK_CHARS) -> list:
+    """Cut a page longer than `limit` at line breaks (a single overlong line
+    is hard-cut) so no chunk is truncated by build_cia_pass1_prompt."""
+    if len(page) <= limit:
+        return [page]
+    pieces, cur = [], ""
+    for line in page.split("\n"):
+        while len(line) > limit:
+            if cur:
+                pieces.append(cur)
+                cur = ""
+            pieces.append(line[:limit])
+            line = line[limit:]
+        if cur and len(cur) + 1 + len(line) > limit:
+            pieces.append(cur)
+            cur = ""
+        cur = f"{cur}\n{line}" if cur else line
+    if cur:
+        pieces.append(cur)
+    return pieces
+
+
+def _cia_chunked_pass1(chg_pages: list, model_id: str, status_widget) -> tuple:
+    """Pass 1 over page groups of ≤ _CIA_P1_CHUNK_CHARS; Change_IDs renumbered globally.
+    Pages longer than a chunk are split across chunks rather than truncated."""
+    chunks, cur = [], ""
+    for page in (p for pg in chg_pages for p in _cia_split_page(pg)):
+        if cur and len(cur) + 1 + len(page) > _CIA_P1_CHUNK_CHARS:
+            chunks.append(cur)
+            cur = ""
+        cur = f"{cur}\n{page}" if cur else page
+    if cur:
+        chunks.append(cur)
+
+    raws = _cia_run_concurrent(
+        chunks,
+        lambda text, prog, k: _cia_stream(model_id, build_cia_pass1_prompt(text), prog, k,
+                                          purpose="cia_pass1_chunk"),
+        status_widget, "🔍 Pass 1 — extracting changes",
+    )
+    frames = [df for df in (_csv_to_df(r) for r in raws) if not df.empty]
+    if not frames:
+        return pd.DataFrame(), ""
+    chg_df = _remove_duplicate_headers(pd.concat(frames, ignore_index=True))
+    chg_df = chg_df.dropna(how="all").reset_index(drop=True)
+    if "Change_ID" in chg_df.columns:
+        chg_df["Change_ID"] = [f"CHG-{i + 1:03d}" for i in range(len(chg_df))]
+    return chg_df, chg_df.to_csv(index=False)
+
+
+def _cia_chunked_pass2(chg_df: pd.DataFrame, frs_pages: list, oq_df: pd.DataFrame,
+                       trace_df: pd.DataFrame, model_id: str, status_widget) -> tuple:
+    """Map each change batch against its retrieved FRS context; merge deterministically."""
+    import math as _math
+
+    sections = _cia_split_frs_sections(frs_pages)
+    df_count: dict = {}
+    for sec in sections:
+        for t in sec["tokens"]:
+            df_count[t] = df_count.get(t, 0) + 1
+    idf = {t: _math.log((1 + len(sections)) / (1 + n)) + 1.0 for t, n in df_count.items()}
+
+    batches = [chg_df.iloc[i:i + _CIA_BATCH_SIZE]
+               for i in range(0, len(chg_df), _CIA_BATCH_SIZE)]
+
+    def _map_batch(batch_df, prog, k):
+        frs_ctx, frs_ids   = _cia_retrieve_frs_context(batch_df, sections, idf)
+        oq_scope, trc_scope = _cia_scope_trace(oq_df, trace_df, frs_ids)
+        raw = _cia_stream(model_id, build_cia_pass2_prompt(
+            batch_df.to_csv(index=False), frs_ctx, oq_scope, trc_scope), prog, k,
+            purpose="cia_pass2_batch")
+        parts = [p.strip() for p in raw.split("|||")]
+        return (_csv_to_df(parts[0]) if len(parts) > 0 else pd.DataFrame(),
+                _csv_to_df(parts[1]) if len(parts) > 1 else pd.DataFrame())
+
+    results = _cia_run_concurrent(batches, _map_batch, status_widget,
+                                  "🗺️ Pass 2 — impact mapping")
+    return (_cia_merge_impacts([r[0] for r in results], "FRS_ID"),
+            _cia_merge_impacts([r[1] for r in results], "OQ_ID"))
+
+
+# ── Deterministic CIA pre-matcher ─────────────────────────────────────────────
+# Before Pass 2, every change item is scored against every FRS row locally:
+# explicit FRS ID citations, IDF-weighted token overlap with the FRS text,
+# and module/screen names harvested from the trace matrix. Unambiguous
+# (change, FRS) links are resolved here, reproducibly. Every change still goes
+# to Pass 2 — retirement, NEW rows, indirect and OQ impacts need the model —
+# with its resolved links (Prematched_FRS) or ranked candidates
+# (Candidate_FRS) attached as hint columns. Resolved links the model does not
+# return are added back after Pass 2, so they can never be lost.
+_CIA_PM_RESOLVE_SCORE  = 0.60   # top candidate must reach this …
+_CIA_PM_RESOLVE_MARGIN = 0.60   # … and the runner-up must be below top × margin
+_CIA_PM_CANDIDATE_MIN  = 0.15   # weakest candidate still worth showing the model
+_CIA_PM_MODULE_BONUS   = 0.25   # Affected_Area ↔ trace module/screen name match
+_CIA_PM_MAX_CANDIDATES = 5
+_CIA_PM_MODULE_COL_HINTS = ("module", "screen", "area", "function", "feature",
+                            "component", "category", "process")
+
+# Change_Type → Impact_Status when a link is resolved without the model
+_CIA_PM_STATUS_BY_TYPE = {
+    "removed_feature":    "Obsolete",
+    "new_feature":        "Needs_Review",
+    "modified_behaviour": "Must_Update",
+    "modified_behavior":  "Must_Update",
+    "config_change":      "Must_Update",
+    "performance_change": "Must_Update",
+    "security_change":    "Must_Update",
+    "bug_fix":            "Needs_Review",
+}
+_CIA_PM_RISK_BY_SCOPE = {
+    "critical": "GxP_Critical", "high": "Data_Integrity",
+    "medium":   "Business",     "low":  "Cosmetic",
+}
 
-def build_cia_pass2_prompt(
-    chg_csv: str,
-    frs_text: str,
-    oq_df: pd.DataFrame,
-    trace_df: pd.DataFrame
-) -> str:
-    """
-    Map each change to impact on existing FRS rows, OQ rows, and trace links.
-    Uses the trace matrix to build the relationship graph first.
-    """
-    oq_summary  = oq_df[oq_df.columns[:5]].head(80).to_csv(index=False) if not oq_df.empty else "No OQ provided"
-    trc_summary = trace_df.head(80).to_csv(index=False) if not trace_df.empty else "No traceability matrix provided"
 
-    return _PROMPT_CIA_PASS2_RAW.format(
-        chg_csv     = chg_csv,
-        frs_text    = frs_text[:4000],
-        oq_summary  = oq_summary,
-        trc_summary = trc_summary,
-    )
+def _cia_trace_cols(trace_df: pd.DataFrame) -> tuple:
+    """Detect (frs_col, oq_col) in a traceability matrix export — either may be None."""
+    frs_col = next((c for c in trace_df.columns
+                    if "frs" in c.lower() and "ref" not in c.lower().replace("frs_ref","x")), None)
+    frs_col = frs_col or next((c for c in trace_df.columns if "frs" in c.lower()), None)
+    oq_col  = next((c for c in trace_df.columns
+                    if "test_id" in c.lower() or c.lower().startswith("oq")), None)
+    return frs_col, oq_col
 
 
-def build_cia_pass3_prompt(
-    frs_impact_df: pd.DataFrame,
-    oq_impact_df:  pd.DataFrame,
-    change_spec_text: str,
-) -> str:
+def _cia_build_frs_index(frs_pages: list, trace_df: pd.DataFrame) -> dict:
     """
-    Build the Pass 3 justification prompt.
-    Only feeds Must_Update, New_Required, and Obsolete rows — the three statuses
-    that require Change Control justification strings. Needs_Review rows are
-    excluded because they do not trigger Change Control actions.
+    Token index over FRS rows: text from FRS sections owned by each ID plus
+    any descriptive trace-matrix text for that ID. Module/screen names come
+    from trace columns whose header looks like a module/area/screen field.
+    Returns {"tokens": {frs_id: set}, "modules": {frs_id: set}, "idf": {tok: w}}.
     """
-    action_statuses = {"Must_Update", "New_Required", "Obsolete"}
-
-    frs_rows = pd.DataFrame()
-    if not frs_impact_df.empty and "Impact_Status" in frs_impact_df.columns:
-        frs_rows = frs_impact_df[
-            frs_impact_df["Impact_Status"].astype(str).isin(action_statuses)
-        ].copy()
-        frs_rows["Document_Type"] = "FRS"
-        # Rename FRS_ID → Document_ID for the unified prompt
-        if "FRS_ID" in frs_rows.columns:
-            frs_rows = frs_rows.rename(columns={"FRS_ID": "Document_ID"})
-
-    oq_rows = pd.DataFrame()
-    if not oq_impact_df.empty and "Impact_Status" in oq_impact_df.columns:
-        oq_rows = oq_impact_df[
-            oq_impact_df["Impact_Status"].astype(str).isin(action_statuses)
-        ].copy()
-        oq_rows["Document_Type"] = "OQ"
-        if "OQ_ID" in oq_rows.columns:
-            oq_rows = oq_rows.rename(columns={"OQ_ID": "Document_ID"})
+    import math as _math
+
+    texts: dict = {}
+    for sec in _cia_split_frs_sections(frs_pages):
+        if sec["owner_id"]:
+            texts.setdefault(sec["owner_id"], []).append(sec["text"])
+
+    modules: dict = {}
+    if trace_df is not None and not trace_df.empty:
+        frs_col, oq_col = _cia_trace_cols(trace_df)
+        if frs_col:
+            mod_cols  = [c for c in trace_df.columns
+                         if any(h in c.lower() for h in _CIA_PM_MODULE_COL_HINTS)]
+            desc_cols = [c for c in trace_df.columns
+                         if "desc" in c.lower() or "title" in c.lower()]
+            for row in trace_df.to_dict("records"):
+                for fid in re.split(r"[;,]", str(row.get(frs_col, ""))):
+                    fid = fid.strip().upper()
+                    if not fid or fid in ("NAN", "—", "-", "N/A"):
+                        continue
+                    texts.setdefault(fid, []).extend(
+                        str(row.get(c, "")) for c in desc_cols)
+                    modules.setdefault(fid, set()).update(
+                        str(row.get(c, "")).strip().lower() for c in mod_cols
+                        if str(row.get(c, "")).strip().lower() not in ("", "nan", "n/a"))
+
+    tokens = {fid: _cia_tokens(" ".join(t)) for fid, t in texts.items()}
+    df_count: dict = {}
+    for toks in tokens.values():
+        for t in toks:
+            df_count[t] = df_count.get(t, 0) + 1
+    n = len(tokens)
+    idf = {t: _math.log((1 + n) / (1 + c)) + 1.0 for t, c in df_count.items()}
+    return {"tokens": tokens, "modules": modules, "idf": idf}
+
+
+def _cia_prematch(chg_df: pd.DataFrame, frs_pages: list, trace_df: pd.DataFrame) -> dict:
+    """
+    Score every change item against the FRS index and annotate the change table.
 
-    # Combine and select only the columns the prompt needs
-    keep_cols = ["Document_ID", "Document_Type", "Impact_Status",
-                 "Change_Driver", "Rationale"]
-    combined  = pd.concat([frs_rows, oq_rows], ignore_index=True)
-    avail     = [c for c in keep_cols if c in combined.columns]
-    impacted_csv = combined[avail].to_csv(index=False) if not combined.empty else "No actionable rows."
+    Returns:
+      resolved_frs_df  FRS_Impact rows for the unambiguous (change, FRS) links
+      hinted_df        every change row + Prematched_FRS / Candidate_FRS hints
+      candidates       Change_ID → [(FRS_ID, score), …] best first
+      stats            counts for the status line / audit log
+    """
+    index  = _cia_build_frs_index(frs_pages, trace_df)
+    known  = set(index["tokens"]) | set(index["modules"])
+    idf    = index["idf"]
+
+    resolved, ambiguous_idx, candidates, prematched = [], [], {}, []
+    for pos, row in enumerate(chg_df.to_dict("records")):
+        cid   = str(row.get("Change_ID", f"CHG-{pos + 1:03d}")).strip()
+        desc  = str(row.get("Description", "")).strip()
+        area  = str(row.get("Affected_Area", "")).strip().lower()
+        blob  = " ".join(str(v) for v in row.values())
+
+        cited = sorted({m.upper() for m in _CIA_FRS_ID_RE.findall(blob)} & known)
+        if cited:
+            scored = [(fid, 1.0) for fid in cited]
+            how    = "explicit"
+        else:
+            c_tok = _cia_tokens(f"{area} {desc}")
+            denom = sum(idf.get(t, 1.0) for t in c_tok) or 1.0
+            scored = []
+            for fid in known:
+                s = sum(idf[t] for t in c_tok & index["tokens"].get(fid, set())) / denom
+                mods = index["modules"].get(fid, set())
+                if area and any(area == m or area in m or m in area for m in mods):
+                    s += _CIA_PM_MODULE_BONUS
+                if s >= _CIA_PM_CANDIDATE_MIN:
+                    scored.append((fid, round(min(s, 1.0), 3)))
+            scored.sort(key=lambda x: (-x[1], x[0]))
+            how = "lexical"
+        candidates[cid] = scored[:_CIA_PM_MAX_CANDIDATES]
+
+        top    = scored[0][1] if scored else 0.0
+        second = scored[1][1] if len(scored) > 1 else 0.0
+        if how == "explicit":
+            links = scored
+        elif top >= _CIA_PM_RESOLVE_SCORE and second < top * _CIA_PM_RESOLVE_MARGIN:
+            links = scored[:1]
+        else:
+            ambiguous_idx.append(pos)
+            prematched.append("")
+            continue
+        prematched.append("; ".join(fid for fid, _ in links))
+
+        status = _CIA_PM_STATUS_BY_TYPE.get(
+            str(row.get("Change_Type", "")).strip().lower(), "Needs_Review")
+        risk   = _CIA_PM_RISK_BY_SCOPE.get(
+            str(row.get("Impact_Scope", "")).strip().lower(), "Business")
+        for fid, score in links:
+            resolved.append({
+                "FRS_ID":           fid,
+                "Change_Driver":    cid,
+                "Impact_Status":    status,
+                "Confidence_Level": "High" if how == "explicit" else "Medium",
+                "Risk_Category":    risk,
+                "Rationale":        (
+                    f"Deterministic pre-match: {cid} cites {fid} explicitly."
+                    if how == "explicit" else
+                    f"Deterministic pre-match: {cid} shares its key terms with "
+                    f"{fid} (score {score:.2f}, no competing FRS)."
+                ),
+                "Action_Required":  (
+                    f"Retire {fid} — {desc}" if status == "Obsolete" else
+                    f"Update {fid} to reflect {cid}: {desc}" if status == "Must_Update" else
+                    f"Review {fid} against {cid}: {desc}"
+                ),
+            })
 
-    return _PROMPT_CIA_PASS3_RAW.format(
-        impacted_csv      = impacted_csv,
-        change_spec_text  = change_spec_text[:4000],
-    )
+    hinted_df = chg_df.copy()
+    cids = [str(r.get("Change_ID", f"CHG-{p + 1:03d}")).strip()
+            for p, r in enumerate(chg_df.to_dict("records"))]
+    hinted_df["Prematched_FRS"] = prematched
+    hinted_df["Candidate_FRS"]  = [
+        "" if pm else ("; ".join(f"{fid} ({s:.2f})" for fid, s in candidates.get(cid, []))
+                       or "none")
+        for cid, pm in zip(cids, prematched)
+    ]
 
+    return {
+        "resolved_frs_df": pd.DataFrame(resolved, columns=[
+            "FRS_ID", "Change_Driver", "Impact_Status", "Confidence_Level",
+            "Risk_Category", "Rationale", "Action_Required"]),
+        "hinted_df":       hinted_df.reset_index(drop=True),
+        "candidates":      candidates,
+        "stats": {
+            "changes":   len(chg_df),
+            "resolved":  len(chg_df) - len(ambiguous_idx),
+            "ambiguous": len(ambiguous_idx),
+            "frs_rows":  len(index["tokens"]),
+        },
+    }
 
 
 def run_cia_analysis(
@@ -5970,15 +8577,23 @@ def run_cia_analysis(
     trace_df: pd.DataFrame,
     model_id: str,
     status_widget,
-    progress_widget
+    progress_widget,
+    chunked: bool = None,
+    prematch: bool = False,
 ) -> dict:
     """
     Full Change Impact Analysis pipeline.
     Returns dict with keys: chg_df, frs_impact_df, oq_impact_df,
     justification_df, cia_gap_df, summary
-    """
-    from litellm import completion as _completion
 
+    chunked: None (default) switches to map-reduce mode automatically when
+    the change spec or FRS exceed what a single Pass 1/Pass 2 prompt can
+    carry; True/False force it on/off.
+
+    prematch: resolve unambiguous change→FRS links locally (_cia_prematch),
+    pass them to Pass 2 as hints and add back any the model leaves out.
+    Off by default until its output is shown to match the plain run.
+    """
     # Extract text from PDFs
     status_widget.text("📄 Extracting change specification text...")
     progress_widget.progress(0.1)
@@ -5988,20 +8603,17 @@ def run_cia_analysis(
     frs_pages  = extract_pages(frs_bytes)
     frs_text   = "\n".join(frs_pages)
 
+    if chunked is None:
+        chunked = (len(chg_text) > _CIA_P1_CHUNK_CHARS
+                   or len(frs_text) > _CIA_FRS_CTX_CHARS)
+
     # Pass 1 — extract structured change table
     status_widget.text("🔍 Pass 1 — Extracting structured change table from spec...")
     progress_widget.progress(0.25)
-    p1_resp = _completion(
-        model=model_id, stream=False, temperature=TEMPERATURE,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user",   "content": build_cia_pass1_prompt(chg_text)}
-        ]
-    )
-    raw_chg = p1_resp.choices[0].message.content or ""
-    raw_chg = re.sub(r'^```[a-zA-Z]*\n?', '', raw_chg, flags=re.MULTILINE)
-    raw_chg = re.sub(r'```\s*$', '', raw_chg, flags=re.MULTILINE).strip()
-    chg_df  = _csv_to_df(raw_chg)
+    if chunked:
+        chg_df, raw_chg = _cia_chunked_pass1(chg_pages, model_id, status_widget)
+    else:
+        chg_df, raw_chg = _cia_single_pass1(chg_text, model_id)
 
     if chg_df.empty:
         raise RuntimeError(
@@ -6012,24 +8624,29 @@ def run_cia_analysis(
     status_widget.text(f"✅ {len(chg_df)} changes extracted. Running impact mapping...")
     progress_widget.progress(0.5)
 
+    # Deterministic pre-match — every change still reaches the model, with
+    # its resolved links / candidates as hint columns
+    pm_frs_df, llm_chg_df, prematch_stats = pd.DataFrame(), chg_df, {}
+    if prematch:
+        pm = _cia_prematch(chg_df, frs_pages, trace_df)
+        pm_frs_df, llm_chg_df, prematch_stats = (
+            pm["resolved_frs_df"], pm["hinted_df"], pm["stats"])
+        status_widget.text(
+            f"🧮 Pre-match — {prematch_stats['resolved']} change(s) linked "
+            f"deterministically, {prematch_stats['ambiguous']} left to the model..."
+        )
+        raw_chg = llm_chg_df.to_csv(index=False)
+
     # Pass 2 — impact mapping
     status_widget.text("🗺️ Pass 2 — Mapping changes to existing FRS and OQ rows...")
-    p2_resp = _completion(
-        model=model_id, stream=False, temperature=TEMPERATURE,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user",   "content": build_cia_pass2_prompt(
-                raw_chg, frs_text, oq_df, trace_df
-            )}
-        ]
-    )
-    raw_p2 = p2_resp.choices[0].message.content or ""
-    raw_p2 = re.sub(r'^```[a-zA-Z]*\n?', '', raw_p2, flags=re.MULTILINE)
-    raw_p2 = re.sub(r'```\s*$', '', raw_p2, flags=re.MULTILINE).strip()
-
-    parts = [p.strip() for p in raw_p2.split("|||")]
-    frs_impact_df = _csv_to_df(parts[0]) if len(parts) > 0 else pd.DataFrame()
-    oq_impact_df  = _csv_to_df(parts[1]) if len(parts) > 1 else pd.DataFrame()
+    if chunked:
+        frs_impact_df, oq_impact_df = _cia_chunked_pass2(
+            llm_chg_df, frs_pages, oq_df, trace_df, model_id, status_widget)
+    else:
+        frs_impact_df, oq_impact_df = _cia_single_pass2(
+            raw_chg, frs_text, oq_df, trace_df, model_id)
+    # Model rows first: a pre-matched (FRS, change) pair only fills a gap
+    frs_impact_df = _cia_merge_impacts([frs_impact_df, pm_frs_df], "FRS_ID")
 
     # ── Trace-Propagated Impact — pandas merge approach ──────────────────────
     # Guarantees 100% compliance: even if the AI missed a linked OQ test,
@@ -6045,11 +8662,7 @@ def run_cia_analysis(
         progress_widget.progress(0.75)
 
         # Step 1 — Detect column names flexibly (handles varied export formats)
-        frs_col = next((c for c in trace_df.columns
-                        if "frs" in c.lower() and "ref" not in c.lower().replace("frs_ref","x")), None)
-        frs_col = frs_col or next((c for c in trace_df.columns if "frs" in c.lower()), None)
-        oq_col  = next((c for c in trace_df.columns
-                        if "test_id" in c.lower() or c.lower().startswith("oq")), None)
+        frs_col, oq_col = _cia_trace_cols(trace_df)
 
         if frs_col and oq_col:
             # Step 2 — Build a clean bridge: trace rows where FRS col is populated
@@ -6190,8 +8803,8 @@ def run_cia_analysis(
         status_widget.text("✍️ Pass 3 — Generating GxP justification strings for Change Control...")
         progress_widget.progress(0.85)
 
-        p3_resp = _completion(
-            model=model_id, stream=False, temperature=0.1,  # lower temp for deterministic phrasing
+        p3_resp = _llm_completion(
+            model=model_id, purpose="cia_pass3", stream=False, temperature=0.1,  # lower temp for deterministic phrasing
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user",   "content": build_cia_pass3_prompt(
@@ -6287,6 +8900,8 @@ def run_cia_analysis(
         "trace_coverage_pct":  trace_coverage_pct,
         "orphan_oq_count":     orphan_oq_count,
         "trace_coverage_ok":   trace_coverage_ok,
+        "prematch_resolved":   prematch_stats.get("resolved", 0),
+        "prematch_ambiguous":  prematch_stats.get("ambiguous", len(chg_df)),
     }
 
     return {
@@ -6711,6 +9326,12 @@ def show_change_impact(user: str, role: str, model_id: str):
         m5.metric("🔗 Trace Coverage",      f"{trc_pct}%",
                   delta=f"{orphan_cnt} orphan OQ" if orphan_cnt > 0 else "intact",
                   delta_color="inverse" if orphan_cnt > 0 else "off")
+        if s.get("prematch_resolved"):
+            st.caption(
+                f"🧮 Deterministic pre-match linked {s['prematch_resolved']} of "
+                f"{s['total_changes']} change(s) before Pass 2 — links the model "
+                f"did not return carry a \"Deterministic pre-match\" Rationale."
+            )
 
         # Colour-coded hero cards
         _c1, _c2, _c3, _c4 = st.columns(4)
@@ -7002,6 +9623,207 @@ _AT_REQUIRED_COLS = {
     "status":      "Workflow Status / State (optional — Rule 20 Status Reversal)",
 }
 
+# ── AT rule toggle defaults ───────────────────────────────────────────────────
+# show_audit_trail() seeds the at_rN_on session keys from this; headless runs
+# (batch_review.py) pass it straight to at_score_events().
+# v96 — 17-rule ruleset. Active toggles default ON; dropped rules default OFF
+# and are hidden from the UI. Old toggle keys preserved (not renamed) so that
+# existing session state and saved configurations continue to load cleanly.
+# See AT Rules Spec v2.0 §1 for the v96 ruleset and §2 for the dropped rules.
+# Rule 17 (Workflow Status Reversal) was re-instated post-review per QA-manager
+# feedback that it is the #1 fraud-hiding pattern. See _RULE_NUM_REMAP for
+# internal-to-UI rule number translation.
+_AT_RULE_DEFAULTS = {
+    # ── v96 Critical (6) ──────────────────────────────────────────────────
+    "at_r6_on":  True,    # v96 #1  Record Reconstruction
+    "at_r7_on":  True,    # v96 #2  Audit Trail Integrity Event
+    "at_r11_on": True,    # v96 #3  Timestamp Reversal
+    "at_r12_on": True,    # v96 #4  Service / Shared Account
+    "at_r18_on": True,    # v96 #5  Self-Approval SoD Violation
+    "at_r19_on": True,    # v96 #6  Modification After Approval
+    # ── v96 High (8) ──────────────────────────────────────────────────────
+    "at_r1_on":  True,    # v96 #7  Vague Rationale
+    "at_r4_on":  False,   # v96 #8  Change Control Drift — T2, default OFF (threshold-sensitive)
+    "at_r5_on":  True,    # v96 #9  Failed Login → Data Manipulation (narrowed)
+    "at_r8_on":  True,    # v96 #10 Privileged User Modification (merged 3+8)
+    "at_r15_on": True,    # v96 #11 Missing Timestamp
+    "at_r16_on": True,    # v96 #12 Missing User Attribution
+    "at_r17_on": True,    # v96 #13 Missing Before/After Values
+    # ── v96 Medium (2) — T2 rules default OFF ─────────────────────────────
+    # T2 = Tier-2 confidence: statistically valid but sensitive to customer
+    # environment (shift patterns, global teams, bulk-update workflows).
+    # Enable after reviewing your organization's operational patterns.
+    "at_r2_on":  True,    # v96 #15 Contemporaneous Burst — T1, stays ON
+    # ── v96 Critical (re-instated) ────────────────────────────────────────
+    "at_r20_on": True,    # v96 #17 Workflow Status Reversal — re-enabled per QA review
+    # ── DROPPED in v96 — default OFF, hidden from UI ──────────────────────
+    "at_r3_on":  False,   # merged into v96 #10 via at_r8_on
+    "at_r9_on":  False,   # Timestamp Gap — dropped (weekend/low-activity noise)
+    "at_r13_on": False,   # Dormant Account — moved to UAR U11
+    "at_r14_on": False,   # First-Time Behavior — dropped (UAR U12 also dropped per UAR v1.2)
+    "at_r21_on": False,   # Role/Permission Change — dropped (UAR U13 also dropped per UAR v1.2)
+    "at_r22_on": False,   # Duplicate Timestamp — dropped (sub-second noise)
+    "at_r23_on": False,   # Missing Record ID — dropped (overlaps Rule 13)
+    "at_r24_on": False,   # Duplicate Rows — dropped (data quality, not compliance)
+}
+
+# ── v96 column auto-mapper (improved) ──────────────────────────────────────────
+# The previous implementation matched only on substring containment,
+# which failed for common no-separator variants like:
+#   recordid → record_id, userid → user_id, tablename → record_type
+# New approach: (1) collapse all separators (_, -, space, dot, slash),
+# (2) consult a synonym table for semantic aliases, (3) fall back to
+# substring containment on the collapsed strings.
+_AT_COLUMN_SYNONYMS = {
+    # canonical_field: tuple of accepted aliases (collapsed, lowercase)
+    "timestamp":   ("timestamp", "datetime", "eventtime", "eventdate",
+                    "actiontime", "actiondate", "logtime", "logdate",
+                    "occurredat", "createdat", "modifiedat",
+                    "auditdate", "audittime", "audittimestamp",
+                    "evttime", "evtdate", "trxtime", "trxdate",
+                    "performedat"),
+    "user_id":     ("userid", "username", "login", "loginid",
+                    "actor", "performedby", "modifiedby", "executedby",
+                    "operator", "useraccount", "actuser", "eventuser",
+                    "auditor", "createdby", "changedby", "userlogin",
+                    "user", "uid"),  # short — Pass 1 exact-match only
+    "action_type": ("actiontype", "eventtype", "operation",
+                    "operationtype", "activitytype",
+                    "transactiontype", "auditaction", "actiontaken",
+                    "evttype", "trxtype", "auditevent",
+                    "action", "event", "tcode"),  # short — Pass 1 exact-match only
+    "record_id":   ("recordid", "recid", "rowid", "objectid",
+                    "entityid", "primarykey", "batchid", "sampleid",
+                    "caseid", "subjectid", "rec_no", "recno", "objid",
+                    "docnum", "docid"),  # short — Pass 1 exact-match only
+    "record_type": ("recordtype", "tablename", "objecttype",
+                    "entitytype", "objectname", "tableof",
+                    "modulename", "tablename", "tabname", "objtype",
+                    "table"),  # short — Pass 1 exact-match only
+    "role":        ("role", "userrole", "rolename",
+                    "permissionlevel", "accesslevel", "userlevel",
+                    "grouprole", "groupname", "userprofile",
+                    "rolelabel"),
+    "comments":    ("comments", "comment", "reason", "changereason",
+                    "rationale", "justification", "remark", "remarks",
+                    "notes", "description", "explanation",
+                    "auditcomment", "modreason", "changenotes"),
+    "new_value":   ("newvalue", "tovalue", "currentvalue",
+                    "aftervalue", "valueafter", "newdata", "newval",
+                    "afterdata", "tovalvalue"),
+    "old_value":   ("oldvalue", "fromvalue", "previousvalue",
+                    "beforevalue", "valuebefore", "olddata",
+                    "originalvalue", "oldval", "beforedata", "priorvalue"),
+    "status":      ("status", "state", "workflow", "workflowstatus",
+                    "stagestatus", "approvalstatus",
+                    "lifecyclestate", "wfstate", "wfstatus",
+                    "currentstate", "currentstatus"),
+}
+
+
+def _at_collapse(s: str) -> str:
+    """Lowercase + remove all common field separators."""
+    return ''.join(ch for ch in str(s).lower()
+                   if ch.isalnum())
+
+
+# Pass 2 aliases (≥ 5 chars) and Pass 3 collapsed field names, compiled once.
+_AT_CONTAIN_ALIASES = {f: tuple(a for a in aliases if a and len(a) >= 5)
+                       for f, aliases in _AT_COLUMN_SYNONYMS.items()}
+_AT_ALIAS_KIND      = _col_alias_kind("at", _AT_COLUMN_SYNONYMS)
+
+
+def _at_autodetect_one(field: str, collapsed_cols: list) -> str:
+    """_at_autodetect_column for one field over [(column, collapsed)]."""
+    aliases = _AT_COLUMN_SYNONYMS.get(field, ())
+    # Pass 1: exact alias match
+    for col, ccol in collapsed_cols:
+        if ccol in aliases:
+            return col
+    # Pass 2: alias ⊂ column (one-way, alias ≥ 5 chars)
+    contain = _AT_CONTAIN_ALIASES.get(field, ())
+    for col, ccol in collapsed_cols:
+        for alias in contain:
+            if alias in ccol:
+                return col
+    # Pass 3: canonical field name in column
+    fcol = _at_collapse(field)
+    if len(fcol) >= 5:
+        for col, ccol in collapsed_cols:
+            if fcol in ccol:
+                return col
+    return "(not in file)"
+
+
+def _at_autodetect_all(columns: list) -> dict:
+    """{field: detected column} for every _AT_COLUMN_SYNONYMS field."""
+    collapsed_cols = [(c, _at_collapse(c)) for c in columns]
+    return {f: _at_autodetect_one(f, collapsed_cols) for f in _AT_COLUMN_SYNONYMS}
+
+
+def _at_autodetect_column(field: str, columns) -> str:
+    """Find best-match column for a canonical field name.
+
+    Algorithm — strict, conservative, false-negative-preferring:
+      Pass 1. EXACT alias match — column collapsed equals one of the
+              synonyms for this field. Highest confidence; returns
+              immediately on first hit.
+      Pass 2. CONTAINMENT — alias appears INSIDE the collapsed column
+              name (e.g. alias 'userid' in collapsed 'systemuserid').
+              Direction is one-way: alias ⊂ column, never the reverse.
+              Min alias length 5 to avoid 'action' matching 'actiontime'.
+      Pass 3. CANONICAL FIELD NAME — collapsed canonical name in
+              collapsed column. Only triggers for fields whose name
+              is itself a common column header.
+    Returns "(not in file)" if no pass yields a match — this is
+    preferred over a wrong match because the user can still pick
+    manually from the dropdown.
+    The whole header row is resolved once per layout (_col_alias_resolve).
+    """
+    hit = _col_alias_resolve(_AT_ALIAS_KIND, columns, _at_autodetect_all).get(field)
+    if hit is None:   # field without a synonym entry: Pass 3 only
+        hit = _at_autodetect_one(field, [(c, _at_collapse(c)) for c in columns])
+    return hit
+
+
+def _at_read_table(raw: bytes, file_name: str) -> tuple:
+    """Read an AT upload (CSV or Excel) as all-string columns.
+
+    Returns (df, sheet_names, sheet_used); both sheet values are None for CSV.
+    Excel: skip "Usage Instructions"-style sheets and prefer one whose name
+    mentions audit / log / data / trail, otherwise the first data sheet.
+    """
+    if file_name.lower().endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(raw), dtype=str,
+                         low_memory=False).fillna("")
+        return df, None, None
+    xl       = pd.ExcelFile(io.BytesIO(raw))
+    sheets   = xl.sheet_names
+    SKIP     = {"usage instructions", "usage", "instructions",
+                "readme", "read me", "guide"}
+    data_sheets = [s for s in sheets
+                   if s.strip().lower() not in SKIP]
+    preferred = [s for s in data_sheets
+                 if any(kw in s.lower()
+                        for kw in ("audit", "log", "data", "trail"))]
+    sheet_to_use = (preferred or data_sheets or sheets)[0]
+    df = pd.read_excel(io.BytesIO(raw), sheet_name=sheet_to_use,
+                       dtype=str).fillna("")
+    return df, list(sheets), sheet_to_use
+
+
+def _at_review_period(mdf: pd.DataFrame) -> tuple:
+    """(start, end, n_unparsed) from a mapped frame's timestamp column —
+    dd-Mon-YYYY strings, blank when no timestamp parses."""
+    _ts_raw = pd.to_datetime(mdf["timestamp"], format=_sniff_ts_format(mdf["timestamp"]),
+                             errors="coerce").dropna()
+    _ts_failed = len(mdf) - len(_ts_raw)
+    if _ts_raw.empty:
+        return "", "", _ts_failed
+    return (_ts_raw.min().strftime("%d-%b-%Y"),
+            _ts_raw.max().strftime("%d-%b-%Y"), _ts_failed)
+
+
 # Vague rationale terms that trigger Rule 1 (standalone = High; 2-word combos = Medium)
 _AT_VAGUE_TERMS = {"fixed","update","updated","error","changed","change","test",
                    "misc","other","n/a","na","correction","corrected","edit","edited",
@@ -7609,7 +10431,378 @@ def _suggested_disposition(row) -> tuple:
             "No significant risk indicator was detected — a brief review "
             "and documented disposition is sufficient.")
 
-def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
+# ── AT scoring profiler ───────────────────────────────────────────────────────
+# Wall time, rows examined and rows fired per stage of at_score_events(), so a
+# slow run can be traced to the rule block that caused it instead of guessed
+# from the "Analysis may take 3–6 minutes" banner. The scoring body calls
+# mark() at the end of each stage — a stage is everything since the previous
+# mark — which keeps the 2,000-line body at its current indentation.
+# The finished profile is shown in the analysis log, written to the Detection
+# Logic sheet's Performance block and saved as JSON under _AT_PROFILE_DIR for
+# regression tracking across engine versions.
+_AT_PROFILE_DIR  = os.path.join(os.path.dirname(DB_PATH), "perf_profiles")
+_AT_PROFILE_KEEP = 200          # newest JSON profiles kept on disk
+
+
+class _AtRuleProfiler:
+    """Checkpoint timer for the AT scoring body. Entered as a context manager
+    by at_score_events(); the body bind()s its working frame once copied and
+    calls mark(stage, *score_cols) as each stage finishes."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df      = df
+        self.stages  = []
+        self.t0      = None
+        self.t_last  = None
+        self.workers = 1
+
+    def bind(self, df: pd.DataFrame):
+        """Count rows and fired scores on df from here on (the body scores a copy)."""
+        self.df = df
+
+    def __enter__(self):
+        self.t0 = self.t_last = _time_mod.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.t_last is not None:
+            # Anything after the last mark (sorting, sentinel columns) is
+            # still scoring time — book it so the stages sum to the total.
+            self.mark("Finalise & sort")
+        return False
+
+    def mark(self, stage: str, *score_cols, fired: int = None,
+             examined: int = None):
+        now  = _time_mod.perf_counter()
+        n_in = len(self.df) if examined is None else int(examined)
+        if fired is None and score_cols:
+            _hit = pd.Series(False, index=self.df.index)
+            for c in score_cols:
+                if c in self.df.columns:
+                    _hit |= pd.to_numeric(self.df[c], errors="coerce").fillna(0) > 0
+            fired = int(_hit.sum())
+        self.stages.append({
+            "stage":         stage,
+            "seconds":       round(now - self.t_last, 4),
+            "rows_examined": n_in,
+            "rows_fired":    fired,
+            "score_cols":    list(score_cols),
+        })
+        self.t_last = now
+
+    def report(self, rule_config: dict = None) -> dict:
+        total = round((self.t_last or 0) - (self.t0 or 0), 4)
+        for s in self.stages:
+            s["share_pct"] = round(100 * s["seconds"] / total, 1) if total else 0.0
+        return {
+            "engine_version": VERSION,
+            "generated_utc":  datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "rows":           len(self.df),
+            "workers":        self.workers,
+            "total_seconds":  total,
+            "rules_disabled": sorted(k for k, v in (rule_config or {}).items() if not v),
+            "stages":         self.stages,
+        }
+
+
+def _at_profile_top(profile: dict, n: int = 5) -> list:
+    """The n slowest stages of a profile, slowest first."""
+    return sorted((profile or {}).get("stages", []),
+                  key=lambda s: s["seconds"], reverse=True)[:n]
+
+
+def _at_profile_save(profile: dict, source_name: str = "") -> str:
+    """Write a scoring profile as JSON under _AT_PROFILE_DIR; returns the path
+    ('' on failure — profiling must never break an analysis run)."""
+    try:
+        os.makedirs(_AT_PROFILE_DIR, exist_ok=True)
+        stamp = profile.get("generated_utc", "").replace(":", "").replace("-", "")
+        tag   = re.sub(r"[^A-Za-z0-9_.-]+", "_", source_name)[:40] or "upload"
+        path  = os.path.join(_AT_PROFILE_DIR, f"at_score_{stamp}_{tag}.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            _json.dump(dict(profile, source=source_name), fh, indent=2)
+        _old = sorted(
+            (os.path.join(_AT_PROFILE_DIR, f) for f in os.listdir(_AT_PROFILE_DIR)
+             if f.endswith(".json")),
+            key=os.path.getmtime, reverse=True)[_AT_PROFILE_KEEP:]
+        for f in _old:
+            os.remove(f)
+        return path
+    except OSError:
+        return ""
+
+
+# ── AT partition-parallel scoring ─────────────────────────────────────────────
+# The expensive AT stages only compare an event with other events of the same
+# user (Rule 2 burst, Rule 16 first-time) or the same record (Rule 12 timestamp
+# reversal). Those stages run through _at_map_partitions(), which hash-
+# partitions the rows on user / record so each key lands whole in one
+# partition, scores the partitions on a process pool and stitches the fired
+# rows back onto the original index. Frame-wide stages (gap scores, copy-paste
+# counts, Rule 4 drift statistics, duplicate timestamps, chain numbering, tier
+# assignment) stay in the serial body and act as the reduction step.
+#
+# Partitions are scored by the same function the serial path calls on the
+# whole frame, so a parallel run is row-for-row identical to a serial one
+# (engine_bench.py --at-workers N checks this against the golden copy).
+import bisect as _bisect
+
+_AT_PARALLEL_MIN_ROWS    = 200_000   # below this, pool start-up outweighs the gain
+_AT_PARALLEL_MAX_WORKERS = 8
+
+_AT_BURST_SVC_PREFIXES = (
+    "svc_","service_","shr_","shared_","batch_","sys_","system_",
+    "robot_","auto_","automation_","api_","sa_","dba_","daemon","interface_",
+)
+_AT_BURST_INSERT_KW = ["INSERT","RESULT_INSERT","CREATE","ADD"]
+_AT_BURST_MODIFY_KW = ["UPDATE","MODIFY","EDIT","AMEND","CORRECT","REVISE"]
+_AT_BURST_WINDOW    = 200    # neighbours examined either side in time order
+
+
+def _at_parallel_workers(n_rows: int, workers: int = None) -> int:
+    """Worker processes for an AT run: an explicit count wins; otherwise the
+    pool is only used on logs of _AT_PARALLEL_MIN_ROWS or more."""
+    if workers is None:
+        if n_rows < _AT_PARALLEL_MIN_ROWS:
+            return 1
+        workers = min(os.cpu_count() or 1, _AT_PARALLEL_MAX_WORKERS)
+    return max(1, int(workers))
+
+
+def _at_map_partitions(fn, frame: pd.DataFrame, key: str, workers: int) -> list:
+    """Call fn on frame hash-partitioned by column `key` and return the list of
+    results. Every row of one key value lands in the same partition and rows
+    keep their order. workers <= 1 runs fn(frame) in-process; so does any
+    failure to start the pool (no fork start method, sandboxed process
+    limits) — the serial result is identical, only slower."""
+    if workers <= 1 or len(frame) < 2:
+        return [fn(frame)]
+    bucket = pd.util.hash_pandas_object(frame[key], index=False).values % workers
+    parts  = [p for p in (frame[bucket == b] for b in range(workers)) if len(p)]
+    try:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # fork: the children inherit this module as already executed — under
+        # Streamlit it is __main__ and cannot be re-imported by a spawned child.
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=len(parts), mp_context=ctx) as pool:
+            return list(pool.map(fn, parts))
+    except Exception:
+        return [fn(frame)]
+
+
+def _at_stitch(results: list, index: pd.Index, fill) -> tuple:
+    """Merge per-partition (scores, rationale) Series — fired rows only — onto
+    the full-frame index."""
+    scores    = pd.Series(0.0, index=index)
+    rationale = pd.Series(fill, index=index)
+    for sc, rat in results:
+        if len(sc):
+            scores.loc[sc.index]    = sc.values
+            rationale.loc[rat.index] = rat.values
+    return scores, rationale
+
+
+def _at_burst_partition(part: pd.DataFrame) -> tuple:
+    """Rule 2 (UI #15) Contemporaneous Burst for the users in `part`.
+
+    part: _pos (row position in the timestamp-sorted full frame), _uid,
+    timestamp_parsed and _act (upper-cased action_type), in _pos order.
+    An event fires when more than 10 same-kind actions by the same human user
+    fall within 15 minutes of it, among the _AT_BURST_WINDOW events either
+    side of it in the full frame's time order. Only same-user neighbours can
+    count, so each user's events are scanned against their own positions.
+    """
+    scores, rationale, fired = [], [], []
+    for uid, grp in part.groupby("_uid", sort=False):
+        if any(uid.lower().startswith(p) for p in _AT_BURST_SVC_PREFIXES):
+            continue
+        pos = grp["_pos"].tolist()
+        ts  = grp["timestamp_parsed"].tolist()
+        ac  = grp["_act"].tolist()
+        ix  = grp.index.tolist()
+        for i in range(len(pos)):
+            is_insert = any(kw in ac[i] for kw in _AT_BURST_INSERT_KW)
+            is_modify = any(kw in ac[i] for kw in _AT_BURST_MODIFY_KW)
+            if not is_insert and not is_modify:
+                continue
+            active_kw  = _AT_BURST_INSERT_KW if is_insert else _AT_BURST_MODIFY_KW
+            burst_type = "INSERT" if is_insert else "UPDATE/MODIFY"
+            rationale_detail = (
+                "batch processing from memory or paper scraps rather than real-time entry"
+                if is_insert else
+                "retrospective bulk modification — possible backdated correction from paper records"
+            )
+            lo = _bisect.bisect_left(pos, pos[i] - _AT_BURST_WINDOW)
+            hi = _bisect.bisect_left(pos, pos[i] + _AT_BURST_WINDOW)
+            count = 0
+            for j in range(lo, hi):
+                if j == i:
+                    continue
+                if abs((ts[j] - ts[i]).total_seconds() / 60) <= 15 and \
+                        any(kw in ac[j] for kw in active_kw):
+                    count += 1
+            if count > 10:
+                fired.append(ix[i])
+                scores.append(6.0)
+                rationale.append(
+                    f"Rule 2 — Contemporaneous Burst [MEDIUM]: {count+1} {burst_type} actions "
+                    f"by user '{uid}' within 15 minutes. Exceeds the 10-action "
+                    f"threshold indicating {rationale_detail}, "
+                    "which is inconsistent with the ALCOA+ Contemporaneous principle (FDA Data Integrity Guidance, 2018)."
+                )
+    return (pd.Series(scores, index=fired, dtype=float),
+            pd.Series(rationale, index=fired, dtype=object))
+
+
+_AT_R12_CREATE_KW  = {"insert","create","add","result_insert","new"}
+_AT_R12_APPROVE_KW = {"approve","release","authorise","authorize","sign","submit",
+                      "batch_release","approve_result"}
+
+
+def _at_reversal_partition(part: pd.DataFrame) -> tuple:
+    """Rule 12 (UI #12) Timestamp Reversal for the records in `part`: approval
+    or release timestamped before the record's creation.
+
+    part: _rid (stripped record_id), action_type and timestamp_parsed, for
+    rows with a record_id and a parsed timestamp.
+    """
+    scores, rationale, fired = [], [], []
+    for rid, grp in part.groupby("_rid"):
+        if len(grp) < 2:
+            continue
+        acts     = grp["action_type"].astype(str).str.lower()
+        creates  = grp[acts.isin(_AT_R12_CREATE_KW)]
+        approves = grp[acts.isin(_AT_R12_APPROVE_KW)]
+        if creates.empty or approves.empty:
+            continue
+        t_create  = creates["timestamp_parsed"].min()
+        t_approve = approves["timestamp_parsed"].min()
+        if pd.isnull(t_create) or pd.isnull(t_approve):
+            continue
+        if t_approve < t_create:
+            for idx in approves.index:
+                fired.append(idx)
+                scores.append(10.0)
+                rationale.append(
+                    f"Rule 12 — Timestamp Reversal [CRITICAL]: "
+                    f"Record '{rid}' was approved/released at {t_approve} "
+                    f"which is before its creation timestamp at {t_create}. "
+                    "This is chronologically impossible in a correctly functioning "
+                    "system and indicates clock manipulation or direct database "
+                    "alteration. (21 CFR Part 11 §11.10(e), ALCOA+ Contemporaneous)"
+                )
+    return (pd.Series(scores, index=fired, dtype=float),
+            pd.Series(rationale, index=fired, dtype=object))
+
+
+# BQ-011: extended high-risk action list — AMEND, DISABLE, UNLOCK added
+_AT_R16_HIGH_RISK_FIRST_ACTIONS = {
+    "delete","del","purge","remove","void",
+    "approve","release","authorise","authorize","sign",
+    "override","batch_release","approve_result",
+    "amend","amendment",
+    "disable","deactivate","unlock",
+}
+_AT_R16_MIN_PRIOR_EVENTS = 5
+
+
+def _at_first_time_partition(part: pd.DataFrame) -> tuple:
+    """Rule 16 First-Time Behavior (dropped in v96; score kept for the Full
+    Audit Log) for the users in `part`.
+
+    part: _uid, _act, _rec (lower-cased) plus the raw action_type and
+    record_type, in the full frame's timestamp order.
+    """
+    scores, rationale, fired = [], [], []
+    for uid, ugrp in part.groupby("_uid"):
+        if len(ugrp) < _AT_R16_MIN_PRIOR_EVENTS + 1:
+            continue
+
+        seen_acts: set = set()
+        _acts = ugrp["_act"].tolist()
+        _recs = ugrp["_rec"].tolist()
+        _raw_acts = ugrp["action_type"].astype(str).tolist()
+        _raw_recs = (ugrp["record_type"].astype(str).tolist()
+                     if "record_type" in ugrp.columns else _recs)
+        for pos, orig in enumerate(ugrp.index):
+            act = _acts[pos]
+            rec = _recs[pos]
+
+            if pos < _AT_R16_MIN_PRIOR_EVENTS:
+                seen_acts.add(act)
+                continue
+
+            prior = pos  # events seen before this position
+            is_new = act not in seen_acts
+
+            if not is_new:
+                seen_acts.add(act)
+                continue
+
+            is_gxp  = any(kw in rec for kw in _AT_SENSITIVE)
+            is_hira = any(kw in act for kw in _AT_R16_HIGH_RISK_FIRST_ACTIONS)
+
+            score = 0.0
+            if prior >= 50 and is_hira and is_gxp:
+                score = 9.0
+            elif prior >= 20 and is_hira:
+                score = 8.0
+            elif prior >= _AT_R16_MIN_PRIOR_EVENTS and is_hira:
+                score = 5.0
+            # Note: first-time non-high-risk actions (SELECT, VIEW, READ, etc.)
+            # do not score independently — they require is_hira to fire.
+            # This prevents alert fatigue from routine read operations.
+
+            if score > 0:
+                conf = (
+                    "High confidence" if prior >= 50 else
+                    "Moderate confidence" if prior >= 20 else
+                    "Low confidence — limited prior history"
+                )
+                fired.append(orig)
+                scores.append(score)
+                rationale.append(
+                    f"Rule 16 — First-Time Behavior [HIGH]: "
+                    f"User '{uid}' performed '{_raw_acts[pos]}' on '{_raw_recs[pos]}' "
+                    f"for the first time within this uploaded log window "
+                    f"(after {prior} prior recorded events). ({conf}) "
+                    "Note: prior activity before the log window may exist — "
+                    "verify against training records and role assignment history. "
+                    "A first-time high-risk action (delete, approve, release, amend) "
+                    "from an established user is an insider risk signal. "
+                    "Verify this action was within the user's approved access rights at the time "
+                    "and obtain documented authorisation if not already on file "
+                    "(21 CFR Part 11 §11.10(d), ALCOA+ Attributable)."
+                )
+
+            seen_acts.add(act)
+    return (pd.Series(scores, index=fired, dtype=float),
+            pd.Series(rationale, index=fired, dtype=object))
+
+
+def at_score_events(df: pd.DataFrame, rule_config: dict = None,
+                    profile: dict = None, workers: int = None) -> pd.DataFrame:
+    """
+    Score every event across the AT v96 ruleset — see _at_score_events_impl().
+
+    profile: optional dict, filled in place with the per-stage timing report
+    (wall seconds, rows examined, rows fired) from _AtRuleProfiler.report().
+    workers: processes for the user- and record-partitioned stages. None picks
+    one per core (up to _AT_PARALLEL_MAX_WORKERS) on logs of at least
+    _AT_PARALLEL_MIN_ROWS rows and scores smaller logs in-process; 1 forces
+    in-process scoring. The output does not depend on the worker count.
+    """
+    with _AtRuleProfiler(df) as _prof:
+        _prof.workers = _at_parallel_workers(len(df), workers)
+        result = _at_score_events_impl(df, rule_config, _prof)
+    if profile is not None:
+        profile.update(_prof.report(rule_config))
+    return result
+
+
+def _at_score_events_impl(df: pd.DataFrame, rule_config: dict,
+                          _prof: _AtRuleProfiler) -> pd.DataFrame:
     """
     Score every event across the AT v96 ruleset (16 active rules; 9 v94e rules
     are present as dead score columns for backward compatibility but are gated
@@ -7652,6 +10845,7 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
         "at_r24_on": ["score_rule24_dup_rows"],                # v96: dropped
     }
     df = df.copy()
+    _prof.bind(df)
 
     # ── v96 — Internal → UI-sequence rule number remap ───────────────────────
     # Internal code variables (score_rule14, score_rule16 …) keep their names —
@@ -7710,12 +10904,17 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     else:
         df["timestamp_parsed"] = pd.NaT
 
+    _prof.mark("Timestamp parsing")
+
     # ── Original 6 dimensions ─────────────────────────────────────────────────
     df["score_temporal"]     = df["timestamp_parsed"].apply(_at_temporal_score)
     df["score_velocity"]     = pd.Series(0.0, index=df.index)  # BQ-007: Rule 9 removed
     df["score_gap"]          = _at_gap_scores(df)
     df["score_del_recreate"] = _at_del_recreate_scores(df)
 
+    _prof.mark("#16 Off-Hours, Timestamp Gap, #1 Record Reconstruction",
+               "score_temporal", "score_gap", "score_del_recreate")
+
     # ── Noise action exclusion ────────────────────────────────────────────────
     # These actions are not GxP data events. They legitimately occur at all hours
     # and should not inflate temporal (Rule 10) or gap (Rule 9) scores.
@@ -7737,6 +10936,10 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
             df.loc[_noise_mask, "score_temporal"] = 0.0
             df.loc[_noise_mask, "score_gap"]      = 0.0
 
+    _prof.mark("Noise action exclusion",
+               fired=int(_noise_mask.sum()) if "action_type" in df.columns else 0)
+
+
     # BQ-004: Rule 8 scope redesigned to eliminate overlap with Rule 3.
     # Rule 3 owns: admin write/delete on core GxP production tables (RESULTS, BATCH etc.)
     # Rule 8 owns: admin write on GxP-regulated tables NOT in Rule 3's core list
@@ -7766,6 +10969,7 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
             return 7.0
         return 0.0
     df["score_privilege"] = df.apply(_priv, axis=1)
+    _prof.mark("#10 Privileged User on GxP Data", "score_privilege")
 
     # Read-only actions on any record type — never a data integrity finding
     _AT_READ_ONLY = {"select", "read", "view", "query", "search",
@@ -7792,6 +10996,7 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
             return 8.0
         return 0.0
     df["score_record"] = df.apply(_rec, axis=1)
+    _prof.mark("#2 Audit Trail Integrity Event", "score_record")
 
     # ── Rule 1 — Vague Rationale (Compliance Gap) ─────────────────────────────
     # Target: UPDATE/MODIFY/EDIT/DELETE on any GxP-regulated table with a
@@ -7979,6 +11184,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
         df["score_rule1_vague_rationale"] = 0.0
         df["rule1_rationale"]             = ""
 
+    _prof.mark("#6 Vague Rationale", "score_rule1_vague_rationale")
+
     # Rule 1 sub-check: Copy-paste rationale reuse
     # Identical non-blank comment repeated across 3+ rows of the same GxP table
     # type is a copy-paste finding — the rationale was not written per-record.
@@ -7991,56 +11198,26 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     # Threshold: >10 same-type actions within 15 minutes by same human user.
     r2_scores    = pd.Series(0.0, index=df.index)
     r2_rationale = pd.Series("", index=df.index)
-    _R2_SVC_PREFIXES = (
-        "svc_","service_","shr_","shared_","batch_","sys_","system_",
-        "robot_","auto_","automation_","api_","sa_","dba_","daemon","interface_",
-    )
     if "timestamp_parsed" in df.columns and "user_id" in df.columns:
-        df_s   = df.sort_values("timestamp_parsed").copy()
-        df_s   = df_s[df_s["timestamp_parsed"].notna()].copy()
-        ts_arr = df_s["timestamp_parsed"].tolist()
-        us_arr = df_s["user_id"].astype(str).tolist()
-        ac_arr = df_s["action_type"].astype(str).str.upper().tolist()
-        ix_arr = df_s.index.tolist()
-        insert_kw = ["INSERT","RESULT_INSERT","CREATE","ADD"]
-        modify_kw = ["UPDATE","MODIFY","EDIT","AMEND","CORRECT","REVISE"]
-        for i in range(len(df_s)):
-            # BQ-002 Fix 1: skip system/service accounts
-            if any(us_arr[i].lower().startswith(p) for p in _R2_SVC_PREFIXES):
-                continue
-            is_insert = any(kw in ac_arr[i] for kw in insert_kw)
-            is_modify = any(kw in ac_arr[i] for kw in modify_kw)
-            if not is_insert and not is_modify:
-                continue
-            active_kw  = insert_kw if is_insert else modify_kw
-            burst_type = "INSERT" if is_insert else "UPDATE/MODIFY"
-            rationale_detail = (
-                "batch processing from memory or paper scraps rather than real-time entry"
-                if is_insert else
-                "retrospective bulk modification — possible backdated correction from paper records"
-            )
-            count = 0
-            for j in range(max(0,i-200), min(len(df_s),i+200)):
-                if j == i:
-                    continue
-                try:
-                    diff_mins = abs((ts_arr[j]-ts_arr[i]).total_seconds() / 60)
-                except Exception:
-                    continue
-                if diff_mins <= 15:
-                    if us_arr[j]==us_arr[i] and any(kw in ac_arr[j] for kw in active_kw):
-                        count += 1
-            if count > 10:
-                r2_scores.at[ix_arr[i]]    = 6.0
-                r2_rationale.at[ix_arr[i]] = (
-                    f"Rule 2 — Contemporaneous Burst [MEDIUM]: {count+1} {burst_type} actions "
-                    f"by user '{us_arr[i]}' within 15 minutes. Exceeds the 10-action "
-                    f"threshold indicating {rationale_detail}, "
-                    "which is inconsistent with the ALCOA+ Contemporaneous principle (FDA Data Integrity Guidance, 2018)."
-                )
+        df_s   = df.sort_values("timestamp_parsed")
+        df_s   = df_s[df_s["timestamp_parsed"].notna()]
+        # Only same-user neighbours can count towards a burst, so the rule is
+        # scored per user partition (see _at_burst_partition) — _pos keeps the
+        # ±200-event window anchored to the full frame's time order.
+        _r2_in = pd.DataFrame({
+            "_pos":             range(len(df_s)),
+            "_uid":             df_s["user_id"].astype(str),
+            "timestamp_parsed": df_s["timestamp_parsed"],
+            "_act":             df_s["action_type"].astype(str).str.upper(),
+        }, index=df_s.index)
+        r2_scores, r2_rationale = _at_stitch(
+            _at_map_partitions(_at_burst_partition, _r2_in, "_uid", _prof.workers),
+            df.index, "")
     df["score_rule2_burst"]    = r2_scores
     df["rule2_rationale"]      = r2_rationale
 
+    _prof.mark("#15 Contemporaneous Burst", "score_rule2_burst")
+
     # ── Rule 3 — Admin/GxP Conflict (SoD Gap) ────────────────────────────────
     # BQ-003: Added DELETE to action coverage — admin deleting a GxP record is
     # the most severe SoD violation and previously bypassed Rule 3 entirely.
@@ -8081,6 +11258,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule3_admin_conflict"] = r3_scores
     df["rule3_rationale"]            = r3_rationale
 
+    _prof.mark("#10 Admin/GxP Conflict", "score_rule3_admin_conflict")
+
     # ── Rule 4 — Change Control Drift (Validation Gap) ────────────────────────
     # Target: new_value column present + deviation from expected patterns
     # Risk: High
@@ -8138,6 +11317,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule4_drift"]    = r4_sc
     df["rule4_rationale"]      = r4_rat
 
+    _prof.mark("#7 Change Control Drift", "score_rule4_drift")
+
     # ── Rule 5 — Failed Login → Data Manipulation (Credential Abuse) ─────────
     # Target: 3+ failed login events followed by a successful login, then a
     #         DELETE or MODIFY on a GxP record within 30 minutes.
@@ -8250,44 +11431,29 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule5_failed_login"] = r5_scores
     df["rule5_rationale"]          = r5_rationale
 
+    _prof.mark("#9 Failed Login → Data Manipulation", "score_rule5_failed_login")
+
     # ── Rule 12 — Timestamp Reversal ──────────────────────────────────────────
     # Approval/release timestamp precedes creation timestamp on the same record.
     # Risk: Critical. Audit trail alone — no extra file needed.
     r12_scores    = pd.Series(0.0, index=df.index)
     r12_rationale = pd.Series("", index=df.index)
     if all(c in df.columns for c in ["record_id","action_type","timestamp_parsed"]):
-        create_kw  = {"insert","create","add","result_insert","new"}
-        approve_kw = {"approve","release","authorise","authorize","sign","submit",
-                      "batch_release","approve_result"}
         valid = df[df["record_id"].astype(str).str.strip().ne("") &
-                   df["timestamp_parsed"].notna()].copy()
-        valid["_rid"] = valid["record_id"].astype(str).str.strip()
-        for rid, grp in valid.groupby("_rid"):
-            if len(grp) < 2:
-                continue
-            acts     = grp["action_type"].astype(str).str.lower()
-            creates  = grp[acts.isin(create_kw)]
-            approves = grp[acts.isin(approve_kw)]
-            if creates.empty or approves.empty:
-                continue
-            t_create  = creates["timestamp_parsed"].min()
-            t_approve = approves["timestamp_parsed"].min()
-            if pd.isnull(t_create) or pd.isnull(t_approve):
-                continue
-            if t_approve < t_create:
-                for idx in approves.index:
-                    r12_scores.at[idx]    = 10.0
-                    r12_rationale.at[idx] = (
-                        f"Rule 12 — Timestamp Reversal [CRITICAL]: "
-                        f"Record '{rid}' was approved/released at {t_approve} "
-                        f"which is before its creation timestamp at {t_create}. "
-                        "This is chronologically impossible in a correctly functioning "
-                        "system and indicates clock manipulation or direct database "
-                        "alteration. (21 CFR Part 11 §11.10(e), ALCOA+ Contemporaneous)"
-                    )
+                   df["timestamp_parsed"].notna()]
+        _r12_in = pd.DataFrame({
+            "_rid":             valid["record_id"].astype(str).str.strip(),
+            "action_type":      valid["action_type"],
+            "timestamp_parsed": valid["timestamp_parsed"],
+        }, index=valid.index)
+        r12_scores, r12_rationale = _at_stitch(
+            _at_map_partitions(_at_reversal_partition, _r12_in, "_rid", _prof.workers),
+            df.index, "")
     df["score_rule12_timestamp_reversal"] = r12_scores
     df["rule12_rationale"]                = r12_rationale
 
+    _prof.mark("#12 Timestamp Reversal", "score_rule12_timestamp_reversal")
+
     # ── Rule 13 — Service / Shared Account GxP Action ─────────────────────────
     # BQ-009: Behavioral consistency auto-detection — a validated instrument
     # interface has a predictable fingerprint (single action, single table,
@@ -8405,6 +11571,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule13_service_account"] = _r13s
     df["rule13_rationale"]             = ""  # deferred to Top-20
 
+    _prof.mark("#8 Service / Shared Account", "score_rule13_service_account")
+
     # ── Rule 14 — Dormant Account Sudden Activity ──────────────────────────────
     # User with ≥90-day gap in activity re-activates and performs GxP action.
     # Risk: High. Audit trail alone — no extra file needed.
@@ -8455,6 +11623,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["rule14_rationale"]             = r14_rationale
 
 
+    _prof.mark("Dormant Account (moved to UAR)", "score_rule14_dormant_account")
+
     # ── Rule 16 — First-Time Behavior Detection ────────────────────────────────
     # Detects when a user performs an action_type they have never performed before
     # in the uploaded audit trail history. High-prior-event users with a sudden
@@ -8470,100 +11640,31 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     # Rationale always states prior event count so reviewer can judge
     # whether "first time" is statistically meaningful.
 
-    # BQ-011: extended high-risk action list — AMEND, DISABLE, UNLOCK added
-    _HIGH_RISK_FIRST_ACTIONS = {
-        "delete","del","purge","remove","void",
-        "approve","release","authorise","authorize","sign",
-        "override","batch_release","approve_result",
-        "amend","amendment",
-        "disable","deactivate","unlock",
-    }
-    _MIN_PRIOR_EVENTS_16 = 5
-
+    # High-risk action list and the 5-event history floor: _AT_R16_* above.
     r16_scores    = pd.Series(0.0, index=df.index)
     r16_rationale = pd.Series("", index=df.index)
 
     if "user_id" in df.columns and "action_type" in df.columns:
-        df_s16 = df.copy()
-        if "timestamp_parsed" in df_s16.columns:
-            df_s16 = df_s16.sort_values("timestamp_parsed").reset_index(drop=False)
-            orig_idx = df_s16["index"].tolist()
-        else:
-            df_s16 = df_s16.reset_index(drop=False)
-            orig_idx = df_s16["index"].tolist()
-
-        df_s16["_uid"] = df_s16["user_id"].astype(str)
-        df_s16["_act"] = df_s16["action_type"].astype(str).str.lower().str.strip()
-        df_s16["_rec"] = df_s16["record_type"].astype(str).str.lower() \
-                         if "record_type" in df_s16.columns \
-                         else pd.Series([""] * len(df_s16))
-
-        for uid, ugrp in df_s16.groupby("_uid"):
-            if len(ugrp) < _MIN_PRIOR_EVENTS_16 + 1:
-                continue
-
-            seen_acts: set = set()
-            for pos, (_, urow) in enumerate(ugrp.iterrows()):
-                orig = urow["index"]
-                act  = urow["_act"]
-                rec  = urow["_rec"]
-                raw_act = str(df.at[orig, "action_type"]) \
-                          if orig in df.index else act
-                raw_rec = str(df.at[orig, "record_type"]) \
-                          if ("record_type" in df.columns and orig in df.index) \
-                          else rec
-
-                if pos < _MIN_PRIOR_EVENTS_16:
-                    seen_acts.add(act)
-                    continue
-
-                prior = pos  # events seen before this position
-                is_new = act not in seen_acts
-
-                if not is_new:
-                    seen_acts.add(act)
-                    continue
-
-                is_gxp  = any(kw in rec for kw in _AT_SENSITIVE)
-                is_hira  = any(kw in act for kw in _HIGH_RISK_FIRST_ACTIONS)
-
-                score = 0.0
-                if prior >= 50 and is_hira and is_gxp:
-                    score = 9.0
-                elif prior >= 20 and is_hira:
-                    score = 8.0
-                elif prior >= _MIN_PRIOR_EVENTS_16 and is_hira:
-                    score = 5.0
-                # Note: first-time non-high-risk actions (SELECT, VIEW, READ, etc.)
-                # do not score independently — they require is_hira to fire.
-                # This prevents alert fatigue from routine read operations.
-
-                if score > 0:
-                    conf = (
-                        "High confidence" if prior >= 50 else
-                        "Moderate confidence" if prior >= 20 else
-                        "Low confidence — limited prior history"
-                    )
-                    r16_scores.at[orig]    = score
-                    r16_rationale.at[orig] = (
-                        f"Rule 16 — First-Time Behavior [HIGH]: "
-                        f"User '{uid}' performed '{raw_act}' on '{raw_rec}' "
-                        f"for the first time within this uploaded log window "
-                        f"(after {prior} prior recorded events). ({conf}) "
-                        "Note: prior activity before the log window may exist — "
-                        "verify against training records and role assignment history. "
-                        "A first-time high-risk action (delete, approve, release, amend) "
-                        "from an established user is an insider risk signal. "
-                        "Verify this action was within the user's approved access rights at the time "
-                        "and obtain documented authorisation if not already on file "
-                        "(21 CFR Part 11 §11.10(d), ALCOA+ Attributable)."
-                    )
-
-                seen_acts.add(act)
+        df_s16 = df.sort_values("timestamp_parsed") \
+                 if "timestamp_parsed" in df.columns else df
+        _r16_in = pd.DataFrame({
+            "_uid":        df_s16["user_id"].astype(str),
+            "_act":        df_s16["action_type"].astype(str).str.lower().str.strip(),
+            "_rec":        df_s16["record_type"].astype(str).str.lower()
+                           if "record_type" in df_s16.columns else "",
+            "action_type": df_s16["action_type"],
+        }, index=df_s16.index)
+        if "record_type" in df_s16.columns:
+            _r16_in["record_type"] = df_s16["record_type"]
+        r16_scores, r16_rationale = _at_stitch(
+            _at_map_partitions(_at_first_time_partition, _r16_in, "_uid", _prof.workers),
+            df.index, "")
 
     df["score_rule16_first_time_behavior"] = r16_scores
     df["rule16_rationale"]                 = r16_rationale
 
+    _prof.mark("First-Time Behavior (dropped)", "score_rule16_first_time_behavior")
+
     # ── Event Chain ID — group related events from Rules 5, 6, 15 ─────────────
     # Gives reviewer a shared identifier to filter and see complete event stories.
     # Format: EC-NNN where NNN increments per chain found in the dataset.
@@ -8659,6 +11760,9 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     # Flag for post-master-table computation:
     df["_needs_seq_ctx"] = chain_id_col.ne("").astype(int)
 
+    _prof.mark("Event chain", fired=int((df["Event_Chain_ID"] != "").sum()))
+
+
     # ── Rule 15 — Missing Timestamp [Tier 1 | High] ──────────────────────────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Contemporaneous
     # Vectorized: null/unparseable timestamp → score 7.5
@@ -8677,6 +11781,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule15_missing_ts"] = _r15_score
     df["rule15_rationale"]        = _r15_rationale
 
+    _prof.mark("#13 Missing Timestamp", "score_rule15_missing_ts")
+
     # ── Rule 16 (client) — Missing User Attribution [Tier 1 | High] ──────────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Attributable
     # Vectorized: blank/null user_id → score 7.5
@@ -8691,6 +11797,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
         False: "",
     })
 
+    _prof.mark("#11 Missing User Attribution", "score_rule16_missing_user")
+
     # ── Rule 17 — Missing / Invalid Before-After Values [Tier 1 | High] ──────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Original
     #
@@ -8886,6 +11994,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
 
         df["score_rule17_missing_values"] = _v17
 
+    _prof.mark("#3 Missing Before/After Values", "score_rule17_missing_values")
+
     # ── Rule 18 — Self-Approval / SoD Violation [Tier 1 | Critical] ──────────
     # 21 CFR Part 11 §11.10(d); EU Annex 11 Clause 12
     # Vectorized: groupby record_id to find creator, merge back to find approver rows.
@@ -8927,6 +12037,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule18_self_approval"] = r18s
     df["rule18_rationale"]           = r18r
 
+    _prof.mark("#4 Self-Approval SoD Violation", "score_rule18_self_approval")
+
     # ── Rule 19 — Modification After Approval [Tier 1 | Critical] ────────────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Original
     # Vectorized: find first approval timestamp per record_id, merge back,
@@ -8968,6 +12080,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule19_mod_after_approval"] = r19s
     df["rule19_rationale"]                = r19r
 
+    _prof.mark("#5 Modification After Approval", "score_rule19_mod_after_approval")
+
     # ── Rule 20 — Workflow Status Reversal [Critical (GxP) / High otherwise] ──
     # v96: re-enabled and rewritten as the new UI Rule 17.
     # Tier-aware: fires Critical (10.0) when reversal happens on a GxP-critical
@@ -9053,12 +12167,16 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule20_workflow_reversal"] = r20s
     df["rule20_rationale"]               = r20r
 
+    _prof.mark("#17 Workflow Status Reversal", "score_rule20_workflow_reversal")
+
     # ── Rule 21 — Role / Permission Change — DROPPED in v96 ──────────────────
     # Kept as zero-score placeholder for backward-compat with score column map.
     # Session-state guard forces at_r21_on=False; no iterrows needed.
     df["score_rule21_role_change"] = 0.0
     df["rule21_rationale"]         = ""
 
+    _prof.mark("Role / Permission Change (dropped)", "score_rule21_role_change")
+
     # ── Rule 22 — Duplicate Timestamp Collision [Tier 2 | Medium] ────────────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Contemporaneous
     # Vectorized: group by timestamp, flag critical-action rows in groups ≥ 2.
@@ -9084,6 +12202,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule22_dup_timestamp"] = r22s
     df["rule22_rationale"]           = r22r
 
+    _prof.mark("Duplicate Timestamp (dropped)", "score_rule22_dup_timestamp")
+
     # ── Rule 23 — Missing Record ID [Tier 1 | High] — Vectorized ─────────────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Original
     _RECORD_NEEDED_ACTS = {"update","modify","edit","delete","remove","approve",
@@ -9103,6 +12223,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
               "linked to source data (21 CFR Part 11 §11.10(e), ALCOA+ Original)."
         )
 
+    _prof.mark("Missing Record ID (dropped)", "score_rule23_missing_record_id")
+
     # ── Rule 24 — Duplicate Rows [Tier 1 | High] ──────────────────────────────
     # 21 CFR Part 11 §11.10(e); ALCOA+ Original
     r24s = pd.Series(0.0, index=df.index)
@@ -9129,6 +12251,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     df["score_rule24_dup_rows"] = r24s
     df["rule24_rationale"]      = r24r
 
+    _prof.mark("Duplicate Rows (dropped)", "score_rule24_dup_rows")
+
     # ── Apply rule config: zero out disabled rule scores before tier assignment ─
     # Scores remain in DataFrame for Full Audit Log visibility but do NOT
     # influence tier, Events for Review admission, or Primary Rule label.
@@ -9324,6 +12448,10 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     else:
         df["_is_burst_dup"] = False
 
+    _prof.mark("Rule config + tier assignment",
+               fired=int(df["Risk_Tier"].isin(["Critical", "High", "Medium"]).sum()))
+
+
     # ── Triggered Rules summary column ───────────────────────────────────────
     # Lists which named rules fired for each event — useful for the Excel output
     def _triggered(row):
@@ -9864,6 +12992,8 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     # Mark with sentinel so caller knows relabeling is pending.
     df["_relabel_pending"] = True   # sentinel consumed and dropped by caller
 
+    _prof.mark("Primary rule, triggered rules & sequence context")
+
     # FIX 2: Sort by Risk_Score descending then timestamp ascending as tiebreaker.
     # FIX TIER-SORT: Sort tier first so Critical always appears above High regardless
     # of composite score — a Critical at 7.1 must show before a High at 7.8.
@@ -9879,6 +13009,245 @@ def at_score_events(df: pd.DataFrame, rule_config: dict = None) -> pd.DataFrame:
     return result
 
 
+def _at_select_for_review(scored: pd.DataFrame, r_start: str, r_end: str) -> tuple:
+    """Post-scoring selection shared by show_audit_trail() and batch_review.py.
+
+    Tags events outside [r_start, r_end] (dd-Mon-YYYY) as "Out of Period",
+    picks the Events for Review set (Top _AT_TOP_N), applies the deferred
+    Top-N relabelling and rolls up same-user same-rule repeats.
+    Returns (scored, top20, aggregated_detail_df_or_[], n_out_of_period);
+    scored is updated in place.
+    """
+    # ── FIX 7: Tag out-of-period events ───────────────────────────
+    # Events whose timestamp falls outside the declared review window
+    # must NOT be scored or escalated — they appear in the Full Audit
+    # Log for completeness but are excluded from Events for Review and
+    # do not contribute to risk tier counts.
+    _r_start_str = (r_start or "").strip()
+    _r_end_str   = (r_end or "").strip()
+    _missing_str = "(review period dates not specified)"
+    _oop_mask    = pd.Series(False, index=scored.index)
+    if (_r_start_str and _r_end_str
+            and _r_start_str != _missing_str
+            and _r_end_str   != _missing_str
+            and "timestamp_parsed" in scored.columns):
+        try:
+            _r_s = pd.to_datetime(_r_start_str, dayfirst=True, errors="coerce")
+            _r_e = pd.to_datetime(_r_end_str,   dayfirst=True, errors="coerce")
+            # Extend _r_e to 23:59:59 so events on the final day are not
+            # falsely flagged — "30-Mar-2025" parses to midnight 00:00:00
+            # without this, any event timestamped after midnight on that
+            # day (e.g. 22:25:59) is incorrectly treated as out-of-period.
+            if pd.notna(_r_e):
+                _r_e = _r_e + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            if pd.notna(_r_s) and pd.notna(_r_e):
+                _ts  = pd.to_datetime(scored["timestamp_parsed"], errors="coerce")
+                _oop_mask = _ts.notna() & ((_ts < _r_s) | (_ts > _r_e))
+                if _oop_mask.any():
+                    # Zero out all risk scores for out-of-period rows
+                    _score_cols = [c for c in scored.columns
+                                   if c.startswith("score_")]
+                    scored.loc[_oop_mask, _score_cols] = 0.0
+                    scored.loc[_oop_mask, "Risk_Score"] = 0.0
+                    scored.loc[_oop_mask, "Risk_Tier"]  = "Out of Period"
+                    scored.loc[_oop_mask, "Primary_Rule"] = \
+                        "Out of Period — excluded from review scope"
+        except Exception:
+            pass   # date parse failure — treat all rows as in-period
+
+    # ── Select Top N — simplified architecture (v93) ──────────────
+    # Rule: Critical → always in. High → always in. Medium → dedup ok.
+    # No named-rule gate. Tier is assigned by rule-priority engine
+    # (highest rule wins) so every event in Events for Review is
+    # directly traceable to a specific named rule.
+    # Deduplication: burst dedup (Rule 2) applies to Medium/Low only.
+    # Off-hours dedup applies to Medium/Low only.
+    # Critical and High events are NEVER deduplicated out.
+
+    # Filter 1: exclude out-of-period rows
+    in_period = scored[scored["Risk_Tier"] != "Out of Period"]
+
+    # Separate Critical/High (always in) from Medium (can dedup); Low never shown
+    _hc_mask = in_period["Risk_Tier"].isin(["Critical", "High"])
+    hc_events = in_period[_hc_mask].copy()
+    med_low    = in_period[in_period["Risk_Tier"] == "Medium"].copy()
+
+    # Filter 2: Dedup burst events — Medium/Low only
+    med_low = med_low[~med_low.get(
+        "_is_burst_dup", pd.Series(False, index=med_low.index))]
+
+    # Deduplicate off-hours (Rule 10) — Medium/Low only, 1 per user
+    _TEMPORAL_KEY = med_low["user_id"].astype(str) + "||temporal"
+    temporal_mask = med_low["score_temporal"] > 0
+    if temporal_mask.any():
+        med_low = med_low.copy()
+        med_low["_temporal_rank"] = med_low.groupby(
+            _TEMPORAL_KEY)["score_temporal"].rank(
+            method="first", ascending=False)
+        med_low = med_low[
+            (med_low["score_temporal"] == 0) |
+            (med_low["_temporal_rank"] <= 1)
+        ]
+
+    # Also dedup Medium burst events by key (user+action+record_id)
+    med_low = med_low.sort_values("Risk_Score", ascending=False)
+    med_low = med_low.drop_duplicates(
+        subset=["user_id","action_type","record_id"], keep="first"
+    ) if all(c in med_low.columns for c in ["user_id","action_type","record_id"]) \
+      else med_low
+
+    # Combine: all H/C first, then fill remaining slots with Medium
+    hc_events  = hc_events.sort_values("Risk_Score", ascending=False)
+    n_hc       = len(hc_events)
+    remaining  = max(0, _AT_TOP_N - n_hc)
+    med_top    = med_low.head(remaining)
+    qualified  = pd.concat([hc_events, med_top]).reset_index(drop=True)
+
+    # No fill padding — shorter honest report beats padded low-signal one
+    top20 = qualified.copy()
+
+    # ── v96 PERF: Apply deferred per-row operations to Top-20 only ──
+    # at_score_events() skips these on the full 100k-row DataFrame to
+    # avoid running expensive Python-function applies at scale. Now that
+    # we have the final Top-20 (≤20 rows), compute them here.
+    if top20.get("_relabel_pending", pd.Series([False])).any():
+        # 1. Rule_Rationale — combined rationale string (all rule notes)
+        if "_combined_rat" in dir():
+            top20["Rule_Rationale"] = top20.apply(_combined_rat, axis=1)
+        # 2. Suggested_Disposition + Rationale
+        if "_suggested_disposition" in dir():
+            _sd = [_suggested_disposition(r) for _, r in top20.iterrows()]
+            top20["Suggested_Disposition"]          = [x[0] for x in _sd]
+            top20["Suggested_Disposition_Rationale"]= [x[1] for x in _sd]
+        # 3. RELABEL_COLS — v96 UI-sequence rule number remap
+        _RELABEL_COLS_TOP = [
+            "Primary_Rule", "Supporting_Signals", "Triggered_Rules",
+            "rule1_rationale", "Rationale", "System_Narrative",
+            "Suggested_Disposition", "Suggested_Disposition_Rationale",
+            "Action_Required", "Regulatory_Basis", "Sequence_Context",
+        ]
+        for _rc in _RELABEL_COLS_TOP:
+            if _rc in top20.columns:
+                top20[_rc] = top20[_rc].astype(str).apply(_relabel_rule)
+        top20.drop(columns=["_relabel_pending"], errors="ignore", inplace=True)
+
+    # Also apply relabeling to scored df's Triggered_Rules for Full Audit Log
+    if "_relabel_pending" in scored.columns:
+        for _rc in ("Primary_Rule", "Triggered_Rules"):
+            if _rc in scored.columns:
+                scored[_rc] = scored[_rc].astype(str).apply(_relabel_rule)
+        scored.drop(columns=["_relabel_pending"], errors="ignore", inplace=True)
+
+    # ── v96 — Same-rule-same-user aggregation (≥3 threshold) ───────
+    # Reviewer-fatigue intervention: when the same user trips the
+    # same Primary_Rule 3+ times in the qualified set, collapse the
+    # group to a single representative row (highest Risk_Score wins)
+    # and stash the detail rows for a separate "Aggregated Detail"
+    # sheet. Reduces visual noise without losing evidence.
+    #
+    # Critical-tier rows are NEVER aggregated — each Critical finding
+    # is independently auditable and deserves its own row regardless
+    # of repetition pattern.
+    #
+    # Aggregation key: (user_id, Primary_Rule). We use Primary_Rule
+    # rather than the score column because Primary_Rule is the
+    # finding label the reviewer actually sees.
+    _AGG_THRESHOLD = 3
+    _aggregated_detail_rows = []   # collects rows that get rolled up
+    if (len(top20) > 0
+        and "user_id" in top20.columns
+        and "Primary_Rule" in top20.columns
+        and "Risk_Tier" in top20.columns
+        and "Risk_Score" in top20.columns):
+        # Identify candidate groups: non-Critical rows with ≥3 events
+        _aggregable = top20[top20["Risk_Tier"] != "Critical"].copy()
+        _aggregable["_group_key"] = (
+            _aggregable["user_id"].astype(str).str.strip()
+            + "||" + _aggregable["Primary_Rule"].astype(str).str.strip()
+        )
+        _group_sizes = _aggregable.groupby("_group_key").size()
+        _aggregable_groups = set(_group_sizes[_group_sizes >= _AGG_THRESHOLD].index)
+        if _aggregable_groups:
+            # Build a parallel _group_key on top20 for the same rows
+            _top_keys = (top20["user_id"].astype(str).str.strip()
+                         + "||" + top20["Primary_Rule"].astype(str).str.strip())
+            _is_aggregable = _top_keys.isin(_aggregable_groups) & (top20["Risk_Tier"] != "Critical")
+            # For each aggregable group, keep the highest-scored row and
+            # mark it; route the rest to detail.
+            _keep_idx = []
+            _detail_idx = []
+            for grp in _aggregable_groups:
+                grp_rows = top20[(_top_keys == grp) & (top20["Risk_Tier"] != "Critical")]
+                grp_rows_sorted = grp_rows.sort_values("Risk_Score", ascending=False)
+                _keep_idx.append(grp_rows_sorted.index[0])
+                _detail_idx.extend(list(grp_rows_sorted.index[1:]))
+            # Pull detail rows into the parking lot, with original primary rep noted
+            _detail_df = top20.loc[_detail_idx].copy() if _detail_idx else pd.DataFrame()
+            if not _detail_df.empty:
+                _aggregated_detail_rows = _detail_df.copy()
+            # Compute Event_Count per kept representative
+            _event_count_map = {grp: len(top20[(_top_keys == grp) & (top20["Risk_Tier"] != "Critical")])
+                                for grp in _aggregable_groups}
+            # Build final top20: non-aggregable rows + representatives
+            _to_drop = set(_detail_idx)
+            top20 = top20[~top20.index.isin(_to_drop)].copy()
+            top20["Event_Count"] = 1
+            # Re-derive group keys post-drop for the surviving aggregable rows
+            _surv_keys = (top20["user_id"].astype(str).str.strip()
+                          + "||" + top20["Primary_Rule"].astype(str).str.strip())
+            for grp, cnt in _event_count_map.items():
+                top20.loc[_surv_keys == grp, "Event_Count"] = cnt
+        else:
+            top20["Event_Count"] = 1
+    else:
+        top20["Event_Count"] = 1
+
+    return scored, top20, _aggregated_detail_rows, int(_oop_mask.sum())
+
+
+def _at_dim_rows(scored: pd.DataFrame, period_label: str, system_name: str,
+                 file_name: str, rule_config: dict) -> list:
+    """DIM rows for one AT period: every High/Critical event (not just the
+    Top-N — the cut is a display decision, DIM needs the full signal), or one
+    "(no escalations)" sentinel so a clean period still banks."""
+    _hc_scored = scored[scored["Risk_Tier"].isin(["High", "Critical"])]
+    # Config hash — identifies which rules were active this run
+    _cfg_active  = sorted(k for k, v in (rule_config or {}).items() if v)
+    _config_hash = hashlib.md5(",".join(_cfg_active).encode()).hexdigest()[:8]
+    _dim_rows = []
+    for _, _ev in _hc_scored.iterrows():
+        _at_rule_str = str(_ev.get("Primary_Rule", ""))
+        _dim_rows.append({
+            "Review_Period":  period_label,
+            "Username":       str(_ev.get("user_id", _ev.get("User", "unknown"))),
+            "Risk_Level":     str(_ev.get("Risk_Tier", "Medium")),
+            "Rule_Triggered": _at_rule_str,
+            "Event_Category": _dim_event_category(_at_rule_str),
+            "System_Name":    system_name,
+            "Event_Type":     str(_ev.get("action_type", _ev.get("Action", ""))),
+            "Event_Timestamp":str(_ev.get("timestamp",   _ev.get("Timestamp", ""))),
+            "Source_File":    file_name,
+            "Source_Module":  "AT",
+            "Config_Hash":    _config_hash,
+        })
+    # Always bank the period even when 0 events are escalated
+    if not _dim_rows:
+        _dim_rows.append({
+            "Review_Period":  period_label,
+            "Username":       "(no escalations)",
+            "Risk_Level":     "Low",
+            "Rule_Triggered": "No named rules triggered",
+            "Event_Category": "Other",
+            "System_Name":    system_name,
+            "Event_Type":     "",
+            "Event_Timestamp":"",
+            "Source_File":    file_name,
+            "Source_Module":  "AT",
+            "Config_Hash":    _config_hash,
+        })
+    return _dim_rows
+
+
 def _at_deterministic_justification(row: dict) -> str:
     """
     Builds a contextual sentence for the What Happened column.
@@ -10049,19 +13418,191 @@ def _at_deterministic_justification(row: dict) -> str:
                 f"{comment_clause}.")
 
 
-def at_generate_justifications(top_df: pd.DataFrame, model_id: str) -> pd.DataFrame:
+# ── Narrative memo cache + concurrent per-event fallback ─────────────────────
+# AI narratives are keyed on a normalised fingerprint of the event (or user)
+# plus the model that wrote it and the prompt version that produced it. A
+# re-run of the same file, or a finding that recurs unchanged in a later
+# period, reuses the accepted narrative instead of paying for another call.
+# Bump a prompt version whenever its prompt text changes — old entries then
+# simply stop matching. In-process LRU in front of the narrative_cache table.
+_NARRATIVE_PROMPT_VERSIONS = {
+    "at_batch":   "at-batch-v1",
+    "at_single":  "at-single-v1",
+    "uar_batch":  "uar-batch-v2",   # v2: {"id", "narrative"} objects, streamed
+    "uar_single": "uar-single-v1",
+}
+_NARRATIVE_CACHE_MAX      = 2000
+_NARRATIVE_DB_TTL_DAYS    = 180      # narrative_cache rows older than this are pruned
+_NARRATIVE_DB_MAX_ROWS    = 50_000   # … and the newest this many are kept
+_NARRATIVE_FALLBACK_MAX_WORKERS = 6   # gateway still enforces per-provider caps
+_NARRATIVE_STATE          = _process_state("narrative_cache")   # survives reruns
+_NARRATIVE_CACHE          = _NARRATIVE_STATE.setdefault("lru", _collections.OrderedDict())
+_NARRATIVE_LOCK           = _NARRATIVE_STATE.setdefault("lock", _threading.Lock())
+_NARRATIVE_WS_RE          = re.compile(r"\s+")
+
+
+def _narrative_fingerprint(*fields) -> str:
+    """Case/whitespace-insensitive digest of the fields a narrative describes."""
+    norm = "\x1f".join(
+        _NARRATIVE_WS_RE.sub(" ", str(f if f is not None else "")).strip().lower()
+        for f in fields
+    )
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()[:32]
+
+
+def _narrative_cache_key(fingerprint: str, model: str, prompt: str) -> str:
+    return f"{_NARRATIVE_PROMPT_VERSIONS[prompt]}|{model}|{fingerprint}"
+
+
+def _narrative_cache_get(fingerprint: str, models: list, prompts: tuple):
+    """First cached narrative for this fingerprint under any (model, prompt)
+    combination, in cascade order. Returns None on a miss."""
+    keys = [_narrative_cache_key(fingerprint, m, p) for m in models for p in prompts]
+    with _NARRATIVE_LOCK:
+        for k in keys:
+            if k in _NARRATIVE_CACHE:
+                _NARRATIVE_CACHE.move_to_end(k)
+                return _NARRATIVE_CACHE[k]
+    try:
+        conn = db_connect()
+        marks = ",".join("?" * len(keys))
+        rows = dict(conn.execute(
+            f"SELECT cache_key, narrative FROM narrative_cache "
+            f"WHERE cache_key IN ({marks})", keys
+        ).fetchall())
+        conn.close()
+    except Exception:
+        return None
+    for k in keys:
+        if k in rows:
+            with _NARRATIVE_LOCK:
+                _NARRATIVE_CACHE[k] = rows[k]
+                while len(_NARRATIVE_CACHE) > _NARRATIVE_CACHE_MAX:
+                    _NARRATIVE_CACHE.popitem(last=False)
+            return rows[k]
+    return None
+
+
+def _narrative_cache_put(fingerprint: str, model: str, prompt: str,
+                         narrative: str) -> None:
+    """Store an accepted AI narrative. Deterministic fallbacks are never cached."""
+    if not narrative or not model:
+        return
+    k = _narrative_cache_key(fingerprint, model, prompt)
+    with _NARRATIVE_LOCK:
+        _NARRATIVE_CACHE[k] = narrative
+        _NARRATIVE_CACHE.move_to_end(k)
+        while len(_NARRATIVE_CACHE) > _NARRATIVE_CACHE_MAX:
+            _NARRATIVE_CACHE.popitem(last=False)
+    try:
+        conn = db_connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO narrative_cache "
+            "(cache_key, prompt_version, model, narrative, created_at) "
+            "VALUES (?,?,?,?,?)",
+            (k, _NARRATIVE_PROMPT_VERSIONS[prompt], model, narrative,
+             datetime.datetime.utcnow().isoformat()),
+        )
+        conn.commit()
+        conn.close()
+    except Exception:
+        pass
+
+
+def _narrative_cache_prune() -> int:
+    """Bound the narrative_cache table: drop rows of retired prompt versions,
+    rows older than _NARRATIVE_DB_TTL_DAYS, then all but the newest
+    _NARRATIVE_DB_MAX_ROWS. Run with the worker's hourly maintenance.
+    Returns the number of rows deleted."""
+    cutoff = (datetime.datetime.utcnow()
+              - datetime.timedelta(days=_NARRATIVE_DB_TTL_DAYS)).isoformat()
+    live   = sorted(set(_NARRATIVE_PROMPT_VERSIONS.values()))
+    conn = db_connect()
+    try:
+        n = conn.execute(
+            f"DELETE FROM narrative_cache WHERE created_at < ? OR created_at IS NULL "
+            f"OR prompt_version NOT IN ({','.join('?' * len(live))})",
+            [cutoff] + live).rowcount
+        n += conn.execute(
+            "DELETE FROM narrative_cache WHERE cache_key NOT IN (SELECT cache_key "
+            "FROM narrative_cache ORDER BY created_at DESC LIMIT ?)",
+            (_NARRATIVE_DB_MAX_ROWS,)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return n
+
+
+def _narratives_concurrent(jobs: dict, on_done=None) -> dict:
+    """Run per-event narrative calls concurrently.
+
+    jobs    — {slot: zero-arg callable returning (text, model) or (None, None)}.
+    on_done — optional on_done(slot, text, model), called on the calling
+              thread as each job finishes (safe for Streamlit updates).
+    Returns {slot: (text, model)} for the slots that produced text; failures
+    are dropped so the caller's deterministic fallback fills them.
+    """
+    if not jobs:
+        return {}
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    out = {}
+    with ThreadPoolExecutor(
+        max_workers=min(_NARRATIVE_FALLBACK_MAX_WORKERS, len(jobs)),
+        thread_name_prefix="valintel-narrative",
+    ) as pool:
+        futs = {pool.submit(fn): slot for slot, fn in jobs.items()}
+        for fut in as_completed(futs):
+            try:
+                text, model = fut.result()
+            except Exception:
+                continue
+            if text:
+                out[futs[fut]] = (text, model)
+                if on_done is not None:
+                    on_done(futs[fut], text, model)
+    return out
+
+
+def at_generate_justifications(top_df: pd.DataFrame, model_id: str,
+                               on_narrative=None) -> pd.DataFrame:
     """
     Generates a one-sentence factual log summary for each escalated event.
-    Primary: single batched LLM call returning JSON array — target 5-15s total.
-    Fallback: deterministic Python justification per event — no visible error.
+    Primary: single batched LLM call returning JSON array — target 5-15s total,
+    streamed so each narrative is usable ~1 s after its row is generated.
+    Fallback A: concurrent per-event calls for events the batch did not cover.
+    Fallback B: deterministic Python justification per event — no visible error.
+    Accepted AI narratives are memoised (_narrative_cache_get) per event.
+    on_narrative(rank, text) — optional; called on the calling thread for every
+    AI narrative as it arrives (rank is 1-based), e.g. to fill a live table.
     """
     total = len(top_df)
     if total == 0:
         return top_df
 
-    # ── Build batch prompt ────────────────────────────────────────────────────
+    justifications = [""] * total
+
+    # ── Memo cache: reuse accepted narratives for identical events ───────────
+    _cascade = _get_ai_cascade()
+    _fps = [
+        _narrative_fingerprint(
+            row.get("user_id", ""), row.get("action_type", ""),
+            row.get("record_type", ""), row.get("record_id", ""),
+            row.get("timestamp", ""), row.get("Primary_Rule", ""),
+            str(row.get("comments", ""))[:80], row.get("Sequence_Context", ""),
+        )
+        for _, row in top_df.iterrows()
+    ]
+    for i, fp in enumerate(_fps):
+        justifications[i] = _narrative_cache_get(
+            fp, _cascade, ("at_batch", "at_single")) or ""
+        if justifications[i] and on_narrative is not None:
+            on_narrative(i + 1, justifications[i])
+
+    # ── Build batch prompt (uncached events only; ids stay = rank) ────────────
     events_payload = []
     for rank, (_, row) in enumerate(top_df.iterrows(), 1):
+        if justifications[rank - 1]:
+            continue
         _primary = str(row.get("Primary_Rule","")).replace(" [CRITICAL]","").replace(" [HIGH]","").replace(" [MEDIUM]","")
         events_payload.append({
             "id":          rank,
@@ -10117,39 +13658,37 @@ EVENTS:
 
 Respond with JSON array only."""
 
-    justifications = [""] * total
-
     # ── Primary: batch LLM call — bypass _call_ai_with_fallback ──────────────
     # _call_ai_with_fallback has timeout=20s which kills a 2400-token batch.
-    # Call litellm directly with timeout=90 so the batch can complete.
-    import re as _re
-    def _extract_json_array(text: str):
-        """Robust extraction: handles fences, leading text, trailing text."""
-        text = text.strip()
-        text = _re.sub(r'^```[a-z]*\n?', '', text, flags=_re.MULTILINE)
-        text = _re.sub(r'\n?```$', '', text, flags=_re.MULTILINE)
-        text = text.strip()
+    # Call the gateway directly with timeout=90 so the batch can complete.
+    # The array is streamed and parsed incrementally: each {"id", "narrative"}
+    # lands in its row (and on_narrative) the moment its closing brace arrives.
+    _pending_ids = {e["id"] for e in events_payload}
+
+    def _accept_item(item, model):
+        if not (isinstance(item, dict) and "id" in item and "narrative" in item):
+            return
         try:
-            return _json.loads(text)
-        except Exception:
-            pass
-        m = _re.search(r'\[.*?\]', text, _re.DOTALL)
-        if m:
-            try:
-                return _json.loads(m.group(0))
-            except Exception:
-                pass
-        return None
+            rank = int(item["id"])
+        except (TypeError, ValueError):
+            return
+        text = str(item.get("narrative", "")).strip()
+        if rank not in _pending_ids or justifications[rank - 1] or len(text) <= 20:
+            return
+        justifications[rank - 1] = text
+        _narrative_cache_put(_fps[rank - 1], model, "at_batch", text)
+        if on_narrative is not None:
+            on_narrative(rank, text)
 
-    _batch_success = False
+    _n_pending = len(events_payload)
     try:
-        from litellm import completion as _comp
-        for _model in _get_ai_cascade():
+        for _model in (_cascade if _n_pending else []):
             try:
-                resp = _comp(
-                    model=_model, stream=False,
+                _llm_stream_json_array(
+                    model=_model, purpose="at_batch", retries=1,
+                    on_item=lambda item, m=_model: _accept_item(item, m),
                     temperature=0.2,
-                    max_tokens=min(120 * total, 3000),
+                    max_tokens=min(120 * _n_pending, 3000),
                     timeout=90,    # batch needs time — 20s timeout was killing it
                     messages=[
                         {"role": "system", "content":
@@ -10159,64 +13698,51 @@ Respond with JSON array only."""
                         {"role": "user", "content": batch_prompt},
                     ]
                 )
-                raw = (resp.choices[0].message.content or "").strip()
-                parsed = _extract_json_array(raw)
-                if isinstance(parsed, list) and len(parsed) > 0:
-                    _by_id = {
-                        item["id"]: item["narrative"]
-                        for item in parsed
-                        if isinstance(item, dict)
-                        and "id" in item and "narrative" in item
-                        and len(str(item.get("narrative",""))) > 20
-                    }
-                    filled = sum(1 for rank in range(1, total+1) if rank in _by_id)
-                    if filled >= max(1, total // 2):
-                        for rank in range(1, total + 1):
-                            if rank in _by_id:
-                                justifications[rank - 1] = str(_by_id[rank])
-                        _batch_success = True
-                        break
             except Exception:
-                continue
+                pass   # keep whatever streamed in before the failure
+            filled = sum(1 for rank in _pending_ids if justifications[rank - 1])
+            if filled >= max(1, _n_pending // 2):
+                break
     except Exception:
         pass
 
     # ── Fallback A: individual calls for any still-empty (batch partial/failed) ─
-    if not _batch_success:
-        try:
-            from litellm import completion as _comp
-            for rank, (_, row) in enumerate(top_df.iterrows(), 1):
-                if justifications[rank - 1]:
-                    continue
-                _rule = str(row.get("Primary_Rule","")).replace("[CRITICAL]","").replace("[HIGH]","").replace("[MEDIUM]","").strip()
-                _single = (
-                    f"Write ONE sentence (max 35 words) for a QA Director:\n"
-                    f"User: {row.get('user_id','?')} | Action: {row.get('action_type','?')} | "
-                    f"Record: {row.get('record_type','')}/{row.get('record_id','')} | "
-                    f"Time: {row.get('timestamp','?')} | "
-                    f"Comment: \"{str(row.get('comments',''))[:60]}\" | "
-                    f"Rule: {_rule[:60]}\n"
-                    f"Explain what happened and what makes it suspicious. "
-                    f"No regulatory citations. No action instructions."
-                )
-                for _model in _get_ai_cascade():
-                    try:
-                        resp = _comp(
-                            model=_model, stream=False,
-                            temperature=0.2, max_tokens=100, timeout=25,
-                            messages=[
-                                {"role": "system", "content": "One-sentence GxP log summary."},
-                                {"role": "user",   "content": _single},
-                            ]
-                        )
-                        candidate = (resp.choices[0].message.content or "").strip()
-                        if candidate and len(candidate) > 20:
-                            justifications[rank - 1] = candidate
-                            break
-                    except Exception:
-                        continue
-        except Exception:
-            pass
+    # Run concurrently — serially this was up to 20 events × 5 models × 25 s.
+    def _single_job(row):
+        _rule = str(row.get("Primary_Rule","")).replace("[CRITICAL]","").replace("[HIGH]","").replace("[MEDIUM]","").strip()
+        _single = (
+            f"Write ONE sentence (max 35 words) for a QA Director:\n"
+            f"User: {row.get('user_id','?')} | Action: {row.get('action_type','?')} | "
+            f"Record: {row.get('record_type','')}/{row.get('record_id','')} | "
+            f"Time: {row.get('timestamp','?')} | "
+            f"Comment: \"{str(row.get('comments',''))[:60]}\" | "
+            f"Rule: {_rule[:60]}\n"
+            f"Explain what happened and what makes it suspicious. "
+            f"No regulatory citations. No action instructions."
+        )
+        return lambda: _llm_cascade_completion(
+            [
+                {"role": "system", "content": "One-sentence GxP log summary."},
+                {"role": "user",   "content": _single},
+            ],
+            purpose="at_single", accept=lambda t: len(t) > 20,
+            stream=False, temperature=0.2, max_tokens=100, timeout=25,
+        )
+
+    def _single_done(rank, text, model):
+        justifications[rank - 1] = text
+        _narrative_cache_put(_fps[rank - 1], model, "at_single", text)
+        if on_narrative is not None:
+            on_narrative(rank, text)
+
+    try:
+        _narratives_concurrent({
+            rank: _single_job(row)
+            for rank, (_, row) in enumerate(top_df.iterrows(), 1)
+            if not justifications[rank - 1]
+        }, on_done=_single_done)
+    except Exception:
+        pass
 
     # ── Fallback: deterministic for any event that didn't get an AI narrative ──
     for rank, (_, row) in enumerate(top_df.iterrows(), 1):
@@ -10228,13 +13754,21 @@ Respond with JSON array only."""
     return top_df
 
 
-def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> bytes:
+def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname,
+                   settings=None, progress_cb=None) -> bytes:
     """
     Build a clean, professional evidence workbook for QA reviewers and auditors.
     White background, dark text, colour only on Risk Level cells.
     Three sheets: Cover & Summary | Events for Review | Full Audit Log
+
+    settings    — optional snapshot of the at_* session keys (thresholds,
+                  rule toggles, system name). Background builds pass one in
+                  because st.session_state is not readable off the script thread.
+    progress_cb — optional callable(fraction, message) fired at sheet boundaries.
     """
     from openpyxl import Workbook
+    _ss   = settings if settings is not None else st.session_state
+    _prog = progress_cb or (lambda _f, _m: None)
     output = io.BytesIO()
     wb     = Workbook()
 
@@ -10274,9 +13808,9 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     def _fill(hex_color):
         return PatternFill("solid", fgColor=hex_color)
 
-    t_crit = float(st.session_state.get("at_thresh_critical", 7.0))
-    t_high = float(st.session_state.get("at_thresh_high",     5.0))
-    t_med  = float(st.session_state.get("at_thresh_medium",   3.0))
+    t_crit = float(_ss.get("at_thresh_critical", 7.0))
+    t_high = float(_ss.get("at_thresh_high",     5.0))
+    t_med  = float(_ss.get("at_thresh_medium",   3.0))
 
     total     = len(scored_df)
     n_esc     = len(top_df)
@@ -10294,6 +13828,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     # ══════════════════════════════════════════════════════════════════════════
     # SHEET 1 — Cover & Summary
     # ══════════════════════════════════════════════════════════════════════════
+    _prog(0.05, "Summary")
     ws = wb.active
     ws.title = "Summary"
     ws.sheet_properties.tabColor = "1E3A5F"
@@ -10850,6 +14385,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     # ══════════════════════════════════════════════════════════════════════════
     # SHEET 2 — Events for Review (QA-friendly, no technical columns)
     # ══════════════════════════════════════════════════════════════════════════
+    _prog(0.15, "Events for Review")
     ws2 = wb.create_sheet("Events for Review")
     ws2.sheet_properties.tabColor = "DC2626"
     ws2.sheet_view.showGridLines  = False
@@ -11048,6 +14584,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     _has_agg = (("Event_Count" in top_df.columns)
                 and ((top_df["Event_Count"] > 1).any()))
     if _has_agg and not scored_df.empty:
+        _prog(0.30, "Aggregated Detail")
         ws_agg = wb.create_sheet("Aggregated Detail")
         ws_agg.sheet_properties.tabColor = "9333EA"   # purple
         ws_agg.sheet_view.showGridLines  = False
@@ -11156,6 +14693,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     # ══════════════════════════════════════════════════════════════════════════
     # SHEET 3 — Full Audit Log (all events, reviewer-friendly columns only)
     # ══════════════════════════════════════════════════════════════════════════
+    _prog(0.40, "Full Audit Log")
     ws3 = wb.create_sheet("Full Audit Log")
     ws3.sheet_properties.tabColor = "374151"
     ws3.sheet_view.showGridLines  = False
@@ -11259,6 +14797,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     # ══════════════════════════════════════════════════════════════════════════
     # SHEET 4 — Detection Logic Reference (active rules for this run)
     # ══════════════════════════════════════════════════════════════════════════
+    _prog(0.80, "Detection Logic")
     ws4 = wb.create_sheet("Detection Logic")
     ws4.sheet_properties.tabColor = "374151"
     ws4.sheet_view.showGridLines  = False
@@ -11324,7 +14863,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
 
     # Column headers on ROW 1 — required for autofilter on Status column
     _n_active = sum(1 for r in _dl_all_rules
-                    if st.session_state.get(r[0], _dl_rule_defaults.get(r[0], True)))
+                    if _ss.get(r[0], _dl_rule_defaults.get(r[0], True)))
     _dl_headers = ["#", "Tier", "Class", "Rule Name", "Trigger Condition",
                    "FDA Regulation", "EU Annex 11", "Status"]
     for ci, hdr in enumerate(_dl_headers, 1):
@@ -11340,7 +14879,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     # Rule rows start at row 2
     row_num = 2
     for cfg_key, rnum, tier, t_class, name, trigger, fda, eu in _dl_all_rules:
-        _active = st.session_state.get(cfg_key, _dl_rule_defaults.get(cfg_key, True))
+        _active = _ss.get(cfg_key, _dl_rule_defaults.get(cfg_key, True))
         _status = "ACTIVE" if _active else "DISABLED FOR THIS RUN"
         _row_alpha = "1.0" if _active else "0.4"
         _tf = _TIER_FILL.get(tier, "F1F5F9")
@@ -11464,6 +15003,50 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     ws4.row_dimensions[row_num].height = 36
     row_num += 1
 
+    # ── Performance — per-stage scoring profile (_AtRuleProfiler) ────────────
+    # Engineering record of where scoring time went for this run. Stage names
+    # carry v96 UI numbers; dropped rules still compute dead score columns and
+    # are listed so their cost stays visible.
+    _perf = _ss.get("at_rule_profile") or {}
+    if _perf.get("stages"):
+        row_num += 1
+        _pf_title = ws4.cell(row=row_num, column=1, value=(
+            f"Performance — scoring engine profile "
+            f"({_perf['rows']:,} events, {_perf['total_seconds']:.2f}s total, "
+            f"engine v{_perf.get('engine_version', VERSION)})"))
+        _pf_title.font      = Font(bold=True, color="FFFFFF", name="Calibri", size=10)
+        _pf_title.fill      = _fill("334155")
+        _pf_title.alignment = Alignment(horizontal="left", vertical="center", indent=1)
+        ws4.merge_cells(f"A{row_num}:H{row_num}")
+        ws4.row_dimensions[row_num].height = 18
+        row_num += 1
+        for ci, hdr in enumerate(["#", "Wall (s)", "% Total", "Stage", "",
+                                  "Rows Examined", "Rows Fired", ""], 1):
+            if not hdr:
+                continue
+            hc = ws4.cell(row=row_num, column=ci, value=hdr)
+            hc.font      = Font(bold=True, color="334155", name="Calibri", size=9)
+            hc.fill      = _fill("E2E8F0")
+            hc.alignment = Alignment(horizontal="left", vertical="center", indent=1)
+        ws4.row_dimensions[row_num].height = 16
+        row_num += 1
+        _pf_slowest = {id(_s) for _s in _at_profile_top(_perf, 3)}
+        for _pi, _stg in enumerate(_perf["stages"], 1):
+            _hot = id(_stg) in _pf_slowest
+            _pf_vals = {1: _pi, 2: _stg["seconds"], 3: _stg.get("share_pct", 0.0),
+                        4: _stg["stage"], 6: _stg["rows_examined"],
+                        7: "—" if _stg["rows_fired"] is None else _stg["rows_fired"]}
+            for ci, val in _pf_vals.items():
+                cell = ws4.cell(row=row_num, column=ci, value=val)
+                cell.font      = Font(bold=_hot and ci in (2, 3),
+                                      color="B45309" if _hot else "1E293B",
+                                      name="Calibri", size=9)
+                cell.fill      = _fill("FFFBEB" if _hot else "FFFFFF")
+                cell.alignment = Alignment(horizontal="left", vertical="top", indent=1)
+            ws4.merge_cells(f"D{row_num}:E{row_num}")
+            ws4.row_dimensions[row_num].height = 16
+            row_num += 1
+
     # GAMP AI compliance footer
     ws4.row_dimensions[row_num].height = 8
     row_num += 1
@@ -11487,6 +15070,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     # Regulators and auditors can verify the uploaded file was not altered.
     # =========================================================================
     import hashlib as _hl
+    _prog(0.85, "Integrity Audit")
     ws5 = wb.create_sheet("Integrity Audit")
     ws5.column_dimensions["A"].width = 36
     ws5.column_dimensions["B"].width = 52
@@ -11564,6 +15148,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     from openpyxl.chart import BarChart, Reference
     from openpyxl.chart.series import SeriesLabel
 
+    _prog(0.90, "Rule Summary")
     ws_rs = wb.create_sheet("Rule Summary")
     ws_rs.sheet_properties.tabColor = "1E3A5F"
     ws_rs.sheet_view.showGridLines   = False
@@ -11587,7 +15172,7 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     _rs_sub = ws_rs.cell(row=2, column=1,
         value=f"Based on {_total_rows:,} total events · "
               f"{len(top_df):,} escalated · "
-              f"System: {st.session_state.get('at_system_name', '') or 'GxP System'}")
+              f"System: {_ss.get('at_system_name', '') or 'GxP System'}")
     _rs_sub.font      = Font(italic=True, color=C_LABEL_FG, name="Calibri", size=9)
     _rs_sub.fill      = PatternFill("solid", fgColor=C_HEADER_BG)
     _rs_sub.alignment = Alignment(horizontal="left", vertical="center", indent=1)
@@ -11715,10 +15300,59 @@ def at_build_excel(top_df, scored_df, system_name, r_start, r_end, fname) -> byt
     ws_rs.merge_cells(f"A{_footer_row}:E{_footer_row}")
     ws_rs.row_dimensions[_footer_row].height = 32
 
+    _prog(0.95, "Saving workbook")
     wb.save(output)
     return output.getvalue()
 
 
+def _at_excel_settings() -> dict:
+    """Snapshot of the session keys at_build_excel reads (thresholds, rule
+    toggles, system name, scoring profile) so the workbook can be built off
+    the script thread."""
+    return {
+        k: v for k, v in st.session_state.items()
+        if isinstance(k, str)
+        and (re.fullmatch(r"at_r\d+_on", k)
+             or k.startswith("at_thresh_")
+             or k in ("at_system_name", "at_rule_profile"))
+    }
+
+
+def _at_submit_workbook_build(top20: pd.DataFrame, scored: pd.DataFrame):
+    """Queue the AT evidence workbook on the background artifact builder.
+
+    Returns the artifact key, or None when no System Name has been entered
+    yet (the workbook header requires one — the download section resubmits
+    once it is filled in).
+    """
+    sys_name = st.session_state.get("at_system_name", "").strip()
+    if not sys_name:
+        return None
+    r_start  = st.session_state.get("at_review_start", "").strip()
+    r_end    = st.session_state.get("at_review_end", "").strip()
+    fname    = st.session_state.get("at_file_name", "")
+    file_hash = st.session_state.get("at_pending_hash", "")
+    settings = _at_excel_settings()
+    key = _artifact_key(
+        "at", file_hash, sys_name, r_start, r_end,
+        # settings carries at_rule_profile (the Performance block), so every
+        # run gets its own workbook; narratives + model catch regenerated text.
+        _artifact_variant(settings, fname, len(scored), len(top20),
+                          _artifact_narratives(top20, "AI_Justification"),
+                          st.session_state.get("selected_model", "")),
+    )
+    artifact_submit(
+        key, at_build_excel,
+        top20, scored, sys_name,
+        r_start or "(review period dates not specified)",
+        r_end   or "(review period dates not specified)",
+        fname,
+        settings=settings,
+        persist=bool(file_hash),
+    )
+    return key
+
+
 # =============================================================================
 # Deterministic GxP user access review engine.
 # Rules U1–U10 | Scoring: additive integer weights | No AI in scoring path.
@@ -11813,6 +15447,14 @@ _UAR_COL_ALIASES: dict = {
     "employment_status": "employment_status", "hr_status": "employment_status",
     "emp_status": "employment_status", "employee_status": "employment_status",
     "hr_active": "employment_status",
+    # employee_id / email — cross-system identity keys (uar_score_systems)
+    "employee_id": "employee_id", "employeeid": "employee_id",
+    "employee_number": "employee_id", "emp_id": "employee_id",
+    "empid": "employee_id", "personnel_number": "employee_id",
+    "worker_id": "employee_id", "hr_id": "employee_id",
+    "email": "email", "email_address": "email", "emailaddress": "email",
+    "mail": "email", "e_mail": "email", "upn": "email",
+    "user_principal_name": "email",
     # access_justification
     "access_justification": "access_justification",
     "justification": "access_justification",
@@ -12108,36 +15750,207 @@ REGULATORY BASIS
 UAR_DETECTION_LOGIC = UAR_DETECTION_LOGIC.rstrip() + _GAMP_AI_BLOCK
 
 
+# ── _uar_preprocess alias pass ───────────────────────────────────────────────
+# Second, collapsed-form alias pass run by _uar_preprocess after
+# _uar_normalise_columns. Strategy: collapse all separators from the column
+# name → look up in the alias map → rename to canonical if found.
+_UAR_PP_COL_ALIAS_MAP = {
+    # ── Account identity ──────────────────────────────────────────────────
+    "username":           ["username","user_name","userid","user_id",
+                           "accountname","account_name","loginid","login_id",
+                           "useraccount","user_account","accountid","account_id",
+                           "userlogin","login"],
+    # ── Account status ────────────────────────────────────────────────────
+    "account_status":     ["account_status","accountstatus","acct_status",
+                           "acctstatus","is_active","isactive","active_yn",
+                           "active_flag","disabled","enabled","status",
+                           "accountstatus"],
+    # ── Employment status ─────────────────────────────────────────────────
+    "employment_status":  ["employment_status","employmentstatus","emp_status",
+                           "empstatus","hr_status","hrstatus","workerstatus",
+                           "workertype"],
+    # ── Login dates ───────────────────────────────────────────────────────
+    "last_login_date":    ["last_login_date","lastlogindate","last_login",
+                           "lastlogin","last_logon","lastlogon",
+                           "last_logon_date","lastlogondate","last_active",
+                           "lastactive","last_access","lastaccess",
+                           "lastactivity","last_activity"],
+    # ── Account created ───────────────────────────────────────────────────
+    "created_date":       ["created_date","createddate","create_date",
+                           "createdate","account_created","accountcreated",
+                           "hire_date","hiredate","hired_date","hireddate",
+                           "start_date","startdate"],
+    # ── Role ─────────────────────────────────────────────────────────────
+    "role":               ["role","roles","user_role","userrole","rolename",
+                           "role_name","permission","permissions","profile",
+                           "user_profile","userprofile","access_level",
+                           "accesslevel","entitlement","job_title","jobtitle",
+                           "position"],
+    # ── Privilege flags (explicit Y/N) ────────────────────────────────────
+    "is_admin":           ["is_admin","isadmin","admin","administrator",
+                           "is_administrator","is_privileged","isprivileged",
+                           "privileged","is_superuser","issuperuser",
+                           "is_root","isroot","is_power_user","ispoweruser"],
+    "can_delete":         ["can_delete","candelete","delete_access",
+                           "deleteaccess","delete_flag","deleteflag",
+                           "has_delete","hasdelete"],
+    "can_approve":        ["can_approve","canapprove","approve_access",
+                           "approveaccess","approve_flag","approveflag",
+                           "has_approve","hasapprove","approval_rights"],
+    "can_release":        ["can_release","canrelease","release_access",
+                           "releaseaccess","release_flag","releaseflag",
+                           "has_release","hasrelease"],
+    "can_modify_master_data": ["can_modify_master_data","canmodifymasterdata",
+                           "master_data_access","masterdataaccess",
+                           "modify_master","modifymaster","master_data_edit",
+                           "masterdataedit"],
+    # ── GxP criticality ───────────────────────────────────────────────────
+    "gxp_criticality":    ["gxp_criticality","gxpcriticality","gxp_critical",
+                           "system_criticality","systemcriticality",
+                           "criticality","gxp_level","gxplevel"],
+    # ── Justification ─────────────────────────────────────────────────────
+    "access_justification":["access_justification","accessjustification",
+                           "justification","business_justification",
+                           "businessjustification","access_reason",
+                           "accessreason"],
+}
+
+_UAR_PP_COLLAPSED = _col_alias_compile(
+    ((alias, canon) for canon, aliases in _UAR_PP_COL_ALIAS_MAP.items()
+     for alias in aliases),
+    _col_alias_collapse)
+_UAR_ALIAS_KIND    = _col_alias_kind("uar", _UAR_COL_ALIASES)
+# canonical → every _UAR_COL_ALIASES key for it (input validator), built once
+_UAR_ALIASES_BY_CANON = {
+    canon: frozenset(a for a, c in _UAR_COL_ALIASES.items() if c == canon)
+    for canon in set(_UAR_COL_ALIASES.values())
+}
+_UAR_PP_ALIAS_KIND = _col_alias_kind("uar_pp", _UAR_PP_COL_ALIAS_MAP)
+
+
+def _uar_pp_alias_renames(columns: list) -> dict:
+    """{header: canonical} rename map for the _uar_preprocess alias pass.
+
+    Dedup rule: when two columns map to the same canonical name, prefer the
+    alphabetic-only column (no digits) over alphanumeric — e.g. AccountName
+    beats UserID for 'username'. Equal candidates: first-seen wins. A column
+    already carrying the canonical name always wins and is never renamed.
+    """
+    def _has_digit_pp(s) -> bool:
+        return any(ch.isdigit() for ch in str(s))
+
+    # Pass 1: pick winner per canonical target
+    _pp_candidates: dict = {}
+    for col in columns:
+        if col in _UAR_PP_COL_ALIAS_MAP:
+            # Already canonical — always wins over any alias
+            _pp_candidates[col] = col
+            continue
+        canon = _UAR_PP_COLLAPSED.get(_col_alias_collapse(col))
+        if canon is not None:
+            if canon not in _pp_candidates:
+                _pp_candidates[canon] = col
+            else:
+                existing = _pp_candidates[canon]
+                if existing == canon:
+                    pass  # canonical col already present — it always wins
+                elif _has_digit_pp(existing) and not _has_digit_pp(col):
+                    _pp_candidates[canon] = col
+
+    # Pass 2: build rename_map only for winners, skip already-canonical cols
+    rename_map = {}
+    _pp_winners = set(_pp_candidates.values())
+    present     = set(columns)
+    for col in columns:
+        if col in _UAR_PP_COL_ALIAS_MAP:
+            continue  # already canonical, no rename needed
+        if col not in _pp_winners:
+            continue  # lost conflict — leave unchanged (will be ignored downstream)
+        canon = _UAR_PP_COLLAPSED.get(_col_alias_collapse(col))
+        if canon is not None and canon not in present:
+            rename_map[col] = canon
+    return rename_map
+
+
 # =============================================================================
 # PREPROCESSING
 # =============================================================================
 
-def _uar_normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
+def _uar_read_table(raw: bytes, file_name: str) -> tuple:
+    """Read a UAR upload (CSV or Excel) as string columns, headers stripped.
+
+    Returns (df, sheet_names, sheet_used); both sheet values are None for CSV.
+    Excel: skip "Usage Instructions"-style sheets and prefer one whose name
+    suggests user / access / role data.
     """
-    Map raw export column headers to normalised internal names using
-    _UAR_COL_ALIASES. Returns df with renamed columns.
-    Unrecognised columns are passed through unchanged.
+    if file_name.lower().endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(raw), dtype=str)
+        df.columns = df.columns.str.strip()
+        return df, None, None
+    xl     = pd.ExcelFile(io.BytesIO(raw))
+    sheets = list(xl.sheet_names)
+    SKIP   = {"usage instructions", "usage", "instructions",
+              "readme", "read me", "guide"}
+    data_sheets = [s for s in sheets if s.strip().lower() not in SKIP]
+    preferred   = [s for s in data_sheets
+                   if any(kw in s.lower()
+                          for kw in ("user", "access", "role",
+                                     "permission", "all users"))]
+    sheet_to_use = (preferred or data_sheets or sheets)[0]
+    df = pd.read_excel(io.BytesIO(raw), sheet_name=sheet_to_use, dtype=str)
+    df.columns = df.columns.str.strip()
+    return df, sheets, sheet_to_use
+
+
+def _uar_review_period(raw_df: pd.DataFrame) -> tuple:
+    """(start, end) as dd-Mon-YYYY from the first parseable last-login /
+    created date column; the current quarter to date when there is none."""
+    for _dcol in ["last_login", "last_login_date", "lastlogindate",
+                  "last_logon", "created_date", "createddate",
+                  "created_at", "creation_date"]:
+        _dcol_match = next(
+            (c for c in raw_df.columns
+             if c.lower().replace(" ","_").replace("-","_") == _dcol),
+            None
+        )
+        if _dcol_match:
+            try:
+                _dcol_parsed = pd.to_datetime(
+                    raw_df[_dcol_match], errors="coerce"
+                ).dropna()
+                if not _dcol_parsed.empty:
+                    return (_dcol_parsed.min().strftime("%d-%b-%Y"),
+                            _dcol_parsed.max().strftime("%d-%b-%Y"))
+            except Exception:
+                pass
+    import datetime as _dt
+    _today = _dt.date.today()
+    _q = (_today.month - 1) // 3
+    _qstart = _dt.date(_today.year, _q * 3 + 1, 1) if _q > 0 else _dt.date(_today.year - 1, 10, 1)
+    return _qstart.strftime("%d-%b-%Y"), _today.strftime("%d-%b-%Y")
 
-    v96: key normalisation also strips underscores so that e.g.
-    'AccountStatus' → 'accountstatus' matches 'account_status' variants,
-    and 'LastLoginDate' → 'lastlogindate' matches 'last_login_date' variants.
 
-    Dedup rule: when two input columns map to the same canonical name,
-    prefer the column whose name is purely alphabetic (no digits) over one
-    that contains digits - e.g. AccountName beats UserID for 'username'.
-    If both are equally alphanumeric, keep the first one encountered.
-    """
+def _uar_alias_key(col) -> str:
+    """_UAR_COL_ALIASES lookup for one header: separator-preserving key
+    (spaces / hyphens → '_') first, then the fully collapsed key."""
+    c = str(col).strip().lower()
+    return (_UAR_COL_ALIASES.get(c.replace(" ", "_").replace("-", "_"))
+            or _UAR_COL_ALIASES.get(c.replace(" ", "").replace("-", "").replace("_", "")))
+
+
+def _uar_alias_renames(columns: list) -> dict:
+    """{header: canonical} rename map for _uar_normalise_columns (uncached)."""
     def _has_digit(s: str) -> bool:
-        return any(ch.isdigit() for ch in s)
+        return any(ch.isdigit() for ch in str(s))
 
     # Pass 1: resolve conflicts - for each canonical target, pick the winner
     candidate_map: dict = {}
-    for col in df.columns:
-        key_with_sep    = col.strip().lower().replace(" ", "_").replace("-", "_")
-        key_without_sep = col.strip().lower().replace(" ", "").replace("-", "").replace("_", "")
-        canon = _UAR_COL_ALIASES.get(key_with_sep) or _UAR_COL_ALIASES.get(key_without_sep)
+    canon_of: dict = {}
+    for col in columns:
+        canon = _uar_alias_key(col)
         if canon is None:
             continue
+        canon_of[col] = canon
         if canon not in candidate_map:
             candidate_map[canon] = col
         else:
@@ -12149,16 +15962,29 @@ def _uar_normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
 
     # Pass 2: build rename_map only for winning columns
     winners = set(candidate_map.values())
-    rename_map = {}
-    for col in df.columns:
-        if col not in winners:
-            continue
-        key_with_sep    = col.strip().lower().replace(" ", "_").replace("-", "_")
-        key_without_sep = col.strip().lower().replace(" ", "").replace("-", "").replace("_", "")
-        canon = _UAR_COL_ALIASES.get(key_with_sep) or _UAR_COL_ALIASES.get(key_without_sep)
-        if canon and col != canon:
-            rename_map[col] = canon
-    return df.rename(columns=rename_map)
+    return {col: canon_of[col] for col in columns
+            if col in winners and col != canon_of[col]}
+
+
+def _uar_normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Map raw export column headers to normalised internal names using
+    _UAR_COL_ALIASES. Returns df with renamed columns.
+    Unrecognised columns are passed through unchanged.
+
+    v96: key normalisation also strips underscores so that e.g.
+    'AccountStatus' → 'accountstatus' matches 'account_status' variants,
+    and 'LastLoginDate' → 'lastlogindate' matches 'last_login_date' variants.
+
+    Dedup rule: when two input columns map to the same canonical name,
+    prefer the column whose name is purely alphabetic (no digits) over one
+    that contains digits - e.g. AccountName beats UserID for 'username'.
+    If both are equally alphanumeric, keep the first one encountered.
+
+    The rename map is resolved once per header layout (_col_alias_resolve).
+    """
+    return df.rename(columns=_col_alias_resolve(
+        _UAR_ALIAS_KIND, df.columns, _uar_alias_renames))
 
 
 def _uar_derive_gxp_criticality(system_str: str) -> str:
@@ -12230,125 +16056,15 @@ def _uar_preprocess(df: pd.DataFrame) -> tuple:
     data_quality_issues = []
     rules_skipped = []
 
-    # ── v96 — Column alias normalisation ──────────────────────────────────────
-    # Before any field-specific logic, remap user-supplied column names to the
-    # canonical names expected by the rest of this function. This allows files
-    # with non-standard headers (AccountName, IsPrivileged, LastLoginDate,
-    # AccountStatus, IS_Admin, Admin, isprivileged, can_delete, …) to be
-    # processed without requiring the user to manually rename every column.
-    #
-    # Strategy: collapse all separators from column name → look up in alias map
-    # → rename to canonical if found. Exact case-insensitive match preferred;
-    # collapsed-form match as fallback.
-    def _collapse_col(s: str) -> str:
-        return ''.join(ch for ch in str(s).lower() if ch.isalnum())
-
-    _UAR_COL_ALIAS_MAP = {
-        # ── Account identity ──────────────────────────────────────────────────
-        "username":           ["username","user_name","userid","user_id",
-                               "accountname","account_name","loginid","login_id",
-                               "useraccount","user_account","accountid","account_id",
-                               "userlogin","login"],
-        # ── Account status ────────────────────────────────────────────────────
-        "account_status":     ["account_status","accountstatus","acct_status",
-                               "acctstatus","is_active","isactive","active_yn",
-                               "active_flag","disabled","enabled","status",
-                               "accountstatus"],
-        # ── Employment status ─────────────────────────────────────────────────
-        "employment_status":  ["employment_status","employmentstatus","emp_status",
-                               "empstatus","hr_status","hrstatus","workerstatus",
-                               "workertype"],
-        # ── Login dates ───────────────────────────────────────────────────────
-        "last_login_date":    ["last_login_date","lastlogindate","last_login",
-                               "lastlogin","last_logon","lastlogon",
-                               "last_logon_date","lastlogondate","last_active",
-                               "lastactive","last_access","lastaccess",
-                               "lastactivity","last_activity"],
-        # ── Account created ───────────────────────────────────────────────────
-        "created_date":       ["created_date","createddate","create_date",
-                               "createdate","account_created","accountcreated",
-                               "hire_date","hiredate","hired_date","hireddate",
-                               "start_date","startdate"],
-        # ── Role ─────────────────────────────────────────────────────────────
-        "role":               ["role","roles","user_role","userrole","rolename",
-                               "role_name","permission","permissions","profile",
-                               "user_profile","userprofile","access_level",
-                               "accesslevel","entitlement","job_title","jobtitle",
-                               "position"],
-        # ── Privilege flags (explicit Y/N) ────────────────────────────────────
-        "is_admin":           ["is_admin","isadmin","admin","administrator",
-                               "is_administrator","is_privileged","isprivileged",
-                               "privileged","is_superuser","issuperuser",
-                               "is_root","isroot","is_power_user","ispoweruser"],
-        "can_delete":         ["can_delete","candelete","delete_access",
-                               "deleteaccess","delete_flag","deleteflag",
-                               "has_delete","hasdelete"],
-        "can_approve":        ["can_approve","canapprove","approve_access",
-                               "approveaccess","approve_flag","approveflag",
-                               "has_approve","hasapprove","approval_rights"],
-        "can_release":        ["can_release","canrelease","release_access",
-                               "releaseaccess","release_flag","releaseflag",
-                               "has_release","hasrelease"],
-        "can_modify_master_data": ["can_modify_master_data","canmodifymasterdata",
-                               "master_data_access","masterdataaccess",
-                               "modify_master","modifymaster","master_data_edit",
-                               "masterdataedit"],
-        # ── GxP criticality ───────────────────────────────────────────────────
-        "gxp_criticality":    ["gxp_criticality","gxpcriticality","gxp_critical",
-                               "system_criticality","systemcriticality",
-                               "criticality","gxp_level","gxplevel"],
-        # ── Justification ─────────────────────────────────────────────────────
-        "access_justification":["access_justification","accessjustification",
-                               "justification","business_justification",
-                               "businessjustification","access_reason",
-                               "accessreason"],
-    }
-
-    # Build collapsed→canonical map (collapsed alias → canonical name)
-    _collapsed_to_canon = {}
-    for canon, aliases in _UAR_COL_ALIAS_MAP.items():
-        for alias in aliases:
-            _collapsed_to_canon[_collapse_col(alias)] = canon
-
-    # Apply: rename columns where we find a match.
-    # Dedup rule: when two columns map to the same canonical name, prefer the
-    # alphabetic-only column (no digits) over alphanumeric — e.g. AccountName
-    # beats UserID for 'username'. Equal candidates: first-seen wins.
-    def _has_digit_pp(s: str) -> bool:
-        return any(ch.isdigit() for ch in s)
-
-    # Pass 1: pick winner per canonical target
-    _pp_candidates: dict = {}
-    for col in df.columns:
-        if col in _UAR_COL_ALIAS_MAP:
-            # Already canonical — always wins over any alias
-            _pp_candidates[col] = col
-            continue
-        ccol = _collapse_col(col)
-        if ccol in _collapsed_to_canon:
-            canon = _collapsed_to_canon[ccol]
-            if canon not in _pp_candidates:
-                _pp_candidates[canon] = col
-            else:
-                existing = _pp_candidates[canon]
-                if existing == canon:
-                    pass  # canonical col already present — it always wins
-                elif _has_digit_pp(existing) and not _has_digit_pp(col):
-                    _pp_candidates[canon] = col
-
-    # Pass 2: build rename_map only for winners, skip already-canonical cols
-    rename_map = {}
-    _pp_winners = set(_pp_candidates.values())
-    for col in df.columns:
-        if col in _UAR_COL_ALIAS_MAP:
-            continue  # already canonical, no rename needed
-        if col not in _pp_winners:
-            continue  # lost conflict — leave unchanged (will be ignored downstream)
-        ccol = _collapse_col(col)
-        if ccol in _collapsed_to_canon:
-            canon = _collapsed_to_canon[ccol]
-            if canon not in df.columns:
-                rename_map[col] = canon
+    # ── v96 — Column alias normalisation ──────────────────────────────────────
+    # Before any field-specific logic, remap user-supplied column names to the
+    # canonical names expected by the rest of this function. This allows files
+    # with non-standard headers (AccountName, IsPrivileged, LastLoginDate,
+    # AccountStatus, IS_Admin, Admin, isprivileged, can_delete, …) to be
+    # processed without requiring the user to manually rename every column.
+    # Alias table + rules: _UAR_PP_COL_ALIAS_MAP / _uar_pp_alias_renames.
+    rename_map = _col_alias_resolve(_UAR_PP_ALIAS_KIND, df.columns,
+                                    _uar_pp_alias_renames)
     if rename_map:
         df = df.rename(columns=rename_map)
 
@@ -12389,7 +16105,12 @@ def _uar_preprocess(df: pd.DataFrame) -> tuple:
             else "Medium"
         )
     elif "system_name" in df.columns:
-        df["gxp_criticality_derived"] = df["system_name"].apply(_uar_derive_gxp_criticality)
+        # Keyword-match each distinct system string once — an export carries a
+        # handful of system names across thousands of rows.
+        _sys_crit = {s: _uar_derive_gxp_criticality(s)
+                     for s in df["system_name"].dropna().unique()}
+        df["gxp_criticality_derived"] = (df["system_name"].map(_sys_crit)
+                                         .fillna("Medium"))
     else:
         df["gxp_criticality_derived"] = "Medium"
         rules_skipped.append("U6 (GxP Criticality) — system_name and gxp_criticality both absent; defaulting to Medium")
@@ -12924,6 +16645,269 @@ def uar_score_users(df: pd.DataFrame, at_top_df: pd.DataFrame = None) -> dict:
     }
 
 
+# =============================================================================
+# MULTI-SYSTEM CONSOLIDATION
+# =============================================================================
+# A quarterly UAR covers many GxP systems, each exported separately.
+# uar_score_systems() scores every export on its own: column normalisation,
+# preprocessing and U1–U10 scoring all run through uar_score_users(). The
+# exports go to a process pool, one system per task.
+#
+# Cross-system analytics then run on a compact identity index, not on one
+# concatenated frame. The index holds one row per (identity, system) account,
+# with just the status and privilege flags. The analytics are:
+#   • the same person holding privileged access in two or more systems;
+#   • SoD pairs whose two halves sit in different systems (e.g. Can_Create
+#     in the LIMS, Can_Approve in the QMS). _uar_sod_conflicts() only sees
+#     one system at a time, so it cannot report these.
+
+_UAR_PARALLEL_MIN_ROWS    = 50_000   # below this, pool start-up outweighs the gain
+_UAR_PARALLEL_MAX_WORKERS = 8
+# Identity attributes in order of preference. The first one that every export
+# carries keys the index. An account with that attribute blank falls back to
+# the next one it has, written "<attribute>:<value>" so it only ever links to
+# accounts keyed the same way.
+_UAR_IDENTITY_COLS        = ("employee_id", "email", "username")
+# Flags carried into the identity index: the high-risk flags plus any other
+# flag an SoD pair names (Can_Create).
+_UAR_INDEX_FLAGS = _UAR_HIGH_PRIV_FLAGS + sorted(
+    {f for p in _UAR_SOD_PAIRS for f in p["flags"]} - set(_UAR_HIGH_PRIV_FLAGS))
+
+
+def _uar_score_system(job: tuple) -> tuple:
+    """Pool task: score one system's export. Returns (system, result,
+    identity columns present). The export's label fills system_name when the
+    export has no such column, so GxP criticality is derived from it."""
+    system, df, at_top_df = job
+    df = _uar_normalise_columns(df)
+    if "system_name" not in df.columns:
+        df = df.assign(system_name=system)
+    present = [c for c in _UAR_IDENTITY_COLS
+               if c in df.columns and df[c].notna().any()]
+    return system, uar_score_users(df, at_top_df=at_top_df), present
+
+
+def _uar_identity_series(df: pd.DataFrame, col: str) -> pd.Series:
+    """Normalised identity key per account. Lower-cased and stripped; a
+    username also loses any DOMAIN\\ prefix and @domain suffix, so that
+    CORP\\jsmith, jsmith@corp.com and JSmith match."""
+    s = df[col].fillna("").astype(str).str.strip().str.lower()
+    if col == "username":
+        s = (s.str.replace(r"^.*\\", "", regex=True)
+              .str.replace(r"@.*$", "", regex=True))
+    return s
+
+
+def _uar_identity_index(results: dict, key_col: str) -> tuple:
+    """One row per (identity, system) account from each system's all_scored.
+    Only the columns that the cross-system analytics and the consolidated
+    workbook read are kept. Accounts blank in key_col fall back per row to
+    the later _UAR_IDENTITY_COLS (Identity_Key records which one was used).
+    Returns (index, unkeyed): unkeyed holds the accounts blank in every
+    identity attribute, which cannot be linked at all."""
+    keep = (["username", "full_name", "account_status_norm",
+             "gxp_criticality_derived", "Risk_Level", "Risk_Score"]
+            + _UAR_INDEX_FLAGS)
+    chain = _UAR_IDENTITY_COLS[_UAR_IDENTITY_COLS.index(key_col):]
+    frames, unkeyed = [], []
+    for system, res in results.items():
+        scored = res.get("all_scored")
+        if scored is None or scored.empty:
+            continue
+        ident = pd.Series("", index=scored.index)
+        used  = pd.Series("", index=scored.index)
+        for col in chain:
+            if col not in scored.columns:
+                continue
+            val  = _uar_identity_series(scored, col)
+            fill = (ident == "") & (val != "")
+            ident[fill] = val[fill] if col == key_col else col + ":" + val[fill]
+            used[fill]  = col
+        part = scored.reindex(columns=keep)
+        part.insert(0, "Identity_Key", used)
+        part.insert(0, "System", system)
+        part.insert(0, "Identity", ident)
+        frames.append(part[part["Identity"] != ""])
+        unkeyed.append(part[part["Identity"] == ""].drop(
+            columns=["Identity", "Identity_Key"]))
+    cols = ["Identity", "System", "Identity_Key"] + keep
+    if not frames:
+        return pd.DataFrame(columns=cols), pd.DataFrame(columns=cols[1:2] + keep)
+    idx = pd.concat(frames, ignore_index=True)
+    idx[_UAR_INDEX_FLAGS] = idx[_UAR_INDEX_FLAGS].fillna(False).astype(bool)
+    return (idx.sort_values(["Identity", "System"], kind="stable").reset_index(drop=True),
+            pd.concat(unkeyed, ignore_index=True))
+
+
+def _uar_cross_system_privileged(idx: pd.DataFrame) -> pd.DataFrame:
+    """Identities with active privileged accounts in two or more systems. The
+    finding is Critical when Is_Admin is held in two or more of them, High
+    otherwise."""
+    cols = ["Identity", "Full_Name", "System_Count", "Systems", "Privileges",
+            "High_GxP_Systems", "Risk_Level", "Reviewer_Disposition"]
+    act = idx[(idx["account_status_norm"] == "Active")
+              & idx[_UAR_HIGH_PRIV_FLAGS].any(axis=1)]
+    n_sys = act.groupby("Identity")["System"].nunique()
+    act = act[act["Identity"].isin(n_sys.index[n_sys >= 2])]
+    rows = []
+    for ident, grp in act.groupby("Identity", sort=True):
+        per_sys = []
+        for system, sg in grp.groupby("System", sort=True):
+            held = [f for f in _UAR_HIGH_PRIV_FLAGS if sg[f].any()]
+            per_sys.append((system, held))
+        n_admin = sum("Is_Admin" in held for _, held in per_sys)
+        names   = grp["full_name"].dropna().astype(str)
+        names   = names[names.str.strip() != ""]
+        rows.append({
+            "Identity":         ident,
+            "Full_Name":        names.iloc[0] if len(names) else "",
+            "System_Count":     len(per_sys),
+            "Systems":          ", ".join(s for s, _ in per_sys),
+            "Privileges":       " | ".join(f"{s}: {', '.join(h)}" for s, h in per_sys),
+            "High_GxP_Systems": int(grp.loc[grp["gxp_criticality_derived"] == "High",
+                                            "System"].nunique()),
+            "Risk_Level":       "Critical" if n_admin >= 2 else "High",
+            "Reviewer_Disposition": "",
+        })
+    if not rows:
+        return pd.DataFrame(columns=cols)
+    return (pd.DataFrame(rows, columns=cols)
+            .sort_values(["Risk_Level", "System_Count", "Identity"],
+                         ascending=[True, False, True], kind="stable")
+            .reset_index(drop=True))
+
+
+def _uar_cross_system_sod(idx: pd.DataFrame) -> pd.DataFrame:
+    """_UAR_SOD_PAIRS evaluated per identity across systems. An identity is in
+    conflict when one flag is held (active) in one system and its partner in
+    a different one. Risk follows _uar_sod_conflicts: Critical when Is_Admin
+    is part of the pair, High otherwise."""
+    cols = ["Conflict_ID", "Conflict_Name", "Identity", "Full_Name",
+            "Systems_Flag_1", "Systems_Flag_2", "GxP_Rationale", "Risk_Level",
+            "Reviewer_Disposition"]
+    act = idx[idx["account_status_norm"] == "Active"]
+    names = (act.loc[act["full_name"].fillna("").astype(str).str.strip() != "",
+                     ["Identity", "full_name"]]
+                .drop_duplicates("Identity").set_index("Identity")["full_name"])
+    holders = {f: act.loc[act[f], ["Identity", "System"]]
+                     .groupby("Identity")["System"].agg(frozenset)
+               for f in _UAR_INDEX_FLAGS}
+    rows = []
+    for pair in _UAR_SOD_PAIRS:
+        f1, f2 = pair["flags"]
+        if f1 not in holders or f2 not in holders:
+            continue
+        s1, s2 = holders[f1], holders[f2]
+        for ident in s1.index.intersection(s2.index):
+            a, b = s1[ident], s2[ident]
+            # Spanning when some pair of systems (x in a, y in b) differs
+            if len(a | b) < 2:
+                continue
+            rows.append({
+                "Conflict_ID":     f"{pair['id']}-X",
+                "Conflict_Name":   pair["name"],
+                "Identity":        ident,
+                "Full_Name":       names.get(ident, ""),
+                "Systems_Flag_1":  f"{f1}: {', '.join(sorted(a))}",
+                "Systems_Flag_2":  f"{f2}: {', '.join(sorted(b))}",
+                "GxP_Rationale":   pair["rationale"],
+                "Risk_Level":      "Critical" if "Is_Admin" in (f1, f2) else "High",
+                "Reviewer_Disposition": "",
+            })
+    if not rows:
+        return pd.DataFrame(columns=cols)
+    return (pd.DataFrame(rows, columns=cols)
+            .sort_values(["Risk_Level", "Conflict_ID", "Identity"], kind="stable")
+            .reset_index(drop=True))
+
+
+def uar_score_systems(exports: dict, at_top_df: pd.DataFrame = None,
+                      workers: int = None) -> dict:
+    """
+    Consolidated UAR over several systems' exports.
+
+    Parameters
+    ----------
+    exports     : {system name: raw user access export DataFrame}
+    at_top_df   : optional AT top findings, passed to every system's scoring
+    workers     : worker processes. None uses the pool only when the exports
+                  total _UAR_PARALLEL_MIN_ROWS or more; 1 forces serial.
+
+    Returns
+    -------
+    dict with keys:
+        systems                 : {system: uar_score_users() result}
+        identity_key            : identity attribute used to link accounts
+        identity_index          : DataFrame — one row per (identity, system)
+        multi_system_privileged : DataFrame — privileged in ≥2 systems
+        cross_system_sod        : DataFrame — SoD pairs spanning systems
+        unkeyed_accounts        : DataFrame — accounts with no identity value
+        summary                 : dict — consolidated counts
+    """
+    jobs = [(str(s), df, at_top_df) for s, df in exports.items()]
+    if workers is None:
+        n_rows  = sum(len(df) for _, df, _ in jobs)
+        workers = (1 if n_rows < _UAR_PARALLEL_MIN_ROWS
+                   else min(os.cpu_count() or 1, _UAR_PARALLEL_MAX_WORKERS))
+    workers = max(1, min(int(workers), len(jobs)))
+
+    scored = None
+    if workers > 1:
+        try:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # fork, as _at_map_partitions: under Streamlit this module is
+            # __main__ and cannot be re-imported by a spawned child.
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                scored = list(pool.map(_uar_score_system, jobs))
+        except Exception:
+            scored = None   # serial result is identical, only slower
+    if scored is None:
+        scored = [_uar_score_system(j) for j in jobs]
+
+    results  = {system: res for system, res, _ in scored}
+    ok       = [(system, present) for system, res, present in scored
+                if not res["data_quality_issues"]]
+    key_col  = next((c for c in _UAR_IDENTITY_COLS
+                     if ok and all(c in present for _, present in ok)), "username")
+    idx, unkeyed = _uar_identity_index({s: results[s] for s, _ in ok}, key_col)
+    priv_df  = _uar_cross_system_privileged(idx)
+    xsod_df  = _uar_cross_system_sod(idx)
+
+    n_sys = idx.groupby("Identity")["System"].nunique()
+    summary = {
+        "systems":                 len(results),
+        "systems_scored":          len(ok),
+        "total_accounts":          len(idx) + len(unkeyed),
+        "fallback_keyed_accounts": int((idx["Identity_Key"] != key_col).sum()),
+        "unkeyed_accounts":        len(unkeyed),
+        "identities":              int(len(n_sys)),
+        "multi_system_identities": int((n_sys >= 2).sum()),
+        "multi_system_privileged": len(priv_df),
+        "cross_system_sod_count":  len(xsod_df),
+        "per_system": [
+            {"system":         system,
+             "total_users":    res["summary"].get("total_users", 0),
+             "active_users":   res["summary"].get("active_users", 0),
+             "Critical":       res["summary"].get("Critical", 0),
+             "High":           res["summary"].get("High", 0),
+             "sod_conflict_count": res["summary"].get("sod_conflict_count", 0),
+             "data_quality_issues": res["data_quality_issues"]}
+            for system, res in results.items()
+        ],
+    }
+    return {
+        "systems":                 results,
+        "identity_key":            key_col,
+        "identity_index":          idx,
+        "multi_system_privileged": priv_df,
+        "cross_system_sod":        xsod_df,
+        "unkeyed_accounts":        unkeyed,
+        "summary":                 summary,
+    }
+
+
 # =============================================================================
 # AI NARRATIVE GENERATION  (mirrors at_generate_justifications exactly)
 # =============================================================================
@@ -13091,7 +17075,8 @@ def _uar_finding_rationale(row: dict) -> str:
     return f"Multiple access risk factors combined — Review Priority Score {score} ({tier})."
 
 
-def uar_generate_justifications(top_df: pd.DataFrame, model_id: str) -> pd.DataFrame:
+def uar_generate_justifications(top_df: pd.DataFrame, model_id: str,
+                                on_narrative=None) -> pd.DataFrame:
     """
     Generate one-sentence factual risk narrative per user.
     Primary: single batched LLM call for all rows (one network round-trip).
@@ -13099,8 +17084,14 @@ def uar_generate_justifications(top_df: pd.DataFrame, model_id: str) -> pd.DataF
     The reviewer never sees an error string in the output.
 
     Batching: all rows are sent in one prompt asking for a JSON array of
-    sentences in the same order as the input rows. This reduces N sequential
-    API calls (N * ~5s latency) to one call (~5s total), regardless of row count.
+    {"id", "narrative"} objects. This reduces N sequential API calls
+    (N * ~5s latency) to one call (~5s total), regardless of row count. The
+    array is streamed and each object is taken as soon as it closes, so
+    on_narrative(row_index, text) (0-based, optional) can fill a live table.
+
+    Rows already in the narrative memo cache skip the batch; rows the batch
+    could not cover get concurrent single-user calls before the
+    deterministic fallback.
     """
     if top_df.empty:
         return top_df
@@ -13133,23 +17124,50 @@ def uar_generate_justifications(top_df: pd.DataFrame, model_id: str) -> pd.DataF
             "is_svc":     is_svc,
         })
 
+    def _user_block(d):
+        return (f'Username={d["username"]} | Role={d["role"]} | '
+                f'JobTitle={d["job_title"]} | Dept={d["department"]} | '
+                f'System={d["system"]} | EmpStatus={d["emp_norm"]} | '
+                f'DaysSinceLogin={d["days_str"]} | '
+                f'AccountType={d["acct_type"]} | '
+                f'CrossModuleFlag={d["cross"]} | '
+                f'TriggeredRules={d["triggered"][:120]}')
+
+    # ── Memo cache: reuse accepted narratives for unchanged users ─────────────
+    _cascade = [model_id] + [m for m in _get_ai_cascade() if m != model_id]
+    _fps = [
+        _narrative_fingerprint(
+            d["username"], d["role"], d["job_title"], d["department"],
+            d["system"], d["emp_norm"], d["days_str"], d["acct_type"],
+            d["cross"], d["triggered"][:120],
+        )
+        for d in row_data
+    ]
+    narratives = [
+        _narrative_cache_get(fp, _cascade, ("uar_batch", "uar_single")) or ""
+        for fp in _fps
+    ]
+    if on_narrative is not None:
+        for i, n in enumerate(narratives):
+            if n:
+                on_narrative(i, n)
+    _pending = [i for i, n in enumerate(narratives) if not n]
+
+    def _accept(i, text, model, prompt):
+        narratives[i] = text
+        _narrative_cache_put(_fps[i], model, prompt, text)
+        if on_narrative is not None:
+            on_narrative(i, text)
+
     # ── Primary: single batched LLM call ─────────────────────────────────────
-    narratives = None
     try:
-        from litellm import completion as _comp
-
-        user_blocks = "\n".join(
-            f'[{i+1}] Username={d["username"]} | Role={d["role"]} | '
-            f'JobTitle={d["job_title"]} | Dept={d["department"]} | '
-            f'System={d["system"]} | EmpStatus={d["emp_norm"]} | '
-            f'DaysSinceLogin={d["days_str"]} | '
-            f'AccountType={d["acct_type"]} | '
-            f'CrossModuleFlag={d["cross"]} | '
-            f'TriggeredRules={d["triggered"][:120]}'
-            for i, d in enumerate(row_data)
-        )
+        if _pending:
+            user_blocks = "\n".join(
+                f'[{n+1}] {_user_block(row_data[i])}'
+                for n, i in enumerate(_pending)
+            )
 
-        batch_prompt = f"""You are writing the System Narrative column in a GxP user access review table.
+            batch_prompt = f"""You are writing the System Narrative column in a GxP user access review table.
 
 For EACH numbered user below, write exactly ONE sentence of observable facts.
 
@@ -13161,46 +17179,75 @@ HARD RULES:
 5. NO action recommendations.
 6. ONE sentence per user. Max 50 words each.
 
-Respond with ONLY a JSON array of strings, one per user, in the same order. No preamble, no keys, no markdown.
-Example for 2 users: ["Sentence for user 1.", "Sentence for user 2."]
+Respond with ONLY a JSON array of objects, one per user, using the user's number as id. No preamble, no markdown.
+Example for 2 users: [{{"id": 1, "narrative": "Sentence for user 1."}}, {{"id": 2, "narrative": "Sentence for user 2."}}]
 
 Users:
 {user_blocks}"""
 
-        response = _comp(
-            model=model_id,
-            messages=[
-                {"role": "system", "content": (
-                    "You write one-sentence factual access profile summaries for "
-                    "pharmaceutical QA tables. Return only a JSON array of strings."
-                )},
-                {"role": "user", "content": batch_prompt},
+            def _on_item(item):
+                if not (isinstance(item, dict) and "narrative" in item):
+                    return
+                try:
+                    n = int(item.get("id")) - 1
+                except (TypeError, ValueError):
+                    return
+                text = str(item["narrative"]).strip()
+                if 0 <= n < len(_pending) and not narratives[_pending[n]] and len(text) > 10:
+                    _accept(_pending[n], text, model_id, "uar_batch")
+
+            _llm_stream_json_array(
+                model=model_id,
+                purpose="uar_batch",
+                on_item=_on_item,
+                messages=[
+                    {"role": "system", "content": (
+                        "You write one-sentence factual access profile summaries for "
+                        "pharmaceutical QA tables. Return only a JSON array of "
+                        "{\"id\", \"narrative\"} objects."
+                    )},
+                    {"role": "user", "content": batch_prompt},
+                ],
+                max_tokens=130 * len(_pending),
+                temperature=0.05,
+                timeout=60,
+            )
+
+    except Exception:
+        pass  # fall through to per-row fallbacks
+
+    # ── Fallback A: concurrent single-user calls for rows still empty ────────
+    def _single_job(d):
+        _prompt = (
+            "Write exactly ONE sentence (max 50 words) of observable facts about "
+            "this user's access for a GxP user access review table. Mention a "
+            "job-title / admin-role mismatch or a service account if present. "
+            "No regulatory language. No action recommendations.\n"
+            f"{_user_block(d)}"
+        )
+        return lambda: _llm_cascade_completion(
+            [
+                {"role": "system", "content": "One-sentence factual access profile summary."},
+                {"role": "user",   "content": _prompt},
             ],
-            max_tokens=120 * len(row_data),
-            temperature=0.05,
-            timeout=60,
+            purpose="uar_single", models=_cascade, accept=lambda t: len(t) > 10,
+            stream=False, temperature=0.05, max_tokens=120, timeout=25,
         )
-        raw = response.choices[0].message.content.strip()
-        # Strip markdown fences if present
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"):
-                raw = raw[4:]
-            raw = raw.strip()
-        import json as _json
-        parsed = _json.loads(raw)
-        if (isinstance(parsed, list)
-                and len(parsed) == len(row_data)
-                and all(isinstance(s, str) and len(s) > 10 for s in parsed)):
-            narratives = parsed
 
+    try:
+        _narratives_concurrent({
+            i: _single_job(row_data[i])
+            for i, n in enumerate(narratives) if not n
+        }, on_done=lambda i, text, model: _accept(i, text, model, "uar_single"))
     except Exception:
-        pass  # fall through to per-row deterministic fallback
+        pass
 
-    # ── Fallback: deterministic per row (no network call) ────────────────────
-    if narratives is None:
-        narratives = [_uar_deterministic_narrative(dict(zip(top_df.columns, row)))
-                      for row in top_df.values]
+    # ── Fallback B: deterministic per row (no network call) ──────────────────
+    if not all(narratives):
+        for i, row in enumerate(top_df.values):
+            if not narratives[i]:
+                narratives[i] = _uar_deterministic_narrative(
+                    dict(zip(top_df.columns, row)))
 
     top_df = top_df.copy()
     top_df = top_df.drop(columns=["System_Narrative"], errors="ignore")
@@ -13212,12 +17259,53 @@ Users:
 # EXCEL OUTPUT
 # =============================================================================
 
+def _uar_dim_rows(result: dict, period_label: str, system_name: str,
+                  file_name: str) -> list:
+    """DIM rows for one UAR period: the High/Critical top users, or one
+    "(no escalations)" sentinel. Without the sentinel a clean UAR run is
+    indistinguishable from the module never running, which breaks
+    per-module posture trending."""
+    _uar_hc = result["top_users"][
+        result["top_users"]["Risk_Level"].isin(["High", "Critical"])
+    ] if not result["top_users"].empty else pd.DataFrame()
+    rows = []
+    for _, _urow in _uar_hc.iterrows():
+        _uar_rule_str = str(_urow.get("Rule_Pattern", _urow.get("Triggered_Rules", "UAR finding")))[:120]
+        rows.append({
+            "Review_Period":  period_label,
+            "Username":       str(_urow.get("username", _urow.get("user_id", "unknown"))),
+            "Risk_Level":     str(_urow.get("Risk_Level", "High")),
+            "Rule_Triggered": _uar_rule_str,
+            "Event_Category": _dim_event_category(_uar_rule_str),
+            "System_Name":    system_name,
+            "Event_Type":     "ACCESS_REVIEW",
+            "Event_Timestamp":str(datetime.datetime.utcnow()),
+            "Source_File":    file_name,
+            "Source_Module":  "UAR",
+        })
+    if not rows:
+        rows.append({
+            "Review_Period":  period_label,
+            "Username":       "(no escalations)",
+            "Risk_Level":     "Low",
+            "Rule_Triggered": "No named rules triggered",
+            "Event_Category": "Other",
+            "System_Name":    system_name,
+            "Event_Type":     "ACCESS_REVIEW",
+            "Event_Timestamp":"",
+            "Source_File":    file_name,
+            "Source_Module":  "UAR",
+        })
+    return rows
+
+
 def uar_build_excel(
     result: dict,
     system_name: str,
     r_start: str,
     r_end: str,
     fname: str,
+    progress_cb=None,
 ) -> bytes:
     """
     Build 5-sheet GxP-compliant evidence workbook for UAR findings.
@@ -13229,9 +17317,12 @@ def uar_build_excel(
         3 — Segregation of Duties Conflicts
         4 — All Users (full scored dataset)
         5 — Detection Logic
+
+    progress_cb — optional callable(fraction, message) fired at sheet boundaries.
     """
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    _prog = progress_cb or (lambda _f, _m: None)
 
     output = io.BytesIO()
     wb     = Workbook()
@@ -13270,6 +17361,7 @@ def uar_build_excel(
     # =========================================================================
     # SHEET 1 — SUMMARY
     # =========================================================================
+    _prog(0.05, "Summary")
     ws1 = wb.active
     ws1.title = "Summary"
     ws1.column_dimensions["A"].width = 34
@@ -13422,6 +17514,7 @@ def uar_build_excel(
         if _top_hc == _top_n_total
         else f"Top {_top_n_total} Flagged Users by Risk Score"
     )
+    _prog(0.20, _ws2_title)
     ws2 = wb.create_sheet(_ws2_title)
 
     # Plain-English rule label map (item 10)
@@ -13512,6 +17605,7 @@ def uar_build_excel(
     # =========================================================================
     # SHEET 3 — SOD CONFLICTS
     # =========================================================================
+    _prog(0.35, "SoD Conflicts")
     ws3 = wb.create_sheet("SoD Conflicts")
     sod_df = result.get("sod_conflicts", pd.DataFrame())
 
@@ -13585,6 +17679,7 @@ def uar_build_excel(
     # =========================================================================
     # SHEET 4 — ALL USERS
     # =========================================================================
+    _prog(0.45, "All Users")
     ws4 = wb.create_sheet("All Users")
     all_df = result.get("all_scored", pd.DataFrame())
 
@@ -13709,6 +17804,7 @@ def uar_build_excel(
     # =========================================================================
     # SHEET 5 — DETECTION LOGIC
     # =========================================================================
+    _prog(0.85, "Detection Logic")
     ws5 = wb.create_sheet("Detection Logic")
 
     # ── Clean structured Detection Logic sheet (v96 redesign) ────────────────
@@ -13827,6 +17923,7 @@ def uar_build_excel(
         ws5.row_dimensions[ri].height = 16
 
     # ── Rule Reference tab (full trigger text) ───────────────────────────────
+    _prog(0.90, "Rule Reference")
     ws5b = wb.create_sheet("Rule Reference")
     ws5b.column_dimensions["A"].width = 105
 
@@ -13869,10 +17966,302 @@ def uar_build_excel(
         if ws5b.row_dimensions[li].height == 0 or ws5b.row_dimensions[li].height == 15:
             ws5b.row_dimensions[li].height = 13 if not is_section else 16
 
+    _prog(0.95, "Saving workbook")
+    wb.save(output)
+    return output.getvalue()
+
+
+def uar_build_consolidated_excel(consolidated: dict, r_start: str, r_end: str) -> bytes:
+    """
+    Build the cross-system evidence workbook for uar_score_systems(). Each
+    system keeps its own uar_build_excel() package; this workbook holds only
+    what no single-system package can show.
+
+    Sheets:
+        1 — Summary (per-system counts + consolidated KPIs)
+        2 — Multi-System Privileged
+        3 — Cross-System SoD
+        4 — Identity Index
+        5 — Unkeyed Accounts (no identity value — not linked across systems)
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
+    C_HEADER_BG = "1E3A5F"
+    C_RISK      = {"Critical": "C0392B", "High": "E67E22",
+                   "Medium": "D4A017", "Low": "27AE60"}
+    thin_side   = Side(style="thin", color="CCCCCC")
+    bdr         = Border(left=thin_side, right=thin_side,
+                         top=thin_side, bottom=thin_side)
+    hdr_font    = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
+    hdr_fill    = PatternFill("solid", fgColor=C_HEADER_BG)
+    body_font   = Font(name="Calibri", size=11, color="1A1A1A")
+    wrap_align  = Alignment(horizontal="left", vertical="center", wrap_text=True)
+
+    def _table(ws, first_row, spec, frame, empty_note, risk_col=None):
+        """spec: [(header, frame column, width)]. Writes header + rows."""
+        for ci, (hdr, _, width) in enumerate(spec, 1):
+            c = ws.cell(row=first_row, column=ci, value=hdr)
+            c.font, c.fill, c.alignment, c.border = hdr_font, hdr_fill, wrap_align, bdr
+            ws.column_dimensions[get_column_letter(ci)].width = width
+        ws.row_dimensions[first_row].height = 20
+        ws.freeze_panes = ws.cell(row=first_row + 1, column=1).coordinate
+        if frame is None or frame.empty:
+            ws.cell(row=first_row + 1, column=1, value=empty_note)
+            return
+        keys = [key for _, key, _ in spec]
+        for ri, values in enumerate(frame.reindex(columns=keys)
+                                         .itertuples(index=False), first_row + 1):
+            for ci, (key, val) in enumerate(zip(keys, values), 1):
+                if isinstance(val, float) and val != val:
+                    val = ""
+                elif isinstance(val, bool):
+                    val = "Y" if val else ""
+                c = ws.cell(row=ri, column=ci, value=val)
+                c.font, c.alignment, c.border = body_font, wrap_align, bdr
+                if key == risk_col and val in C_RISK:
+                    c.fill = PatternFill("solid", fgColor=C_RISK[val])
+                    c.font = Font(name="Calibri", size=11, bold=True,
+                                  color="1A1A1A" if val == "Medium" else "FFFFFF")
+
+    output = io.BytesIO()
+    wb     = Workbook()
+    smry   = consolidated.get("summary", {})
+
+    # ── Sheet 1 — Summary ────────────────────────────────────────────────────
+    ws1 = wb.active
+    ws1.title = "Summary"
+    title = ws1.cell(row=1, column=1,
+                     value="VALINTEL.AI — Consolidated User Access Review")
+    title.font = Font(name="Calibri", bold=True, size=13, color=C_HEADER_BG)
+    ws1.row_dimensions[1].height = 22
+    kpis = [
+        ("Review Period",            f"{r_start}  →  {r_end}"),
+        ("Analysis Date (UTC)",
+         datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")),
+        ("Regulatory Basis",         _REG_UAR),
+        ("Systems Reviewed",         smry.get("systems", 0)),
+        ("Accounts Reviewed",        smry.get("total_accounts", 0)),
+        ("Identity Key",             consolidated.get("identity_key", "")),
+        ("Accounts on Fallback Key", smry.get("fallback_keyed_accounts", 0)),
+        ("Unkeyed Accounts",         smry.get("unkeyed_accounts", 0)),
+        ("Distinct Identities",      smry.get("identities", 0)),
+        ("Identities in ≥2 Systems", smry.get("multi_system_identities", 0)),
+        ("Multi-System Privileged",  smry.get("multi_system_privileged", 0)),
+        ("Cross-System SoD Conflicts", smry.get("cross_system_sod_count", 0)),
+    ]
+    for ri, (label, value) in enumerate(kpis, 3):
+        c1 = ws1.cell(row=ri, column=1, value=label)
+        c2 = ws1.cell(row=ri, column=2, value=value)
+        c1.font = Font(name="Calibri", size=11, bold=True, color="1A1A1A")
+        c2.font = body_font
+        for c in (c1, c2):
+            c.alignment, c.border = wrap_align, bdr
+    per_sys = pd.DataFrame(smry.get("per_system", []))
+    if not per_sys.empty:
+        per_sys["status"] = per_sys["data_quality_issues"].apply(
+            lambda issues: "; ".join(issues) if issues else "Scored")
+    _table(ws1, len(kpis) + 4,
+           [("System", "system", 34), ("Users", "total_users", 22),
+            ("Active", "active_users", 10), ("Critical", "Critical", 10),
+            ("High", "High", 10), ("SoD Conflicts", "sod_conflict_count", 14),
+            ("Status", "status", 60)],
+           per_sys, "No systems supplied.")
+    ws1.freeze_panes = None
+
+    # ── Sheet 2 — Multi-System Privileged ────────────────────────────────────
+    _table(wb.create_sheet("Multi-System Privileged"), 1,
+           [("Identity", "Identity", 24), ("Full Name", "Full_Name", 22),
+            ("Systems", "System_Count", 9), ("System List", "Systems", 30),
+            ("Privileges by System", "Privileges", 60),
+            ("High-GxP Systems", "High_GxP_Systems", 12),
+            ("Risk Level", "Risk_Level", 12),
+            ("Reviewer Disposition", "Reviewer_Disposition", 25)],
+           consolidated.get("multi_system_privileged"),
+           "No identity holds privileged access in more than one system.",
+           risk_col="Risk_Level")
+
+    # ── Sheet 3 — Cross-System SoD ───────────────────────────────────────────
+    _table(wb.create_sheet("Cross-System SoD"), 1,
+           [("Conflict ID", "Conflict_ID", 12), ("Conflict", "Conflict_Name", 28),
+            ("Identity", "Identity", 24), ("Full Name", "Full_Name", 22),
+            ("Flag 1 — Systems", "Systems_Flag_1", 30),
+            ("Flag 2 — Systems", "Systems_Flag_2", 30),
+            ("Risk Level", "Risk_Level", 12),
+            ("GxP Rationale", "GxP_Rationale", 60),
+            ("Reviewer Disposition", "Reviewer_Disposition", 25)],
+           consolidated.get("cross_system_sod"),
+           "No Segregation of Duties conflicts span systems.",
+           risk_col="Risk_Level")
+
+    # ── Sheet 4 — Identity Index ─────────────────────────────────────────────
+    _table(wb.create_sheet("Identity Index"), 1,
+           [("Identity", "Identity", 24), ("System", "System", 20),
+            ("Identity Key", "Identity_Key", 14),
+            ("Username", "username", 18), ("Full Name", "full_name", 22),
+            ("Account Status", "account_status_norm", 14),
+            ("GxP Criticality", "gxp_criticality_derived", 14),
+            ("Risk Level", "Risk_Level", 12), ("Risk Score", "Risk_Score", 10)]
+           + [(f.replace("_", " "), f, 12) for f in _UAR_INDEX_FLAGS],
+           consolidated.get("identity_index"), "No accounts scored.",
+           risk_col="Risk_Level")
+
+    # ── Sheet 5 — Unkeyed Accounts ───────────────────────────────────────────
+    _table(wb.create_sheet("Unkeyed Accounts"), 1,
+           [("System", "System", 20), ("Username", "username", 18),
+            ("Full Name", "full_name", 22),
+            ("Account Status", "account_status_norm", 14),
+            ("Risk Level", "Risk_Level", 12), ("Risk Score", "Risk_Score", 10)]
+           + [(f.replace("_", " "), f, 12) for f in _UAR_INDEX_FLAGS],
+           consolidated.get("unkeyed_accounts"),
+           "Every account carries an identity value.",
+           risk_col="Risk_Level")
+
     wb.save(output)
     return output.getvalue()
 
 
+def _uar_submit_workbook_build(result: dict):
+    """Queue the UAR evidence workbook on the background artifact builder.
+    Returns the artifact key, or None while System Name is still blank."""
+    sys_name = st.session_state.get("uar_system_name", "").strip()
+    if not sys_name:
+        return None
+    r_start   = st.session_state.get("uar_review_start", "").strip()
+    r_end     = st.session_state.get("uar_review_end", "").strip()
+    fname     = st.session_state.get("uar_file_name", "")
+    file_hash = st.session_state.get("uar_pending_hash", "")
+    key = _artifact_key(
+        "uar", file_hash, sys_name, r_start, r_end,
+        _artifact_variant(
+            st.session_state.get("uar_column_mapping") or {},
+            fname, result.get("summary", {}),
+            len(result.get("all_scored", [])),
+            _artifact_narratives(result.get("top_users"), "System_Narrative"),
+            st.session_state.get("selected_model", ""),
+        ),
+    )
+    artifact_submit(
+        key, uar_build_excel,
+        result, sys_name,
+        r_start or "(not specified)",
+        r_end   or "(not specified)",
+        fname,
+        persist=bool(file_hash),
+    )
+    return key
+
+
+def _show_uar_consolidated(user: str):
+    """
+    Consolidated review: one export per system, scored together by
+    uar_score_systems(). Renders the cross-system findings and offers the
+    uar_build_consolidated_excel() workbook. Each file's system name is its
+    file stem; columns go through uar_score_users()'s own alias resolution
+    (the interactive mapper is single-file only).
+    """
+    files = st.file_uploader(
+        "One user access export per system (CSV or XLSX)",
+        type=["csv", "xlsx", "xls"],
+        accept_multiple_files=True,
+        key=f"uar_cons_upload_{st.session_state.get('uar_key_n', 0)}",
+    )
+    if not files:
+        st.caption("System names are taken from the file names.")
+        return
+    if len(files) < 2:
+        st.info("Attach at least two systems' exports for a consolidated review.")
+        return
+
+    if st.button("▶ Run Consolidated Review", type="primary", key="uar_cons_run_btn"):
+        exports, skipped, dates = {}, [], []
+        for f in files:
+            raw    = f.getvalue()
+            system = f.name.rsplit(".", 1)[0]
+            try:
+                df, sheets, _ = _uar_read_table(raw, f.name)
+                _, sev, title, _, _ = _validate_uar_input_file(raw, f.name, df, sheets)
+            except Exception as e:
+                skipped.append(f"{f.name}: could not read file — {e}")
+                continue
+            if sev == "hard_reject":
+                skipped.append(f"{f.name}: {title}")
+                continue
+            if system in exports:
+                skipped.append(f"{f.name}: system '{system}' appears twice")
+                continue
+            exports[system] = df
+            dates.extend(_uar_review_period(df))
+        if len(exports) < 2:
+            st.session_state["uar_cons_result"] = None
+            for s in skipped:
+                st.error(s)
+            st.error("A consolidated review needs at least two readable exports.")
+            return
+        with st.spinner(f"Scoring {len(exports)} systems…"):
+            cons = uar_score_systems(exports,
+                                     at_top_df=st.session_state.get("at_top20_df"))
+        span = pd.to_datetime(pd.Series(dates, dtype=object),
+                              errors="coerce", dayfirst=True).dropna()
+        r_span = ((span.min().strftime("%d-%b-%Y"), span.max().strftime("%d-%b-%Y"))
+                  if len(span) else ("", ""))
+        st.session_state["uar_cons_result"] = (cons, r_span, skipped)
+        log_audit(
+            user, "UAR_CONSOLIDATED_RUN", "DATASET",
+            new_value=(f"{cons['summary']['systems_scored']} systems, "
+                       f"{cons['summary']['multi_system_privileged']} multi-system "
+                       f"privileged, {cons['summary']['cross_system_sod_count']} "
+                       f"cross-system SoD"),
+            reason=f"Systems: {', '.join(exports)}",
+        )
+
+    stored = st.session_state.get("uar_cons_result")
+    if not stored:
+        return
+    cons, (r_start, r_end), skipped = stored
+    for s in skipped:
+        st.warning(f"Skipped {s}")
+    smry = cons["summary"]
+    _c1, _c2, _c3, _c4 = st.columns(4)
+    _c1.metric("Systems scored", f"{smry['systems_scored']} / {smry['systems']}")
+    _c2.metric("Identities", f"{smry['identities']:,}")
+    _c3.metric("Multi-system privileged", smry["multi_system_privileged"])
+    _c4.metric("Cross-system SoD", smry["cross_system_sod_count"])
+    st.caption(f"Accounts linked across systems by **{cons['identity_key']}**"
+               + (f" · {smry['fallback_keyed_accounts']} linked on a fallback attribute"
+                  if smry.get("fallback_keyed_accounts") else "") + ".")
+    _unkeyed = cons.get("unkeyed_accounts")
+    if _unkeyed is not None and not _unkeyed.empty:
+        st.warning(f"{len(_unkeyed)} account(s) carry no identity value and are "
+                   f"left out of the cross-system analytics — review them manually.")
+        st.dataframe(_unkeyed[["System", "username", "full_name",
+                               "account_status_norm", "Risk_Level"]],
+                     use_container_width=True, hide_index=True)
+    st.dataframe(pd.DataFrame(smry["per_system"]).drop(columns="data_quality_issues"),
+                 use_container_width=True, hide_index=True)
+    for s in smry["per_system"]:
+        for issue in s["data_quality_issues"]:
+            st.error(f"{s['system']}: {issue}")
+    if not cons["multi_system_privileged"].empty:
+        st.markdown("**Privileged in two or more systems**")
+        st.dataframe(cons["multi_system_privileged"], use_container_width=True,
+                     hide_index=True)
+    if not cons["cross_system_sod"].empty:
+        st.markdown("**Segregation-of-duties conflicts spanning systems**")
+        st.dataframe(cons["cross_system_sod"], use_container_width=True,
+                     hide_index=True)
+    if st.download_button(
+        label="📥 Download Consolidated UAR Workbook",
+        data=uar_build_consolidated_excel(cons, r_start, r_end),
+        file_name=f"UAR_CONSOLIDATED_{datetime.date.today()}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key="uar_cons_download_btn",
+    ):
+        log_audit(user, "UAR_DOWNLOAD", "REPORT", new_value="UAR_CONSOLIDATED",
+                  reason=f"Systems: {', '.join(cons['systems'])}")
+
+
 # =============================================================================
 # STREAMLIT UI
 # =============================================================================
@@ -14295,6 +18684,9 @@ them in Step 2.
     )
     st.markdown("<div style='margin-top:10px;'></div>", unsafe_allow_html=True)
 
+    with st.expander("🗂 Consolidated review — several systems", expanded=False):
+        _show_uar_consolidated(user)
+
     uploaded = st.file_uploader(
         "User access export (CSV or XLSX)",
         type=["csv", "xlsx", "xls"],
@@ -14328,32 +18720,15 @@ them in Step 2.
     if uploaded:
         try:
             _uar_raw_bytes = uploaded.getvalue()
-            _uar_sheets    = None
-            if uploaded.name.lower().endswith(".csv"):
-                raw_df = pd.read_csv(io.BytesIO(_uar_raw_bytes), dtype=str)
-            else:
-                _xl = pd.ExcelFile(io.BytesIO(_uar_raw_bytes))
-                _uar_sheets = list(_xl.sheet_names)
-                # Prefer a sheet whose name suggests user/access data
-                _SKIP = {"usage instructions", "usage", "instructions",
-                         "readme", "read me", "guide"}
-                _data_sheets = [s for s in _uar_sheets
-                                if s.strip().lower() not in _SKIP]
-                _preferred = [s for s in _data_sheets
-                              if any(kw in s.lower()
-                                     for kw in ("user", "access", "role",
-                                                "permission", "all users"))]
-                _sheet_to_use = (_preferred or _data_sheets or _uar_sheets)[0]
-                raw_df = pd.read_excel(io.BytesIO(_uar_raw_bytes),
-                                       sheet_name=_sheet_to_use,
-                                       dtype=str)
-                if len(_uar_sheets) > 1:
-                    st.caption(
-                        f"📋 Reading sheet: **{_sheet_to_use}**"
-                        + (f"  ·  skipped: "
-                           f"{', '.join(s for s in _uar_sheets if s != _sheet_to_use)}"
-                           if len(_uar_sheets) > 1 else "")
-                    )
+            raw_df, _uar_sheets, _sheet_to_use = _uar_read_table(
+                _uar_raw_bytes, uploaded.name)
+            if _uar_sheets and len(_uar_sheets) > 1:
+                st.caption(
+                    f"📋 Reading sheet: **{_sheet_to_use}**"
+                    + (f"  ·  skipped: "
+                       f"{', '.join(s for s in _uar_sheets if s != _sheet_to_use)}"
+                       if len(_uar_sheets) > 1 else "")
+                )
             raw_df.columns = raw_df.columns.str.strip()
 
             # ── Validate UAR input BEFORE committing to session state ──────
@@ -14397,34 +18772,8 @@ them in Step 2.
                     st.session_state["uar_scored_result"] = None
                     st.session_state["uar_analysis_done"] = False
                 # Auto-derive review period from date columns in the file
-                _uar_date_derived = False
-                for _dcol in ["last_login", "last_login_date", "lastlogindate",
-                              "last_logon", "created_date", "createddate",
-                              "created_at", "creation_date"]:
-                    _dcol_match = next(
-                        (c for c in raw_df.columns
-                         if c.lower().replace(" ","_").replace("-","_") == _dcol),
-                        None
-                    )
-                    if _dcol_match:
-                        try:
-                            _dcol_parsed = pd.to_datetime(
-                                raw_df[_dcol_match], errors="coerce"
-                            ).dropna()
-                            if not _dcol_parsed.empty:
-                                st.session_state["uar_review_start"] = _dcol_parsed.min().strftime("%d-%b-%Y")
-                                st.session_state["uar_review_end"]   = _dcol_parsed.max().strftime("%d-%b-%Y")
-                                _uar_date_derived = True
-                                break
-                        except Exception:
-                            pass
-                if not _uar_date_derived:
-                    import datetime as _dt
-                    _today = _dt.date.today()
-                    _q = (_today.month - 1) // 3
-                    _qstart = _dt.date(_today.year, _q * 3 + 1, 1) if _q > 0 else _dt.date(_today.year - 1, 10, 1)
-                    st.session_state["uar_review_start"] = _qstart.strftime("%d-%b-%Y")
-                    st.session_state["uar_review_end"]   = _today.strftime("%d-%b-%Y")
+                (st.session_state["uar_review_start"],
+                 st.session_state["uar_review_end"]) = _uar_review_period(raw_df)
             # else: blocked — uar_raw_df not set until override clicked.
         except Exception as e:
             st.error(f"Could not read file: {e}")
@@ -14465,10 +18814,7 @@ them in Step 2.
         for col in cols:
             k_col = col.strip().lower().replace(" ","").replace("-","").replace("_","")
             # Check aliases
-            internal = _UAR_COL_ALIASES.get(
-                col.strip().lower().replace(" ","_").replace("-","_")
-            ) or _UAR_COL_ALIASES.get(k_col)
-            if internal == field:
+            if _uar_alias_key(col) == field:
                 return col
             # Direct match
             if k_col == k_field or k_col == field.replace("_",""):
@@ -14599,8 +18945,23 @@ them in Step 2.
             if not result["top_users"].empty:
                 _prog_bar.progress(70, text="Generating AI review narratives…")
                 _prog_status.caption("Step 3/4 — Generating AI-assisted review narratives for top users")
+                # Live preview — rows fill in as each streamed narrative arrives
+                _live_tbl  = st.empty()
+                _live_rows = pd.DataFrame({
+                    "User": result["top_users"].get(
+                        "username", pd.Series(["?"] * len(result["top_users"]))
+                    ).astype(str).tolist(),
+                    "System Narrative": "…",
+                })
+
+                def _on_uar_narrative(i, text):
+                    _live_rows.iat[i, 1] = text
+                    _live_tbl.dataframe(_live_rows, use_container_width=True,
+                                        hide_index=True)
+
                 result["top_users"] = uar_generate_justifications(
-                    result["top_users"], model_id)
+                    result["top_users"], model_id, on_narrative=_on_uar_narrative)
+                _live_tbl.empty()
             _prog_bar.progress(90, text="Building evidence package…")
             _prog_status.caption("Step 4/4 — Building GxP evidence package")
             _prog_bar.progress(100, text="Complete")
@@ -14622,6 +18983,8 @@ them in Step 2.
             file_hash=st.session_state.get("uar_pending_hash", ""),
             filename=st.session_state.get("uar_file_name", ""),
         )
+        # Speculative workbook build — see _uar_submit_workbook_build
+        _uar_submit_workbook_build(result)
 
         # ── Auto-feed DIM: bank High/Critical UAR findings ────────────────────
         _uar_sys  = st.session_state.get("uar_system_name", "System")
@@ -14639,67 +19002,22 @@ them in Step 2.
             _uar_period_label = _uar_date_range
         else:
             _uar_period_label = f"UAR Period {st.session_state.get('dim_periods_banked', 0) + 1}"
-        _uar_hc   = result["top_users"][
-            result["top_users"]["Risk_Level"].isin(["High", "Critical"])
-        ] if not result["top_users"].empty else pd.DataFrame()
-        _uar_dim_rows = []
-        for _, _urow in _uar_hc.iterrows():
-            _uar_rule_str = str(_urow.get("Rule_Pattern", _urow.get("Triggered_Rules", "UAR finding")))[:120]
-            _uar_dim_rows.append({
-                "Review_Period":  _uar_period_label,
-                "Username":       str(_urow.get("username", _urow.get("user_id", "unknown"))),
-                "Risk_Level":     str(_urow.get("Risk_Level", "High")),
-                "Rule_Triggered": _uar_rule_str,
-                "Event_Category": _dim_event_category(_uar_rule_str),
-                "System_Name":    _uar_sys,
-                "Event_Type":     "ACCESS_REVIEW",
-                "Event_Timestamp":str(datetime.datetime.utcnow()),
-                "Source_File":    _uar_file,
-                "Source_Module":  "UAR",
-            })
-        if _uar_dim_rows:
-            _uar_existing = [
-                r for r in st.session_state.get("dim_accumulated_rows", [])
-                if not (r.get("Review_Period") == _uar_period_label
-                        and r.get("Source_Module") == "UAR"
-                        and r.get("Source_File") == _uar_file)
-            ]
-            _uar_existing.extend(_uar_dim_rows)
-            st.session_state["dim_accumulated_rows"] = _uar_existing
-            st.session_state["dim_periods_banked"] = len(
-                set(r["Review_Period"] for r in _uar_existing))
-            # Invalidate cached DIM result so next DIM open re-scores with UAR data
-            st.session_state["dim_analysis_done"] = False
-            st.session_state["dim_result"] = None
-        else:
-            # UAR ran but found zero High/Critical users — bank a sentinel row
-            # so DIM can distinguish "UAR ran clean" from "UAR never ran".
-            # Without this, a clean UAR run is indistinguishable from the module
-            # not being exercised, which breaks per-module posture trending.
-            _uar_sentinel = {
-                "Review_Period":  _uar_period_label,
-                "Username":       "(no escalations)",
-                "Risk_Level":     "Low",
-                "Rule_Triggered": "No named rules triggered",
-                "Event_Category": "Other",
-                "System_Name":    _uar_sys,
-                "Event_Type":     "ACCESS_REVIEW",
-                "Event_Timestamp":"",
-                "Source_File":    _uar_file,
-                "Source_Module":  "UAR",
-            }
-            _uar_existing = [
-                r for r in st.session_state.get("dim_accumulated_rows", [])
-                if not (r.get("Review_Period") == _uar_period_label
-                        and r.get("Source_Module") == "UAR"
-                        and r.get("Source_File") == _uar_file)
-            ]
-            _uar_existing.append(_uar_sentinel)
-            st.session_state["dim_accumulated_rows"] = _uar_existing
-            st.session_state["dim_periods_banked"] = len(
-                set(r["Review_Period"] for r in _uar_existing))
-            st.session_state["dim_analysis_done"] = False
-            st.session_state["dim_result"] = None
+        _uar_rows = _uar_dim_rows(result, _uar_period_label, _uar_sys, _uar_file)
+        _uar_existing = [
+            r for r in st.session_state.get("dim_accumulated_rows", [])
+            if not (r.get("Review_Period") == _uar_period_label
+                    and r.get("Source_Module") == "UAR"
+                    and r.get("Source_File") == _uar_file)
+        ]
+        _uar_existing.extend(_uar_rows)
+        st.session_state["dim_accumulated_rows"] = _uar_existing
+        st.session_state["dim_periods_banked"] = len(
+            set(r["Review_Period"] for r in _uar_existing))
+        # Invalidate cached DIM result so next DIM open re-scores with UAR data
+        st.session_state["dim_analysis_done"] = False
+        st.session_state["dim_result"] = None
+        st.session_state["dim_cache"] = None
+        st.session_state["dim_rows_gen"] = st.session_state.get("dim_rows_gen", 0) + 1
 
         st.rerun()
 
@@ -14869,7 +19187,8 @@ them in Step 2.
                       "uar_last_run_hash", "uar_last_run_filename",
                       "uar_invalidation_msg",
                       "uar_review_start", "uar_review_end",
-                      "uar_mapping_done", "uar_column_mapping"] + _uar_cache_keys:
+                      "uar_mapping_done", "uar_column_mapping",
+                      "uar_cons_result"] + _uar_cache_keys:
                 if k in st.session_state:
                     del st.session_state[k]
             st.session_state["uar_key_n"] = st.session_state.get("uar_key_n", 0) + 1
@@ -14881,21 +19200,11 @@ them in Step 2.
     if not sys_name:
         st.warning("⚠️ Enter a **System Name** above before downloading.")
     else:
-        _uar_xlsx_cache_key = f"uar_xlsx_cache_{sys_name}_{r_start}_{r_end}"
+        # Built in the background since scoring finished (1–3 min for large
+        # files) — this only polls; leaving the page does not cancel the build.
+        _uar_artifact_id    = _uar_submit_workbook_build(result)
+        _uar_xlsx_cache_key = f"uar_xlsx_cache_{_uar_artifact_id}"
         xlsx = st.session_state.get(_uar_xlsx_cache_key)
-        if xlsx is None:
-            with st.spinner(
-                "Building GxP evidence package — this takes 1–3 minutes for large files. "
-                "Do not navigate away."
-            ):
-                xlsx = uar_build_excel(
-                    result,
-                    sys_name,
-                    r_start or "(not specified)",
-                    r_end   or "(not specified)",
-                    st.session_state.get("uar_file_name", ""),
-                )
-                st.session_state[_uar_xlsx_cache_key] = xlsx
         _dl_col, _ = st.columns([3, 5])
         with _dl_col:
             st.markdown(
@@ -14905,17 +19214,22 @@ them in Step 2.
                 "<p style='font-size:0.76rem;margin:0 0 4px;visibility:hidden;'>_</p>",
                 unsafe_allow_html=True,
             )
-            _trial_gate(
-                label="📥 Download UAR Evidence Package (.xlsx)",
-                data=xlsx,
-                file_name=(
-                    f"UAR_{sys_name.replace(' ', '_')}"
-                    f"_{datetime.date.today()}.xlsx"
-                ),
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="uar_download_btn",
-                use_container_width=True,
-            )
+            if xlsx is None:
+                xlsx = artifact_wait(_uar_artifact_id, "GxP evidence package")
+                if xlsx is not None:
+                    st.session_state[_uar_xlsx_cache_key] = xlsx
+            if xlsx is not None:
+                _trial_gate(
+                    label="📥 Download UAR Evidence Package (.xlsx)",
+                    data=xlsx,
+                    file_name=(
+                        f"UAR_{sys_name.replace(' ', '_')}"
+                        f"_{datetime.date.today()}.xlsx"
+                    ),
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="uar_download_btn",
+                    use_container_width=True,
+                )
             st.caption(
                 "5-sheet GxP evidence package: Summary · Top 10 Users · "
                 "SoD Conflicts · All Users · Detection Logic"
@@ -15038,15 +19352,43 @@ def _dim_trend_arrow(pct_change: float) -> str:
     if abs(pct_change) <= 5: return "→"
     return "↑" if pct_change > 0 else "↓"
 
+def _dim_trend_labels(pct: pd.Series) -> list:
+    """_dim_trend_label over a Δ% column; NaN (no prior) reads "—"."""
+    import numpy as _np
+    v   = pct.to_numpy(dtype=float)
+    a   = _np.abs(v)
+    d   = _np.where(v > 0, "Increase", "Decrease")
+    out = _np.select(
+        [_np.isnan(v), a <= 5, a <= 15, a <= 30],
+        ["—", "Stable", _np.char.add("Slight ", d), _np.char.add("Moderate ", d)],
+        default=_np.char.add("Significant ", d))
+    return out.tolist()
+
+def _dim_trend_arrows(pct: pd.Series) -> list:
+    """_dim_trend_arrow over a Δ% column; NaN (no prior) reads "—"."""
+    import numpy as _np
+    v = pct.to_numpy(dtype=float)
+    return _np.select([_np.isnan(v), _np.abs(v) <= 5, v > 0],
+                      ["—", "→", "↑"], default="↓").tolist()
 
-def _dim_normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
-    """Normalise column names using alias map. Returns df with standardised cols."""
-    rename = {}
-    for col in df.columns:
-        mapped = _DIM_COL_ALIASES.get(col.strip().lower().replace(" ", "_"))
+
+_DIM_ALIAS_KIND = _col_alias_kind("dim", _DIM_COL_ALIASES)
+
+
+def _dim_alias_renames(columns: list) -> dict:
+    renames = {}
+    for col in columns:
+        mapped = _DIM_COL_ALIASES.get(str(col).strip().lower().replace(" ", "_"))
         if mapped:
-            rename[col] = mapped
-    return df.rename(columns=rename)
+            renames[col] = mapped
+    return renames
+
+
+def _dim_normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalise column names using alias map. Returns df with standardised cols.
+    The rename map is resolved once per header layout (_col_alias_resolve)."""
+    return df.rename(columns=_col_alias_resolve(_DIM_ALIAS_KIND, df.columns,
+                                                _dim_alias_renames))
 
 
 def _dim_classify_rule(rule_str: str) -> dict:
@@ -15084,11 +19426,35 @@ def _dim_classify_rule(rule_str: str) -> dict:
     }
 
 
+def _dim_per_value(s: pd.Series, fn):
+    """fn(v) for every row of s as an object array, evaluated once per
+    distinct value and broadcast through the pd.factorize codes. Missing
+    values go to fn row by row, because fn may tell None from NaN
+    (str(None) is 'None', str(nan) is 'nan')."""
+    import numpy as _np
+    codes, uniq = pd.factorize(s)
+    mapped = _np.empty(len(uniq) + 1, dtype=object)
+    for i, v in enumerate(uniq):
+        mapped[i] = fn(v)
+    out  = mapped[codes]
+    vals = s.values
+    for i in _np.flatnonzero(codes < 0):
+        out[i] = fn(vals[i])
+    return out
+
+
 def dim_score_periods(df: pd.DataFrame) -> dict:
     """
     Core DIM scoring engine. Deterministic — no AI in this path.
     Returns structured result dict for Excel builder and UI.
+
+    Row-level work is columnar: risk levels and rule strings are classified
+    once per distinct value (_dim_per_value), and period metrics come from
+    groupby aggregations. Trends use shift over the period table, postures
+    use rank tables over it. Python loops run only over periods, repeat
+    users and recurring rules, never over findings.
     """
+    import numpy as _np
     issues = []
     rules_skipped = []
 
@@ -15105,16 +19471,22 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
         "low": "Low", "lo": "Low", "minimal": "Low",
     }
     df = df.copy()
-    df["Risk_Level_Norm"] = df["Risk_Level"].apply(
+    df["Risk_Level_Norm"] = _dim_per_value(
+        df["Risk_Level"],
         lambda v: _RISK_NORM.get(str(v).strip().lower(), str(v).strip()))
     df["Risk_Weight"] = df["Risk_Level_Norm"].map(_DIM_RISK_WEIGHT).fillna(1)
 
     # ── Classify events ───────────────────────────────────────────────────────
-    rule_flags = df["Rule_Triggered"].apply(_dim_classify_rule)
-    df["is_deletion"]     = rule_flags.apply(lambda x: x["is_deletion"])
-    df["is_failed_login"] = rule_flags.apply(lambda x: x["is_failed_login"])
-    df["is_off_hours"]    = rule_flags.apply(lambda x: x["is_off_hours"])
-    df["is_dormant"]      = rule_flags.apply(lambda x: x["is_dormant"])
+    # _dim_classify_rule runs once per distinct rule string; the flags are
+    # broadcast back to the rows through the factorised codes.
+    _flag_names = ("is_deletion", "is_failed_login", "is_off_hours", "is_dormant")
+    rule_flags = _np.array(
+        list(_dim_per_value(df["Rule_Triggered"],
+                            lambda r: tuple(_dim_classify_rule(r)[k]
+                                            for k in _flag_names))),
+        dtype=bool).reshape(len(df), len(_flag_names))
+    for _i, _k in enumerate(_flag_names):
+        df[_k] = rule_flags[:, _i]
     df["is_high_crit"]    = df["Risk_Level_Norm"].isin(["High", "Critical"])
 
     # ── Check optional columns ────────────────────────────────────────────────
@@ -15126,14 +19498,39 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
     if not has_timestamp:
         rules_skipped.append("Timestamp-based off-hours trend — Event_Timestamp column not provided")
 
+    # ── Event timestamps, parsed once per period ─────────────────────────────
+    # Each period's Event_Timestamp values are parsed in one to_datetime call
+    # (format inference stays per period, as each period is one upload). The
+    # period, repeat-user and rule orderings below all read these
+    # minima instead of re-filtering and re-parsing the frame per key.
+    _ts_by_period = {}   # period → (row positions, parsed timestamps)
+    if has_timestamp:
+        for _p, _ix in df.groupby("Review_Period", sort=False).indices.items():
+            _ts_by_period[_p] = (_ix, pd.to_datetime(
+                df["Event_Timestamp"].iloc[_ix], errors="coerce").reset_index(drop=True))
+
+    def _ts_min_by(key_col: str, rows_mask=None) -> dict:
+        """{(key, period): earliest parsed Event_Timestamp} over rows_mask."""
+        out = {}
+        for _p, (_ix, _ts) in _ts_by_period.items():
+            _keys = pd.Series(df[key_col].to_numpy()[_ix])
+            if rows_mask is not None:
+                _sel = rows_mask.to_numpy()[_ix]
+                _ts, _keys = _ts[_sel], _keys[_sel]
+            _ts = _ts.dropna()
+            if _ts.empty:
+                continue
+            for _k, _v in _ts.groupby(_keys[_ts.index], sort=False).min().items():
+                out[(_k, _p)] = _v
+        return out
+
     # ── Sort periods chronologically by earliest event timestamp ─────────────
     # Alphabetic sort breaks when users run periods out of order (e.g. Q2 before Q1).
     # Parse the minimum Event_Timestamp per period to derive true chronological order.
     _all_periods = df["Review_Period"].dropna().unique().tolist()
     def _period_start(p):
-        _rows = df[df["Review_Period"] == p]
-        if "Event_Timestamp" in _rows.columns:
-            _ts = pd.to_datetime(_rows["Event_Timestamp"], errors="coerce").dropna()
+        if p in _ts_by_period:
+            _ts = _ts_by_period[p][1].dropna()
             if not _ts.empty:
                 return _ts.min()
         import re as _re
@@ -15165,40 +19562,55 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
     )
 
     # ── Feature 1: Period trend metrics ──────────────────────────────────────
-    period_rows = []
-    for p in periods:
-        pf = df[df["Review_Period"] == p]
-        pf_real = pf[~pf["_is_sentinel"]]   # exclude sentinel rows from counts
-        # Per-module high-critical counts — required for per-module posture
-        # so a clean AT period is never masked by UAR findings (and vice versa).
-        pf_at  = pf_real[pf_real["Source_Module"] == "AT"]
-        pf_uar = pf_real[pf_real["Source_Module"] == "UAR"]
-        pf_dci = pf_real[pf_real["Source_Module"] == "DCI"]
-        # "Was this module exercised?" — sentinel OR real row presence.
-        # This distinguishes "module ran and found nothing" (zero findings is a
-        # REAL signal — compare to prior) from "module never ran" (no signal).
-        _at_ran  = bool((pf["Source_Module"] == "AT").any())
-        _uar_ran = bool((pf["Source_Module"] == "UAR").any())
-        _dci_ran = bool((pf["Source_Module"] == "DCI").any())
-        period_rows.append({
-            "Review_Period":        p,
-            "Total_Findings":       len(pf_real),
-            "AT_Findings":          int((pf_real["Source_Module"] == "AT").sum()),
-            "UAR_Findings":         int((pf_real["Source_Module"] == "UAR").sum()),
-            "DCI_Findings":         int((pf_real["Source_Module"] == "DCI").sum()),
-            "AT_Ran":               _at_ran,
-            "UAR_Ran":              _uar_ran,
-            "DCI_Ran":              _dci_ran,
-            "High_Critical":        int(pf_real["is_high_crit"].sum()),
-            "AT_High_Critical":     int(pf_at["is_high_crit"].sum()),
-            "UAR_High_Critical":    int(pf_uar["is_high_crit"].sum()),
-            "DCI_High_Critical":    int(pf_dci["is_high_crit"].sum()),
-            "Deletion_Findings":    int(pf_real["is_deletion"].sum()),
-            "Failed_Login":         int(pf_real["is_failed_login"].sum()),
-            "Dormant_Findings":     int(pf_real["is_dormant"].sum()),
-            "Avg_Risk_Weight":      round(float(pf_real["Risk_Weight"].mean()), 2) if not pf_real.empty else 0.0,
-        })
-    period_df = pd.DataFrame(period_rows)
+    # One groupby over (period, module) for the per-module counts, one over
+    # period for the cross-module counts. Sentinel rows count towards "module
+    # ran" but not towards findings.
+    # "Was this module exercised?" — sentinel OR real row presence.
+    # This distinguishes "module ran and found nothing" (zero findings is a
+    # REAL signal — compare to prior) from "module never ran" (no signal).
+    _real = df[~df["_is_sentinel"].fillna(False).astype(bool)]
+    _ran  = (df.groupby(["Review_Period", "Source_Module"]).size()
+               .unstack(fill_value=0).reindex(index=periods, fill_value=0) > 0)
+    _by_mod = (_real.groupby(["Review_Period", "Source_Module"])
+                    .agg(n=("is_high_crit", "size"), hc=("is_high_crit", "sum"))
+                    .unstack(fill_value=0).reindex(index=periods, fill_value=0))
+    _by_per = (_real.groupby("Review_Period")
+                    .agg(n=("is_high_crit", "size"),
+                         hc=("is_high_crit", "sum"),
+                         dele=("is_deletion", "sum"),
+                         failed=("is_failed_login", "sum"),
+                         dormant=("is_dormant", "sum"),
+                         w_sum=("Risk_Weight", "sum"))
+                    .reindex(index=periods))
+
+    def _mod_col(frame, stat, mod):
+        return (frame[(stat, mod)] if (stat, mod) in frame.columns
+                else pd.Series(0, index=periods)).astype(int).values
+
+    def _mod_ran(mod):
+        return (_ran[mod] if mod in _ran.columns
+                else pd.Series(False, index=periods)).astype(bool).values
+
+    _n_real = _by_per["n"].fillna(0).astype(int)
+    period_df = pd.DataFrame({
+        "Review_Period":        periods,
+        "Total_Findings":       _n_real.values,
+        "AT_Findings":          _mod_col(_by_mod, "n", "AT"),
+        "UAR_Findings":         _mod_col(_by_mod, "n", "UAR"),
+        "DCI_Findings":         _mod_col(_by_mod, "n", "DCI"),
+        "AT_Ran":               _mod_ran("AT"),
+        "UAR_Ran":              _mod_ran("UAR"),
+        "DCI_Ran":              _mod_ran("DCI"),
+        "High_Critical":        _by_per["hc"].fillna(0).astype(int).values,
+        "AT_High_Critical":     _mod_col(_by_mod, "hc", "AT"),
+        "UAR_High_Critical":    _mod_col(_by_mod, "hc", "UAR"),
+        "DCI_High_Critical":    _mod_col(_by_mod, "hc", "DCI"),
+        "Deletion_Findings":    _by_per["dele"].fillna(0).astype(int).values,
+        "Failed_Login":         _by_per["failed"].fillna(0).astype(int).values,
+        "Dormant_Findings":     _by_per["dormant"].fillna(0).astype(int).values,
+        "Avg_Risk_Weight":      [round(float(w / n), 2) if n else 0.0
+                                 for w, n in zip(_by_per["w_sum"].fillna(0.0), _n_real)],
+    })
 
     # Calculate % change column-by-column vs prior period
     metrics = ["Total_Findings", "AT_Findings", "UAR_Findings", "DCI_Findings",
@@ -15206,14 +19618,10 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
                "Failed_Login", "Dormant_Findings"]
     for m in metrics:
         prev = period_df[m].shift(1)
-        period_df[f"{m}_pct_chg"] = (
-            ((period_df[m] - prev) / prev.replace(0, 1) * 100)
-            .round(1)
-        )
-        period_df[f"{m}_trend"] = period_df[f"{m}_pct_chg"].apply(
-            lambda v: _dim_trend_label(v) if pd.notna(v) else "—")
-        period_df[f"{m}_arrow"] = period_df[f"{m}_pct_chg"].apply(
-            lambda v: _dim_trend_arrow(v) if pd.notna(v) else "—")
+        pct  = ((period_df[m] - prev) / prev.replace(0, 1) * 100).round(1)
+        period_df[f"{m}_pct_chg"] = pct
+        period_df[f"{m}_trend"]   = _dim_trend_labels(pct)
+        period_df[f"{m}_arrow"]   = _dim_trend_arrows(pct)
 
     # ── Suppress misleading per-module Δ% when comparison isn't legitimate ────
     # A module's Δ% only means something if the module ran in BOTH this period
@@ -15245,16 +19653,9 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
     # require a prior observation before any trend signal can be asserted.
     # Without this guard, a module's first-ever run would always read as
     # +∞% change and fire Critical — indefensible to an inspector.
-    def _posture_for(chg, hc):
-        if pd.isna(chg):        return "Baseline"
-        if chg > 30 and hc > 0: return "Critical"
-        if chg > 15:            return "Deteriorating"
-        if chg < -15:           return "Improving"
-        return "Stable"
-
     def _compute_module_postures(findings_key, hc_key, ran_key):
         """
-        Walk periods in order. A module's posture is:
+        A module's posture per period is:
           - "N/A"       if the module was NOT run in this period (ran_key = False)
           - "Baseline"  if this is the first period the module was run (no prior)
           - trend label computed from count vs the prior ACTIVE period otherwise
@@ -15263,39 +19664,26 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
         A period with 7 findings followed by a clean run (0 findings) is a
         real Improving signal — it only reads N/A if the module was never
         actually exercised for that period.
+
+        The prior ACTIVE period is a shift over the run periods only. Going
+        from 0 to 0 findings is 0 % (Stable). Going from 0 to findings is
+        treated as +100 %, which reads Deteriorating, not Critical, unless
+        there are high/critical findings.
         """
-        postures = []
-        seen_active = False  # has this module been run in any prior period?
-        prev_count  = None   # findings count in the prior RUN period
-        for _, row in period_df.iterrows():
-            if not bool(row.get(ran_key, False)):
-                postures.append("N/A")
-                continue
-            count = int(row.get(findings_key, 0))
-            if not seen_active:
-                # First-ever run for this module — Baseline, no trend.
-                postures.append("Baseline")
-                seen_active = True
-                prev_count = count
-                continue
-            # Subsequent run — compute trend vs prior run's count.
-            # If prior was 0 and current is 0: Stable (no change).
-            # If prior was 0 and current > 0: can't compute %; use hc signal.
-            # If prior > 0: standard pct change.
-            if prev_count is None:
-                chg = float("nan")
-            elif prev_count == 0 and count == 0:
-                chg = 0.0
-            elif prev_count == 0 and count > 0:
-                # Went from clean to findings — deteriorating.
-                # Treat as +100% to trigger Deteriorating (not Critical unless HC).
-                chg = 100.0
-            else:
-                chg = (count - prev_count) / prev_count * 100.0
-            hc = int(row.get(hc_key, 0))
-            postures.append(_posture_for(chg, hc))
-            prev_count = count
-        return postures
+        ran   = period_df[ran_key].fillna(False).astype(bool).values
+        count = period_df[findings_key].values[ran].astype(float)
+        hc    = period_df[hc_key].values[ran]
+        prev  = _np.concatenate(([_np.nan], count[:-1]))
+        with _np.errstate(divide="ignore", invalid="ignore"):
+            chg = _np.where(prev == 0, _np.where(count == 0, 0.0, 100.0),
+                            (count - prev) / prev * 100.0)
+        active = _np.select(
+            [_np.isnan(prev), (chg > 30) & (hc > 0), chg > 15, chg < -15],
+            ["Baseline", "Critical", "Deteriorating", "Improving"],
+            default="Stable")
+        postures = _np.full(len(ran), "N/A", dtype=object)
+        postures[ran] = active
+        return postures.tolist()
 
     period_df["AT_Posture"]  = _compute_module_postures(
         "AT_Findings",  "AT_High_Critical",  "AT_Ran")
@@ -15313,45 +19701,32 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
         "Improving":     1,
         "Baseline":      0,
     }
-
-    def _overall_posture(row):
-        # N/A and Baseline both contribute no trend signal.
-        # - N/A      = module wasn't run in this period
-        # - Baseline = module's first active period (can't compare to nothing)
-        at_p  = row["AT_Posture"]
-        uar_p = row["UAR_Posture"]
-        dci_p = row.get("DCI_Posture", "N/A")
-        at_silent  = at_p  in ("N/A", "Baseline")
-        uar_silent = uar_p in ("N/A", "Baseline")
-        dci_silent = dci_p in ("N/A", "Baseline")
-
-        if at_silent and uar_silent and dci_silent:
-            return "Baseline", "—"
-
-        # Collect active signals only
-        _active = {}
-        if not at_silent:  _active["AT"]  = _POSTURE_RANK[at_p]
-        if not uar_silent: _active["UAR"] = _POSTURE_RANK[uar_p]
-        if not dci_silent: _active["DCI"] = _POSTURE_RANK[dci_p]
-
-        if not _active:
-            return "Baseline", "—"
-
-        # Worst-of: highest rank wins; tie priority: AT > UAR > DCI
-        _worst_driver = max(_active, key=lambda k: (_active[k],
-                            {"AT": 3, "UAR": 2, "DCI": 1}[k]))
-        _worst_posture = {
-            "AT": at_p, "UAR": uar_p, "DCI": dci_p
-        }[_worst_driver]
-        return _worst_posture, _worst_driver
-
-    _overall = period_df.apply(lambda r: _overall_posture(r), axis=1)
-    period_df["DI_Posture"]      = _overall.apply(lambda t: t[0])
-    period_df["Posture_Driver"]  = _overall.apply(lambda t: t[1])
+    # Worst-of: highest rank wins; tie priority: AT > UAR > DCI. Each module
+    # contributes rank * 10 + priority; N/A and Baseline (no trend signal)
+    # contribute -1. A period where every module is silent reads Baseline.
+    _drivers = ("AT", "UAR", "DCI")
+    _keys = _np.column_stack([
+        period_df[f"{m}_Posture"].map(
+            lambda p, _pr=pr: -1 if p in ("N/A", "Baseline")
+            else _POSTURE_RANK[p] * 10 + _pr).values
+        for m, pr in zip(_drivers, (3, 2, 1))
+    ])
+    _worst  = _keys.argmax(axis=1)
+    _silent = _keys.max(axis=1) < 0
+    _post   = period_df[[f"{m}_Posture" for m in _drivers]].values
+    period_df["DI_Posture"]     = _np.where(
+        _silent, "Baseline", _post[_np.arange(len(period_df)), _worst]).tolist()
+    period_df["Posture_Driver"] = _np.where(
+        _silent, "—", _np.array(_drivers, dtype=object)[_worst]).tolist()
 
     # ── Feature 2: Repeat high-risk users ────────────────────────────────────
     hc_df     = df[df["is_high_crit"] & ~df["_is_sentinel"]].copy()
-    user_grp  = hc_df.groupby("Username")
+    # Only users flagged in 2+ periods can be repeat users — the per-user
+    # loop below skips everyone else before touching their rows.
+    _n_user_periods = hc_df.groupby("Username")["Review_Period"].nunique(dropna=False)
+    user_grp  = hc_df[hc_df["Username"].isin(
+        _n_user_periods.index[_n_user_periods >= 2])].groupby("Username")
+    _user_ts_min = _ts_min_by("Username", df["is_high_crit"] & ~df["_is_sentinel"])
     # Build set of UAR-flagged usernames for compound risk detection
     _uar_flagged_users = set(
         hc_df[hc_df["Source_Module"] == "UAR"]["Username"].str.lower().unique()
@@ -15372,16 +19747,16 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
     for uname, grp in user_grp:
         # Sort periods chronologically using actual event timestamps per period
         _user_periods = grp["Review_Period"].unique().tolist()
-        def _up_start(p):
-            _r = grp[grp["Review_Period"] == p]
-            _ts = pd.to_datetime(_r.get("Event_Timestamp", pd.Series(dtype=str)),
-                                 errors="coerce").dropna()
-            return _ts.min() if not _ts.empty else pd.Timestamp.max
-        periods_flagged = sorted(_user_periods, key=_up_start)
+        periods_flagged = sorted(
+            _user_periods,
+            key=lambda p: _user_ts_min.get((uname, p), pd.Timestamp.max))
         if len(periods_flagged) < 2:
             continue
+        # Ties broken on the rule label — value_counts() tie order varies
+        # between pandas releases.
         rule_counts = grp["Rule_Triggered"].value_counts()
-        top_rule    = rule_counts.index[0] if len(rule_counts) else "—"
+        top_rule    = (min(rule_counts.items(), key=lambda kv: (-kv[1], str(kv[0])))[0]
+                       if len(rule_counts) else "—")
         _uname_lower = str(uname).lower()
         _is_cross_module = (_uname_lower in _uar_flagged_users and _uname_lower in _at_flagged_users)
         _is_r5r6 = _uname_lower in _at_r5r6_compound_users
@@ -15417,20 +19792,18 @@ def dim_score_periods(df: pd.DataFrame) -> dict:
         r = _re2.sub(r'\s*\[(HIGH|MEDIUM|CRITICAL|LOW)\]\s*$', '', r, flags=_re2.IGNORECASE)
         return r[:80]
 
-    df["Primary_Rule"] = df["Rule_Triggered"].apply(_primary_rule)
+    df["Primary_Rule"] = _dim_per_value(df["Rule_Triggered"], _primary_rule)
     rule_grp = df[~df["_is_sentinel"]].groupby("Primary_Rule")   # exclude sentinels
+    _rule_ts_min = _ts_min_by("Primary_Rule", ~df["_is_sentinel"])
     rule_rows = []
     for rule, grp in rule_grp:
         if not rule or rule == "nan" or "no named rules" in rule.lower():
             continue
         # Sort periods chronologically using actual timestamps
-        def _rp_start(p):
-            _r = grp[grp["Review_Period"] == p]
-            _ts = pd.to_datetime(_r.get("Event_Timestamp", pd.Series(dtype=str)),
-                                 errors="coerce").dropna()
-            return _ts.min() if not _ts.empty else pd.Timestamp.max
         _raw_periods  = grp["Review_Period"].unique().tolist()
-        periods_seen  = sorted(_raw_periods, key=_rp_start)
+        periods_seen  = sorted(
+            _raw_periods,
+            key=lambda p: _rule_ts_min.get((rule, p), pd.Timestamp.max))
         period_counts = grp.groupby("Review_Period").size().to_dict()
         first_cnt     = period_counts.get(periods_seen[0], 0)
         # Always use the global last period (not last-seen period) so a rule that
@@ -16992,7 +21365,6 @@ def _dim_generate_narrative(smry: dict, period_df: pd.DataFrame,
 
     # Try AI narrative
     try:
-        from litellm import completion as _comp
         ctx = "\n".join(fallback_lines)
         prompt = f"""You are writing an executive summary for a pharmaceutical QA periodic review.
 
@@ -17010,8 +21382,9 @@ CALCULATED DATA:
 
 Write the executive summary now. Start with "## Review Scope" heading."""
 
-        resp = _comp(
-            model=model_id, stream=False, temperature=0.05, max_tokens=500,
+        resp = _llm_completion(
+            model=model_id, purpose="dim_narrative", stream=False,
+            temperature=0.05, max_tokens=500,
             messages=[
                 {"role": "system", "content":
                  "You write data-grounded executive summaries for pharmaceutical QA teams. "
@@ -17029,6 +21402,118 @@ Write the executive summary now. Start with "## Review Scope" heading."""
     return "\n".join(fallback_lines)
 
 
+# ── DIM computation cache ─────────────────────────────────────────────────────
+# show_dim reruns on every widget click. Scoring all banked periods and
+# rebuilding the 6-sheet workbook (which also calls the narrative LLM) on each
+# rerun is pure waste when nothing has been banked since. One cache entry lives
+# in st.session_state["dim_cache"], keyed on dim_rows_gen + system name +
+# VERSION. Every site that banks or clears dim_accumulated_rows bumps
+# dim_rows_gen (and sets dim_cache back to None); those sites always assign a
+# new list, so len/id of the rows also guard any path that forgets the bump.
+def _dim_cache_key(rows: list, system_name: str) -> tuple:
+    return (st.session_state.get("dim_rows_gen", 0), len(rows), id(rows),
+            (system_name or "").strip(), VERSION)
+
+
+def _dim_cache_entry(rows: list, system_name: str, result: dict = None) -> dict:
+    """Current cache entry for `rows`, or a fresh one. When `result` is given
+    the entry must also hold that exact result object — a workbook is never
+    served for a different scoring run than the one on screen."""
+    key   = _dim_cache_key(rows, system_name)
+    entry = st.session_state.get("dim_cache")
+    if (entry and entry.get("key") == key
+            and (result is None or entry.get("result") is result)):
+        return entry
+    entry = {"key": key, "result": result, "xlsx": {}}
+    st.session_state["dim_cache"] = entry
+    return entry
+
+
+def _dim_score_cached(rows: list, system_name: str) -> dict:
+    """dim_score_periods() over the banked rows, memoised per cache key.
+    Error results are returned but never cached."""
+    entry = _dim_cache_entry(rows, system_name)
+    if entry.get("result") is not None:
+        return entry["result"]
+    result = dim_score_periods(_dim_normalise_columns(pd.DataFrame(rows)))
+    if "error" not in result:
+        entry["result"] = result
+    return result
+
+
+def _dim_build_excel_cached(result: dict, rows: list, system_name: str,
+                            file_name: str, model_id: str) -> bytes:
+    """dim_build_excel() memoised on the scoring cache key + workbook inputs."""
+    entry  = _dim_cache_entry(rows, system_name, result)
+    subkey = (file_name, model_id)
+    xlsx   = entry["xlsx"].get(subkey)
+    if xlsx is None:
+        xlsx = dim_build_excel(result, system_name, file_name, model_id)
+        entry["xlsx"][subkey] = xlsx
+    return xlsx
+
+
+# ── Persistent DIM period store ───────────────────────────────────────────────
+# Same row dicts as dim_accumulated_rows, one JSON blob per row. Re-banking a
+# (system, period, module, file) replaces the earlier rows — the same rule the
+# session banking paths apply — so a batch re-run never double-counts a period.
+def _dim_store_bank(rows: list, system_name: str, period: str, module: str,
+                    source_file: str, user: str = "") -> int:
+    """Replace the stored rows for this period/module/file with `rows`."""
+    now  = datetime.datetime.utcnow().isoformat()
+    conn = db_connect()
+    try:
+        conn.execute(
+            "DELETE FROM dim_bank WHERE system_name=? AND review_period=? "
+            "AND source_module=? AND source_file=?",
+            (system_name, period, module, source_file))
+        conn.executemany(
+            "INSERT INTO dim_bank (system_name, review_period, source_module, "
+            "source_file, row_json, banked_by, banked_at) VALUES (?,?,?,?,?,?,?)",
+            [(system_name, period, module, source_file,
+              _json.dumps(r, default=str), user, now) for r in rows])
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def _dim_store_load(system_name: str = None) -> list:
+    """All stored DIM rows (optionally for one system), in banking order."""
+    conn = db_connect()
+    try:
+        if system_name:
+            cur = conn.execute(
+                "SELECT row_json FROM dim_bank WHERE system_name=? ORDER BY id",
+                (system_name,))
+        else:
+            cur = conn.execute("SELECT row_json FROM dim_bank ORDER BY id")
+        return [_json.loads(r[0]) for r in cur.fetchall()]
+    except Exception:
+        return []
+    finally:
+        conn.close()
+
+
+def _dim_store_periods(system_name: str = None) -> list:
+    """Distinct stored review periods (optionally for one system) — the cheap
+    index-only query behind the DIM page's load button."""
+    conn = db_connect()
+    try:
+        if system_name:
+            cur = conn.execute(
+                "SELECT DISTINCT review_period FROM dim_bank WHERE system_name=? "
+                "ORDER BY review_period", (system_name,))
+        else:
+            cur = conn.execute(
+                "SELECT DISTINCT review_period FROM dim_bank ORDER BY review_period")
+        return [r[0] for r in cur.fetchall()]
+    except Exception:
+        return []
+    finally:
+        conn.close()
+
+
 def _show_evidence_pack_placeholder():
     """Evidence Pack — placeholder until AT + UAR + DCI all have completed runs."""
     import streamlit as st
@@ -17132,6 +21617,31 @@ def show_dim(user: str, role: str, model_id: str):
         f"📊 No periods banked · Maximum recommended: {_DIM_MAX_PERIODS} periods."
     )
 
+    # ── Periods banked by batch_review.py (persistent dim_bank table) ────────
+    # Only the period labels are read on each rerun; rows load on click.
+    _stored_periods = _dim_store_periods(_sys_name or None)
+    if _stored_periods:
+        if st.button(f"📥 Load {len(_stored_periods)} stored period"
+                     f"{'s' if len(_stored_periods) != 1 else ''}",
+                     key="dim_store_load_btn",
+                     help="Merge periods banked by batch runs into this session"):
+            _stored = _dim_store_load(_sys_name or None)
+            _keys = set((r.get("Review_Period"), r.get("Source_Module"),
+                         r.get("Source_File")) for r in _stored)
+            _merged = [r for r in _acc_rows
+                       if (r.get("Review_Period"), r.get("Source_Module"),
+                           r.get("Source_File")) not in _keys] + _stored
+            st.session_state["dim_accumulated_rows"] = _merged
+            st.session_state["dim_periods_banked"]   = len(
+                set(r["Review_Period"] for r in _merged))
+            if not _sys_name and _stored:
+                st.session_state["dim_system_name"] = _stored[-1].get("System_Name", "")
+            st.session_state["dim_analysis_done"] = False
+            st.session_state["dim_result"]        = None
+            st.session_state["dim_cache"]         = None
+            st.session_state["dim_rows_gen"]      = st.session_state.get("dim_rows_gen", 0) + 1
+            st.rerun()
+
 
 
     if _banked >= _DIM_MAX_PERIODS:
@@ -17166,10 +21676,9 @@ def show_dim(user: str, role: str, model_id: str):
     # ── Auto-run when arriving from the AT CTA button ─────────────────────────
     if _autorun and not _done:
         st.session_state.pop("dim_autorun_pending", None)
-        input_df = _dim_normalise_columns(pd.DataFrame(_acc_rows))
         with st.status("Running Data Integrity Monitor…", expanded=True) as status:
             st.write("Classifying events and calculating trends…")
-            result = dim_score_periods(input_df)
+            result = _dim_score_cached(_acc_rows, _sys_name)
             if "error" in result:
                 status.update(label="Error", state="error")
                 st.error(result["error"]); return
@@ -17201,10 +21710,9 @@ def show_dim(user: str, role: str, model_id: str):
             run_btn = st.button("▶ Run DI Monitor", type="primary",
                                 use_container_width=True, key="dim_run_btn")
         if run_btn:
-            input_df = _dim_normalise_columns(pd.DataFrame(_acc_rows))
             with st.status("Running Data Integrity Monitor…", expanded=True) as status:
                 st.write("Classifying events and calculating trends…")
-                result = dim_score_periods(input_df)
+                result = _dim_score_cached(_acc_rows, _sys_name)
                 if "error" in result:
                     status.update(label="Error", state="error")
                     st.error(result["error"]); return
@@ -17485,7 +21993,8 @@ def show_dim(user: str, role: str, model_id: str):
     _dl_fname = f"{_src_label} ({_banked} period{'s' if _banked != 1 else ''})"
     _dl_out   = f"DIM_{_dl_sys.replace(' ','_')}_{datetime.datetime.utcnow().strftime('%Y-%m-%d')}.xlsx"
     with st.spinner("Building evidence package…"):
-        _dl_xlsx = dim_build_excel(result, _dl_sys, _dl_fname, model_id)
+        _dl_xlsx = _dim_build_excel_cached(result, _banked_rows, _dl_sys,
+                                           _dl_fname, model_id)
     _dl_col, _clear_col, _ = st.columns([3, 2, 3])
     with _dl_col:
         _trial_gate(
@@ -17504,6 +22013,8 @@ def show_dim(user: str, role: str, model_id: str):
             st.session_state["dim_periods_banked"]   = 0
             st.session_state["dim_analysis_done"]    = False
             st.session_state["dim_autorun_pending"]  = False
+            st.session_state["dim_cache"]            = None
+            st.session_state["dim_rows_gen"]         = st.session_state.get("dim_rows_gen", 0) + 1
             st.rerun()
     st.caption("5 sheets: Dashboard · Period Trends · Repeat Users · Rule Recurrence · Activity Heatmap · Narrative Summary")
     st.markdown("<div style='margin-bottom:8px;'></div>", unsafe_allow_html=True)
@@ -18037,47 +22548,8 @@ def show_audit_trail(user: str, role: str, model_id: str):
         )
         st.markdown("---")
 
-    # ── Initialise rule config defaults ───────────────────────────────────────
-    # v96 — 17-rule ruleset. Active toggles default ON; dropped rules default OFF
-    # and are hidden from the UI. Old toggle keys preserved (not renamed) so that
-    # existing session state and saved configurations continue to load cleanly.
-    # See AT Rules Spec v2.0 §1 for the v96 ruleset and §2 for the dropped rules.
-    # Rule 17 (Workflow Status Reversal) was re-instated post-review per QA-manager
-    # feedback that it is the #1 fraud-hiding pattern. See _RULE_NUM_REMAP for
-    # internal-to-UI rule number translation.
-    _RULE_DEFAULTS = {
-        # ── v96 Critical (6) ──────────────────────────────────────────────────
-        "at_r6_on":  True,    # v96 #1  Record Reconstruction
-        "at_r7_on":  True,    # v96 #2  Audit Trail Integrity Event
-        "at_r11_on": True,    # v96 #3  Timestamp Reversal
-        "at_r12_on": True,    # v96 #4  Service / Shared Account
-        "at_r18_on": True,    # v96 #5  Self-Approval SoD Violation
-        "at_r19_on": True,    # v96 #6  Modification After Approval
-        # ── v96 High (8) ──────────────────────────────────────────────────────
-        "at_r1_on":  True,    # v96 #7  Vague Rationale
-        "at_r4_on":  False,   # v96 #8  Change Control Drift — T2, default OFF (threshold-sensitive)
-        "at_r5_on":  True,    # v96 #9  Failed Login → Data Manipulation (narrowed)
-        "at_r8_on":  True,    # v96 #10 Privileged User Modification (merged 3+8)
-        "at_r15_on": True,    # v96 #11 Missing Timestamp
-        "at_r16_on": True,    # v96 #12 Missing User Attribution
-        "at_r17_on": True,    # v96 #13 Missing Before/After Values
-        # ── v96 Medium (2) — T2 rules default OFF ─────────────────────────────
-        # T2 = Tier-2 confidence: statistically valid but sensitive to customer
-        # environment (shift patterns, global teams, bulk-update workflows).
-        # Enable after reviewing your organization's operational patterns.
-        "at_r2_on":  True,    # v96 #15 Contemporaneous Burst — T1, stays ON
-        # ── v96 Critical (re-instated) ────────────────────────────────────────
-        "at_r20_on": True,    # v96 #17 Workflow Status Reversal — re-enabled per QA review
-        # ── DROPPED in v96 — default OFF, hidden from UI ──────────────────────
-        "at_r3_on":  False,   # merged into v96 #10 via at_r8_on
-        "at_r9_on":  False,   # Timestamp Gap — dropped (weekend/low-activity noise)
-        "at_r13_on": False,   # Dormant Account — moved to UAR U11
-        "at_r14_on": False,   # First-Time Behavior — dropped (UAR U12 also dropped per UAR v1.2)
-        "at_r21_on": False,   # Role/Permission Change — dropped (UAR U13 also dropped per UAR v1.2)
-        "at_r22_on": False,   # Duplicate Timestamp — dropped (sub-second noise)
-        "at_r23_on": False,   # Missing Record ID — dropped (overlaps Rule 13)
-        "at_r24_on": False,   # Duplicate Rows — dropped (data quality, not compliance)
-    }
+    # ── Initialise rule config defaults (_AT_RULE_DEFAULTS) ───────────────────
+    _RULE_DEFAULTS = dict(_AT_RULE_DEFAULTS)
     for _k, _v in _RULE_DEFAULTS.items():
         if _k not in st.session_state:
             st.session_state[_k] = _v
@@ -20664,27 +25136,10 @@ match your system's export column names to the fields above — rename nothing i
         if uploaded:
             try:
                 raw = uploaded.getvalue()
-                _sheet_names_for_validation = None
-                if uploaded.name.lower().endswith(".csv"):
-                    df = pd.read_csv(io.BytesIO(raw), dtype=str,
-                                     low_memory=False).fillna("")
-                else:
-                    # Smart sheet selection: skip "Usage Instructions", prefer
-                    # "Audit Log" sheet if present, otherwise use first data sheet
-                    xl       = pd.ExcelFile(io.BytesIO(raw))
-                    sheets   = xl.sheet_names
-                    _sheet_names_for_validation = list(sheets)
-                    SKIP     = {"usage instructions", "usage", "instructions",
-                                "readme", "read me", "guide"}
-                    data_sheets = [s for s in sheets
-                                   if s.strip().lower() not in SKIP]
-                    # Prefer a sheet whose name contains "audit" or "log"
-                    preferred = [s for s in data_sheets
-                                 if any(kw in s.lower()
-                                        for kw in ("audit", "log", "data", "trail"))]
-                    sheet_to_use = (preferred or data_sheets or sheets)[0]
-                    df = pd.read_excel(io.BytesIO(raw), sheet_name=sheet_to_use,
-                                       dtype=str).fillna("")
+                df, _sheet_names_for_validation, sheet_to_use = \
+                    _at_read_table(raw, uploaded.name)
+                if _sheet_names_for_validation:
+                    sheets = _sheet_names_for_validation
                     if len(sheets) > 1:
                         st.caption(f"📋 Reading sheet: **{sheet_to_use}**"
                                    + (f"  ·  skipped: {', '.join(s for s in sheets if s != sheet_to_use)}"
@@ -20748,100 +25203,9 @@ match your system's export column names to the fields above — rename nothing i
             df    = st.session_state["at_raw_df"]
             avail = ["(not in file)"] + list(df.columns)
 
-            # ── v96 column auto-mapper (improved) ─────────────────────────────
-            # The previous implementation matched only on substring containment,
-            # which failed for common no-separator variants like:
-            #   recordid → record_id, userid → user_id, tablename → record_type
-            # New approach: (1) collapse all separators (_, -, space, dot, slash),
-            # (2) consult a synonym table for semantic aliases, (3) fall back to
-            # substring containment on the collapsed strings.
-            _AT_COLUMN_SYNONYMS = {
-                # canonical_field: tuple of accepted aliases (collapsed, lowercase)
-                "timestamp":   ("timestamp", "datetime", "eventtime", "eventdate",
-                                "actiontime", "actiondate", "logtime", "logdate",
-                                "occurredat", "createdat", "modifiedat",
-                                "auditdate", "audittime", "audittimestamp",
-                                "evttime", "evtdate", "trxtime", "trxdate",
-                                "performedat"),
-                "user_id":     ("userid", "username", "login", "loginid",
-                                "actor", "performedby", "modifiedby", "executedby",
-                                "operator", "useraccount", "actuser", "eventuser",
-                                "auditor", "createdby", "changedby", "userlogin",
-                                "user", "uid"),  # short — Pass 1 exact-match only
-                "action_type": ("actiontype", "eventtype", "operation",
-                                "operationtype", "activitytype",
-                                "transactiontype", "auditaction", "actiontaken",
-                                "evttype", "trxtype", "auditevent",
-                                "action", "event", "tcode"),  # short — Pass 1 exact-match only
-                "record_id":   ("recordid", "recid", "rowid", "objectid",
-                                "entityid", "primarykey", "batchid", "sampleid",
-                                "caseid", "subjectid", "rec_no", "recno", "objid",
-                                "docnum", "docid"),  # short — Pass 1 exact-match only
-                "record_type": ("recordtype", "tablename", "objecttype",
-                                "entitytype", "objectname", "tableof",
-                                "modulename", "tablename", "tabname", "objtype",
-                                "table"),  # short — Pass 1 exact-match only
-                "role":        ("role", "userrole", "rolename",
-                                "permissionlevel", "accesslevel", "userlevel",
-                                "grouprole", "groupname", "userprofile",
-                                "rolelabel"),
-                "comments":    ("comments", "comment", "reason", "changereason",
-                                "rationale", "justification", "remark", "remarks",
-                                "notes", "description", "explanation",
-                                "auditcomment", "modreason", "changenotes"),
-                "new_value":   ("newvalue", "tovalue", "currentvalue",
-                                "aftervalue", "valueafter", "newdata", "newval",
-                                "afterdata", "tovalvalue"),
-                "old_value":   ("oldvalue", "fromvalue", "previousvalue",
-                                "beforevalue", "valuebefore", "olddata",
-                                "originalvalue", "oldval", "beforedata", "priorvalue"),
-                "status":      ("status", "state", "workflow", "workflowstatus",
-                                "stagestatus", "approvalstatus",
-                                "lifecyclestate", "wfstate", "wfstatus",
-                                "currentstate", "currentstatus"),
-            }
-            def _collapse(s: str) -> str:
-                """Lowercase + remove all common field separators."""
-                return ''.join(ch for ch in str(s).lower()
-                               if ch.isalnum())
-            # Pre-collapse uploaded column names once for efficiency
-            _collapsed_cols = [(c, _collapse(c)) for c in df.columns]
-
+            # ── v96 column auto-mapper — _at_autodetect_column() ─────────────
             def _autodetect(field):
-                """Find best-match column for a canonical field name.
-
-                Algorithm — strict, conservative, false-negative-preferring:
-                  Pass 1. EXACT alias match — column collapsed equals one of the
-                          synonyms for this field. Highest confidence; returns
-                          immediately on first hit.
-                  Pass 2. CONTAINMENT — alias appears INSIDE the collapsed column
-                          name (e.g. alias 'userid' in collapsed 'systemuserid').
-                          Direction is one-way: alias ⊂ column, never the reverse.
-                          Min alias length 5 to avoid 'action' matching 'actiontime'.
-                  Pass 3. CANONICAL FIELD NAME — collapsed canonical name in
-                          collapsed column. Only triggers for fields whose name
-                          is itself a common column header.
-                Returns "(not in file)" if no pass yields a match — this is
-                preferred over a wrong match because the user can still pick
-                manually from the dropdown.
-                """
-                aliases = _AT_COLUMN_SYNONYMS.get(field, ())
-                # Pass 1: exact alias match
-                for col, ccol in _collapsed_cols:
-                    if ccol in aliases:
-                        return col
-                # Pass 2: alias ⊂ column (one-way, alias ≥ 5 chars)
-                for col, ccol in _collapsed_cols:
-                    for alias in aliases:
-                        if alias and len(alias) >= 5 and alias in ccol:
-                            return col
-                # Pass 3: canonical field name in column
-                fcol = _collapse(field)
-                if len(fcol) >= 5:
-                    for col, ccol in _collapsed_cols:
-                        if fcol in ccol:
-                            return col
-                return "(not in file)"
+                return _at_autodetect_column(field, df.columns)
 
             mapping = {}
 
@@ -20953,15 +25317,10 @@ match your system's export column names to the fields above — rename nothing i
                         st.session_state["at_mapping_done"] = True
                         # ── Auto-detect review period from timestamp column ────
                         try:
-                            _ts_raw = pd.to_datetime(mdf["timestamp"], format=_sniff_ts_format(mdf["timestamp"]), errors="coerce").dropna()
+                            (st.session_state["at_review_start"],
+                             st.session_state["at_review_end"],
+                             _ts_failed) = _at_review_period(mdf)
                             _ts_total = len(mdf)
-                            _ts_failed = _ts_total - len(_ts_raw)
-                            if not _ts_raw.empty:
-                                st.session_state["at_review_start"] = _ts_raw.min().strftime("%d-%b-%Y")
-                                st.session_state["at_review_end"]   = _ts_raw.max().strftime("%d-%b-%Y")
-                            else:
-                                st.session_state["at_review_start"] = ""
-                                st.session_state["at_review_end"]   = ""
                             # v96 — timestamp parse warning
                             if _ts_total > 0 and _ts_failed / _ts_total > 0.10:
                                 st.session_state["at_ts_parse_warn"] = (
@@ -21037,7 +25396,8 @@ match your system's export column names to the fields above — rename nothing i
                           "at_file_name","at_mapping_done","at_analysis_done","at_total_events",
                           "at_review_start","at_review_end",
                           "at_last_run_hash","at_last_run_filename","at_invalidation_msg",
-                          "at_pending_hash","at_ts_parse_warn"]:
+                          "at_pending_hash","at_ts_parse_warn",
+                          "at_rule_profile","at_rule_profile_path"]:
                     if k in st.session_state:
                         del st.session_state[k]
                 st.session_state["at_key_n"] = st.session_state.get("at_key_n",0) + 1
@@ -21062,198 +25422,30 @@ match your system's export column names to the fields above — rename nothing i
                     )
                 st.write("📊 Step 1: Parsing timestamps and running 15-rule scoring engine...")
                 _ = prog.progress(0.05)
-                scored = at_score_events(df, rule_config=_AT_RULE_CONFIG)
-                st.write(f"✅ Step 1 complete — {len(scored):,} events scored across 15 rules")
+                _at_prof = {}
+                scored = at_score_events(df, rule_config=_AT_RULE_CONFIG,
+                                         profile=_at_prof)
+                st.write(f"✅ Step 1 complete — {len(scored):,} events scored across 15 rules "
+                         f"in {_at_prof['total_seconds']:.1f}s"
+                         + (f" on {_at_prof['workers']} worker processes"
+                            if _at_prof.get("workers", 1) > 1 else ""))
+                st.write("⏱️ Slowest stages: " + " · ".join(
+                    f"{_s['stage']} {_s['seconds']:.2f}s ({_s['share_pct']:.0f}%)"
+                    for _s in _at_profile_top(_at_prof, 3)))
+                st.session_state["at_rule_profile"]      = _at_prof
+                st.session_state["at_rule_profile_path"] = _at_profile_save(
+                    _at_prof, st.session_state.get("at_file_name", ""))
                 _ = prog.progress(0.50)
 
-                # ── FIX 7: Tag out-of-period events ───────────────────────────
-                # Events whose timestamp falls outside the declared review window
-                # must NOT be scored or escalated — they appear in the Full Audit
-                # Log for completeness but are excluded from Events for Review and
-                # do not contribute to risk tier counts.
-                _r_start_str = st.session_state.get("at_review_start", "").strip()
-                _r_end_str   = st.session_state.get("at_review_end",   "").strip()
-                _missing_str = "(review period dates not specified)"
-                _oop_mask    = pd.Series(False, index=scored.index)
-                if (_r_start_str and _r_end_str
-                        and _r_start_str != _missing_str
-                        and _r_end_str   != _missing_str
-                        and "timestamp_parsed" in scored.columns):
-                    try:
-                        _r_s = pd.to_datetime(_r_start_str, dayfirst=True, errors="coerce")
-                        _r_e = pd.to_datetime(_r_end_str,   dayfirst=True, errors="coerce")
-                        # Extend _r_e to 23:59:59 so events on the final day are not
-                        # falsely flagged — "30-Mar-2025" parses to midnight 00:00:00
-                        # without this, any event timestamped after midnight on that
-                        # day (e.g. 22:25:59) is incorrectly treated as out-of-period.
-                        if pd.notna(_r_e):
-                            _r_e = _r_e + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-                        if pd.notna(_r_s) and pd.notna(_r_e):
-                            _ts  = pd.to_datetime(scored["timestamp_parsed"], errors="coerce")
-                            _oop_mask = _ts.notna() & ((_ts < _r_s) | (_ts > _r_e))
-                            if _oop_mask.any():
-                                # Zero out all risk scores for out-of-period rows
-                                _score_cols = [c for c in scored.columns
-                                               if c.startswith("score_")]
-                                scored.loc[_oop_mask, _score_cols] = 0.0
-                                scored.loc[_oop_mask, "Risk_Score"] = 0.0
-                                scored.loc[_oop_mask, "Risk_Tier"]  = "Out of Period"
-                                scored.loc[_oop_mask, "Primary_Rule"] = \
-                                    "Out of Period — excluded from review scope"
-                                n_oop = int(_oop_mask.sum())
-                                st.info(f"ℹ️ {n_oop:,} event(s) fall outside the declared "
-                                        f"review period and have been excluded from scoring.")
-                    except Exception:
-                        pass   # date parse failure — treat all rows as in-period
-
-                st.write(f"📋 Step 2: Selecting Top {_AT_TOP_N} highest-risk events...")
                 _ = prog.progress(0.65)
-                # ── Select Top N — simplified architecture (v93) ──────────────
-                # Rule: Critical → always in. High → always in. Medium → dedup ok.
-                # No named-rule gate. Tier is assigned by rule-priority engine
-                # (highest rule wins) so every event in Events for Review is
-                # directly traceable to a specific named rule.
-                # Deduplication: burst dedup (Rule 2) applies to Medium/Low only.
-                # Off-hours dedup applies to Medium/Low only.
-                # Critical and High events are NEVER deduplicated out.
-
-                # Filter 1: exclude out-of-period rows
-                in_period = scored[scored["Risk_Tier"] != "Out of Period"]
-
-                # Separate Critical/High (always in) from Medium (can dedup); Low never shown
-                _hc_mask = in_period["Risk_Tier"].isin(["Critical", "High"])
-                hc_events = in_period[_hc_mask].copy()
-                med_low    = in_period[in_period["Risk_Tier"] == "Medium"].copy()
-
-                # Filter 2: Dedup burst events — Medium/Low only
-                med_low = med_low[~med_low.get(
-                    "_is_burst_dup", pd.Series(False, index=med_low.index))]
-
-                # Deduplicate off-hours (Rule 10) — Medium/Low only, 1 per user
-                _TEMPORAL_KEY = med_low["user_id"].astype(str) + "||temporal"
-                temporal_mask = med_low["score_temporal"] > 0
-                if temporal_mask.any():
-                    med_low = med_low.copy()
-                    med_low["_temporal_rank"] = med_low.groupby(
-                        _TEMPORAL_KEY)["score_temporal"].rank(
-                        method="first", ascending=False)
-                    med_low = med_low[
-                        (med_low["score_temporal"] == 0) |
-                        (med_low["_temporal_rank"] <= 1)
-                    ]
-
-                # Also dedup Medium burst events by key (user+action+record_id)
-                med_low = med_low.sort_values("Risk_Score", ascending=False)
-                med_low = med_low.drop_duplicates(
-                    subset=["user_id","action_type","record_id"], keep="first"
-                ) if all(c in med_low.columns for c in ["user_id","action_type","record_id"]) \
-                  else med_low
-
-                # Combine: all H/C first, then fill remaining slots with Medium
-                hc_events  = hc_events.sort_values("Risk_Score", ascending=False)
-                n_hc       = len(hc_events)
-                remaining  = max(0, _AT_TOP_N - n_hc)
-                med_top    = med_low.head(remaining)
-                qualified  = pd.concat([hc_events, med_top]).reset_index(drop=True)
-
-                # No fill padding — shorter honest report beats padded low-signal one
-                top20 = qualified.copy()
-
-                # ── v96 PERF: Apply deferred per-row operations to Top-20 only ──
-                # at_score_events() skips these on the full 100k-row DataFrame to
-                # avoid running expensive Python-function applies at scale. Now that
-                # we have the final Top-20 (≤20 rows), compute them here.
-                if top20.get("_relabel_pending", pd.Series([False])).any():
-                    # 1. Rule_Rationale — combined rationale string (all rule notes)
-                    if "_combined_rat" in dir():
-                        top20["Rule_Rationale"] = top20.apply(_combined_rat, axis=1)
-                    # 2. Suggested_Disposition + Rationale
-                    if "_suggested_disposition" in dir():
-                        _sd = [_suggested_disposition(r) for _, r in top20.iterrows()]
-                        top20["Suggested_Disposition"]          = [x[0] for x in _sd]
-                        top20["Suggested_Disposition_Rationale"]= [x[1] for x in _sd]
-                    # 3. RELABEL_COLS — v96 UI-sequence rule number remap
-                    _RELABEL_COLS_TOP = [
-                        "Primary_Rule", "Supporting_Signals", "Triggered_Rules",
-                        "rule1_rationale", "Rationale", "System_Narrative",
-                        "Suggested_Disposition", "Suggested_Disposition_Rationale",
-                        "Action_Required", "Regulatory_Basis", "Sequence_Context",
-                    ]
-                    for _rc in _RELABEL_COLS_TOP:
-                        if _rc in top20.columns:
-                            top20[_rc] = top20[_rc].astype(str).apply(_relabel_rule)
-                    top20.drop(columns=["_relabel_pending"], errors="ignore", inplace=True)
-
-                # Also apply relabeling to scored df's Triggered_Rules for Full Audit Log
-                if "_relabel_pending" in scored.columns:
-                    for _rc in ("Primary_Rule", "Triggered_Rules"):
-                        if _rc in scored.columns:
-                            scored[_rc] = scored[_rc].astype(str).apply(_relabel_rule)
-                    scored.drop(columns=["_relabel_pending"], errors="ignore", inplace=True)
-
-                # ── v96 — Same-rule-same-user aggregation (≥3 threshold) ───────
-                # Reviewer-fatigue intervention: when the same user trips the
-                # same Primary_Rule 3+ times in the qualified set, collapse the
-                # group to a single representative row (highest Risk_Score wins)
-                # and stash the detail rows for a separate "Aggregated Detail"
-                # sheet. Reduces visual noise without losing evidence.
-                #
-                # Critical-tier rows are NEVER aggregated — each Critical finding
-                # is independently auditable and deserves its own row regardless
-                # of repetition pattern.
-                #
-                # Aggregation key: (user_id, Primary_Rule). We use Primary_Rule
-                # rather than the score column because Primary_Rule is the
-                # finding label the reviewer actually sees.
-                _AGG_THRESHOLD = 3
-                _aggregated_detail_rows = []   # collects rows that get rolled up
-                if (len(top20) > 0
-                    and "user_id" in top20.columns
-                    and "Primary_Rule" in top20.columns
-                    and "Risk_Tier" in top20.columns
-                    and "Risk_Score" in top20.columns):
-                    # Identify candidate groups: non-Critical rows with ≥3 events
-                    _aggregable = top20[top20["Risk_Tier"] != "Critical"].copy()
-                    _aggregable["_group_key"] = (
-                        _aggregable["user_id"].astype(str).str.strip()
-                        + "||" + _aggregable["Primary_Rule"].astype(str).str.strip()
-                    )
-                    _group_sizes = _aggregable.groupby("_group_key").size()
-                    _aggregable_groups = set(_group_sizes[_group_sizes >= _AGG_THRESHOLD].index)
-                    if _aggregable_groups:
-                        # Build a parallel _group_key on top20 for the same rows
-                        _top_keys = (top20["user_id"].astype(str).str.strip()
-                                     + "||" + top20["Primary_Rule"].astype(str).str.strip())
-                        _is_aggregable = _top_keys.isin(_aggregable_groups) & (top20["Risk_Tier"] != "Critical")
-                        # For each aggregable group, keep the highest-scored row and
-                        # mark it; route the rest to detail.
-                        _keep_idx = []
-                        _detail_idx = []
-                        for grp in _aggregable_groups:
-                            grp_rows = top20[(_top_keys == grp) & (top20["Risk_Tier"] != "Critical")]
-                            grp_rows_sorted = grp_rows.sort_values("Risk_Score", ascending=False)
-                            _keep_idx.append(grp_rows_sorted.index[0])
-                            _detail_idx.extend(list(grp_rows_sorted.index[1:]))
-                        # Pull detail rows into the parking lot, with original primary rep noted
-                        _detail_df = top20.loc[_detail_idx].copy() if _detail_idx else pd.DataFrame()
-                        if not _detail_df.empty:
-                            _aggregated_detail_rows = _detail_df.copy()
-                        # Compute Event_Count per kept representative
-                        _event_count_map = {grp: len(top20[(_top_keys == grp) & (top20["Risk_Tier"] != "Critical")])
-                                            for grp in _aggregable_groups}
-                        # Build final top20: non-aggregable rows + representatives
-                        _to_drop = set(_detail_idx)
-                        top20 = top20[~top20.index.isin(_to_drop)].copy()
-                        top20["Event_Count"] = 1
-                        # Re-derive group keys post-drop for the surviving aggregable rows
-                        _surv_keys = (top20["user_id"].astype(str).str.strip()
-                                      + "||" + top20["Primary_Rule"].astype(str).str.strip())
-                        for grp, cnt in _event_count_map.items():
-                            top20.loc[_surv_keys == grp, "Event_Count"] = cnt
-                    else:
-                        top20["Event_Count"] = 1
-                else:
-                    top20["Event_Count"] = 1
+                st.write(f"📋 Step 2: Selecting Top {_AT_TOP_N} highest-risk events...")
+                scored, top20, _aggregated_detail_rows, n_oop = _at_select_for_review(
+                    scored,
+                    st.session_state.get("at_review_start", ""),
+                    st.session_state.get("at_review_end", ""))
+                if n_oop:
+                    st.info(f"ℹ️ {n_oop:,} event(s) fall outside the declared "
+                            f"review period and have been excluded from scoring.")
 
                 # Stash aggregated detail for the Excel builder's "Aggregated Detail" sheet.
                 # If empty, the builder skips creating the sheet.
@@ -21283,6 +25475,9 @@ match your system's export column names to the fields above — rename nothing i
                     file_hash=st.session_state.get("at_pending_hash", ""),
                     filename=st.session_state.get("at_file_name", ""),
                 )
+                # Speculative workbook build — starts now so the download is
+                # usually ready by the time the reviewer has read the Top-20.
+                _at_submit_workbook_build(top20, scored)
 
                 # ── Auto-feed DIM ──────────────────────────────────────────────
                 # Bank ALL High/Critical events — not just the top-20 UI cap.
@@ -21293,45 +25488,8 @@ match your system's export column names to the fields above — rename nothing i
                 ).strip(" →") or f"Period {st.session_state.get('dim_periods_banked',0)+1}"
                 _at_sys  = st.session_state.get("at_system_name", "System")
                 _at_file = st.session_state.get("at_file_name", "")
-                _hc_scored = scored[scored["Risk_Tier"].isin(["High", "Critical"])].copy()
-                _dim_rows = []
-                # Build config hash — identifies which rules were active this run
-                import hashlib as _hashlib
-                _cfg_active = sorted(
-                    k for k, v in _AT_RULE_CONFIG.items() if v
-                ) if "_AT_RULE_CONFIG" in dir() else []
-                _config_hash = _hashlib.md5(
-                    ",".join(_cfg_active).encode()).hexdigest()[:8]
-                for _, _ev in _hc_scored.iterrows():
-                    _at_rule_str = str(_ev.get("Primary_Rule", ""))
-                    _dim_rows.append({
-                        "Review_Period":  _at_period_label,
-                        "Username":       str(_ev.get("user_id", _ev.get("User", "unknown"))),
-                        "Risk_Level":     str(_ev.get("Risk_Tier", "Medium")),
-                        "Rule_Triggered": _at_rule_str,
-                        "Event_Category": _dim_event_category(_at_rule_str),
-                        "System_Name":    _at_sys,
-                        "Event_Type":     str(_ev.get("action_type", _ev.get("Action", ""))),
-                        "Event_Timestamp":str(_ev.get("timestamp",   _ev.get("Timestamp", ""))),
-                        "Source_File":    _at_file,
-                        "Source_Module":  "AT",
-                        "Config_Hash":    _config_hash,
-                    })
-                # Always bank the period even when 0 events are escalated
-                if not _dim_rows:
-                    _dim_rows.append({
-                        "Review_Period":  _at_period_label,
-                        "Username":       "(no escalations)",
-                        "Risk_Level":     "Low",
-                        "Rule_Triggered": "No named rules triggered",
-                        "Event_Category": "Other",
-                        "System_Name":    _at_sys,
-                        "Event_Type":     "",
-                        "Event_Timestamp":"",
-                        "Source_File":    _at_file,
-                        "Source_Module":  "AT",
-                        "Config_Hash":    _config_hash,
-                    })
+                _dim_rows = _at_dim_rows(scored, _at_period_label, _at_sys, _at_file,
+                                         _AT_RULE_CONFIG)
                 _existing = [r for r in st.session_state.get("dim_accumulated_rows", [])
                              if r["Review_Period"] != _at_period_label]
                 _existing.extend(_dim_rows)
@@ -21341,6 +25499,8 @@ match your system's export column names to the fields above — rename nothing i
                 # Invalidate cached DIM result so next DIM open re-scores
                 st.session_state["dim_analysis_done"] = False
                 st.session_state["dim_result"] = None
+                st.session_state["dim_cache"] = None
+                st.session_state["dim_rows_gen"] = st.session_state.get("dim_rows_gen", 0) + 1
 
                 n_crit = int((scored["Risk_Tier"]=="Critical").sum())
                 _ = prog.progress(1.0)
@@ -21465,22 +25625,15 @@ match your system's export column names to the fields above — rename nothing i
                     "*'(review period dates not specified)'* instead of actual dates. "
                     "Enter Start and End dates above to include them in the report."
                 )
-            # ── Cache Excel bytes — build once, reuse on every subsequent rerun ──
-            # at_build_excel on 50k rows takes 3-5 minutes. Without caching, every
-            # Streamlit rerun (including the one triggered by clicking the download
-            # button itself) rebuilds the workbook from scratch. Cache key includes
-            # sys_name + r_start + r_end so a metadata change correctly invalidates.
-            _xlsx_cache_key = f"at_xlsx_cache_{sys_name}_{r_start}_{r_end}"
+            # ── Excel bytes come from the background artifact builder ─────────
+            # at_build_excel on 50k rows takes 3-5 minutes. The build was queued
+            # when scoring finished; submitting again is a no-op for the same
+            # key, and a metadata change (sys_name / dates / rule config) yields
+            # a new key and therefore a fresh build. Session cache keeps the
+            # bytes across reruns without re-reading the registry.
+            _artifact_id    = _at_submit_workbook_build(top20, scored)
+            _xlsx_cache_key = f"at_xlsx_cache_{_artifact_id}"
             xlsx = st.session_state.get(_xlsx_cache_key)
-            if xlsx is None:
-                xlsx = at_build_excel(
-                    top20, scored,
-                    sys_name,
-                    r_start  or "(review period dates not specified)",
-                    r_end    or "(review period dates not specified)",
-                    st.session_state.get("at_file_name",""),
-                )
-                st.session_state[_xlsx_cache_key] = xlsx
             # ── Download left, Start New Analysis right ────────────────────────
             _at_fname = st.session_state.get("at_file_name", "")
             dl_col, na_col = st.columns(2)
@@ -21491,15 +25644,20 @@ match your system's export column names to the fields above — rename nothing i
                     "<p style='font-size:0.76rem;margin:0 0 4px;visibility:hidden;'>_</p>",
                     unsafe_allow_html=True
                 )
-                _trial_gate(
-                    label="📥 Download Evidence Package (.xlsx)",
-                    data=xlsx,
-                    file_name=(f"AuditTrail_{sys_name.replace(' ','_')}"
-                               f"_{datetime.date.today()}.xlsx"),
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="at_download_btn",
-                    use_container_width=True,
-                )
+                if xlsx is None:
+                    xlsx = artifact_wait(_artifact_id, "evidence package")
+                    if xlsx is not None:
+                        st.session_state[_xlsx_cache_key] = xlsx
+                if xlsx is not None:
+                    _trial_gate(
+                        label="📥 Download Evidence Package (.xlsx)",
+                        data=xlsx,
+                        file_name=(f"AuditTrail_{sys_name.replace(' ','_')}"
+                                   f"_{datetime.date.today()}.xlsx"),
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        key="at_download_btn",
+                        use_container_width=True,
+                    )
                 st.markdown(
                     "<p style='color:#64748b;font-size:0.76rem;margin-top:4px;line-height:1.5;'>"
                     "Output generated with 6 worksheets: <b style='color:#94a3b8;'>Summary</b> · "
@@ -21525,7 +25683,8 @@ match your system's export column names to the fields above — rename nothing i
                               "at_file_name","at_mapping_done","at_analysis_done","at_total_events",
                               "at_review_start","at_review_end",
                               "at_last_run_hash","at_last_run_filename","at_invalidation_msg",
-                              "at_pending_hash","at_ts_parse_warn"] + _cache_keys:
+                              "at_pending_hash","at_ts_parse_warn",
+                              "at_rule_profile","at_rule_profile_path"] + _cache_keys:
                         if k in st.session_state:
                             del st.session_state[k]
                     st.session_state["at_key_n"] = st.session_state.get("at_key_n",0) + 1
@@ -21545,6 +25704,35 @@ match your system's export column names to the fields above — rename nothing i
                 unsafe_allow_html=True,
             )
 
+        # ── Scoring performance — per-stage profile from _AtRuleProfiler ───────
+        _at_prof = st.session_state.get("at_rule_profile")
+        if st.session_state.get("at_analysis_done") and _at_prof:
+            with st.expander(
+                f"⏱️ Scoring Performance — {_at_prof['total_seconds']:.1f}s for "
+                f"{_at_prof['rows']:,} events"
+                + (f" · {_at_prof['workers']} workers" if _at_prof.get("workers", 1) > 1 else ""),
+                expanded=False,
+            ):
+                st.dataframe(
+                    pd.DataFrame(_at_prof["stages"])[
+                        ["stage", "seconds", "share_pct", "rows_examined", "rows_fired"]
+                    ].rename(columns={
+                        "stage": "Stage", "seconds": "Wall (s)", "share_pct": "% of Total",
+                        "rows_examined": "Rows Examined", "rows_fired": "Rows Fired",
+                    }),
+                    use_container_width=True, hide_index=True,
+                )
+                st.download_button(
+                    "⬇️ Download profile (JSON)",
+                    data=_json.dumps(_at_prof, indent=2).encode("utf-8"),
+                    file_name="at_score_profile.json",
+                    mime="application/json",
+                    key="at_profile_dl",
+                )
+                if st.session_state.get("at_rule_profile_path"):
+                    st.caption(f"Saved for regression tracking: "
+                               f"`{st.session_state['at_rule_profile_path']}`")
+
         # ── DIM Counter — full width, light background ─────────────────────────
         _banked = st.session_state.get("dim_periods_banked", 0)
         st.markdown("<div style='margin-top:14px;'></div>", unsafe_allow_html=True)
@@ -22139,6 +26327,116 @@ section[data-testid="stSidebar"] .stRadio [data-baseweb="radio"] div div {
                             st.success(f"User '{new_u_clean}' created with role: {new_r}.")
                     else:
                         st.warning("Username and password are required.")
+            with st.expander("⏱ LLM Gateway", expanded=False):
+                _gw_stats = llm_gateway_stats()
+                if _gw_stats.empty:
+                    st.caption("No LLM calls recorded since the app started.")
+                else:
+                    st.dataframe(_gw_stats, use_container_width=True, hide_index=True)
+                    st.caption("Cascade order by live health: "
+                               + " → ".join(_llm_ranked_cascade()))
+                    st.caption(f"Last {len(_LLM_CALL_LOG)} calls — per-provider limits: "
+                               + ", ".join(f"{p} {s['limits']['rpm']} rpm / "
+                                           f"{s['limits']['concurrency']} concurrent"
+                                           for p, s in sorted(_LLM_PROVIDERS.items())))
+            with st.expander("🚀 Startup Profile", expanded=False):
+                _bp = _boot_profile()
+                _bp_df = pd.DataFrame(_bp["cold"]).rename(columns={"ms": "Cold start (ms)"})
+                _bp_df["This rerun (ms)"] = [r["ms"] for r in _bp["last"]]
+                st.dataframe(_bp_df, use_container_width=True, hide_index=True)
+                st.caption(f"Cold start total: {sum(r['ms'] for r in _bp['cold']):,.0f} ms · "
+                           f"this rerun: {sum(r['ms'] for r in _bp['last']):,.0f} ms")
+                if _bp["lazy_imports"]:
+                    st.caption("Deferred imports (first-use cost, off the startup path): "
+                               + ", ".join(f"{m} {ms:,.0f} ms"
+                                           for m, ms in _bp["lazy_imports"].items()))
+                else:
+                    st.caption("No deferred dependency has been imported yet this process.")
+            with st.expander("📦 Background Builds", expanded=False):
+                _ab_stats = artifact_stats()
+                if _ab_stats.empty:
+                    st.caption("No evidence workbooks built since the app started.")
+                else:
+                    st.dataframe(_ab_stats, use_container_width=True, hide_index=True)
+                st.caption(f"Workbooks persist in {_ARTIFACT_DIR} for "
+                           f"{_ARTIFACT_TTL_S // 3600} h.")
+            with st.expander("🔎 Audit Search", expanded=False):
+                _as_table = st.selectbox("Log", list(_AUDIT_SEARCH_TABLES),
+                                         key="audit_search_table")
+                _as_text  = st.text_input("Text", key="audit_search_text",
+                                          placeholder="Free text (action, object, reason…)")
+                _as_user  = st.text_input("User", key="audit_search_user",
+                                          placeholder="Exact username")
+                _as_act   = st.text_input("Action", key="audit_search_action",
+                                          placeholder="Exact action, e.g. LOGIN_FAILED")
+                _as_from  = st.date_input("From", value=None, key="audit_search_from")
+                _as_to    = st.date_input("To",   value=None, key="audit_search_to")
+                _as_page  = st.number_input("Page", min_value=1, value=1, step=1,
+                                            key="audit_search_page")
+                _as = audit_search(_as_table, user=_as_user.strip() or None,
+                                   date_from=_as_from, date_to=_as_to,
+                                   action=_as_act.strip() or None, text=_as_text,
+                                   page=int(_as_page), page_size=50)
+                if _as.get("error"):
+                    st.warning(f"Audit search failed: {_as['error']}")
+                else:
+                    st.dataframe(_as["rows"], use_container_width=True, hide_index=True)
+                    st.caption(f"{_as['total']:,} match(es) · page {_as['page']} of "
+                               f"{max(_as['pages'], 1)} · {_as['ms']:,.1f} ms"
+                               + (" · full-text index" if _as["fts"] else "")
+                               + (f" · {_as['segments']} archive segment(s)"
+                                  if _as["segments"] else ""))
+            with st.expander("🗃 Artifact Store", expanded=False):
+                _bs = blob_stats()
+                if "error" in _bs:
+                    st.caption(f"Blob store unavailable: {_bs['error']}")
+                else:
+                    st.caption(f"{_bs['blobs']:,} blob(s) · "
+                               f"{_bs['stored_bytes'] / 1048576:,.1f} MB on disk for "
+                               f"{_bs['referenced_bytes'] / 1048576:,.1f} MB referenced · "
+                               + (", ".join(f"{p} {n:,}" for p, n in sorted(_bs["refs"].items()))
+                                  or "no references"))
+                    st.caption("Retention: " + ", ".join(
+                        f"{p} {'forever' if d is None else f'{d} d'}"
+                        for p, d in _BLOB_RETENTION_DAYS.items()))
+                if st.button("Apply retention now", key="blob_gc_btn"):
+                    _gc = blob_gc()
+                    _nc = _narrative_cache_prune()
+                    st.success(f"{_gc['offloaded']} legacy row(s) offloaded, "
+                               f"{_gc['expired_refs'] + _gc['orphan_refs']} reference(s) "
+                               f"released, {_gc['blobs_deleted']} blob(s) deleted "
+                               f"({_gc['bytes_freed'] / 1048576:,.1f} MB), "
+                               f"{_nc} cached narrative(s) pruned.")
+            with st.expander("🗄 Audit Archive", expanded=False):
+                # Listing reads archive_segments only; verification re-hashes
+                # every segment file, so it runs on demand.
+                _segs = _archive_segments()
+                if not _segs:
+                    st.caption("No archive segments sealed yet.")
+                else:
+                    st.dataframe(pd.DataFrame(_segs)[
+                        ["segment_id", "table_name", "period", "row_count",
+                         "file_name", "sealed_at"]],
+                        use_container_width=True, hide_index=True)
+                    st.caption(f"{len(_segs)} segment(s), "
+                               f"{sum(s['row_count'] for s in _segs):,} rows.")
+                    if st.button("Verify chain", key="audit_archive_verify"):
+                        _av = archive_verify()
+                        if _av["ok"].all():
+                            st.success(f"Hash chain intact across {len(_av)} segment(s).")
+                        else:
+                            st.error(f"{int((~_av['ok']).sum())} segment(s) fail verification.")
+                            st.dataframe(_av[~_av["ok"]], use_container_width=True,
+                                         hide_index=True)
+                st.caption(f"Closed months older than the last {_ARCHIVE_HOT_MONTHS} "
+                           f"are sealed to {_ARCHIVE_DIR}.")
+                if st.button("Seal closed months", key="audit_archive_seal"):
+                    try:
+                        _sealed = archive_seal_closed(user)
+                        st.success(f"Sealed {len(_sealed)} segment(s), "
+                                   f"{sum(s['row_count'] for s in _sealed):,} rows.")
+                    except Exception as e:
+                        st.error(f"Archive sealing failed: {e}")
     # ── Bottom action bar — Back + End Session ───────────────────────────────
     # Rendered AFTER all module content so it never sits adjacent to module
     # buttons (e.g. UAR confirm mapping) and cannot be accidentally triggered.
@@ -22750,12 +27048,7 @@ section[data-testid="stSidebar"] .stRadio [data-baseweb="radio"] div div {
             # ── URS Accountability Check ───────────────────────────────────────
             if not urs_df.empty and "Req_ID" in urs_df.columns:
                 urs_ids_all  = set(urs_df["Req_ID"].dropna().astype(str).str.strip())
-                frs_urs_refs = set()
-                if not frs_df.empty and "Source_URS_Ref" in frs_df.columns:
-                    frs_urs_refs = set(
-                        re.sub(r'\s*\(.*?\)\s*$', '', s).strip()
-                        for s in frs_df["Source_URS_Ref"].dropna().astype(str)
-                    )
+                frs_urs_refs = _build_link_index(None, frs_df, None)["frs_urs_refs"]
                 uncovered_urs = urs_ids_all - frs_urs_refs
                 if uncovered_urs:
                     log_audit(user, "URS_FRS_GAP_DETECTED", "URS_FILE",
@@ -23352,7 +27645,13 @@ section[data-testid="stSidebar"] .stRadio [data-baseweb="radio"] div div {
 # =============================================================================
 # 13. ROUTER
 # =============================================================================
-if not st.session_state.authenticated:
-    show_login()
-else:
-    show_app()
+_BOOT_MARKS.append(("module definitions", _boot_time.perf_counter()))
+_boot_profile()
+
+# Streamlit executes this file as __main__ on every rerun. Importing it as a
+# module (engine_bench.py) loads the scoring engines without rendering a page.
+if __name__ == "__main__":
+    if not st.session_state.authenticated:
+        show_login()
+    else:
+        show_app()
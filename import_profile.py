@@ -0,0 +1,80 @@
+"""
+VALINTEL.AI — Cold-Start Import Profile
+=======================================
+Measures how long generator.py's third-party dependencies take to import in
+a fresh interpreter, comparing the old eager import set with the current one
+(litellm, the langchain PDF loader and pdfplumber now load on first use).
+
+Each set is imported in a new subprocess so nothing is served from
+sys.modules; the median of N runs is reported.
+
+Usage:
+    python import_profile.py [runs]
+
+    runs — subprocess runs per set (default 5)
+
+Exit code: 0 always (this is a measurement, not a gate)
+"""
+
+import sys
+import subprocess
+import statistics
+import importlib.util
+
+
+# ── Import sets ───────────────────────────────────────────────────────────────
+
+EAGER_BEFORE = [
+    "streamlit", "pandas", "litellm", "langchain_community.document_loaders",
+    "pdfplumber", "openpyxl.styles", "bcrypt",
+]
+EAGER_NOW = ["streamlit", "pandas", "openpyxl.styles", "bcrypt"]
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module.split(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _time_imports(modules: list, runs: int) -> float:
+    """Median wall time (seconds) to import `modules` in a fresh interpreter."""
+    code = (
+        "import time; t = time.perf_counter()\n"
+        + "".join(f"import {m}\n" for m in modules)
+        + "print(time.perf_counter() - t)"
+    )
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code],
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    missing = [m for m in EAGER_BEFORE if not _installed(m)]
+    if missing:
+        print(f"⚠️  Not installed (excluded from both sets): {', '.join(missing)}")
+
+    before = [m for m in EAGER_BEFORE if m not in missing]
+    now    = [m for m in EAGER_NOW if m not in missing]
+
+    print(f"\nPer-module import cost (median of {runs}):")
+    for m in before:
+        flag = "eager" if m in now else "lazy "
+        print(f"  [{flag}] {m:<42} {_time_imports([m], runs) * 1000:8.1f} ms")
+
+    t_before = _time_imports(before, runs)
+    t_now    = _time_imports(now, runs)
+    print(f"\nEager set before : {t_before * 1000:8.1f} ms")
+    print(f"Eager set now    : {t_now * 1000:8.1f} ms")
+    if t_before > 0:
+        print(f"Reduction        : {(1 - t_now / t_before) * 100:7.1f} %")